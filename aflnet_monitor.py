@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Live progress of the AFLNet jobs of a generation.
+
+AFLNet keeps ``plot_data`` (one line per stats update), ``fuzzer_stats``
+and the state machine it learnt (``ipsm.dot``) in its output directory,
+inside the container, and we only looked at them once the final tarball
+had been copied out. A JobMonitor polls them through the container runtime
+while the job runs (container_runtime.Runtime.read) and appends the new
+rows to ``<aflnet output>/progress_<pool>.jsonl``:
+
+    time, elapsed, pool, paths, edges, states, execs_per_sec, cycles, crashes, hangs
+
+``edges`` is estimated from AFL's map density (map_size% of the 64k map);
+``states`` is the number of states in ipsm.dot at poll time. When the job
+has finished, the complete ``plot_data`` in its tarball fills in the rows
+the polls missed. getcov_fuzzbench_net.py finally consolidates the rows of
+all pools into ``<logdir>/aflnet_progress.parquet`` (with pyarrow; without
+it the JSON lines are all there is).
+
+ELMFUZZ_MONITOR=0 turns the polling off; ELMFUZZ_MONITOR_INTERVAL is the
+seconds between polls (default 30). The helpers at the bottom (load,
+latest, series, exec_rate, stalled_pools) are for the plot scripts and for
+decisions taken while the campaign runs:
+
+    python aflnet_monitor.py status gen3/aflnetout                 # while it runs
+    python aflnet_monitor.py series gen3/logs/aflnet_progress.parquet -p 0001 -c edges
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tarfile
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+MONITOR_ENV = 'ELMFUZZ_MONITOR'
+INTERVAL_ENV = 'ELMFUZZ_MONITOR_INTERVAL'
+TABLE_FILE = 'aflnet_progress.parquet'
+ROWS_GLOB = 'progress_*.jsonl'
+
+COLUMNS = ['time', 'elapsed', 'pool', 'paths', 'edges', 'states', 'execs_per_sec', 'cycles', 'crashes', 'hangs']
+# AFL's plot_data columns, when the file has no header
+PLOT_DATA_COLUMNS = ['unix_time', 'cycles_done', 'cur_path', 'paths_total', 'pending_total', 'pending_favs',
+                     'map_size', 'unique_crashes', 'unique_hangs', 'max_depth', 'execs_per_sec']
+MAP_SIZE = 65536
+# Directories below the image's working directory the output may be in
+SEARCH_DEPTH = 3
+
+DOT_NODE_RE = re.compile(r'^\s*"?(\w+)"?\s*(?:\[|;|$|->)')
+DOT_EDGE_RE = re.compile(r'"?(\w+)"?\s*->\s*"?(\w+)"?')
+
+def monitor_enabled() -> bool:
+    return os.environ.get(MONITOR_ENV, '1') != '0'
+
+def poll_interval() -> float:
+    return float(os.environ.get(INTERVAL_ENV, '30'))
+
+def parse_plot_data(text: str) -> List[dict]:
+    columns = PLOT_DATA_COLUMNS
+    rows = []
+    for line in text.splitlines():
+        if line.startswith('#'):
+            columns = [c.strip() for c in line.lstrip('#').split(',')]
+            continue
+        values = [v.strip() for v in line.split(',')]
+        if len(values) < len(columns):
+            continue
+        rows.append(dict(zip(columns, values)))
+    return rows
+
+def parse_fuzzer_stats(text: str) -> Dict[str, str]:
+    stats = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition(':')
+        if sep:
+            stats[key.strip()] = value.strip()
+    return stats
+
+def count_states(dot: str) -> int:
+    states = set()
+    for line in dot.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('digraph', 'graph', '}', '{', 'node', 'edge', '//')):
+            continue
+        m = DOT_EDGE_RE.search(line)
+        if m:
+            states.update(m.groups())
+            continue
+        m = DOT_NODE_RE.match(line)
+        if m:
+            states.add(m.group(1))
+    return len(states)
+
+def number(value, cast=float):
+    try:
+        return cast(str(value).rstrip('%'))
+    except (TypeError, ValueError):
+        return None
+
+def plot_row(pool: str, start: Optional[float], raw: dict) -> dict:
+    t = number(raw.get('unix_time'))
+    density = number(raw.get('map_size'))
+    return {
+        'time': t,
+        'elapsed': t - start if t is not None and start is not None else None,
+        'pool': pool,
+        'paths': number(raw.get('paths_total'), int),
+        'edges': round(density / 100 * MAP_SIZE) if density is not None else None,
+        'states': None,
+        'execs_per_sec': number(raw.get('execs_per_sec')),
+        'cycles': number(raw.get('cycles_done'), int),
+        'crashes': number(raw.get('unique_crashes'), int),
+        'hangs': number(raw.get('unique_hangs'), int),
+    }
+
+class JobMonitor:
+    """Polls the AFLNet output of one running job and appends its progress rows."""
+
+    def __init__(self, runtime, handle: str, pool: str, output_base: str, dest_dir: str, workdir: str,
+                 interval: Optional[float] = None):
+        self.runtime = runtime
+        self.handle = handle
+        self.pool = pool
+        self.output_base = output_base
+        self.path = os.path.join(dest_dir, f'progress_{pool}.jsonl')
+        self.workdir = workdir
+        self.interval = poll_interval() if interval is None else interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.start_time = None
+        self.last_time = None
+        self.rows = 0
+        # Rows already recorded (an interrupted run appends to the same file)
+        for row in load_rows(self.path):
+            if row.get('time') is None:
+                continue
+            self.last_time = max(self.last_time or row['time'], row['time'])
+            if self.start_time is None and row.get('elapsed') is not None:
+                self.start_time = row['time'] - row['elapsed']
+
+    def patterns(self, name: str) -> List[str]:
+        return [os.path.join(self.workdir, *(['*'] * depth), self.output_base, name)
+                for depth in range(SEARCH_DEPTH + 1)]
+
+    def read(self, name: str) -> Optional[str]:
+        data = self.runtime.read(self.handle, self.patterns(name))
+        return data.decode('utf-8', errors='replace') if data is not None else None
+
+    def add(self, plot_text: Optional[str], stats_text: Optional[str], dot_text: Optional[str]) -> int:
+        stats = parse_fuzzer_stats(stats_text) if stats_text else {}
+        if self.start_time is None and number(stats.get('start_time')) is not None:
+            self.start_time = number(stats['start_time'])
+        states = count_states(dot_text) if dot_text else None
+        raw_rows = parse_plot_data(plot_text) if plot_text else []
+        if not raw_rows and stats:
+            # No plot_data yet: the current stats
+            raw_rows = [{'unix_time': stats.get('last_update'), 'cycles_done': stats.get('cycles_done'),
+                         'paths_total': stats.get('paths_total'), 'map_size': stats.get('bitmap_cvg'),
+                         'unique_crashes': stats.get('unique_crashes'),
+                         'unique_hangs': stats.get('unique_hangs'), 'execs_per_sec': stats.get('execs_per_sec')}]
+        new = []
+        for raw in raw_rows:
+            t = number(raw.get('unix_time'))
+            if t is None or (self.last_time is not None and t <= self.last_time):
+                continue
+            if self.start_time is None:
+                self.start_time = t
+            new.append(plot_row(self.pool, self.start_time, raw))
+        if not new:
+            return 0
+        # The state count is only known for now
+        new[-1]['states'] = states
+        with open(self.path, 'a') as f:
+            for row in new:
+                print(json.dumps(row), file=f)
+        self.last_time = new[-1]['time']
+        self.rows += len(new)
+        return len(new)
+
+    def poll(self) -> int:
+        return self.add(self.read('plot_data'), self.read('fuzzer_stats'), self.read('ipsm.dot'))
+
+    def loop(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Warning: monitoring job {self.pool} failed: {e}", file=sys.stderr)
+
+    def start(self) -> 'JobMonitor':
+        self.thread = threading.Thread(target=self.loop, name=f'monitor-{self.pool}', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def ingest_tarball(self, path: str) -> int:
+        """Rows of the finished job's plot_data that the polls missed."""
+        files = {}
+        try:
+            with tarfile.open(path, 'r:*') as tf:
+                for member in tf.getmembers():
+                    name = os.path.basename(member.name)
+                    parts = member.name.split('/')
+                    if member.isfile() and name in ('plot_data', 'fuzzer_stats', 'ipsm.dot') \
+                            and '.state' not in parts:
+                        f = tf.extractfile(member)
+                        if f is not None:
+                            files[name] = f.read().decode('utf-8', errors='replace')
+        except (OSError, tarfile.TarError) as e:
+            print(f"Warning: cannot read the progress of job {self.pool} from {path}: {e}", file=sys.stderr)
+            return 0
+        return self.add(files.get('plot_data'), files.get('fuzzer_stats'), files.get('ipsm.dot'))
+
+# -- storage ----------------------------------------------------------------
+
+def load_rows(path: str) -> List[dict]:
+    rows = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return rows
+
+def consolidate(aflnet_dir: str, table_path: str) -> Optional[str]:
+    """Write the rows of all pools to a Parquet table; None without pyarrow or rows."""
+    rows = []
+    for path in sorted(glob.glob(os.path.join(aflnet_dir, ROWS_GLOB))):
+        rows += load_rows(path)
+    if not rows:
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print(f"pyarrow is not installed; the AFLNet progress stays in {aflnet_dir}/{ROWS_GLOB}", file=sys.stderr)
+        return None
+    table = pa.table({c: [row.get(c) for row in rows] for c in COLUMNS})
+    pq.write_table(table, table_path)
+    return table_path
+
+# -- queries ----------------------------------------------------------------
+
+def load(path: str) -> List[dict]:
+    """Progress rows of a Parquet table, a progress_*.jsonl file or a directory of them."""
+    if os.path.isdir(path):
+        rows = []
+        for p in sorted(glob.glob(os.path.join(path, ROWS_GLOB))):
+            rows += load_rows(p)
+        return rows
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pylist()
+    return load_rows(path)
+
+def latest(rows: List[dict]) -> Dict[str, dict]:
+    """The last row of every pool, with the last known state count."""
+    last: Dict[str, dict] = {}
+    states: Dict[str, int] = {}
+    for row in sorted(rows, key=lambda r: r.get('time') or 0):
+        last[row['pool']] = row
+        if row.get('states') is not None:
+            states[row['pool']] = row['states']
+    return {pool: dict(row, states=states.get(pool)) for pool, row in last.items()}
+
+def series(rows: List[dict], pool: str, column: str) -> List[tuple]:
+    """(elapsed, value) pairs of one column of one pool, for plotting."""
+    return [(row.get('elapsed'), row.get(column))
+            for row in sorted(rows, key=lambda r: r.get('time') or 0)
+            if row['pool'] == pool and row.get(column) is not None]
+
+def exec_rate(rows: List[dict], pool: str, window: float = 300) -> Optional[float]:
+    """Mean execs/s of a pool over its last ``window`` seconds."""
+    points = series(rows, pool, 'execs_per_sec')
+    if not points:
+        return None
+    end = points[-1][0] or 0
+    recent = [v for t, v in points if t is None or t >= end - window]
+    return sum(recent) / len(recent)
+
+def stalled_pools(rows: List[dict], window: float = 600) -> List[str]:
+    """Pools whose edge and path counts have not grown in their last ``window`` seconds."""
+    by_pool = defaultdict(list)
+    for row in sorted(rows, key=lambda r: r.get('time') or 0):
+        by_pool[row['pool']].append(row)
+    stalled = []
+    for pool, pool_rows in by_pool.items():
+        end = pool_rows[-1].get('elapsed') or 0
+        if end < window:
+            continue
+        before = [r for r in pool_rows if (r.get('elapsed') or 0) <= end - window]
+        if before and (before[-1].get('edges'), before[-1].get('paths')) == \
+                (pool_rows[-1].get('edges'), pool_rows[-1].get('paths')):
+            stalled.append(pool)
+    return sorted(stalled)
+
+def main():
+    parser = argparse.ArgumentParser(description='Progress of the AFLNet jobs of a generation')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('status', help='Latest progress of every pool')
+    p.add_argument('path', help='AFLNet output directory (progress_*.jsonl) or progress table')
+    p.add_argument('--window', type=float, default=600, help='Seconds without progress to call a pool stalled')
+    p = sub.add_parser('series', help='One column of one pool as CSV (elapsed,value)')
+    p.add_argument('path')
+    p.add_argument('-p', '--pool', required=True)
+    p.add_argument('-c', '--column', default='edges', choices=COLUMNS)
+    p = sub.add_parser('consolidate', help='Write the progress rows to a Parquet table')
+    p.add_argument('path', help='AFLNet output directory')
+    p.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'consolidate':
+        print(consolidate(args.path, args.output) or 'nothing written')
+        return
+    rows = load(args.path)
+    if args.command == 'series':
+        print('elapsed,value')
+        for t, v in series(rows, args.pool, args.column):
+            print(f'{t},{v}')
+        return
+    stalled = set(stalled_pools(rows, args.window))
+    print(f"{'pool':<12} {'elapsed':>9} {'paths':>7} {'edges':>7} {'states':>7} {'execs/s':>9}")
+    for pool, row in sorted(latest(rows).items()):
+        rate = exec_rate(rows, pool)
+        print(f"{pool:<12} {row.get('elapsed') or 0:>9.0f} {row.get('paths') or 0:>7} {row.get('edges') or 0:>7} "
+              f"{row.get('states') if row.get('states') is not None else '-':>7} "
+              f"{rate if rate is not None else 0:>9.1f}{'  stalled' if pool in stalled else ''}")
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@ fi
 # to find the config file ($ELMFUZZ_RUNDIR/config.yaml)
 export ELMFUZZ_RUNDIR="$1"
 export ELMFUZZ_RUN_NAME=$(basename "$ELMFUZZ_RUNDIR")
+# Compiled raw seeds are shared between generations and models (see seed_compiler.py)
+export ELMFUZZ_SEED_CACHE="${ELMFUZZ_SEED_CACHE:-$ELMFUZZ_RUNDIR/seed_cache}"
 seeds=$(./elmconfig.py get run.seeds)
 if [ -n "${NUM_GENERATIONS:-}" ]; then
     num_gens=${NUM_GENERATIONS}
@@ -57,28 +59,11 @@ if [ $start_gen -eq -1 ]; then
             fi
     done
 else
-    for g in $(seq $start_gen $((last_gen+1))); do
-        if [ -d "$ELMFUZZ_RUNDIR/gen$g" ]; then
-            if [ "$should_clean" == "True" ]; then
-                echo "Removing existing rundir(s):" "$ELMFUZZ_RUNDIR/gen$g"
-                rm -rf "$ELMFUZZ_RUNDIR/gen$g"
-            else
-                echo "Found existing rundir(s):" "$ELMFUZZ_RUNDIR/gen$g"
-                echo "Set run.clean to True to remove existing rundirs."
-                exit 1
-            fi
-        fi
-        if [ -f "$ELMFUZZ_RUNDIR/stamps/gen$g.stamp" ]; then
-            if [ "$should_clean" == "True" ]; then
-                echo "Removing existing rundir(s):" "$ELMFUZZ_RUNDIR/stamps/gen$g.stamp"
-                rm -rf "$ELMFUZZ_RUNDIR/stamps/gen$g.stamp"
-            else
-                echo "Found existing rundir(s):" "$ELMFUZZ_RUNDIR/stamps/gen$g.stamp"
-                echo "Set run.clean to True to remove existing rundirs."
-                exit 1
-            fi
-        fi
-    done
+    # Resuming: existing generations are kept. Finished generations (stamp
+    # present) are skipped and unfinished ones continue from their stage
+    # checkpoints (gen*/logs/checkpoints.json). To redo a generation, remove
+    # its stamp and clear its checkpoints with checkpoint.py clear.
+    echo "Resuming run from generation $start_gen"
 fi
 
 if [ "$TYPE" == "fuzzbench" ]; then
@@ -104,22 +89,50 @@ if [ $start_gen -eq -1 ]; then
     python "$ELMFUZZ_RUNDIR"/seed_gen_${PROTOCOL_TYPE}.py \
         --input_seeds "$ELMFUZZ_RUNDIR"/initial/seeds/0000/ \
         --init_variants "$ELMFUZZ_RUNDIR"/initial/variants/0000/ 
-    ./do_gen_net.sh initial gen0
-    for i in $(seq 0 $last_gen); do
-        ./do_gen_net.sh gen$i gen$((i+1))
-        if [ $i -eq $last_gen ]; then
-            ./do_gen_net_finial.sh gen$((i+1)) gen$((i+2))
-        fi
-    done
+    if [ -n "${PIPELINE:-}" ]; then
+        # Overlap consecutive generations (see pipeline_net.py)
+        python pipeline_net.py run initial $(seq -f 'gen%g' 0 $((last_gen + 1)))
+        ./do_gen_net_finial.sh gen$((last_gen+1)) gen$((last_gen+2))
+    else
+        ./do_gen_net.sh initial gen0
+        for i in $(seq 0 $last_gen); do
+            ./do_gen_net.sh gen$i gen$((i+1))
+            if [ $i -eq $last_gen ]; then
+                ./do_gen_net_finial.sh gen$((i+1)) gen$((i+2))
+            fi
+        done
+    fi
 
 else
+    mkdir -p "$ELMFUZZ_RUNDIR"/stamps
+    run_gen() {
+        if [ -f "$ELMFUZZ_RUNDIR/stamps/$3.stamp" ]; then
+            echo "Generation $3 already finished; skipping"
+        else
+            "$1" "$2" "$3"
+        fi
+    }
+    if [ -n "${PIPELINE:-}" ]; then
+        # pipeline_net.py skips the stamped generations itself
+        if [ $start_gen -eq 0 ]; then
+            gens="initial $(seq -f 'gen%g' 0 $((last_gen + 1)))"
+        else
+            gens=$(seq -f 'gen%g' $((start_gen - 1)) $((last_gen + 1)))
+        fi
+        python pipeline_net.py run $gens
+        ./do_gen_net_finial.sh gen$((last_gen+1)) gen$((last_gen+2))
+        exit 0
+    fi
     if [ $start_gen -eq 0 ]; then
         real_start_gen=0
-        ./do_gen.sh initial gen0
+        run_gen ./do_gen_net.sh initial gen0
     else
         real_start_gen=$((start_gen-1))
     fi
     for i in $(seq $real_start_gen $last_gen); do
-        ./do_gen.sh gen$i gen$((i+1))
+        run_gen ./do_gen_net.sh gen$i gen$((i+1))
+        if [ $i -eq $last_gen ]; then
+            ./do_gen_net_finial.sh gen$((i+1)) gen$((i+2))
+        fi
     done
 fi
@@ -4,7 +4,6 @@ import argparse
 import json
 from collections import defaultdict
 import re
-import plotext as plt
 import os
 
 gen_re = re.compile(r'gen(\d+)')
@@ -58,6 +57,8 @@ def main():
 
     rundir = args.covfiles[0].split('/')[0]
     if args.plot and not ON_NSF_ACCESS:
+        # plotext takes longer to import than the rest of this script takes to run
+        import plotext as plt
         # Don't fill the whole terminal
         width, height = plt.ts()
         plt.plotsize(width // 2, height // 2)
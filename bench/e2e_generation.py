@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for the generation loop on a CPU-only machine.
+
+Copies a preset into a scratch run directory, points its model endpoint at
+an in-process mock TGI server (bench/mock_tgi.py), switches the coverage
+stage to the offline stub (bench/stub_getcov.py) and runs all_gen_net.sh for
+the requested number of generations. Afterwards the stage timelines are
+summarized into:
+
+    variants/s       variants written by genvariants per second of mutation
+    executions/s     generator runs by genoutputs per second of execution
+    selection time   seed + state selection wall-clock
+
+Example:
+
+    python bench/e2e_generation.py --preset preset/live555 --generations 2 \\
+        --num-variants 4 --latency 0.3 --tokens-per-second 40 --json result.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from ruamel.yaml import YAML
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+import telemetry
+import mock_tgi
+
+def prepare_rundir(preset: str, rundir: str, endpoint: str, args) -> None:
+    shutil.copytree(preset, rundir, ignore=shutil.ignore_patterns('__pycache__', 'gen*', 'initial', 'stamps'))
+    yaml = YAML()
+    config_path = os.path.join(rundir, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.load(f)
+    config['type'] = 'stub'
+    model_name = config['model']['names'][0]
+    config['model']['names'] = [model_name]
+    config['model']['endpoints'] = [f'{model_name}:{endpoint}']
+    config['run']['seeds'] = [os.path.join(rundir, 'init_seeds', '*.raw')]
+    config['run']['clean'] = True
+    if args.pools:
+        config['run']['state_pools'] = args.pools
+    gv = config['cli']['genvariants_parallel']
+    gv['num_variants'] = args.num_variants
+    if args.jobs:
+        gv['jobs'] = args.jobs
+    with open(config_path, 'w') as f:
+        yaml.dump(config, f)
+
+def stage_totals(summary: dict, stages: list[str]) -> tuple[float, int]:
+    wall = sum(r['wall_seconds'] for r in summary['stages'] if r['stage'] in stages)
+    items = sum(r['items'] for r in summary['stages'] if r['stage'] in stages)
+    return wall, items
+
+def rate(items: int, seconds: float):
+    return items / seconds if seconds > 0 else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark whole generations against a mock TGI server')
+    parser.add_argument('--preset', default=os.path.join(REPO_DIR, 'preset', 'live555'),
+                        help='Preset directory (config.yaml, seed_gen_<proto>.py, init_seeds/)')
+    parser.add_argument('--rundir', default=None,
+                        help='Run directory to create (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary run directory')
+    parser.add_argument('--generations', type=int, default=1, help='Number of generations to run')
+    parser.add_argument('--num-variants', type=int, default=2, help='Variants per seed and model')
+    parser.add_argument('--jobs', type=int, default=None, help='Override genvariants_parallel.jobs')
+    parser.add_argument('--pools', nargs='+', default=None, help='Override run.state_pools')
+    parser.add_argument('--exec-delay', type=float, default=0.0,
+                        help='Seconds the stub coverage stage spends per input')
+    parser.add_argument('--json', default=None, help='Write the results to this file')
+    mock_tgi.add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server, mock, url = mock_tgi.serve_in_thread(mock_tgi.config_from_args(args))
+    print(f"Mock TGI listening on {url}", file=sys.stderr)
+
+    tmpdir = None
+    if args.rundir is None:
+        tmpdir = tempfile.mkdtemp(prefix='elmfuzz-bench-')
+        rundir = os.path.join(tmpdir, 'run')
+    else:
+        rundir = os.path.abspath(args.rundir)
+        if os.path.exists(rundir):
+            print(f"Error: {rundir} already exists", file=sys.stderr)
+            sys.exit(1)
+    prepare_rundir(os.path.abspath(args.preset), rundir, url, args)
+
+    env = dict(os.environ)
+    env['NUM_GENERATIONS'] = str(args.generations)
+    env['STUB_EXEC_DELAY'] = str(args.exec_delay)
+    start = time.time()
+    rc = subprocess.call(['./all_gen_net.sh', rundir], cwd=REPO_DIR, env=env)
+    wall = time.time() - start
+    server.shutdown()
+
+    events = telemetry.load_events(sorted(glob.glob(os.path.join(rundir, '*', 'logs', 'timeline.jsonl'))))
+    summary = telemetry.summarize(events)
+    telemetry.print_summary(summary, file=sys.stderr)
+
+    mutate_wall, variants = stage_totals(summary, ['genvariants'])
+    exec_wall, executions = stage_totals(summary, ['genoutputs'])
+    selection_wall, _ = stage_totals(summary, ['select_seeds', 'select_states'])
+    result = {
+        'preset': os.path.basename(os.path.abspath(args.preset)),
+        'generations': args.generations,
+        'returncode': rc,
+        'wall_seconds': wall,
+        'variants': variants,
+        'variants_per_second': rate(variants, mutate_wall),
+        'executions': executions,
+        'executions_per_second': rate(executions, exec_wall),
+        'selection_seconds': selection_wall,
+        'mock': mock.stats(),
+    }
+    print(f"Wall-clock:     {wall:.1f}s (exit status {rc})", file=sys.stderr)
+    for label, key in [('Variants/s:', 'variants_per_second'), ('Executions/s:', 'executions_per_second')]:
+        value = result[key]
+        print(f"{label:<15} {value:.2f}" if value is not None else f"{label:<15} -", file=sys.stderr)
+    print(f"{'Selection:':<15} {selection_wall:.2f}s", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if tmpdir is not None:
+        if args.keep:
+            print(f"Run directory kept at {rundir}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    sys.exit(rc)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the ``run`` script of the AFLNet images (fuzzbench/*/run.sh).
+
+The local container runtime (container_runtime.py) runs it instead of the
+image: it takes run.sh's arguments, copies every input into
+``<outdir>/queue/`` under an AFLNet-style name, writes the fake coverage of
+bench/stub_getcov.py to ``<outdir>/.state/seed_cov/`` and packs
+``<outdir>.tar.gz`` in the working directory, as run.sh does. Like AFLNet,
+it keeps ``plot_data``, ``fuzzer_stats`` and ``ipsm.dot`` up to date while
+it runs (see aflnet_monitor.py). So the real getcov_fuzzbench_net.py
+(deduplication, scheduling, collection, monitoring) runs without a
+container daemon:
+
+    ELMFUZZ_RUNTIME=local python getcov_fuzzbench_net.py --image unused \\
+        --input gen1/outputs/ --output gen1/aflnetout --covfile gen1/logs/coverage.json
+
+ELMFUZZ_FAKE_AFLNET_DELAY is the seconds to sleep per input (at most the
+fuzzing timeout), to emulate execution cost.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tarfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_getcov import fake_seed_cov
+
+def write_progress(outdir: str, start: float, paths: int, edges: int, states: set) -> None:
+    now = time.time()
+    rate = paths / max(now - start, 1e-3)
+    with open(os.path.join(outdir, 'plot_data'), 'a') as f:
+        print(f'{int(now)}, 0, {paths - 1}, {paths}, 0, 0, {edges / 65536 * 100:.2f}%, 0, 0, 1, {rate:.2f}', file=f)
+    with open(os.path.join(outdir, 'fuzzer_stats'), 'w') as f:
+        print(f'start_time        : {int(start)}\nlast_update       : {int(now)}\n'
+              f'paths_total       : {paths}\nexecs_per_sec     : {rate:.2f}', file=f)
+    with open(os.path.join(outdir, 'ipsm.dot'), 'w') as f:
+        print('digraph g {', file=f)
+        for s in sorted(states):
+            print(f'\t{s} [color="black"];', file=f)
+        print('}', file=f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake AFLNet run with the arguments of run.sh')
+    parser.add_argument('fuzzer')
+    parser.add_argument('inputs', help='Input directory')
+    parser.add_argument('outdir', help='Name of the output directory (and tarball)')
+    parser.add_argument('options', nargs='?', default='')
+    parser.add_argument('timeout', nargs='?', type=float, default=0)
+    parser.add_argument('skipcount', nargs='?', default='')
+    args = parser.parse_args()
+
+    delay = float(os.environ.get('ELMFUZZ_FAKE_AFLNET_DELAY', '0'))
+    queue_dir = os.path.join(args.outdir, 'queue')
+    cov_dir = os.path.join(args.outdir, '.state', 'seed_cov')
+    os.makedirs(queue_dir, exist_ok=True)
+    os.makedirs(cov_dir, exist_ok=True)
+    names = sorted(f for f in os.listdir(args.inputs) if os.path.isfile(os.path.join(args.inputs, f)))
+    start = time.time()
+    with open(os.path.join(args.outdir, 'plot_data'), 'w') as f:
+        print('# unix_time, cycles_done, cur_path, paths_total, pending_total, pending_favs, '
+              'map_size, unique_crashes, unique_hangs, max_depth, execs_per_sec', file=f)
+    edges, states = set(), set()
+    for i, name in enumerate(names):
+        src = os.path.join(args.inputs, name)
+        qname = f'id:{i:06d},orig:{name}'
+        shutil.copyfile(src, os.path.join(queue_dir, qname))
+        with open(src, 'rb') as f:
+            lines = fake_seed_cov(f.read())
+        with open(os.path.join(cov_dir, qname), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        states.update(lines[0].split(':')[1].split('-'))
+        edges.update(line.split(':')[0] for line in lines[1:])
+        write_progress(args.outdir, start, i + 1, len(edges), states)
+        if delay and (not args.timeout or time.time() - start + delay <= args.timeout):
+            time.sleep(delay)
+    print(f"{args.fuzzer}: {len(names)} inputs in {time.time() - start:.1f}s")
+
+    with tarfile.open(f'{args.outdir}.tar.gz', 'w:gz') as tf:
+        tf.add(args.outdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Import-time profile and start-up budgets of the pipeline entry points.
+
+Every stage is its own process started from bash, some of them many times
+per generation (genoutputs_net.py starts one driver_net.py per variant,
+do_gen_net.sh calls ./elmconfig.py for each setting), so what a script
+imports before doing any work is paid over and over. This runs
+``python -X importtime -c 'import <module>'`` a few times per entry point,
+keeps the median of the module's cumulative import time and checks it
+against IMPORT_BUDGETS:
+
+    python bench/importtime.py                      # all entry points; exit 1 if one is over budget
+    python bench/importtime.py driver_net --top 15  # where driver_net's start-up goes
+    python bench/importtime.py --json importtime.json
+    ELMFUZZ_IMPORT_BUDGET_SCALE=1.5 python bench/importtime.py   # allow 50% more everywhere
+
+Import times depend on the machine, so budgets are not milliseconds but
+multiples of a baseline measured in the same run: importing the standard
+library modules nearly every entry point needs (BASELINE_MODULES, 15-30 ms
+on a typical machine). The bare interpreter start (``-c pass``) would be
+the obvious baseline, but what ``site`` imports varies with the
+environment far more than with the machine. ``ELMFUZZ_IMPORT_BUDGET_SCALE``
+multiplies every budget. Modules that fail to import (a dependency missing
+here) are reported, not counted as over budget.
+
+Heavy dependencies that only some code paths need (plotext, tqdm in the
+greedy selection, requests in prompt_budget, the process pool of a
+multi-run driver) are imported where they are used.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+BUDGET_SCALE_ENV = 'ELMFUZZ_IMPORT_BUDGET_SCALE'
+
+BASELINE_MODULES = ['argparse', 'json', 'logging', 'typing', 'subprocess']
+
+# Cumulative import time per entry point, in multiples of the baseline;
+# most frequently started first
+IMPORT_BUDGETS = {
+    'driver_net': 1.5,
+    'driver': 1.5,
+    'elmconfig': 2.5,
+    'select_seeds_net': 4,
+    'select_states_net': 4,
+    'seed_clusters': 1.5,
+    'telemetry': 1.2,
+    'util': 1,
+    'analyze_cov': 1,
+    'prompt_budget': 1,
+    'cmin_net': 3.5,
+    'getcov_fuzzbench_net': 7,
+    'genoutputs_net': 8,
+    'genvariants_parallel_net': 12,
+}
+
+class ImportLine(NamedTuple):
+    self_us: int
+    cumulative_us: int
+    depth: int
+    name: str
+
+def parse_importtime(stderr: str) -> List[ImportLine]:
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        lines.append(ImportLine(int(self_us), int(cumulative_us), depth, name.strip()))
+    return lines
+
+def module_subtree(lines: List[ImportLine], module: str) -> List[ImportLine]:
+    """The imports made by importing ``module`` (it is reported after them)."""
+    for end, line in enumerate(lines):
+        if line.depth == 0 and line.name == module:
+            start = end
+            while start > 0 and lines[start - 1].depth > 0:
+                start -= 1
+            return lines[start:end + 1]
+    return []
+
+def run_importtime(code: str) -> List[ImportLine]:
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_DIR,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        raise ImportError((proc.stderr.strip().splitlines() or ['?'])[-1])
+    return parse_importtime(proc.stderr)
+
+def profile_once(module: str) -> List[ImportLine]:
+    return module_subtree(run_importtime(f'import {module}'), module)
+
+def baseline_ms(runs: int = 5) -> float:
+    """Median import time of BASELINE_MODULES in a fresh interpreter, ms."""
+    code = 'import ' + ', '.join(BASELINE_MODULES)
+    return statistics.median(sum(line.cumulative_us for line in run_importtime(code)
+                                 if line.depth == 0 and line.name in BASELINE_MODULES) / 1000
+                             for _ in range(runs))
+
+class Profile(NamedTuple):
+    module: str
+    # Median cumulative import time of the module, ms
+    import_ms: float
+    # Median self time per imported module, ms
+    self_ms: Dict[str, float]
+    error: Optional[str]
+
+def profile(module: str, runs: int = 5) -> Profile:
+    totals = []
+    self_times = defaultdict(list)
+    try:
+        for _ in range(runs):
+            subtree = profile_once(module)
+            totals.append(subtree[-1].cumulative_us / 1000 if subtree else 0.0)
+            for line in subtree:
+                self_times[line.name].append(line.self_us / 1000)
+    except ImportError as e:
+        return Profile(module, 0.0, {}, str(e))
+    return Profile(module, statistics.median(totals),
+                   {name: statistics.median(times) for name, times in self_times.items()}, None)
+
+def budget_for(module: str, baseline: float) -> Optional[float]:
+    """The budget of ``module`` in ms, given the baseline of this machine."""
+    budget = IMPORT_BUDGETS.get(module)
+    if budget is None:
+        return None
+    return budget * baseline * float(os.environ.get(BUDGET_SCALE_ENV) or 1)
+
+def print_top(p: Profile, top: int) -> None:
+    print(f"Heaviest imports of {p.module} (self ms, median of runs):")
+    for name, ms in sorted(p.self_ms.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {ms:8.2f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the import time of the pipeline entry points')
+    parser.add_argument('modules', nargs='*', default=None, help='Modules to profile (default: all budgeted)')
+    parser.add_argument('-r', '--runs', type=int, default=5, help='Runs per module (the median is kept)')
+    parser.add_argument('--top', type=int, default=0, help='Also list the N heaviest imports per module')
+    parser.add_argument('--json', default=None, help='Write the profiles to this file')
+    parser.add_argument('--no-check', action='store_true', help='Report only, do not fail on a budget')
+    args = parser.parse_args()
+
+    modules = args.modules or list(IMPORT_BUDGETS)
+    over = []
+    profiles = []
+    baseline = baseline_ms(max(1, args.runs))
+    print(f"Baseline ({', '.join(BASELINE_MODULES)}): {baseline:.1f} ms")
+    print(f"{'module':<26} {'import_ms':>10} {'x base':>7} {'budget':>7}")
+    for module in modules:
+        p = profile(module, max(1, args.runs))
+        profiles.append(p)
+        budget = budget_for(module, baseline)
+        if p.error is not None:
+            print(f"{module:<26} {'-':>10} {'-':>7} {'-':>7}  cannot import: {p.error}")
+            continue
+        over_budget = budget is not None and p.import_ms > budget
+        if over_budget:
+            over.append(module)
+        budget_column = f"{budget / baseline:>7.1f}" if budget is not None else f"{'-':>7}"
+        print(f"{module:<26} {p.import_ms:>10.1f} {p.import_ms / baseline:>7.1f} {budget_column}"
+              f"{'  OVER BUDGET' if over_budget else ''}")
+        if args.top:
+            print_top(p, args.top)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'baseline_ms': baseline,
+                       'modules': {p.module: {'import_ms': p.import_ms, 'budget_ms': budget_for(p.module, baseline),
+                                              'error': p.error, 'self_ms': p.self_ms} for p in profiles}},
+                      f, indent=2)
+    if over and not args.no_check:
+        print(f"Over the start-up budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
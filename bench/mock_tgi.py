@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for a text-generation-inference (TGI) server.
+
+Implements the endpoints genvariants_parallel(_net).py talks to (``/info``
+and ``/generate``) so the mutation stage and whole generations can be run
+and benchmarked on a CPU-only machine. Completions are either replayed from
+existing genvariants meta logs (``--replay 'run/gen*/logs/meta/*/*.json'``) or
+synthesized from the one-line message functions found in the prompt, which
+yields variants that the seed modules' ``__<proto>_gen__`` can execute.
+
+Latency, decode throughput, batching and failures are configurable:
+
+    python bench/mock_tgi.py --port 8192 --latency 0.3 --tokens-per-second 40 \\
+        --max-batch 16 --error-rate 0.02
+
+``GET /stats`` returns request counters and latency percentiles.
+"""
+
+import argparse
+import ast
+import glob
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+FIM_PATTERNS = [
+    re.compile(r'^<PRE> (?P<pre>.*) <SUF>(?P<suf>.*) <MID>$', re.S),
+    re.compile(r'^<\|fim_prefix\|>(?P<pre>.*)<\|fim_suffix\|>(?P<suf>.*)<\|fim_middle\|>$', re.S),
+    re.compile(r'^<fim_prefix>(?P<pre>.*)<fim_suffix>(?P<suf>.*)<fim_middle>$', re.S),
+]
+FALLBACK_PAYLOAD = b'OPTIONS * RTSP/1.0\r\nCSeq: 1\r\n'
+MESSAGE_FUNC_RE = re.compile(r'^def (?P<name>\w+)\(\): return (?P<payload>b(?:\'(?:[^\'\\]|\\.)*\'|"(?:[^"\\]|\\.)*"))\s*$', re.M)
+
+class MockConfig:
+    def __init__(self, model_id='codellama/CodeLlama-13b-hf', latency=0.2, latency_sigma=0.3,
+                 tokens_per_second=50.0, max_batch=32, error_rate=0.0, error_status=503,
+                 slow_rate=0.0, slow_factor=10.0, length_rate=0.05, max_total_tokens=16384,
+                 max_input_length=12288, replay: Optional[List[str]] = None, seed=None):
+        self.model_id = model_id
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.max_batch = max_batch
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.length_rate = length_rate
+        self.max_total_tokens = max_total_tokens
+        self.max_input_length = max_input_length
+        self.replay = replay or []
+        self.seed = seed
+
+def estimate_tokens(text: str) -> int:
+    # Code tokenizers average roughly 3-4 characters per token
+    return max(1, len(text) // 4)
+
+def load_replay(patterns: List[str]) -> List[str]:
+    """Collect generated_text from genvariants meta logs."""
+    completions = []
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            text = (meta.get('response') or {}).get('generated_text')
+            if text:
+                completions.append(text)
+    return completions
+
+def mutate_payload(rng: random.Random, payload: bytes) -> bytes:
+    lines = payload.split(b'\r\n') if b'\r\n' in payload else payload.split(b'\n')
+    sep = b'\r\n' if b'\r\n' in payload else b'\n'
+    choice = rng.random()
+    if len(lines) > 2 and choice < 0.3:
+        # Duplicate a header line
+        i = rng.randrange(1, len(lines))
+        lines.insert(i, lines[i])
+    elif len(lines) > 2 and choice < 0.5:
+        # Drop a header line
+        del lines[rng.randrange(1, len(lines))]
+    elif choice < 0.8:
+        # Perturb the numbers (sequence numbers, ports, lengths)
+        lines = [re.sub(rb'\d+', lambda m: str(max(0, int(m.group()) + rng.randint(-3, 3))).encode(), l)
+                 if rng.random() < 0.3 else l for l in lines]
+    else:
+        # Append a random extension header
+        lines.insert(max(1, len(lines) - 1), b'X-Mock-%d: %d' % (rng.randint(0, 99), rng.randint(0, 1 << 16)))
+    return sep.join(lines)
+
+def synthesize(rng: random.Random, prompt: str) -> str:
+    """Write a few new one-line message functions in the style of the prompt."""
+    m = None
+    for pattern in FIM_PATTERNS:
+        m = pattern.match(prompt)
+        if m:
+            break
+    context = m.group('pre') + m.group('suf') if m else prompt
+    funcs = [(f.group('name'), f.group('payload')) for f in MESSAGE_FUNC_RE.finditer(context)]
+    if not funcs:
+        return f'def mock_{rng.randint(0, 999):03d}_OPTIONS(): return {FALLBACK_PAYLOAD!r}\n'
+    out = []
+    for _ in range(rng.randint(1, 4)):
+        name, payload_src = rng.choice(funcs)
+        try:
+            payload = ast.literal_eval(payload_src)
+        except (ValueError, SyntaxError):
+            continue
+        method = name.rsplit('_', 1)[-1]
+        new_payload = mutate_payload(rng, payload)
+        out.append(f'def mock_{rng.randint(0, 99999):05d}_{method}(): return {new_payload!r}')
+    return '\n'.join(out) + '\n'
+
+class MockTGI:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.batch = threading.BoundedSemaphore(config.max_batch)
+        self.replay = load_replay(config.replay)
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.generated_tokens = 0
+        self.latencies: List[float] = []
+        self.started = time.time()
+
+    def info(self) -> dict:
+        return {
+            'model_id': self.config.model_id,
+            'model_dtype': 'torch.float16',
+            'max_concurrent_requests': self.config.max_batch * 4,
+            'max_best_of': 2,
+            'max_stop_sequences': 4,
+            'max_input_length': self.config.max_input_length,
+            'max_total_tokens': self.config.max_total_tokens,
+            'version': 'mock',
+        }
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            lat = sorted(self.latencies)
+            def pct(p):
+                return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else None
+            elapsed = time.time() - self.started
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'generated_tokens': self.generated_tokens,
+                'uptime': elapsed,
+                'tokens_per_second': self.generated_tokens / elapsed if elapsed > 0 else 0.0,
+                'latency_p50': pct(0.5),
+                'latency_p90': pct(0.9),
+                'latency_p99': pct(0.99),
+            }
+
+    def generate(self, body: dict) -> tuple:
+        start = time.time()
+        prompt = body.get('inputs', '')
+        params = body.get('parameters') or {}
+        max_new_tokens = int(params.get('max_new_tokens') or 256)
+        stop = params.get('stop') or []
+        with self.rng_lock:
+            fail = self.rng.random() < self.config.error_rate
+            slow = self.rng.random() < self.config.slow_rate
+            truncate = self.rng.random() < self.config.length_rate
+            first_token = self.rng.lognormvariate(0, self.config.latency_sigma) * self.config.latency
+            if self.replay:
+                text = self.rng.choice(self.replay)
+            else:
+                text = synthesize(self.rng, prompt)
+        input_tokens = estimate_tokens(prompt)
+        with self.stats_lock:
+            self.requests += 1
+        if input_tokens > self.config.max_input_length:
+            with self.stats_lock:
+                self.errors += 1
+            return 422, {'error': f'Input validation error: `inputs` must have less than '
+                                  f'{self.config.max_input_length} tokens. Given: {input_tokens}',
+                         'error_type': 'validation'}
+
+        finish_reason = 'eos_token'
+        for stop_seq in stop:
+            idx = text.find(stop_seq)
+            if idx != -1:
+                text = text[:idx + len(stop_seq)]
+                finish_reason = 'stop_sequence'
+        limit = min(max_new_tokens, self.config.max_total_tokens - input_tokens)
+        if truncate or estimate_tokens(text) > limit:
+            cut = min(len(text), max(1, limit * 4) if not truncate else max(1, len(text) // 2))
+            text = text[:cut]
+            finish_reason = 'length'
+        tokens = estimate_tokens(text)
+
+        # Requests beyond max_batch queue up, like TGI's continuous batching
+        with self.batch:
+            delay = first_token + tokens / self.config.tokens_per_second
+            if slow:
+                delay *= self.config.slow_factor
+            time.sleep(delay)
+        with self.stats_lock:
+            self.latencies.append(time.time() - start)
+            if fail:
+                self.errors += 1
+            else:
+                self.generated_tokens += tokens
+        if fail:
+            return self.config.error_status, {'error': 'Model is overloaded', 'error_type': 'overloaded'}
+        return 200, {
+            'generated_text': text,
+            'details': {
+                'finish_reason': finish_reason,
+                'generated_tokens': tokens,
+                'seed': None,
+                'prefill': [],
+                'tokens': [],
+            },
+        }
+
+def make_handler(mock: MockTGI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/info':
+                self._send(200, mock.info())
+            elif self.path == '/stats':
+                self._send(200, mock.stats())
+            elif self.path == '/health':
+                self._send(200, {})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError:
+                self._send(400, {'error': 'invalid JSON'})
+                return
+            if self.path == '/generate':
+                self._send(*mock.generate(body))
+            else:
+                self._send(404, {'error': 'not found'})
+    return Handler
+
+def serve_in_thread(config: MockConfig, host: str = '127.0.0.1', port: int = 0):
+    """Start the mock server in a daemon thread. Returns (server, mock, url)."""
+    mock = MockTGI(config)
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, mock, f'http://{host}:{server.server_address[1]}'
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--model-id', default='codellama/CodeLlama-13b-hf',
+                        help='Model id reported by /info (selects the FIM prompt format)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Median time to first token (s)')
+    parser.add_argument('--latency-sigma', type=float, default=0.3, help='Log-normal spread of the latency')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help='Decode speed per request')
+    parser.add_argument('--max-batch', type=int, default=32, help='Requests served concurrently')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of failed requests')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of requests that are slow')
+    parser.add_argument('--slow-factor', type=float, default=10.0, help='Slowdown of slow requests')
+    parser.add_argument('--length-rate', type=float, default=0.05,
+                        help="Fraction of completions cut off with finish_reason 'length'")
+    parser.add_argument('--max-total-tokens', type=int, default=16384)
+    parser.add_argument('--max-input-length', type=int, default=12288)
+    parser.add_argument('--replay', action='append', default=[],
+                        help='Glob of genvariants meta logs to replay completions from (may be repeated)')
+    parser.add_argument('--seed', type=int, default=None)
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        model_id=args.model_id, latency=args.latency, latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second, max_batch=args.max_batch,
+        error_rate=args.error_rate, error_status=args.error_status,
+        slow_rate=args.slow_rate, slow_factor=args.slow_factor, length_rate=args.length_rate,
+        max_total_tokens=args.max_total_tokens, max_input_length=args.max_input_length,
+        replay=args.replay, seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock TGI server for offline benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8192)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    mock = MockTGI(config_from_args(args))
+    if args.replay:
+        print(f"Loaded {len(mock.replay)} completions to replay", file=sys.stderr)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(mock))
+    server.daemon_threads = True
+    print(f"Mock TGI serving {args.model_id} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(mock.stats(), indent=2), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the selection, coverage and generation hot paths.
+
+Runs each benchmark on synthetic inputs (bench/synth.py) a few times and
+stores the median wall-clock seconds, with the other measurements of the
+benchmark, as JSON. ``--baseline`` compares the results with an earlier run
+and exits with status 1 if a benchmark got slower by more than
+``--threshold`` (and by more than ``--min-delta`` seconds, so that noise on
+tiny timings does not count):
+
+    python bench/run.py -o bench/results.json                     # all benchmarks, medium scale
+    python bench/run.py --scale large --only select_seeds -o new.json
+    python bench/run.py -o new.json --baseline bench/results.json --threshold 0.2
+    python bench/run.py compare bench/results.json new.json
+
+Benchmarks:
+
+    select_seeds.greedy   select_seeds_net.py on the synthetic generation (subset filter + greedy)
+    select_seeds.ilp      the same with -u (OR-Tools/PuLP set cover, when installed)
+    select_states.noss    select_states_net.py --noss
+    select_states.ss      select_states_net.py --ss
+    analyze_cov           analyze_cov.print_cov and cumulative_cov
+    getcov.assemble       getcov_fuzzbench_net.add_job_coverage over every pool, then json.dumps
+    pipeline.partial_cov  pipeline_net.partial_coverage of the per-pool coverage files
+    driver.generate_one   driver_net.generate_one calls per second (a trivial generator)
+    genvariants.prompt    genvariants_parallel_net.build_prompt against bench/mock_tgi.py
+    startup.driver        import time of driver_net.py, started once per variant (bench/importtime.py)
+
+The scripts run as subprocesses (as do_gen_net.sh runs them), everything
+else in-process. A benchmark whose dependencies are missing is recorded as
+``skipped`` with the reason, not failed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+import synth
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+class Skip(Exception):
+    pass
+
+def run_script(ctx, args: List[str], **env) -> dict:
+    environ = dict(os.environ, ELMFUZZ_RUNDIR=ctx.rundir, **env)
+    environ.pop('ELMFUZZ_TIMELINE', None)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + args, cwd=REPO_DIR, env=environ,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ['?'])[-1]
+        if 'ModuleNotFoundError' in last or 'ImportError' in last:
+            raise Skip(last)
+        raise RuntimeError(f"{args[0]} exited with {proc.returncode}: {last}")
+    return {'seconds': seconds}
+
+def select_seeds(ctx, use_ilp: bool) -> dict:
+    out = os.path.join(ctx.tmp, 'elites.json')
+    args = ['select_seeds_net.py', '-g', ctx.generation, '-n', str(ctx.num_selected),
+            '-c', ctx.covfile, '-i', ctx.elites, '-o', out]
+    result = run_script(ctx, args + (['-u'] if use_ilp else []))
+    with open(out) as f:
+        result['elites'] = sum(len(files) for pools in json.load(f).values() for files in pools.values())
+    return result
+
+@benchmark('select_seeds.greedy')
+def bench_select_greedy(ctx) -> dict:
+    return select_seeds(ctx, use_ilp=False)
+
+@benchmark('select_seeds.ilp')
+def bench_select_ilp(ctx) -> dict:
+    try:
+        import ortools  # noqa: F401
+    except ImportError:
+        try:
+            import pulp  # noqa: F401
+        except ImportError:
+            raise Skip('neither ortools nor pulp is installed')
+    return select_seeds(ctx, use_ilp=True)
+
+def select_states(ctx, mode: str) -> dict:
+    seeds_root = os.path.join(ctx.tmp, f'seeds_{mode}')
+    shutil.rmtree(seeds_root, ignore_errors=True)
+    return run_script(ctx, ['select_states_net.py', '-c', ctx.covfile, '-e', ctx.elites, '-g', ctx.generation,
+                            f'--{mode}', '--seeds-root', seeds_root, '--log-dir', os.path.join(ctx.tmp, 'logs')])
+
+@benchmark('select_states.noss')
+def bench_states_noss(ctx) -> dict:
+    return select_states(ctx, 'noss')
+
+@benchmark('select_states.ss')
+def bench_states_ss(ctx) -> dict:
+    return select_states(ctx, 'ss')
+
+@benchmark('analyze_cov')
+def bench_analyze_cov(ctx) -> dict:
+    import analyze_cov
+    start = time.perf_counter()
+    rows = analyze_cov.print_cov([ctx.covfile])
+    analyze_cov.cumulative_cov([ctx.covfile])
+    return {'seconds': time.perf_counter() - start, 'rows': len(rows)}
+
+def load_job_covs(ctx) -> Dict[str, dict]:
+    jobs = {}
+    for pool in ctx.pools:
+        with open(os.path.join(ctx.aflnetout, f'cov_{pool}.json')) as f:
+            jobs[pool] = json.load(f)
+    return jobs
+
+@benchmark('getcov.assemble')
+def bench_getcov_assemble(ctx) -> dict:
+    import getcov_fuzzbench_net
+    jobs = load_job_covs(ctx)
+    start = time.perf_counter()
+    all_cov = {ctx.gen_key: {}}
+    for pool, job_cov in jobs.items():
+        getcov_fuzzbench_net.add_job_coverage(all_cov, int(ctx.gen_key), pool, job_cov)
+    size = len(json.dumps(all_cov))
+    return {'seconds': time.perf_counter() - start, 'bytes': size}
+
+@benchmark('pipeline.partial_cov')
+def bench_partial_coverage(ctx) -> dict:
+    from pipeline_net import partial_coverage
+    start = time.perf_counter()
+    cov, pools = partial_coverage(ctx.aflnetout, ctx.gen_key)
+    json.dumps(cov)
+    return {'seconds': time.perf_counter() - start, 'pools': len(pools)}
+
+GENERATOR_MODULE = '''
+def generate(rng, out):
+    for i in range(64):
+        out.write(b"OPTIONS rtsp://127.0.0.1:8554/stream RTSP/1.0\\r\\nCSeq: %d\\r\\n\\r\\n" % i)
+'''
+
+@benchmark('driver.generate_one')
+def bench_generate_one(ctx) -> dict:
+    import driver_net
+    module_path = os.path.join(ctx.tmp, 'bench_generator.py')
+    with open(module_path, 'w') as f:
+        f.write(GENERATOR_MODULE)
+    namespace = {}
+    exec(compile(GENERATOR_MODULE, module_path, 'exec'), namespace)
+    args = SimpleNamespace(size_limit=50 * 1024 * 1024, timeout=10, max_mem=-1, module_path=module_path,
+                           budget=None)
+    calls = 500
+    start = time.perf_counter()
+    for i in range(calls):
+        driver_net.generate_one(os.path.join(ctx.tmp, 'outputs', f'{i % 50}.raw'), namespace['generate'], args)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'calls_per_second': calls / seconds}
+
+def seed_module(rng, functions: int) -> str:
+    lines = ['import random', '']
+    for i in range(functions):
+        lines.append(f'def rtsp_{i:03d}_OPTIONS(): return b"OPTIONS rtsp://127.0.0.1:8554/s{rng.randint(0, 999)} '
+                     f'RTSP/1.0\\r\\nCSeq: {i}\\r\\n\\r\\n"')
+    lines += ['', 'def __rtsp_gen__():', '    return [f() for f in (%s)]' %
+              ', '.join(f'rtsp_{i:03d}_OPTIONS' for i in range(functions))]
+    return '\n'.join(lines) + '\n'
+
+@benchmark('genvariants.prompt')
+def bench_build_prompt(ctx) -> dict:
+    import random
+    import genvariants_parallel_net as gv
+    import mock_tgi
+    from prompt_budget import PromptBudget
+    server, _, url = mock_tgi.serve_in_thread(mock_tgi.MockConfig(latency=0))
+    try:
+        info = gv.model_info(url)
+        rng = random.Random(0)
+        files = []
+        for i in range(20):
+            path = os.path.join(ctx.tmp, 'variants', f'seed_{i}.py')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(seed_module(rng, 200))
+            files.append(path)
+        corpus = gv.SeedCorpus(files)
+        budget = PromptBudget.for_endpoint(url, info, 2048, 'heuristic')
+        infill = gv.select_infilling_prompt(info['model_id'])
+        args = SimpleNamespace(protocol_type='rtsp', start_line=0)
+        prompts = 600
+        random.seed(0)
+        start = time.perf_counter()
+        for i in range(prompts):
+            gv.build_prompt(['infilled', 'lmsplice', 'complete'][i % 3], files[i % len(files)], args, infill,
+                            corpus, budget)
+        seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return {'seconds': seconds, 'prompts_per_second': prompts / seconds}
+
+@benchmark('startup.driver')
+def bench_driver_startup(ctx) -> dict:
+    import importtime
+    p = importtime.profile('driver_net', runs=5)
+    if p.error is not None:
+        raise Skip(p.error)
+    return {'seconds': p.import_ms / 1000}
+
+def run_benchmarks(names: List[str], ctx, repeat: int) -> Dict[str, dict]:
+    results = {}
+    for name in names:
+        runs = []
+        try:
+            for _ in range(repeat):
+                runs.append(BENCHMARKS[name](ctx))
+        except (Skip, ImportError) as e:
+            results[name] = {'status': f'skipped: {e}'}
+        except Exception as e:
+            results[name] = {'status': f'error: {type(e).__name__}: {e}'}
+        else:
+            seconds = [r['seconds'] for r in runs]
+            result = dict(runs[-1])
+            result.update({'status': 'ok', 'seconds': statistics.median(seconds), 'runs': seconds})
+            results[name] = result
+        status = results[name]['status']
+        timing = f"{results[name]['seconds']:.3f}s" if status == 'ok' else status
+        print(f"{name:<22} {timing}", file=sys.stderr)
+    return results
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta: float) -> List[str]:
+    """Print the comparison; the names of the benchmarks that regressed."""
+    regressions = []
+    print(f"{'benchmark':<22} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        old = baseline['results'].get(name, {})
+        new = current['results'].get(name, {})
+        if old.get('status') != 'ok' or new.get('status') != 'ok':
+            print(f"{name:<22} {old.get('status', '-')[:10]:>10} {new.get('status', '-')[:10]:>10}")
+            continue
+        change = new['seconds'] / old['seconds'] - 1 if old['seconds'] > 0 else 0.0
+        regressed = change > threshold and new['seconds'] - old['seconds'] > min_delta
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<22} {old['seconds']:>9.3f}s {new['seconds']:>9.3f}s {change:>+7.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        return ''
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+        parser.add_argument('command')
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown (0.2 = 20%%)')
+        parser.add_argument('--min-delta', type=float, default=0.05, help='Ignore slowdowns below this (s)')
+        args = parser.parse_args()
+        with open(args.baseline) as f, open(args.current) as g:
+            regressions = compare(json.load(f), json.load(g), args.threshold, args.min_delta)
+        sys.exit(1 if regressions else 0)
+
+    parser = argparse.ArgumentParser(description='Run the benchmark suite')
+    parser.add_argument('--scale', choices=sorted(synth.SCALES), default='medium')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='Benchmarks (or name prefixes) to run: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per benchmark (the median is kept)')
+    parser.add_argument('--num-selected', type=int, default=277, help='select_seeds_net.py -n')
+    parser.add_argument('-o', '--output', default=None, help='Write the results to this file')
+    parser.add_argument('--baseline', default=None, help='Results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown (0.2 = 20%%)')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='Ignore slowdowns below this (s)')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic run directory')
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if args.only is None or any(n.startswith(o) for o in args.only)]
+    tmp = tempfile.mkdtemp(prefix='elmfuzz-bench-')
+    try:
+        start = time.time()
+        paths = synth.make_rundir(os.path.join(tmp, 'run'), **synth.SCALES[args.scale])
+        print(f"Synthetic {args.scale} run directory in {time.time() - start:.1f}s", file=sys.stderr)
+        ctx = SimpleNamespace(tmp=tmp, num_selected=args.num_selected, gen_key=paths['generation'][3:], **paths)
+        results = run_benchmarks(names, ctx, max(1, args.repeat))
+    finally:
+        if args.keep:
+            print(f"Synthetic run directory kept at {tmp}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        'meta': {'time': time.time(), 'host': socket.gethostname(), 'python': platform.python_version(),
+                 'revision': git_revision(), 'scale': args.scale, 'repeat': args.repeat,
+                 'num_selected': args.num_selected},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('scale') != args.scale:
+            print(f"Warning: the baseline was measured at scale {baseline['meta'].get('scale')}", file=sys.stderr)
+        if compare(baseline, report, args.threshold, args.min_delta):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
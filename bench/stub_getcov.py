@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for getcov_fuzzbench_net.py.
+
+Instead of running AFLNet in a container, every generated output is copied
+into ``<output>/<pool>/queue/`` under an AFLNet-style name and given a fake
+but deterministic coverage: the "state" is the sequence of request methods
+and the "edges" are hashes of the methods, header names and byte trigrams
+of the input. The coverage file has the same layout as the real one, so
+seed/state selection can run on it unchanged. With ``--protocol``, inputs
+are deduplicated first, like the real stage does (canonicalize_net.py).
+
+do_gen_net.sh uses it when the run's ``type`` is ``stub``.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import canonicalize_net
+import protocols
+import telemetry
+from util import parse_seed_cov
+
+METHOD_RE = re.compile(rb'^([A-Z_]{3,20}) \S+ [A-Z]+/\d', re.M)
+HEADER_RE = re.compile(rb'^([A-Za-z-]{2,40}):', re.M)
+
+def fake_seed_cov(data: bytes, trigram_edges: int = 4096) -> list[str]:
+    """Synthesize AFLNet seed_cov lines (state line plus edge:hits lines) for an input."""
+    methods = METHOD_RE.findall(data)
+    codes = [str(200 + zlib.crc32(m) % 64) for m in methods]
+    lines = [f"state:0-{'-'.join(codes)}::::" if codes else "state:0::::"]
+    edges = set()
+    for m in methods:
+        edges.add(zlib.crc32(b'method:' + m) & 0xffff)
+    for h in HEADER_RE.findall(data):
+        edges.add(zlib.crc32(b'header:' + h.lower()) & 0xffff)
+    for i in range(0, max(0, len(data) - 2), 3):
+        edges.add(0x10000 + zlib.crc32(data[i:i+3]) % trigram_edges)
+    lines.extend(f'{e}:1' for e in sorted(edges))
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake AFLNet coverage collection for offline runs')
+    parser.add_argument('--input', required=True, help='Directory with one subdirectory of outputs per state pool')
+    parser.add_argument('--output', required=True, help='AFLNet output directory of the generation')
+    parser.add_argument('--covfile', required=True, help='Aggregated coverage file to write')
+    parser.add_argument('--next_gen', type=int, default=1)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='Seconds to sleep per input, to emulate execution cost')
+    parser.add_argument('--protocol', default=None,
+                        help='Drop protocol-equivalent inputs first (unless ELMFUZZ_DEDUP=0)')
+    args = parser.parse_args()
+
+    all_cov_data = {str(args.next_gen): {}}
+    pools = sorted(d for d in os.listdir(args.input) if os.path.isdir(os.path.join(args.input, d)))
+    proto = None
+    if args.protocol in protocols.PROTOCOLS and canonicalize_net.dedup_enabled():
+        proto = protocols.get(args.protocol)
+    dedup_stats = []
+    with telemetry.span('aflnet', jobs=len(pools), next_gen=args.next_gen, stub=True) as sp:
+        for pool in pools:
+            pool_dir = os.path.join(args.input, pool)
+            queue_dir = os.path.join(args.output, pool, 'queue')
+            os.makedirs(queue_dir, exist_ok=True)
+            job_cov = {}
+            names = sorted(f for f in os.listdir(pool_dir) if os.path.isfile(os.path.join(pool_dir, f)))
+            if proto is not None:
+                classes = canonicalize_net.dedup_files(proto, [os.path.join(pool_dir, f) for f in names])
+                dedup_stats.append(canonicalize_net.pool_stats(pool, len(names), classes))
+                names = sorted(os.path.basename(rep) for rep in classes)
+            for i, name in enumerate(names):
+                src = os.path.join(pool_dir, name)
+                qname = f'id:{i:06d},orig:{name}'
+                shutil.copyfile(src, os.path.join(queue_dir, qname))
+                with open(src, 'rb') as f:
+                    job_cov[qname] = fake_seed_cov(f.read())
+                if args.delay:
+                    time.sleep(args.delay)
+            with open(os.path.join(args.output, f'cov_{pool}.json'), 'w') as f:
+                json.dump(job_cov, f)
+            all_cov_data[str(args.next_gen)][pool] = {
+                k: dict([parse_seed_cov(v)]) for k, v in job_cov.items()
+            }
+            sp.add_items(len(job_cov))
+            print(f"{pool}: {len(job_cov)} inputs", file=sys.stderr)
+
+    if dedup_stats:
+        canonicalize_net.print_report(dedup_stats, file=sys.stderr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.covfile)), exist_ok=True)
+    with open(args.covfile, 'w') as f:
+        json.dump(all_cov_data, f)
+
+if __name__ == '__main__':
+    main()
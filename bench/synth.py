@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Synthetic selection inputs at production sizes, for bench/run.py.
+
+Writes a run directory shaped like one step of do_gen_net.sh:
+
+    config.yaml                       run.state_pools (for select_states_net.py)
+    gen<N>/aflnetout/<pool>/queue/    AFLNet queue entries (random bytes)
+    gen<N>/aflnetout/cov_<pool>.json  their seed_cov lines (as getcov_fuzzbench_net.py collects them)
+    gen<N>/logs/coverage.json         the coverage of generation N
+    gen<N-1>/logs/elites.json         the elites of the previous step
+
+Coverage is drawn so that selection does realistic work: edges are picked
+with a Zipf-like bias (a few edges every input hits, a long tail of rare
+ones), most queue entries derive from an earlier entry of their pool by
+adding and dropping a few edges (near-duplicates, as AFLNet's queue has),
+and each entry walks a path of protocol states that gives its ``__TRANS_``
+transitions.
+
+    python bench/synth.py /tmp/synth --seeds 3000 --edges 30000 --pools 4
+"""
+
+import argparse
+import json
+import os
+import random
+from typing import Dict, List
+
+# Parameters per scale: queue entries over all pools, distinct edges, edges per entry
+SCALES = {
+    'small': {'seeds': 300, 'edges': 3000, 'edges_per_seed': 150},
+    'medium': {'seeds': 2000, 'edges': 20000, 'edges_per_seed': 400},
+    'large': {'seeds': 6000, 'edges': 60000, 'edges_per_seed': 800},
+}
+
+NUM_STATES = 12
+
+def pick_edges(rng: random.Random, num_edges: int, k: int) -> set:
+    # Zipf-like: small edge ids are hit far more often than large ones
+    return set(min(num_edges - 1, int(num_edges ** rng.random()) - 1) for _ in range(k))
+
+def state_path(rng: random.Random) -> str:
+    states = ['0']
+    for _ in range(rng.randint(1, 8)):
+        states.append(str(200 + rng.randrange(NUM_STATES)))
+    return '-'.join(states)
+
+def synth_pool(rng: random.Random, pool: str, num_seeds: int, num_edges: int,
+               edges_per_seed: int) -> Dict[str, List[str]]:
+    """seed_cov lines per queue entry of one pool."""
+    entries: Dict[str, List[str]] = {}
+    edge_sets = []
+    for i in range(num_seeds):
+        if edge_sets and rng.random() < 0.8:
+            # A near-duplicate of an earlier entry
+            parent = rng.randrange(len(edge_sets))
+            edges = set(edge_sets[parent])
+            for e in rng.sample(sorted(edges), min(len(edges), rng.randint(0, 3))):
+                edges.discard(e)
+            edges |= pick_edges(rng, num_edges, rng.randint(0, 5))
+            name = f'id:{i:06d},src:{parent:06d},op:havoc,rep:{rng.randint(1, 16)}'
+        else:
+            edges = pick_edges(rng, num_edges, edges_per_seed)
+            name = f'id:{i:06d},orig:seed_{pool}_{i}.raw'
+        edge_sets.append(edges)
+        entries[name] = [f'state:{state_path(rng)}::::'] + [f'{e}:{rng.randint(1, 255)}' for e in sorted(edges)]
+    return entries
+
+def transitions(state_str: str) -> List[str]:
+    states = state_str.split('-')
+    return [f'__TRANS_{a}_{b}__' for a, b in zip(states, states[1:])]
+
+def make_rundir(rundir: str, gen: int = 3, pools: int = 4, seeds: int = 2000, edges: int = 20000,
+                edges_per_seed: int = 400, elites: int = 300, seed: int = 0) -> dict:
+    """Write the synthetic run directory; returns the paths the benchmarks use."""
+    rng = random.Random(seed)
+    pool_names = [f'{i:04d}' for i in range(pools)]
+    gen_dir = os.path.join(rundir, f'gen{gen}')
+    prev_dir = os.path.join(rundir, f'gen{gen - 1}')
+    os.makedirs(os.path.join(gen_dir, 'logs'), exist_ok=True)
+    os.makedirs(os.path.join(prev_dir, 'logs'), exist_ok=True)
+    with open(os.path.join(rundir, 'config.yaml'), 'w') as f:
+        f.write('run:\n  state_pools:\n' + ''.join(f"  - '{p}'\n" for p in pool_names))
+
+    coverage = {str(gen): {}}
+    for pool in pool_names:
+        entries = synth_pool(rng, pool, seeds // pools, edges, edges_per_seed)
+        queue = os.path.join(gen_dir, 'aflnetout', pool, 'queue')
+        os.makedirs(queue, exist_ok=True)
+        for name in entries:
+            with open(os.path.join(queue, name), 'wb') as f:
+                f.write(rng.randbytes(rng.randint(64, 2048)))
+        with open(os.path.join(gen_dir, 'aflnetout', f'cov_{pool}.json'), 'w') as f:
+            json.dump(entries, f)
+        coverage[str(gen)][pool] = {
+            name: {lines[0][len('state:'):-len('::::')]: [l.split(':')[0] for l in lines[1:]]}
+            for name, lines in entries.items()
+        }
+    covfile = os.path.join(gen_dir, 'logs', 'coverage.json')
+    with open(covfile, 'w') as f:
+        json.dump(coverage, f)
+
+    # The previous elites: a sample of this generation's entries, as select_seeds_net.py writes them
+    previous = {f'gen{gen - 1}': {}}
+    candidates = [(pool, name, cov) for pool, files in coverage[str(gen)].items() for name, cov in files.items()]
+    for pool, name, cov in rng.sample(candidates, min(elites, len(candidates))):
+        (state_str, edge_list), = cov.items()
+        size = os.path.getsize(os.path.join(gen_dir, 'aflnetout', pool, 'queue', name))
+        previous[f'gen{gen - 1}'].setdefault(pool, {})[name] = [edge_list + transitions(state_str), size]
+        prev_queue = os.path.join(prev_dir, 'aflnetout', pool, 'queue')
+        os.makedirs(prev_queue, exist_ok=True)
+        with open(os.path.join(gen_dir, 'aflnetout', pool, 'queue', name), 'rb') as src, \
+                open(os.path.join(prev_queue, name), 'wb') as dst:
+            dst.write(src.read())
+    elites_file = os.path.join(prev_dir, 'logs', 'elites.json')
+    with open(elites_file, 'w') as f:
+        json.dump(previous, f)
+    return {'rundir': rundir, 'generation': f'gen{gen}', 'covfile': covfile, 'elites': elites_file,
+            'aflnetout': os.path.join(gen_dir, 'aflnetout'), 'pools': pool_names}
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic run directory for the selection benchmarks')
+    parser.add_argument('rundir')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+    parser.add_argument('--seeds', type=int, default=None, help='Queue entries over all pools')
+    parser.add_argument('--edges', type=int, default=None, help='Distinct edges')
+    parser.add_argument('--edges-per-seed', type=int, default=None)
+    parser.add_argument('--pools', type=int, default=4)
+    parser.add_argument('--elites', type=int, default=300, help='Elites of the previous step')
+    parser.add_argument('--gen', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale])
+    for key in ('seeds', 'edges', 'edges_per_seed'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    paths = make_rundir(os.path.abspath(args.rundir), args.gen, args.pools, elites=args.elites,
+                        seed=args.seed, **params)
+    print(json.dumps(paths, indent=2))
+
+if __name__ == '__main__':
+    main()
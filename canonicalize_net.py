@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Protocol-aware canonicalization and deduplication of generated inputs.
+
+Many generated message sequences differ only in volatile fields (CSeq
+numbers, session ids, Content-Length, whitespace), but each one would still
+be an AFLNet seed of its own and be replayed during calibration. An input is
+canonicalized by
+
+  * splitting it into messages with the protocol plugin (protocols.py),
+  * normalizing line endings and runs of blanks,
+  * blanking the protocol's volatile headers and fields,
+
+and its class is the hash of the resulting method sequence plus the
+normalized messages. Only the smallest input of every class is kept.
+
+getcov_fuzzbench_net.py applies this to every pool before the inputs are
+copied into the AFLNet container (``--no-dedup`` or ``ELMFUZZ_DEDUP=0``
+turn it off), writes ``dedup_<pool>.json`` (kept input -> dropped
+duplicates) next to the pool's coverage and prints the dedup ratio per pool.
+
+    python canonicalize_net.py report -p rtsp gen3/seeds/*/
+    python canonicalize_net.py dedup -p rtsp gen3/seeds/0001 /tmp/input
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from typing import Dict, List, Tuple
+
+import protocols
+from protocols import Protocol
+
+DEDUP_ENV = 'ELMFUZZ_DEDUP'
+
+BLANKS = re.compile(rb'[ \t]+')
+HEADER = re.compile(rb'^([A-Za-z][A-Za-z0-9-]*)[ \t]*:')
+
+def dedup_enabled() -> bool:
+    return os.environ.get(DEDUP_ENV, '1') != '0'
+
+def normalize_message(proto: Protocol, message: bytes) -> bytes:
+    lines = []
+    for line in re.split(rb'\r?\n', message):
+        line = BLANKS.sub(b' ', line).strip()
+        m = HEADER.match(line)
+        if m and m.group(1).lower() in proto.volatile_headers:
+            line = m.group(1) + b': *'
+        lines.append(line)
+    message = b'\r\n'.join(lines)
+    for pattern, replacement in proto.volatile_patterns:
+        message = re.sub(pattern, replacement, message, flags=re.M)
+    return message
+
+def canonical_key(proto: Protocol, data: bytes) -> str:
+    """Equivalence class of an input: its method sequence and normalized messages."""
+    messages = proto.split(data)
+    h = hashlib.sha1()
+    h.update(b' '.join(proto.classify(m).encode() for m in messages))
+    for m in messages:
+        h.update(b'\0')
+        h.update(normalize_message(proto, m))
+    return h.hexdigest()
+
+def dedup_files(proto: Protocol, paths: List[str]) -> Dict[str, List[str]]:
+    """Map the representative (smallest) input of every class to its duplicates."""
+    classes: Dict[str, List[Tuple[int, str]]] = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        classes.setdefault(canonical_key(proto, data), []).append((len(data), path))
+    result = {}
+    for members in classes.values():
+        members.sort()
+        result[members[0][1]] = [path for _, path in members[1:]]
+    return result
+
+def copy_deduplicated(proto: Protocol, src_dir: str, dest_dir: str) -> dict:
+    """Copy the pool ``src_dir`` to ``dest_dir``, keeping one input per class.
+
+    Subdirectories are copied as they are. Returns the pool's dedup stats,
+    including ``classes`` (kept file name -> dropped file names).
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    files = []
+    for name in sorted(os.listdir(src_dir)):
+        s = os.path.join(src_dir, name)
+        if os.path.isdir(s):
+            shutil.copytree(s, os.path.join(dest_dir, name))
+        else:
+            files.append(s)
+    classes = dedup_files(proto, files)
+    for rep in classes:
+        shutil.copy2(rep, os.path.join(dest_dir, os.path.basename(rep)))
+    return pool_stats(os.path.basename(src_dir.rstrip(os.path.sep)), len(files), classes)
+
+def pool_stats(pool: str, total: int, classes: Dict[str, List[str]]) -> dict:
+    return {
+        'pool': pool,
+        'total': total,
+        'kept': len(classes),
+        'ratio': 1 - len(classes) / total if total else 0.0,
+        'classes': {os.path.basename(k): [os.path.basename(d) for d in v]
+                    for k, v in sorted(classes.items()) if v},
+    }
+
+def print_report(stats: List[dict], file=sys.stdout) -> None:
+    print(f"{'pool':<12} {'inputs':>8} {'kept':>8} {'dedup':>7}", file=file)
+    total = kept = 0
+    for s in sorted(stats, key=lambda s: s['pool']):
+        print(f"{s['pool']:<12} {s['total']:>8} {s['kept']:>8} {s['ratio']:>7.1%}", file=file)
+        total += s['total']
+        kept += s['kept']
+    if len(stats) > 1:
+        ratio = 1 - kept / total if total else 0.0
+        print(f"{'all':<12} {total:>8} {kept:>8} {ratio:>7.1%}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Canonicalize and deduplicate protocol inputs')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('report', help='Print the dedup ratio of pool directories')
+    p.add_argument('-p', '--protocol', required=True, choices=sorted(protocols.PROTOCOLS))
+    p.add_argument('--json', action='store_true', help='Print the stats as JSON')
+    p.add_argument('pools', nargs='+', help='Pool directories with one input per file')
+    p = sub.add_parser('dedup', help='Copy a pool, keeping one input per class')
+    p.add_argument('-p', '--protocol', required=True, choices=sorted(protocols.PROTOCOLS))
+    p.add_argument('src', help='Pool directory')
+    p.add_argument('dest', help='Destination directory')
+    args = parser.parse_args()
+
+    proto = protocols.get(args.protocol)
+    if args.cmd == 'report':
+        stats = []
+        for pool in args.pools:
+            files = [os.path.join(pool, f) for f in sorted(os.listdir(pool))
+                     if os.path.isfile(os.path.join(pool, f))]
+            stats.append(pool_stats(os.path.basename(pool.rstrip(os.path.sep)), len(files),
+                                    dedup_files(proto, files)))
+        if args.json:
+            json.dump(stats, sys.stdout, indent=2)
+            print()
+        else:
+            print_report(stats)
+    else:
+        print_report([copy_deduplicated(proto, args.src, args.dest)])
+
+if __name__ == '__main__':
+    main()
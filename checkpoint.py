@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Stage-level checkpoints for resumable generations.
+
+Each generation keeps a small manifest (``<gen>/logs/checkpoints.json``)
+with one entry per (generation, model, state pool, stage). An entry records
+whether the stage was started or finished and a hash of the stage's inputs,
+so a finished stage is only skipped if its inputs have not changed since.
+
+do_gen_net.sh drives this through the CLI:
+
+    status=$(python checkpoint.py status -m MANIFEST -g gen3 --stage mutate --model M --pool 0001 --inputs ...)
+    python checkpoint.py begin ...    # mark the stage as started
+    python checkpoint.py mark ...     # mark the stage as finished
+
+``status`` prints one of ``done``, ``started``, ``stale`` (finished, but on
+different inputs) or ``none``. ``clear`` drops entries so that stages are
+re-run on the next resume.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+DONE = 'done'
+STARTED = 'started'
+STALE = 'stale'
+NONE = 'none'
+
+def hash_inputs(paths: Iterable[str]) -> str:
+    """Content hash over files and directories (walked in sorted order)."""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(b'\0path\0' + path.encode())
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                h.update(hashlib.file_digest(f, 'sha256').digest())
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    h.update(b'\0file\0' + os.path.relpath(full, path).encode())
+                    with open(full, 'rb') as f:
+                        h.update(hashlib.file_digest(f, 'sha256').digest())
+        else:
+            h.update(b'\0missing')
+    return h.hexdigest()
+
+def stage_key(gen: str, stage: str, model: Optional[str] = None, pool: Optional[str] = None) -> str:
+    return '/'.join([gen, model or '-', pool or '-', stage])
+
+def key_matches(key: str, prefix: str) -> bool:
+    return not prefix or key == prefix or key.startswith(prefix.rstrip('/') + '/')
+
+class Manifest:
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_f:
+            fcntl.flock(lock_f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_f, fcntl.LOCK_UN)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print(f"Warning: corrupted checkpoint manifest {self.path}; ignoring it", file=sys.stderr)
+            return {}
+
+    def _store(self, entries: dict) -> None:
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def entries(self) -> dict:
+        with self._locked():
+            return self._load()
+
+    def status(self, key: str, input_hash: Optional[str] = None) -> str:
+        entry = self.entries().get(key)
+        if entry is None:
+            return NONE
+        if input_hash is not None and entry.get('input_hash') != input_hash:
+            return STALE
+        return entry['status']
+
+    def _update(self, key: str, **fields) -> None:
+        with self._locked():
+            entries = self._load()
+            entry = entries.get(key, {})
+            entry.update(fields)
+            entries[key] = entry
+            self._store(entries)
+
+    def begin(self, key: str, input_hash: Optional[str] = None) -> None:
+        self._update(key, status=STARTED, input_hash=input_hash,
+                     started_at=time.time(), host=socket.gethostname())
+
+    def mark(self, key: str, input_hash: Optional[str] = None, **extra) -> None:
+        self._update(key, status=DONE, input_hash=input_hash, finished_at=time.time(), **extra)
+
+    def clear(self, prefix: str = '') -> int:
+        """Drop the entry ``prefix`` and the entries under it (``gen1`` is not ``gen10``)."""
+        with self._locked():
+            entries = self._load()
+            dropped = [k for k in entries if key_matches(k, prefix)]
+            for k in dropped:
+                del entries[k]
+            self._store(entries)
+        return len(dropped)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage checkpoints for resumable generations')
+    subparsers = parser.add_subparsers(dest='subcommand', required=True)
+    for name, help_text in [
+        ('status', 'Print done/started/stale/none for a stage'),
+        ('check', 'Exit 0 if the stage is done with the same inputs, 1 otherwise'),
+        ('begin', 'Record that a stage has started'),
+        ('mark', 'Record that a stage has finished'),
+    ]:
+        cmd = subparsers.add_parser(name, help=help_text)
+        cmd.add_argument('-m', '--manifest', required=True, help='Path to the checkpoint manifest')
+        cmd.add_argument('-g', '--gen', required=True, help='Generation being produced')
+        cmd.add_argument('--stage', required=True)
+        cmd.add_argument('--model', default=None)
+        cmd.add_argument('--pool', default=None)
+        cmd.add_argument('--inputs', nargs='*', default=[],
+                         help='Files or directories whose contents identify the stage inputs')
+    cmd = subparsers.add_parser('clear', help='Drop checkpoints so that stages are re-run')
+    cmd.add_argument('-m', '--manifest', required=True)
+    cmd.add_argument('-g', '--gen', default='', help='Only drop entries of this generation')
+    cmd.add_argument('--stage', default=None, help='Only drop entries of this stage')
+    cmd = subparsers.add_parser('list', help='Print the manifest')
+    cmd.add_argument('-m', '--manifest', required=True)
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest)
+    if args.subcommand == 'list':
+        for key, entry in sorted(manifest.entries().items()):
+            print(f"{key:<48} {entry['status']}")
+        return
+    if args.subcommand == 'clear':
+        if args.stage is None:
+            dropped = manifest.clear(args.gen)
+        else:
+            dropped = 0
+            for key in list(manifest.entries()):
+                if key_matches(key, args.gen) and key.endswith('/' + args.stage):
+                    dropped += manifest.clear(key)
+        print(f"Dropped {dropped} checkpoint(s)", file=sys.stderr)
+        return
+
+    key = stage_key(args.gen, args.stage, args.model, args.pool)
+    input_hash = hash_inputs(args.inputs) if args.inputs else None
+    if args.subcommand == 'status':
+        print(manifest.status(key, input_hash))
+    elif args.subcommand == 'check':
+        sys.exit(0 if manifest.status(key, input_hash) == DONE else 1)
+    elif args.subcommand == 'begin':
+        manifest.begin(key, input_hash)
+    elif args.subcommand == 'mark':
+        manifest.mark(key, input_hash)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Stateful corpus minimization of the state pools before they go to AFLNet.
+
+The pools that getcov_fuzzbench_net.py hands to AFLNet hold the seeds picked
+by select_states_net.py (copies of earlier AFLNet queue entries, often the
+same elite in several pools) next to the newly generated inputs. For the
+former the coverage is already known from the seed_cov files of earlier
+generations (``<gen>/aflnetout/cov_<pool>.json``): the covered edges plus the
+state sequence of the ``state:...::::`` line. Per pool, this keeps a
+minimum-cost subset of those seeds that preserves both the edge coverage and
+the state-transition coverage (weighted greedy set cover, cost = file size)
+and moves the other seeds out of the pool. Inputs with unknown coverage are
+always kept.
+
+Known seeds are matched by content hash, so renamed copies are recognized.
+Pools are minimized in parallel. The kept/dropped mapping goes to
+``<log-dir>/cmin.json`` and the dropped seeds to ``<log-dir>/cmin_dropped/<pool>/``.
+
+do_gen_net.sh runs this right before coverage collection unless
+ELMFUZZ_CMIN=0:
+
+    python cmin_net.py -i gen3/seeds -L gen4/logs
+"""
+
+import argparse
+import glob
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import telemetry
+from util import parse_seed_cov
+
+CMIN_ENV = 'ELMFUZZ_CMIN'
+
+# Content hash -> coverage elements, shared with the worker processes
+_INDEX: Dict[str, frozenset] = {}
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def coverage_elements(lines: List[str]) -> frozenset:
+    """Edges and state transitions of one seed_cov file."""
+    state, edges = parse_seed_cov(lines)
+    elements = set(edges)
+    states = state.split('-') if state != 'unknown' else []
+    for src, dst in zip(states, states[1:]):
+        elements.add(f'__TRANS_{src}_{dst}__')
+    return frozenset(elements)
+
+def build_index(rundir: str) -> Dict[str, frozenset]:
+    """Coverage of every queue entry with a seed_cov in the run, by content hash."""
+    index = {}
+    for cov_path in sorted(glob.glob(os.path.join(rundir, '*', 'aflnetout', 'cov_*.json'))):
+        pool = os.path.basename(cov_path)[len('cov_'):-len('.json')]
+        queue_dir = os.path.join(os.path.dirname(cov_path), pool)
+        try:
+            with open(cov_path) as f:
+                job_cov = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, lines in job_cov.items():
+            for path in [os.path.join(queue_dir, name), os.path.join(queue_dir, 'queue', name)]:
+                if os.path.isfile(path):
+                    index[file_digest(path)] = coverage_elements(lines)
+                    break
+    return index
+
+def weighted_set_cover(candidates: List[Tuple[str, frozenset, int]]) -> List[str]:
+    """Greedy cover of all elements of ``candidates`` (key, elements, cost).
+
+    Picks the candidate with the most new elements per unit of cost, with
+    lazy re-evaluation of the gains (CELF).
+    """
+    covered: Set[str] = set()
+    universe = set().union(*(c[1] for c in candidates)) if candidates else set()
+    pq = [(-len(elements) / max(cost, 1), cost, key, elements) for key, elements, cost in candidates if elements]
+    heapq.heapify(pq)
+    selected = []
+    while pq and len(covered) < len(universe):
+        neg_ratio, cost, key, elements = heapq.heappop(pq)
+        gain = len(elements - covered)
+        if gain == 0:
+            continue
+        ratio = gain / max(cost, 1)
+        if ratio < -neg_ratio:
+            heapq.heappush(pq, (-ratio, cost, key, elements))
+            continue
+        selected.append((key, elements, cost))
+        covered |= elements
+    # Greedy picks can become redundant later on; drop those, costliest first
+    counts: Dict[str, int] = {}
+    for _, elements, _ in selected:
+        for e in elements:
+            counts[e] = counts.get(e, 0) + 1
+    kept = []
+    for key, elements, cost in sorted(selected, key=lambda s: -s[2]):
+        if all(counts[e] > 1 for e in elements):
+            for e in elements:
+                counts[e] -= 1
+        else:
+            kept.append(key)
+    return kept
+
+def minimize_pool(pool_dir: str) -> dict:
+    """Kept and dropped files of one pool (the pool is not modified)."""
+    known, unknown = [], []
+    seen_digests = {}
+    duplicates = []
+    for name in sorted(os.listdir(pool_dir)):
+        path = os.path.join(pool_dir, name)
+        if not os.path.isfile(path):
+            continue
+        digest = file_digest(path)
+        if digest not in _INDEX:
+            unknown.append(name)
+        elif digest in seen_digests:
+            # Same seed copied twice into the pool
+            duplicates.append(name)
+        else:
+            seen_digests[digest] = name
+            known.append((name, _INDEX[digest], os.path.getsize(path)))
+    kept = set(weighted_set_cover(known))
+    return {
+        'pool': os.path.basename(pool_dir.rstrip(os.path.sep)),
+        'kept': sorted(kept) + unknown,
+        'dropped': sorted([name for name, _, _ in known if name not in kept] + duplicates),
+        'known': len(known) + len(duplicates),
+        'unknown': len(unknown),
+    }
+
+def minimize(input_dir: str, rundir: str, jobs: int = 1, pools: Optional[List[str]] = None) -> List[dict]:
+    global _INDEX
+    _INDEX = build_index(rundir)
+    if pools is None:
+        pools = sorted(d for d in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, d)))
+    pool_dirs = [os.path.join(input_dir, p) for p in pools]
+    if jobs <= 1 or len(pool_dirs) <= 1:
+        return [minimize_pool(d) for d in pool_dirs]
+    # Workers are forked and inherit the index
+    with ProcessPoolExecutor(max_workers=min(jobs, len(pool_dirs))) as executor:
+        return list(executor.map(minimize_pool, pool_dirs))
+
+def apply(input_dir: str, results: List[dict], dropped_root: str) -> None:
+    for r in results:
+        if not r['dropped']:
+            continue
+        dest = os.path.join(dropped_root, r['pool'])
+        os.makedirs(dest, exist_ok=True)
+        for name in r['dropped']:
+            shutil.move(os.path.join(input_dir, r['pool'], name), os.path.join(dest, name))
+
+def print_report(results: List[dict], file=sys.stderr) -> None:
+    print(f"{'pool':<12} {'known':>7} {'kept':>7} {'dropped':>8} {'unknown':>8}", file=file)
+    for r in results:
+        print(f"{r['pool']:<12} {r['known']:>7} {r['known'] - len(r['dropped']):>7} "
+              f"{len(r['dropped']):>8} {r['unknown']:>8}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Minimize the state pools on their recorded edge and state coverage')
+    parser.add_argument('-i', '--input', required=True, help='Directory with one subdirectory per state pool')
+    parser.add_argument('-L', '--log-dir', required=True, help='Where cmin.json and the dropped seeds go')
+    parser.add_argument('-r', '--rundir', default=os.environ.get('ELMFUZZ_RUNDIR'),
+                        help='Run directory with the coverage of earlier generations (default: $ELMFUZZ_RUNDIR)')
+    parser.add_argument('-p', '--pools', nargs='+', default=None, help='Only these pools')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Pools minimized in parallel')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='Only report, do not move seeds')
+    args = parser.parse_args()
+    if not args.rundir:
+        parser.error('--rundir or ELMFUZZ_RUNDIR is required')
+
+    with telemetry.span('cmin') as sp:
+        results = minimize(args.input, args.rundir, args.jobs, args.pools)
+        if not args.dry_run:
+            apply(args.input, results, os.path.join(args.log_dir, 'cmin_dropped'))
+        sp.add_items(sum(len(r['dropped']) for r in results))
+    print_report(results)
+    if not args.dry_run:
+        os.makedirs(args.log_dir, exist_ok=True)
+        with open(os.path.join(args.log_dir, 'cmin.json'), 'w') as f:
+            json.dump({r['pool']: {'kept': r['kept'], 'dropped': r['dropped']} for r in results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
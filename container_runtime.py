@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Container runtimes for the AFLNet stage.
+
+getcov_fuzzbench_net.py ran one ``docker run`` per state pool in parallel,
+but on ACCESS/HPC hosts (no Docker daemon) it fell back to a single serial
+``apptainer exec`` over the combined input. The runtimes here share one
+interface, so every backend gets the same per-pool jobs and scheduling
+(workqueue.py):
+
+    runtime = get_runtime('apptainer')
+    handle = runtime.start(image, ['run', 'aflnet', '/tmp/input', ...],
+                           binds={run_tmp: '/tmp'}, workdir='/home/ubuntu/experiments',
+                           label=label, limits=Limits(cpus=1), log_path='aflnet_0001.log')
+    runtime.read(handle, ['/home/ubuntu/experiments/*/*/aflnetout_0001/plot_data'])  # while it runs
+    runtime.wait(handle)
+    runtime.copy_out(handle, '/home/ubuntu/experiments/aflnetout_0001.tar.gz', dest)
+    runtime.cleanup(handle)
+
+  * ``docker``: ``docker run -d`` with a label, so an interrupted run can
+    reattach to its containers (``find``); containers are kept afterwards,
+    as before.
+  * ``apptainer``: one ``apptainer instance`` per job (with a writable
+    tmpfs for the outputs), images are ``<SIF_ROOT>/<image>``. CPU and
+    memory limits need cgroups v2 and are only passed with
+    ELMFUZZ_APPTAINER_LIMITS=1. Instances left by an interrupted run are
+    stopped and their jobs restarted.
+  * ``local``: a plain process, no container. The image's ``run`` script is
+    replaced by the command in ELMFUZZ_LOCAL_RUN (default:
+    bench/fake_aflnet.py, which fakes AFLNet's outputs), container paths
+    are mapped to a private directory per job, and memory is limited with
+    RLIMIT_AS. This makes the AFLNet stage testable and benchmarkable on a
+    box without a container daemon.
+
+The runtime is chosen by ``--runtime`` or ELMFUZZ_RUNTIME, and defaults to
+``apptainer`` on ACCESS (ACCESS_INFO set) and ``docker`` elsewhere.
+
+    python container_runtime.py --runtime local -v /tmp/pool:/tmp -w /home/ubuntu/experiments \
+        -- run aflnet /tmp/input aflnetout "" 60 20
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import resource
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+RUNTIME_ENV = 'ELMFUZZ_RUNTIME'
+LOCAL_RUN_ENV = 'ELMFUZZ_LOCAL_RUN'
+APPTAINER_LIMITS_ENV = 'ELMFUZZ_APPTAINER_LIMITS'
+RUNTIMES = ['docker', 'apptainer', 'local']
+
+class Limits(NamedTuple):
+    cpus: Optional[float] = None
+    # Bytes
+    memory: Optional[int] = None
+
+def default_runtime() -> str:
+    if os.environ.get(RUNTIME_ENV):
+        return os.environ[RUNTIME_ENV]
+    return 'apptainer' if 'ACCESS_INFO' in os.environ else 'docker'
+
+def shell_command(command: List[str], workdir: Optional[str]) -> str:
+    cmd = shlex.join(command)
+    return f'cd {shlex.quote(workdir)} && {cmd}' if workdir else cmd
+
+def read_script(patterns: List[str]) -> str:
+    """Shell snippet printing the first file matching one of the (unquoted) globs."""
+    return f'for f in {" ".join(patterns)}; do [ -f "$f" ] && exec cat "$f"; done; exit 1'
+
+class Runtime:
+    """Start a command in an image, wait for it, and copy files out of it."""
+    name = None
+
+    def start(self, image: str, command: List[str], binds: Optional[Dict[str, str]] = None,
+              workdir: Optional[str] = None, label: Optional[str] = None,
+              limits: Limits = Limits(), log_path: Optional[str] = None) -> str:
+        """Start ``command`` in ``image`` and return a handle; its output is streamed to ``log_path``."""
+        raise NotImplementedError
+
+    def find(self, label: str) -> Optional[str]:
+        """Handle of a job left running by an earlier run, if the runtime can reattach to it."""
+        return None
+
+    def wait(self, handle: str) -> int:
+        raise NotImplementedError
+
+    def copy_out(self, handle: str, src: str, dest: str) -> None:
+        raise NotImplementedError
+
+    def read(self, handle: str, patterns: List[str]) -> Optional[bytes]:
+        """Contents of the first file matching one of the globs, while the job runs."""
+        return None
+
+    def cleanup(self, handle: str) -> None:
+        pass
+
+    def run(self, image: str, command: List[str], **kwargs) -> int:
+        """Start, wait and clean up."""
+        handle = self.start(image, command, **kwargs)
+        try:
+            return self.wait(handle)
+        finally:
+            self.cleanup(handle)
+
+class DockerRuntime(Runtime):
+    name = 'docker'
+
+    def __init__(self):
+        self.followers: Dict[str, subprocess.Popen] = {}
+
+    def start(self, image, command, binds=None, workdir=None, label=None, limits=Limits(), log_path=None):
+        cmd = ['docker', 'run', '-d']
+        if limits.cpus:
+            cmd.append(f'--cpus={limits.cpus:g}')
+        if limits.memory:
+            cmd.append(f'--memory={limits.memory}')
+        if label:
+            cmd += ['--label', label]
+        for host, container in (binds or {}).items():
+            cmd += ['-v', f'{host}:{container}']
+        cmd += [image, '/bin/bash', '-c', shell_command(command, workdir)]
+        res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        cid = res.stdout.strip()
+        self.follow(cid, log_path)
+        return cid
+
+    def follow(self, cid: str, log_path: Optional[str]) -> None:
+        if log_path is None:
+            return
+        with open(log_path, 'ab') as log:
+            self.followers[cid] = subprocess.Popen(['docker', 'logs', '-f', cid], stdout=log,
+                                                   stderr=subprocess.STDOUT)
+
+    def find(self, label):
+        res = subprocess.run(['docker', 'ps', '-a', '-q', '--filter', f'label={label}'],
+                             capture_output=True, text=True)
+        cids = res.stdout.split() if res.returncode == 0 else []
+        return cids[0] if cids else None
+
+    def wait(self, handle):
+        res = subprocess.run(['docker', 'wait', handle], check=True, capture_output=True, text=True)
+        follower = self.followers.pop(handle, None)
+        if follower is not None:
+            # ``docker logs -f`` ends with the container
+            follower.wait()
+        try:
+            return int(res.stdout.strip())
+        except ValueError:
+            return -1
+
+    def copy_out(self, handle, src, dest):
+        subprocess.run(['docker', 'cp', f'{handle}:{src}', dest], check=True)
+
+    def read(self, handle, patterns):
+        res = subprocess.run(['docker', 'exec', handle, 'sh', '-c', read_script(patterns)], capture_output=True)
+        return res.stdout if res.returncode == 0 else None
+
+class ApptainerRuntime(Runtime):
+    name = 'apptainer'
+
+    def __init__(self, sif_root: Optional[str] = None):
+        self.sif_root = sif_root or os.environ.get('SIF_ROOT', '.')
+        self.procs: Dict[str, subprocess.Popen] = {}
+
+    @staticmethod
+    def instance_name(label: Optional[str]) -> str:
+        if label is None:
+            return f'elmfuzz-{uuid.uuid4().hex[:12]}'
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', label)
+
+    def image_path(self, image: str) -> str:
+        if os.path.exists(image):
+            return image
+        path = os.path.join(self.sif_root, image)
+        if not os.path.exists(path) and os.path.exists(path + '.sif'):
+            path += '.sif'
+        return path
+
+    def start(self, image, command, binds=None, workdir=None, label=None, limits=Limits(), log_path=None):
+        name = self.instance_name(label)
+        cmd = ['apptainer', 'instance', 'start', '--cleanenv', '--writable-tmpfs']
+        if os.environ.get(APPTAINER_LIMITS_ENV) == '1':
+            if limits.cpus:
+                cmd.append(f'--cpus={limits.cpus:g}')
+            if limits.memory:
+                cmd.append(f'--memory={limits.memory}')
+        for host, container in (binds or {}).items():
+            cmd += ['--bind', f'{host}:{container}:rw']
+        cmd += [self.image_path(image), name]
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+        try:
+            self.procs[name] = subprocess.Popen(
+                ['apptainer', 'exec', f'instance://{name}', '/bin/bash', '-c', shell_command(command, workdir)],
+                stdout=log, stderr=subprocess.STDOUT)
+        finally:
+            if log_path:
+                log.close()
+        return name
+
+    def find(self, label):
+        # The job's process died with the run that started it: stop the
+        # instance so that the job starts over under the same name
+        name = self.instance_name(label)
+        res = subprocess.run(['apptainer', 'instance', 'list', '--json'], capture_output=True, text=True)
+        try:
+            instances = json.loads(res.stdout).get('instances', []) if res.returncode == 0 else []
+        except ValueError:
+            instances = []
+        if any(i.get('instance') == name for i in instances):
+            subprocess.run(['apptainer', 'instance', 'stop', name], capture_output=True)
+        return None
+
+    def wait(self, handle):
+        return self.procs.pop(handle).wait()
+
+    def copy_out(self, handle, src, dest):
+        with open(dest, 'wb') as f:
+            subprocess.run(['apptainer', 'exec', f'instance://{handle}', 'cat', src], stdout=f, check=True)
+
+    def read(self, handle, patterns):
+        res = subprocess.run(['apptainer', 'exec', f'instance://{handle}', 'sh', '-c', read_script(patterns)],
+                             capture_output=True)
+        return res.stdout if res.returncode == 0 else None
+
+    def cleanup(self, handle):
+        subprocess.run(['apptainer', 'instance', 'stop', handle], capture_output=True)
+
+class LocalRuntime(Runtime):
+    name = 'local'
+
+    def __init__(self, run_command: Optional[str] = None):
+        default = f'{sys.executable} {os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench", "fake_aflnet.py")}'
+        self.run_command = shlex.split(run_command or os.environ.get(LOCAL_RUN_ENV) or default)
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, tuple] = {}
+
+    @staticmethod
+    def translate(path: str, mounts: Dict[str, str]) -> str:
+        """Host path of a container path, through the longest matching mount."""
+        for container in sorted(mounts, key=len, reverse=True):
+            if path == container or path.startswith(container.rstrip('/') + '/'):
+                return os.path.join(mounts[container], os.path.relpath(path, container))
+        return path
+
+    def start(self, image, command, binds=None, workdir=None, label=None, limits=Limits(), log_path=None):
+        root = tempfile.mkdtemp(prefix='elmfuzz-local-')
+        mounts = {container: host for host, container in (binds or {}).items()}
+        if workdir is not None:
+            mounts.setdefault(workdir, os.path.join(root, workdir.lstrip('/')))
+            os.makedirs(mounts[workdir], exist_ok=True)
+        # The image's entry script is replaced by the local command
+        argv = self.run_command + [self.translate(a, mounts) if a.startswith('/') else a for a in command[1:]]
+
+        def set_limits():
+            if limits.memory:
+                resource.setrlimit(resource.RLIMIT_AS, (limits.memory, limits.memory))
+        log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+        try:
+            proc = subprocess.Popen(argv, cwd=mounts.get(workdir, root), stdout=log, stderr=subprocess.STDOUT,
+                                    preexec_fn=set_limits)
+        finally:
+            if log_path:
+                log.close()
+        handle = f'local-{proc.pid}'
+        with self.lock:
+            self.jobs[handle] = (proc, root, mounts)
+        return handle
+
+    def wait(self, handle):
+        return self.jobs[handle][0].wait()
+
+    def copy_out(self, handle, src, dest):
+        shutil.copyfile(self.translate(src, self.jobs[handle][2]), dest)
+
+    def read(self, handle, patterns):
+        mounts = self.jobs[handle][2]
+        for pattern in patterns:
+            for path in sorted(glob.glob(self.translate(pattern, mounts))):
+                try:
+                    with open(path, 'rb') as f:
+                        return f.read()
+                except OSError:
+                    continue
+        return None
+
+    def cleanup(self, handle):
+        with self.lock:
+            _, root, _ = self.jobs.pop(handle)
+        shutil.rmtree(root, ignore_errors=True)
+
+def get_runtime(name: Optional[str] = None) -> Runtime:
+    name = name or default_runtime()
+    if name == 'docker':
+        return DockerRuntime()
+    if name == 'apptainer':
+        return ApptainerRuntime()
+    if name == 'local':
+        return LocalRuntime()
+    raise ValueError(f'Unknown container runtime {name!r} (choose from {", ".join(RUNTIMES)})')
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a command through a container runtime')
+    parser.add_argument('--runtime', choices=RUNTIMES, default=default_runtime())
+    parser.add_argument('-i', '--image', default='', help='Image (ignored by the local runtime)')
+    parser.add_argument('-w', '--workdir', default=None, help='Working directory inside the container')
+    parser.add_argument('-v', '--bind', action='append', default=[], help='host:container bind mount')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    binds = dict(b.split(':', 1) for b in args.bind)
+    sys.exit(get_runtime(args.runtime).run(args.image, command, binds=binds, workdir=args.workdir))
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,31 @@ STATE_POOLS=($(./elmconfig.py get run.state_pools))
 PROTOCOL_TYPE=$(./elmconfig.py get protocol_type)
 TDPFUZZ_FORBIDDEN="${TDPFUZZ_FORBIDDEN:-}"
 
+# Every stage appends its spans to the generation's timeline
+# (see telemetry.py for the summary and Chrome trace exporters)
+export ELMFUZZ_TIMELINE="${LOGDIR}/timeline.jsonl"
+export ELMFUZZ_GEN="${next_gen}"
+
+# Stage checkpoints (see checkpoint.py). A stage whose checkpoint is done
+# with the same inputs is skipped when a generation is re-run; a stage that
+# was started but not finished is resumed where the tools support it.
+CKPT_MANIFEST="${LOGDIR}/checkpoints.json"
+CKPT_INPUTS=("$ELMFUZZ_RUNDIR/config.yaml")
+ckpt() {
+    local cmd="$1"
+    shift
+    python checkpoint.py "$cmd" -m "$CKPT_MANIFEST" -g "$next_gen" "$@" --inputs "${CKPT_INPUTS[@]}"
+}
+
+# Variants are shrunk (unreachable functions removed) on their way from
+# genvariants to genoutputs; ELMFUZZ_SHRINK=0 passes them on as they are
+shrink_stream() {
+    if [ "${ELMFUZZ_SHRINK:-1}" != "0" ]; then
+        python shrink_batch.py --stream
+    else
+        cat
+    fi
+}
 
 COLOR_RED='\033[0;31m'
 COLOR_GREEN='\033[0;32m'
@@ -103,12 +128,27 @@ else
 
         
 
-        python select_seeds_net.py -u -g $prev_gen -n $NUM_SELECTED -c $cov_file -i $input_elite_file -o $output_elite_file 
+        CKPT_INPUTS+=("$cov_file" "$input_elite_file")
+        if [ "$(ckpt status --stage select_seeds)" == "done" ]; then
+            echo "Checkpoint: seed selection already done; skipping"
+        else
+            ckpt begin --stage select_seeds
+            python select_seeds_net.py -u -g $prev_gen -n $NUM_SELECTED -c $cov_file -i $input_elite_file -o $output_elite_file 
+            ckpt mark --stage select_seeds
+        fi
+        # Everything downstream depends on the selected elites
+        CKPT_INPUTS+=("$output_elite_file")
         
-        if [ -z "$TDPFUZZ_FORBIDDEN" ]; then
-            python select_states_net.py -c $cov_file -e $output_elite_file -g $prev_gen --ss
-        elif [ "$TDPFUZZ_FORBIDDEN" = "NOSS" ]; then
-            python select_states_net.py -c $cov_file -e $output_elite_file -g $prev_gen --noss
+        if [ "$(ckpt status --stage select_states)" == "done" ]; then
+            echo "Checkpoint: state selection already done; skipping"
+        else
+            ckpt begin --stage select_states
+            if [ -z "$TDPFUZZ_FORBIDDEN" ]; then
+                python select_states_net.py -c $cov_file -e $output_elite_file -g $prev_gen --ss
+            elif [ "$TDPFUZZ_FORBIDDEN" = "NOSS" ]; then
+                python select_states_net.py -c $cov_file -e $output_elite_file -g $prev_gen --noss
+            fi
+            ckpt mark --stage select_states
         fi
         # python select_seeds_net.py -g $prev_gen -n $NUM_SELECTED -c $cov_file -i $input_elite_file -o $output_elite_file | \
         #     while read cov gen model generator ; do
@@ -143,61 +183,159 @@ fi
 # fi
 VARIANT_ARGS="-n ${NUM_VARIANTS}"
 
+# With ELMFUZZ_BANDIT=1 the variants are allocated over the seeds and
+# mutators by the yield of the last generation (see mutator_bandit.py);
+# the total stays NUM_VARIANTS per seed
+PLAN_ARGS=""
+if [ "${ELMFUZZ_BANDIT:-0}" == "1" ] && [ "$prev_gen" != "initial" ]; then
+    python mutator_bandit.py plan \
+        -p "${prev_gen}" \
+        -g "${next_gen}" \
+        -n "${NUM_VARIANTS}" \
+        --pools "${STATE_POOLS[@]}" \
+        -o "${LOGDIR}/bandit_plan.json"
+    PLAN_ARGS="--plan ${LOGDIR}/bandit_plan.json"
+fi
+
 
 echo "Generating next generation: ${NUM_VARIANTS} variants for each seed with each model"
 
 
 
-for model_name in $MODELS ; do
-    for state_name in "${STATE_POOLS[@]}"; do
-        MODEL=$(basename "$model_name")
-        GVLOG="${LOGDIR}/meta"
-        GOLOG="${LOGDIR}/outputgen_${MODEL}.jsonl"
-        GVOUT=$(./elmconfig.py get run.genvariant_dir -s MODEL=${MODEL} -s GEN=${prev_gen})
-        GOOUT=$(./elmconfig.py get run.genoutput_dir -s MODEL=${MODEL} -s GEN=${prev_gen})
-
-        echo "====================== $model_name:$state_name ======================"
-        python "$ELMFUZZ_RUNDIR"/seed_gen_${PROTOCOL_TYPE}.py \
-            --input_seeds "${GOOUT}/${state_name}/" \
-            --init_variants "${GVOUT}/${state_name}/"
+if [ -z "${SEQUENTIAL_POOLS:-}" ]; then
+    # All (model, pool) combinations at once, sharing the LLM endpoint(s) and
+    # the execution workers (see genpools_net.py). Set SEQUENTIAL_POOLS=1 for
+    # the one-pool-at-a-time loop below.
+    GENPOOLS_ARGS=""
+    if [ "$TDPFUZZ_FORBIDDEN" == "NOSM" ]; then
+        GENPOOLS_ARGS="--no-mutate"
+    fi
+    python genpools_net.py $GENPOOLS_ARGS $PLAN_ARGS \
+        -p "${prev_gen}" \
+        -g "${next_gen}" \
+        -L "${LOGDIR}" \
+        -n "${NUM_VARIANTS}" \
+        --models $MODELS \
+        --pools "${STATE_POOLS[@]}" \
+        -m "$CKPT_MANIFEST" \
+        --ckpt-inputs "${CKPT_INPUTS[@]}"
+    # Coverage is collected from the output directory of the last model, as in the loop
+    last_model="${MODELS##* }"
+    GOOUT=$(./elmconfig.py get run.genoutput_dir -s MODEL=$(basename "$last_model") -s GEN=${prev_gen})
+else
+    for model_name in $MODELS ; do
+        for state_name in "${STATE_POOLS[@]}"; do
+            MODEL=$(basename "$model_name")
+            GVLOG="${LOGDIR}/meta/${state_name}"
+            GOLOG="${LOGDIR}/outputgen_${MODEL}.jsonl"
+            GVOUT=$(./elmconfig.py get run.genvariant_dir -s MODEL=${MODEL} -s GEN=${prev_gen})
+            GOOUT=$(./elmconfig.py get run.genoutput_dir -s MODEL=${MODEL} -s GEN=${prev_gen})
+
+            echo "====================== $model_name:$state_name ======================"
+            if [ "$(ckpt status --stage seed_gen --model "${MODEL}" --pool "${state_name}")" == "done" ]; then
+                echo "Checkpoint: seed modules of $state_name already generated; skipping"
+            else
+                ckpt begin --stage seed_gen --model "${MODEL}" --pool "${state_name}"
+                python telemetry.py run --stage seed_gen --pool "${state_name}" --model "${MODEL}" -- \
+                    python "$ELMFUZZ_RUNDIR"/seed_gen_${PROTOCOL_TYPE}.py \
+                    --input_seeds "${GOOUT}/${state_name}/" \
+                    --init_variants "${GVOUT}/${state_name}/"
+                ckpt mark --stage seed_gen --model "${MODEL}" --pool "${state_name}"
+            fi
       
-        if [ "$TDPFUZZ_FORBIDDEN" != "NOSM" ]; then
-            python genvariants_parallel_net.py \
-                $VARIANT_ARGS \
-                -M "${model_name}" \
-                -O "${GVOUT}/${state_name}/" \
-                -L "${GVLOG}" \
-                "$ELMFUZZ_RUNDIR"/${prev_gen}/variants/${state_name}/*.py \
-            | python genoutputs_net.py \
-                -L "${GOLOG}" \
-                -O "${GOOUT}/${state_name}/" \
-                -g "${prev_gen}"
-        fi
-        # rm "$GOLOG"
-        # python shrink_variants_in_dir.py --source-dir "${GVOUT}"
+            if [ "$TDPFUZZ_FORBIDDEN" != "NOSM" ]; then
+                mutate_status=$(ckpt status --stage mutate --model "${MODEL}" --pool "${state_name}")
+                if [ "$mutate_status" == "done" ]; then
+                    echo "Checkpoint: variants of $model_name:$state_name already generated; skipping"
+                    continue
+                fi
+                RESUME_ARGS=""
+                if [ "$mutate_status" == "started" ]; then
+                    echo "Checkpoint: resuming the interrupted variant batch of $model_name:$state_name"
+                    RESUME_ARGS="--resume"
+                fi
+                # Variants are written next to the seed modules; only the seed
+                # modules are inputs, also when an interrupted batch is resumed
+                seed_modules=()
+                for f in "$ELMFUZZ_RUNDIR"/${prev_gen}/variants/${state_name}/*.py; do
+                    case "$(basename "$f")" in
+                        var_*) ;;
+                        *) seed_modules+=("$f") ;;
+                    esac
+                done
+                # Variants speculated while the previous coverage run was still
+                # going (pipeline_net.py) are adopted if their seed modules match
+                ADOPT_ARGS=""
+                if [ -d "$ELMFUZZ_RUNDIR/spec/${prev_gen}/variants" ]; then
+                    ADOPT_ARGS="--adopt $ELMFUZZ_RUNDIR/spec/${prev_gen}"
+                fi
+                ckpt begin --stage mutate --model "${MODEL}" --pool "${state_name}"
+                python genvariants_parallel_net.py \
+                    $VARIANT_ARGS $RESUME_ARGS $ADOPT_ARGS $PLAN_ARGS \
+                    -M "${model_name}" \
+                    -O "${GVOUT}/${state_name}/" \
+                    -L "${GVLOG}" \
+                    "${seed_modules[@]}" \
+                | shrink_stream \
+                | python genoutputs_net.py $RESUME_ARGS \
+                    -L "${GOLOG}" \
+                    -O "${GOOUT}/${state_name}/" \
+                    -g "${prev_gen}"
+                ckpt mark --stage mutate --model "${MODEL}" --pool "${state_name}"
+            fi
+            # rm "$GOLOG"
+            # python shrink_variants_in_dir.py --source-dir "${GVOUT}"
+        done
     done
-done
+fi
 
 # Collect the coverage of the generators
 echo "Collecting coverage of the generators"
 all_models_genout_dir=$(realpath -m "$GOOUT")
 
-case "$TYPE" in
-    fuzzbench|oss-fuzz|docker|profuzzbench)
-        python getcov_fuzzbench_net.py \
-            --image tdpfuzz/"$PROJECT_NAME" \
-            --input "$all_models_genout_dir" \
-            --output "${AFLNET_OUT}" \
-            --covfile "${LOGDIR}/coverage.json" \
-            --next_gen "${next_gen#gen}"
-        ;;
-    *)
-        python getcov.py -O "${LOGDIR}/coverage.json" "$all_models_genout_dir"
-        ;;
-esac
+getcov_status=$(ckpt status --stage getcov)
+if [ "$getcov_status" == "done" ] && [ -f "${LOGDIR}/coverage.json" ]; then
+    echo "Checkpoint: coverage already collected; skipping"
+else
+    GETCOV_RESUME="--no-resume"
+    if [ "$getcov_status" == "started" ]; then
+        echo "Checkpoint: resuming the interrupted coverage run; finished jobs are kept"
+        GETCOV_RESUME="--resume"
+    elif [ "${ELMFUZZ_CMIN:-1}" != "0" ]; then
+        # Drop selected seeds whose edge and state coverage other seeds of the pool already have
+        python cmin_net.py -i "$all_models_genout_dir" -L "${LOGDIR}"
+    fi
+    ckpt begin --stage getcov
+    case "$TYPE" in
+        fuzzbench|oss-fuzz|docker|profuzzbench)
+            python getcov_fuzzbench_net.py \
+                --image tdpfuzz/"$PROJECT_NAME" \
+                --input "$all_models_genout_dir" \
+                --output "${AFLNET_OUT}" \
+                --covfile "${LOGDIR}/coverage.json" \
+                --next_gen "${next_gen#gen}" \
+                $GETCOV_RESUME
+            ;;
+        stub)
+            # Offline benchmarking (bench/e2e_generation.py): fake coverage, no AFLNet
+            python bench/stub_getcov.py \
+                --input "$all_models_genout_dir" \
+                --output "${AFLNET_OUT}" \
+                --covfile "${LOGDIR}/coverage.json" \
+                --next_gen "${next_gen#gen}" \
+                --delay "${STUB_EXEC_DELAY:-0}" \
+                --protocol "$PROTOCOL_TYPE"
+            ;;
+        *)
+            python getcov.py -O "${LOGDIR}/coverage.json" "$all_models_genout_dir"
+            ;;
+    esac
+    ckpt mark --stage getcov
+fi
 
 # Plot coverage
-python analyze_cov.py -m $num_gens -p "$ELMFUZZ_RUNDIR"/*/logs/coverage.json
+python telemetry.py run --stage analyze_cov -- \
+    python analyze_cov.py -m $num_gens -p "$ELMFUZZ_RUNDIR"/*/logs/coverage.json
 
 # Create a stamp file to indicate that this generation is finished
 touch "$ELMFUZZ_RUNDIR"/stamps/${next_gen}.stamp
@@ -13,7 +13,6 @@ import resource
 from typing import BinaryIO, Callable, List, NamedTuple, Tuple, Union
 from tempfile import TemporaryDirectory
 from contextlib import nullcontext, redirect_stdout, redirect_stderr
-from concurrent.futures import ProcessPoolExecutor, as_completed
 import logging
 
 from drive_log import set_loglevel
@@ -330,6 +329,20 @@ def fill_result(result, module_path, function_name, output_file, args):
         args = args,
     )
 
+def run_all(function, output_files: List[str], args):
+    """Yield (output_file, result) for each output file as its run finishes."""
+    if len(output_files) == 1:
+        # A single run (genoutputs starts one driver per module) needs no process
+        # pool; starting one costs more than most generator runs
+        yield output_files[0], generate_one(output_files[0], function, args)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor() as executor:
+        futures = {executor.submit(generate_one, output_file, function, args): output_file
+                   for output_file in output_files}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
 def main():
     parser = make_parser('Run an input generator function in a loop')
     args = parser.parse_args()
@@ -349,18 +362,14 @@ def main():
             return
 
         function = function_or_result
-        with ProcessPoolExecutor() as executor:
-            futures = {}
-            for seed_input in seed_inputs:
-                for i in range(args.num):
-                    output_file = f'{args.output_prefix}_{os.path.basename(seed_input).replace(".", "-")}_{i:08}{args.output_suffix}'
-                    future = executor.submit(generate_one, output_file, function, args)
-                    futures[future] = output_file
-            for future in as_completed(futures):
-                output_file = futures[future]
-                result = future.result()
-                final_result = fill_result(result, module_path, function_name, output_file, args)
-                print(final_result.json(), file=f)
+        output_files = []
+        for seed_input in seed_inputs:
+            for i in range(args.num):
+                output_file = f'{args.output_prefix}_{os.path.basename(seed_input).replace(".", "-")}_{i:08}{args.output_suffix}'
+                output_files.append(output_file)
+        for output_file, result in run_all(function, output_files, args):
+            final_result = fill_result(result, module_path, function_name, output_file, args)
+            print(final_result.json(), file=f)
     # else:
     #     with open(args.logfile, 'w') if args.logfile else nullcontext(sys.stdout) as log_f:
     #         module_path = os.path.abspath(args.module_path)
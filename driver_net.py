@@ -13,29 +13,34 @@ import resource
 from typing import BinaryIO, Callable, List, NamedTuple, Tuple, Union
 from tempfile import TemporaryDirectory
 from contextlib import nullcontext, redirect_stdout, redirect_stderr
-from concurrent.futures import ProcessPoolExecutor, as_completed
 import logging
 
 from drive_log import set_loglevel
 logger = logging.getLogger('root')
 
+# Message functions of the wrapped module, looked up once per worker process
+_MESSAGE_TABLES = {}
+
 class RTSPWrapper:
-    def __init__(self, func_names):
-        self.func_names = func_names
+    def __init__(self, func_names, separator=b'\r\n\r\n'):
+        self.func_names = tuple(func_names)
+        self.separator = separator
+
+    def message_table(self):
+        table = _MESSAGE_TABLES.get(self.func_names)
+        if table is None:
+            import sys
+            if 'generator_module' in sys.modules:
+                generator_module = sys.modules['generator_module']
+            else:
+                import generator_module
+            table = _MESSAGE_TABLES[self.func_names] = tuple(
+                getattr(generator_module, name) for name in self.func_names
+            )
+        return table
 
     def __call__(self, rng, output):
-        import sys
-        if 'generator_module' in sys.modules:
-            generator_module = sys.modules['generator_module']
-        else:
-            import generator_module
-        
-        funcs = [getattr(generator_module, name) for name in self.func_names]
-        for i, func in enumerate(funcs):
-            output.write(func())
-            if i < len(funcs) - 1:
-                output.write(b'\r\n\r\n')
-        output.write(b'\r\n\r\n')
+        output.write(self.separator.join([func() for func in self.message_table()]) + self.separator)
 
 class ExceptionInfo(NamedTuple):
     exception_class: str
@@ -66,6 +71,8 @@ class GenResult(str,Enum):
     UnknownErr  = "UnknownErr"
     NoLogErr    = "NoLogErr"
     AFLErr      = "AFLErr"
+    # Stopped by the adaptive budget of timeout_policy.py, before the timeout
+    BudgetKill  = "BudgetKill"
 
 class ResultInfo(NamedTuple):
     time_taken: float
@@ -122,11 +129,12 @@ class TimedExecution():
     def __enter__(self):
         self.start_time = time.time()
         self.old_handler = signal.signal(signal.SIGALRM, self._handle_timeout)
-        signal.alarm(self.timeout)
+        # setitimer, unlike alarm, takes fractions of a second (budgets)
+        signal.setitimer(signal.ITIMER_REAL, self.timeout)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        signal.alarm(0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
         signal.signal(signal.SIGALRM, self.old_handler)
         self.time_taken = time.time() - self.start_time
         self.timed_out = False
@@ -235,8 +243,10 @@ def generate_one(
 
     with open('/dev/urandom', 'rb') as rng, \
          SizeLimitedBinaryFile(open(output_file, 'wb'), max_size=args.size_limit) as output:
+        budget = getattr(args, 'budget', None)
+        budget_limited = budget is not None and budget < args.timeout
         try:
-            with Sandbox(args.timeout, args.max_mem) as s:
+            with Sandbox(budget if budget_limited else args.timeout, args.max_mem) as s:
                 function(rng, output)
             r = Result(
                 result_type = GenResult.Success,
@@ -259,7 +269,7 @@ def generate_one(
             )
         except TimeoutError as e:
             r = Result(
-                result_type = GenResult.Timeout,
+                result_type = GenResult.BudgetKill if budget_limited else GenResult.Timeout,
                 error = None,
                 data = s.result(),
             )
@@ -290,10 +300,17 @@ def get_function(module_path, function_name, args):
             try:
                 function = getattr(generator_module, function_name)
             except AttributeError:
-                # If function not found, check if we should use the wrapper
-                func_names = [k for k, v in sorted(generator_module.__dict__.items()) if k.startswith('seed_') and callable(v)]
+                # If function not found, check if we should use the wrapper: the
+                # message table seed_compiler.py wrote, else the seed_* functions
+                table = getattr(generator_module, '__message_table__', None)
+                if isinstance(table, tuple):
+                    func_names = [func.__name__ for func in table if callable(func)]
+                else:
+                    func_names = [k for k, v in sorted(generator_module.__dict__.items()) if k.startswith('seed_') and callable(v)]
                 if func_names:
-                     return RTSPWrapper(func_names)
+                     wrapper = RTSPWrapper(func_names)
+                     wrapper.message_table()
+                     return wrapper
                 raise
 
             print(f'{function_name}', file=sys.stderr)
@@ -332,6 +349,10 @@ def make_parser(description):
     parser.add_argument(
         '-t', '--timeout', type=int, default=10,
         help='Timeout for the run (in seconds)')
+    parser.add_argument(
+        '-b', '--budget', type=float, default=None,
+        help='Per-run budget below the timeout (in seconds, see timeout_policy.py); '
+        'runs stopped by it are BudgetKill results')
     parser.add_argument(
         '-M', '--max-mem', type=int, default=1024*1024*1024,
         help='Maximum memory usage (in bytes)')
@@ -357,6 +378,20 @@ def fill_result(result, module_path, function_name, output_file, args):
         args = args,
     )
 
+def run_all(function, output_files: List[str], args):
+    """Yield (output_file, result) for each output file as its run finishes."""
+    if len(output_files) == 1:
+        # A single run (genoutputs starts one driver per module) needs no process
+        # pool; starting one costs more than most generator runs
+        yield output_files[0], generate_one(output_files[0], function, args)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor() as executor:
+        futures = {executor.submit(generate_one, output_file, function, args): output_file
+                   for output_file in output_files}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
 def main():
     parser = make_parser('Run an input generator function in a loop')
     args = parser.parse_args()
@@ -379,21 +414,17 @@ def main():
             return
 
         function = function_or_result
-        with ProcessPoolExecutor() as executor:
-            futures = {}
-            for seed_input in seed_inputs:
-                for i in range(args.num):
-                    if args.num == 1 and len(seed_inputs) == 1:
-                         output_file = f'{args.output_prefix}{args.output_suffix}'
-                    else:
-                         output_file = f'{args.output_prefix}_{os.path.basename(seed_input).replace(".", "-")}_{i:08}{args.output_suffix}'
-                    future = executor.submit(generate_one, output_file, function, args)
-                    futures[future] = output_file
-            for future in as_completed(futures):
-                output_file = futures[future]
-                result = future.result()
-                final_result = fill_result(result, module_path, function_name, output_file, args)
-                print(final_result.json(), file=f)
+        output_files = []
+        for seed_input in seed_inputs:
+            for i in range(args.num):
+                if args.num == 1 and len(seed_inputs) == 1:
+                    output_file = f'{args.output_prefix}{args.output_suffix}'
+                else:
+                    output_file = f'{args.output_prefix}_{os.path.basename(seed_input).replace(".", "-")}_{i:08}{args.output_suffix}'
+                output_files.append(output_file)
+        for output_file, result in run_all(function, output_files, args):
+            final_result = fill_result(result, module_path, function_name, output_file, args)
+            print(final_result.json(), file=f)
     # else:
     #     with open(args.logfile, 'w') if args.logfile else nullcontext(sys.stdout) as log_f:
     #         module_path = os.path.abspath(args.module_path)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Coverage over time of an AFLNet queue, replayed by parallel server instances.
+
+The targets' cov_script.sh used to replay one queue entry at a time: pkill
+the server, start aflnet-replay, give the server a fixed 3 s under
+``timeout`` and recompute the global coverage from scratch with ``gcovr -r
+.. -s``; crash_script did the same per crash. Both now call this script,
+which every target image has in $WORKDIR (the Dockerfiles copy it from the
+``fuzzbench`` build context, ``docker build --build-context fuzzbench=..
+.``), and which replays as follows:
+
+  * ``-j`` server instances replay in parallel. Each instance gets its own
+    port when the server takes one on the command line, and otherwise its
+    own network namespace (``unshare -rn``), so the configured port is free
+    in every instance. Docker's default seccomp profile forbids the
+    namespaces; without them such a target is replayed on one instance.
+  * Every instance dumps its gcov counters under its own GCOV_PREFIX (or
+    its own LLVM_PROFILE_FILE), so instances never mix counters and a batch
+    only reads what it changed: the counters are read with one ``gcov
+    --json-format`` call per batch, merged into the covered lines and
+    branches so far, and removed.
+  * A server is stopped as soon as its replay is done rather than after a
+    fixed timeout, and targets whose server handles any number of sessions
+    (``persistent``) keep one server per instance for a whole batch.
+
+Inputs are replayed in queue order (the seeds, then ``id:*`` by mtime), in
+batches of ``--step`` inputs, and one row per batch is written in
+cov_script.sh's format, ``Time,l_per,l_abs,b_per,b_abs``. Batches run one
+after another, so the rows are a time series like before; only the inputs
+of a batch are replayed concurrently.
+
+    cd $WORKDIR && python3 replay_cov.py -t live555 -j 8 -s 20 \\
+        live555/testProgs/aflnetout/ live555/testProgs/aflnetout/cov_over_time.csv
+    python3 replay_cov.py -t live555 --crashes aflnetout/ crashes.json   # which crashes reproduce
+
+It needs only the Python 3.8 standard library and the gcov (or llvm-cov)
+of the image.
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+class Target(NamedTuple):
+    # Directory (relative to $WORKDIR) the server runs in
+    cwd: str
+    # Server command; ``{port}`` is replaced by the instance's port
+    server: Tuple[str, ...]
+    protocol: str
+    port: int
+    # Root of the coverage build (relative to cwd), as passed to gcovr -r
+    gcov_root: str
+    replay_args: Tuple[str, ...] = ('1',)
+    stop_signal: str = 'SIGUSR1'
+    # The server serves any number of sessions without carrying state over
+    persistent: bool = False
+    # Seconds between starting the server and replaying
+    server_wait: float = 0.2
+    # Run before each server start (e.g. emptying the FTP share)
+    prepare: Optional[str] = None
+    # Started along with each replay (e.g. kamailio's second SIP party)
+    companion: Tuple[str, ...] = ()
+
+# From the targets' cov_script.sh
+TARGETS = {
+    # Session ids are fixed to 8888 by gcov.patch, so a server takes one session
+    'live555': Target('live555-cov/testProgs', ('./testOnDemandRTSPServer', '{port}'), 'RTSP', 8554, '..'),
+    'exim': Target('exim-gcov', ('exim', '-bd', '-oX', '{port}', '-oP', '/tmp/exim_{port}.pid'), 'SMTP', 25, '.',
+                   replay_args=('100',), stop_signal='SIGTERM', persistent=True),
+    'forked-daapd': Target('.', ('./forked-daapd-gcov/src/forked-daapd', '-d', '0', '-c', './forked-daapd.conf', '-f'),
+                           'HTTP', 3689, 'forked-daapd-gcov', replay_args=('100', '10000'), persistent=True,
+                           server_wait=1.0),
+    'kamailio': Target('.', ('./kamailio-gcov/src/kamailio', '-f', './kamailio-basic.cfg', '-L',
+                             './kamailio-gcov/src/modules', '-Y', './kamailio-gcov/runtime_dir/', '-n', '1', '-D', '-E'),
+                       'SIP', 5060, 'kamailio-gcov', stop_signal='SIGTERM', companion=('./run_pjsip',)),
+    'proftpd': Target('proftpd-gcov', ('./proftpd', '-n', '-c', '{workdir}/basic.conf', '-X'), 'FTP', 21, '.',
+                      stop_signal='SIGTERM', prepare='rm -f /home/ubuntu/ftpshare/*'),
+    'pure-ftpd': Target('pure-ftpd-gcov', ('src/pure-ftpd', '-A'), 'FTP', 21, '.', stop_signal='SIGTERM'),
+}
+
+# Seconds a replay or a server stop may take before it is killed
+REPLAY_TIMEOUT = 10.0
+STOP_TIMEOUT = 3.0
+
+def queue_inputs(folder: str, testdir: str) -> List[str]:
+    """Inputs in the order cov_script.sh replays them: the seeds, then id:* by mtime."""
+    seeds = sorted(glob.glob(os.path.join(folder, testdir, '*.raw')))
+    ids = sorted(glob.glob(os.path.join(folder, testdir, 'id*')), key=lambda p: (os.path.getmtime(p), p))
+    return seeds + [p for p in ids if p not in seeds]
+
+class Instance(NamedTuple):
+    index: int
+    port: int
+    # GCOV_PREFIX / LLVM_PROFILE_FILE directory of the instance
+    counters: str
+    netns: bool
+
+# -- replaying --------------------------------------------------------------
+
+def instance_env(inst: Instance, backend: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    if backend == 'gcov':
+        env['GCOV_PREFIX'] = inst.counters
+        env['GCOV_PREFIX_STRIP'] = '0'
+    else:
+        env['LLVM_PROFILE_FILE'] = os.path.join(inst.counters, '%p.profraw')
+    return env
+
+def start_server(target: Target, inst: Instance, workdir: str, env: Dict[str, str]) -> subprocess.Popen:
+    if target.prepare:
+        subprocess.run(target.prepare, shell=True, cwd=os.path.join(workdir, target.cwd),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    argv = [a.format(port=inst.port, workdir=workdir) for a in target.server]
+    server = subprocess.Popen(argv, cwd=os.path.join(workdir, target.cwd), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(target.server_wait)
+    return server
+
+def stop_server(target: Target, server: subprocess.Popen) -> int:
+    """Stop the server so that it dumps its counters; its exit status (negative: signal)."""
+    if server.poll() is None:
+        server.send_signal(getattr(signal, target.stop_signal))
+        try:
+            server.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return server.wait()
+
+def replay(target: Target, inst: Instance, replayer: str, path: str, workdir: str, env: Dict[str, str]) -> None:
+    cwd = os.path.join(workdir, target.cwd)
+    companions = [subprocess.Popen(list(target.companion), cwd=cwd, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)] if target.companion else []
+    try:
+        subprocess.run([replayer, path, target.protocol, str(inst.port)] + list(target.replay_args),
+                       cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       timeout=REPLAY_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        pass
+    finally:
+        for c in companions:
+            c.kill()
+            c.wait()
+
+def run_instance(target_name: str, inst: Instance, replayer: str, paths: List[str], workdir: str,
+                 backend: str) -> Dict[str, int]:
+    """Replay ``paths`` on one instance; the server's exit status per input."""
+    target = TARGETS[target_name]
+    env = instance_env(inst, backend)
+    if inst.netns:
+        subprocess.run(['ip', 'link', 'set', 'lo', 'up'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    status = {}
+    if target.persistent:
+        server = start_server(target, inst, workdir, env)
+        for path in paths:
+            replay(target, inst, replayer, path, workdir, env)
+        code = stop_server(target, server)
+        status = {path: code for path in paths}
+    else:
+        for path in paths:
+            server = start_server(target, inst, workdir, env)
+            replay(target, inst, replayer, path, workdir, env)
+            status[path] = stop_server(target, server)
+    return status
+
+def run_batch(target_name: str, instances: List[Instance], replayer: str, batch: List[str], workdir: str,
+              backend: str, pool: ThreadPoolExecutor) -> Dict[str, int]:
+    shares = [batch[i::len(instances)] for i in range(len(instances))]
+    futures = []
+    for inst, share in zip(instances, shares):
+        if not share:
+            continue
+        if inst.netns:
+            # Re-run this script for the share, inside a network namespace of its own
+            spec = json.dumps({'target': target_name, 'instance': inst._asdict(), 'replayer': replayer,
+                               'paths': share, 'workdir': workdir, 'backend': backend})
+            futures.append((inst, pool.submit(subprocess.run,
+                                              ['unshare', '-rn', sys.executable, os.path.abspath(__file__),
+                                               '--instance', spec],
+                                              stdout=subprocess.PIPE, universal_newlines=True)))
+        else:
+            futures.append((inst, pool.submit(run_instance, target_name, inst, replayer, share, workdir, backend)))
+    status = {}
+    for inst, f in futures:
+        res = f.result()
+        if isinstance(res, subprocess.CompletedProcess):
+            # Without its status the instance replayed nothing, and the
+            # coverage of the batch would silently stay flat
+            if res.returncode != 0:
+                raise RuntimeError(f"Instance {inst.index} failed in its network namespace "
+                                   f"(exit status {res.returncode})")
+            res = json.loads(res.stdout.strip().splitlines()[-1])
+        status.update(res)
+    return status
+
+def netns_available() -> bool:
+    """Whether network namespaces can be created (Docker's default seccomp profile forbids it)."""
+    try:
+        return subprocess.run(['unshare', '-rn', 'true'], stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+# -- coverage ---------------------------------------------------------------
+
+class GcovCoverage:
+    """Covered lines and branches so far, fed with the counters each batch dumped."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.lines: Set[Tuple[str, int]] = set()
+        self.branches: Set[Tuple[str, int, int]] = set()
+        gcnos = glob.glob(os.path.join(self.root, '**', '*.gcno'), recursive=True)
+        all_lines, all_branches = self.read(gcnos, covered_only=False)
+        self.total_lines = len(all_lines)
+        self.total_branches = len(all_branches)
+
+    @staticmethod
+    def read(paths: List[str], covered_only: bool = True) -> Tuple[set, set]:
+        lines, branches = set(), set()
+        if not paths:
+            return lines, branches
+        with tempfile.TemporaryDirectory() as tmp:
+            subprocess.run(['gcov', '--json-format', '--branch-probabilities'] + paths, cwd=tmp,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for report in glob.glob(os.path.join(tmp, '*.gcov.json.gz')):
+                with gzip.open(report, 'rt') as f:
+                    data = json.load(f)
+                for source in data.get('files', []):
+                    name = source['file']
+                    for line in source.get('lines', []):
+                        if not covered_only or line.get('count', 0) > 0:
+                            lines.add((name, line['line_number']))
+                        for i, branch in enumerate(line.get('branches', [])):
+                            if not covered_only or branch.get('count', 0) > 0:
+                                branches.add((name, line['line_number'], i))
+        return lines, branches
+
+    def add(self, counters: str) -> None:
+        """Merge the counters an instance dumped under ``counters`` and remove them."""
+        gcdas = glob.glob(os.path.join(counters, '**', '*.gcda'), recursive=True)
+        for gcda in gcdas:
+            gcno = os.path.join(counters, os.path.relpath(gcda, counters))[:-len('.gcda')] + '.gcno'
+            original = '/' + os.path.relpath(gcno, counters)
+            if not os.path.exists(gcno) and os.path.exists(original):
+                os.symlink(original, gcno)
+        lines, branches = self.read(gcdas)
+        self.lines |= lines
+        self.branches |= branches
+        for gcda in gcdas:
+            os.remove(gcda)
+
+    def row(self) -> Tuple[float, int, float, int]:
+        l_per = 100 * len(self.lines) / self.total_lines if self.total_lines else 0
+        b_per = 100 * len(self.branches) / self.total_branches if self.total_branches else 0
+        return round(l_per, 1), len(self.lines), round(b_per, 1), len(self.branches)
+
+class LlvmCoverage:
+    """The same for -fprofile-instr-generate builds: raw profiles merged into one profile."""
+
+    def __init__(self, binary: str, workdir: str):
+        self.binary = binary
+        self.profile = os.path.join(workdir, 'merged.profdata')
+        self.summary = {}
+
+    def add(self, counters: str) -> None:
+        raws = glob.glob(os.path.join(counters, '*.profraw'))
+        if not raws:
+            return
+        inputs = raws + ([self.profile] if os.path.exists(self.profile) else [])
+        subprocess.run(['llvm-profdata', 'merge', '-sparse', '-o', self.profile + '.new'] + inputs, check=True)
+        os.replace(self.profile + '.new', self.profile)
+        for raw in raws:
+            os.remove(raw)
+        res = subprocess.run(['llvm-cov', 'export', '-summary-only', '-instr-profile', self.profile, self.binary],
+                             stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        self.summary = json.loads(res.stdout)['data'][0]['totals']
+
+    def row(self) -> Tuple[float, int, float, int]:
+        lines = self.summary.get('lines', {})
+        branches = self.summary.get('branches', {})
+        return (round(lines.get('percent', 0), 1), lines.get('covered', 0),
+                round(branches.get('percent', 0), 1), branches.get('covered', 0))
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay an AFLNet queue on parallel servers and record coverage over time')
+    parser.add_argument('folder', help='AFLNet output directory')
+    parser.add_argument('output', help='Coverage CSV (or, with --crashes, the exit status JSON)')
+    parser.add_argument('-t', '--target', choices=sorted(TARGETS), required=True)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Server instances')
+    parser.add_argument('-s', '--step', type=int, default=None, help='Inputs per coverage row (default: -j)')
+    parser.add_argument('--backend', choices=['gcov', 'llvm'], default='gcov')
+    parser.add_argument('--binary', default=None, help='Instrumented binary (llvm backend)')
+    parser.add_argument('--unstructured', action='store_true',
+                        help='Replay queue/ with afl-replay instead of replayable-queue/ with aflnet-replay')
+    parser.add_argument('--crashes', action='store_true',
+                        help='Replay the crashes and record the server exit status of each (as crash_script)')
+    parser.add_argument('--workdir', default=os.environ.get('WORKDIR', '/home/ubuntu/experiments'))
+    parser.add_argument('--instance', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.instance is not None:
+        spec = json.loads(args.instance)
+        status = run_instance(spec['target'], Instance(**spec['instance']), spec['replayer'], spec['paths'],
+                              spec['workdir'], spec['backend'])
+        print(json.dumps(status))
+        return
+
+    target = TARGETS[args.target]
+    # The replayers run in the server's directory
+    args.folder = os.path.abspath(args.folder)
+    replayer = 'afl-replay' if args.unstructured else 'aflnet-replay'
+    testdir = ('crashes' if args.crashes else 'queue') if args.unstructured else \
+        ('replayable-crashes' if args.crashes else 'replayable-queue')
+    inputs = queue_inputs(args.folder, testdir) if not args.crashes else \
+        sorted(glob.glob(os.path.join(args.folder, testdir, 'id*')))
+    fixed_port = not any('{port}' in a for a in target.server)
+    jobs = max(1, args.jobs)
+    netns = fixed_port and jobs > 1 and netns_available()
+    if fixed_port and jobs > 1 and not netns:
+        # All instances would listen on the configured port
+        print(f"Cannot create network namespaces (run the container with --security-opt seccomp=unconfined); "
+              f"replaying {args.target} on one instance", file=sys.stderr)
+        jobs = 1
+    counters_root = tempfile.mkdtemp(prefix='replay_cov-')
+    instances = [Instance(i, target.port if fixed_port else target.port + 1000 + i,
+                          os.path.join(counters_root, f'inst_{i}'), netns)
+                 for i in range(jobs)]
+    for inst in instances:
+        os.makedirs(inst.counters, exist_ok=True)
+
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=len(instances)) as pool:
+            if args.crashes:
+                status = run_batch(args.target, instances, replayer, inputs, args.workdir, args.backend, pool)
+                with open(args.output, 'w') as f:
+                    json.dump(status, f, indent=2)
+                crashed = [p for p, code in status.items() if code < 0 or code >= 128]
+                print(f"{len(crashed)} of {len(inputs)} crash inputs terminated the server", file=sys.stderr)
+                return
+
+            root = os.path.join(args.workdir, target.cwd, target.gcov_root)
+            if args.backend == 'gcov':
+                coverage = GcovCoverage(root)
+            else:
+                if args.binary is None:
+                    parser.error('--binary is required with the llvm backend')
+                coverage = LlvmCoverage(args.binary, counters_root)
+            step = args.step or len(instances)
+            with open(args.output, 'w') as out:
+                print('Time,l_per,l_abs,b_per,b_abs', file=out)
+                for i in range(0, len(inputs), step):
+                    batch = inputs[i:i + step]
+                    run_batch(args.target, instances, replayer, batch, args.workdir, args.backend, pool)
+                    for inst in instances:
+                        coverage.add(inst.counters)
+                    l_per, l_abs, b_per, b_abs = coverage.row()
+                    print(f'{int(os.path.getmtime(batch[-1]))},{l_per},{l_abs},{b_per},{b_abs}', file=out)
+                    out.flush()
+    finally:
+        shutil.rmtree(counters_root, ignore_errors=True)
+    print(f"Replayed {len(inputs)} inputs on {len(instances)} instance(s) in {time.time() - start:.1f}s",
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
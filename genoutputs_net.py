@@ -2,7 +2,7 @@
 
 import argparse
 from collections import OrderedDict, defaultdict
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
 import glob
 import json
 import logging
@@ -11,7 +11,7 @@ import re
 import shutil
 import subprocess
 import sys
-from typing import BinaryIO
+from typing import BinaryIO, Optional
 try:
     # Not until 3.11
     from hashlib import file_digest
@@ -27,11 +27,19 @@ except ImportError:
         return hasher
 
 from drive_log import setup_custom_logger
+import output_stats
+import telemetry
+import timeout_policy
+import workqueue
 logger = setup_custom_logger('root')
 
 from tqdm import tqdm
 from driver_net import ExceptionInfo, Result, ResultInfo, GenResult
 
+# Seconds the driver gets beyond its budgeted runs (interpreter start-up,
+# importing the module) before it is killed
+BUDGET_KILL_MARGIN = 5.0
+
 # Global color cycle with ANSI colors
 COLOR_GREEN = '\033[92m'
 COLOR_RED = '\033[91m'
@@ -119,68 +127,12 @@ def get_gentype(module_path):
     return gentype_re.search(basename).group('gentype')
 
 def generate_stats(logfile):
-    color_preferences = {
-        'Success': COLOR_GREEN,
-        'Error': COLOR_RED,
-        'Timeout': COLOR_YELLOW,
-        'AFLErr': COLOR_CYAN_UNDERLINE,
-    }
-    def add_stats(d1, d2):
-        return {k: d1.get(k, 0) + d2.get(k, 0) for k in set(d1) | set(d2)}
-    # Track stats as we go and print them at the end
-    running_stats = defaultdict(lambda: defaultdict(int))
+    # Re-aggregate a finished log; main() aggregates the results as they arrive
+    agg = output_stats.StatsAggregator.from_log(logfile)
     with open(logfile) as f:
         original_args = json.loads(f.readline())['data']['args']
-        for line in f:
-            result = json.loads(line)
-            try:
-                module_path = result['module_path']
-            except KeyError:
-                print(f"Error: {line}", file=sys.stderr)
-            if result['result_type'] == 'ImportError':
-                # Mark the batch as an error
-                running_stats[get_gentype(module_path)]['ImportError'] += original_args['driver']['num_iterations']
-            else:
-                running_stats[get_gentype(module_path)][result['result_type']] += 1
-    running_stats = { k: dict(v) for k, v in running_stats.items() }
-    combined = {}
-    for k in running_stats:
-        combined = add_stats(combined, running_stats[k])
-    print(f"Stats:", file=sys.stderr)
-    for k in sorted(running_stats.keys()):
-        print(f"  {k}: {running_stats[k]}", file=sys.stderr)
-    print(f"  combined: {combined}", file=sys.stderr)
-    print(f"Stats (visual):", file=sys.stderr)
-    for k in sorted(running_stats.keys()):
-        print(f"  {k}: {draw_success_rate(running_stats[k],color_preferences)}", file=sys.stderr)
-    print(f"  combined: {draw_success_rate(combined,color_preferences)}", file=sys.stderr)
-    total = sum(combined.values())
-    success = combined.get('Success', 0)
-    print(f"     total: {total} files attempted", file=sys.stderr)
-    print(f"   success: {success} files generated", file=sys.stderr)
-    if total != 0:
-        print(f"  success%: {success/total*100:.2f}%", file=sys.stderr)
-
-    # Write stats to genoutputs_net.log
-    try:
-        log_dir = os.path.dirname(os.path.abspath(logfile))
-        stats_log_path = os.path.join(log_dir, "genoutputs_net.log")
-        
-        output_dir = original_args['output_dir']
-        statename = os.path.basename(os.path.normpath(output_dir))
-        
-        with open(stats_log_path, "a") as f:
-            print(f"State: {statename}", file=f)
-            for k in sorted(running_stats.keys()):
-                print(f"  {k}: {running_stats[k]}", file=f)
-            print(f"  combined: {combined}", file=f)
-            print(f"     total: {total} files attempted", file=f)
-            print(f"   success: {success} files generated", file=f)
-            if total != 0:
-                print(f"  success%: {success/total*100:.2f}%", file=f)
-            print("-" * 40, file=f)
-    except Exception as e:
-        print(f"Error writing stats to log file: {e}", file=sys.stderr)
+    statename = os.path.basename(os.path.normpath(original_args['output_dir']))
+    agg.report(statename, os.path.join(os.path.dirname(os.path.abspath(logfile)), "genoutputs_net.log"))
 
 def generate_filestats(logfile):
     from idontwannadoresearch.txdm import txdm
@@ -330,7 +282,7 @@ class filestats_action(argparse.Action):
 
         parser.exit()
 
-def generate_corpus(module_path, input_seeds: str, worker_dir, args):
+def generate_corpus(module_path, input_seeds: str, worker_dir, args, budget=None):
     module_name = os.path.basename(module_path)
     # Copy the module to the output directory
     copied_module_name = os.path.join(worker_dir, module_name)
@@ -359,12 +311,21 @@ def generate_corpus(module_path, input_seeds: str, worker_dir, args):
         '-i', input_seeds,
         actual_module_name, args.driver.function_name,
     ]
+    if budget is not None:
+        # Adaptive per-run budget (timeout_policy.py)
+        cmd[-2:-2] = ['-b', str(budget)]
     logger.debug(f"Running: {' '.join(cmd)}")
     input_seed_num = len(input_seeds.split(';'))
     result = None
     try:
         # if not args.driver.real_feedback:
-        timeout = 0.5 * args.driver.timeout * input_seed_num * args.driver.num_iterations * 0.5 # Kill the process if 50% of the generation cannot finished in 0.5 timeout
+        if budget is not None:
+            # The driver stops every run at its budget itself, so the kill
+            # must leave it all of them plus its start-up, or runs over
+            # budget are never recorded as BudgetKill
+            timeout = budget * input_seed_num * args.driver.num_iterations + BUDGET_KILL_MARGIN
+        else:
+            timeout = 0.5 * args.driver.timeout * input_seed_num * args.driver.num_iterations * 0.5 # Kill the process if 50% of the generation cannot finished in 0.5 timeout
         subprocess.run(cmd, check=True, text=True, timeout=timeout, capture_output=True)
         # else:
         #     subprocess.run(cmd, check=True, text=True, capture_output=True, timeout=210)
@@ -425,9 +386,56 @@ def generate_corpus(module_path, input_seeds: str, worker_dir, args):
             gen_results.append(json.loads(result.json()))
     return gen_results
 
+def generate_corpus_batch(module_paths: list[str], input_seeds: str, output_dir: str, driver: dict,
+                          budgets: Optional[dict] = None) -> list[list[dict]]:
+    """Work-queue handler: run generate_corpus on each module of a batch.
+
+    ``budgets`` maps module paths to their adaptive per-run budget."""
+    args = argparse.Namespace(output_dir=output_dir, driver=argparse.Namespace(**driver))
+    results = []
+    for module_path in module_paths:
+        # Use a temp dir for worker files to keep output clean
+        module_base = os.path.splitext(os.path.basename(module_path))[0]
+        worker_dir = os.path.join(output_dir, ".work", module_base)
+        os.makedirs(worker_dir, exist_ok=True)
+        try:
+            results.append(output_stats.annotate_outputs(
+                generate_corpus(module_path, input_seeds, worker_dir, args, (budgets or {}).get(module_path))))
+        except Exception as e:
+            results.append([json.loads(Result(
+                error=ExceptionInfo.from_exception(e, module_path),
+                data = None,
+                module_path = module_path,
+                result_type = GenResult.Error,
+                function_name = driver.get('function_name'),
+            ).json())])
+        finally:
+            # Clean up worker dir
+            shutil.rmtree(worker_dir, ignore_errors=True)
+    return results
+
 import util
 from typing import Optional
 import random
+import bisect
+
+def list_output_stems(output_dir: str, suffix: str) -> list[str]:
+    """Sorted names (without suffix) of the outputs already in output_dir."""
+    if not os.path.isdir(output_dir):
+        return []
+    return sorted(
+        name[:-len(suffix)] if suffix else name
+        for name in os.listdir(output_dir)
+        if name.endswith(suffix) and os.path.isfile(os.path.join(output_dir, name))
+    )
+
+def has_outputs(module_base: str, stems: list[str]) -> bool:
+    # driver_net names outputs either <base><suffix> or <base>_<seed>_<i><suffix>
+    i = bisect.bisect_left(stems, module_base)
+    if i < len(stems) and stems[i] == module_base:
+        return True
+    j = bisect.bisect_left(stems, module_base + '_')
+    return j < len(stems) and stems[j].startswith(module_base + '_')
 
 def get_seed_input_dir() -> Optional[str]:
     r = util.get_config('cli.genoutputs.seed_input_dir')
@@ -446,6 +454,53 @@ def get_resample_iterations() -> int:
     assert isinstance(r, str)
     return int(r)
 
+def resolve_input_seeds(gen: str) -> str:
+    """The ';'-joined seed inputs passed to every generator of a generation."""
+    resample = get_resample_iterations()
+
+    ELMFUZZ_RUNDIR = os.environ.get('ELMFUZZ_RUNDIR', '.')
+    
+    seed_input_dir = get_seed_input_dir()
+    if seed_input_dir is None:
+        input_seeds_str = ""
+    elif resample != -1:
+        assert gen.startswith('gen')
+        if int(gen.removeprefix('gen')) % resample == 0:
+            print('INFO: Resample seed inputs')
+            assert seed_input_dir is not None
+            seed_inputs_raw = []
+            for p, ds, fs in os.walk(seed_input_dir):
+                for f in fs:
+                    seed_inputs_raw.append(os.path.join(p, f))
+            
+            seed_input_samples = get_seed_input_samples()
+            if seed_input_samples is not None and seed_input_samples != -1:
+                input_seeds = random.sample(seed_inputs_raw, seed_input_samples)
+            else:
+                input_seeds = seed_inputs_raw
+        else:
+            print('INFO: Inherit seed inputs')
+            input_seeds = []
+            previous_gen = f'gen{int(gen.removeprefix("gen")) - 1}' if gen.startswith('gen') else 'initial'
+            with open(f'{ELMFUZZ_RUNDIR}/{previous_gen}/seed_inputs', 'r') as f:
+                for line in f:
+                    input_seeds.append(line.strip())
+        
+        with open(f'{ELMFUZZ_RUNDIR}/{gen}/seed_inputs', 'w') as f:
+            for seed in input_seeds:
+                print(seed, file=f)
+        input_seeds_str = ';'.join(input_seeds)
+    else:
+        tmp = get_seed_input_samples()
+        assert tmp is None or tmp == -1
+        seed_inputs_raw = []
+        assert seed_input_dir is not None
+        for p, ds, fs in os.walk(seed_input_dir):
+            for f in fs:
+                seed_inputs_raw.append(os.path.join(p, f))
+        input_seeds_str = ';'.join(seed_inputs_raw)
+    return input_seeds_str
+
 def make_parser():
     parser = argparse.ArgumentParser(
         description='Create outputs using generated programs'
@@ -462,6 +517,16 @@ def make_parser():
                         help="Don't catch exceptions in the main driver loop")
     parser.add_argument('-L', '--logfile', type=str, default=None,
                         help='Log file for JSON results')
+    parser.add_argument('--queue-batch', type=int, default=16,
+                        help='Modules per job when running through a shared work queue (ELMFUZZ_QUEUE)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip modules that already have outputs and append to the log file')
+    parser.add_argument('--cpu-budget', type=float, default=0.0,
+                        help='CPU seconds of module runs per generation, shared by the pools (0: unlimited); '
+                        'see timeout_policy.py')
+    parser.add_argument('--log-results', choices=output_stats.LOG_MODES, default='compact',
+                        help='Result lines written to the log file: all fields, compact (no arguments or '
+                        'output of successful runs), or none; see output_stats.py')
     parser.add_argument('--stats-only', action=filestats_action,
                         default=argparse.SUPPRESS,
                         help='Only compute stats for the given log file')
@@ -516,108 +581,120 @@ def main():
     # Force num_iterations to 1 globally
     args.driver.num_iterations = 1
 
+    resuming_log = (args.resume and args.logfile is not None
+                    and os.path.exists(args.logfile) and os.path.getsize(args.logfile) > 0)
     if args.logfile is not None:
-        output_log = open(args.logfile, 'w')
+        output_log = open(args.logfile, 'a' if resuming_log else 'w')
     else:
         output_log = sys.stdout
     
     # Record the arguments we're using in the log
-    print(json.dumps(
-        {'error': None, 'data': {'args': args.__dict__}},
-        default=lambda x: x.__dict__ if hasattr(x, '__dict__') else str(x),
-    ), file=output_log)
+    if not resuming_log:
+        print(json.dumps(
+            {'error': None, 'data': {'args': args.__dict__}},
+            default=lambda x: x.__dict__ if hasattr(x, '__dict__') else str(x),
+        ), file=output_log)
+    finished_stems = list_output_stems(args.output_dir, args.driver.output_suffix) if args.resume else []
 
     # The first line sent by genvariants is the number of modules it will produce
     module_count = int(sys.stdin.readline())
     
-    gen: str = args.generation
-    resample = get_resample_iterations()
-
-    ELMFUZZ_RUNDIR = os.environ.get('ELMFUZZ_RUNDIR', '.')
-    
-    seed_input_dir = get_seed_input_dir()
-    if seed_input_dir is None:
-        input_seeds_str = ""
-    elif resample != -1:
-        assert gen.startswith('gen')
-        if int(gen.removeprefix('gen')) % resample == 0:
-            print('INFO: Resample seed inputs')
-            assert seed_input_dir is not None
-            seed_inputs_raw = []
-            for p, ds, fs in os.walk(seed_input_dir):
-                for f in fs:
-                    seed_inputs_raw.append(os.path.join(p, f))
-            
-            seed_input_samples = get_seed_input_samples()
-            if seed_input_samples is not None and seed_input_samples != -1:
-                input_seeds = random.sample(seed_inputs_raw, seed_input_samples)
-            else:
-                input_seeds = seed_inputs_raw
-        else:
-            print('INFO: Inherit seed inputs')
-            input_seeds = []
-            previous_gen = f'gen{int(gen.removeprefix("gen")) - 1}' if gen.startswith('gen') else 'initial'
-            with open(f'{ELMFUZZ_RUNDIR}/{previous_gen}/seed_inputs', 'r') as f:
-                for line in f:
-                    input_seeds.append(line.strip())
-        
-        with open(f'{ELMFUZZ_RUNDIR}/{gen}/seed_inputs', 'w') as f:
-            for seed in input_seeds:
-                print(seed, file=f)
-        input_seeds_str = ';'.join(input_seeds)
-    else:
-        tmp = get_seed_input_samples()
-        assert tmp is None or tmp == -1
-        seed_inputs_raw = []
-        assert seed_input_dir is not None
-        for p, ds, fs in os.walk(seed_input_dir):
-            for f in fs:
-                seed_inputs_raw.append(os.path.join(p, f))
-        input_seeds_str = ';'.join(seed_inputs_raw)
+    input_seeds_str = resolve_input_seeds(args.generation)
 
     # if args.driver.real_feedback:
     #     print('INFO: Using real feedback', file=sys.stderr)
 
-    # Call generate_all on each module in args.module_paths in parallel
-    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+    # Call generate_all on each module in args.module_paths in parallel.
+    # With a shared work queue (ELMFUZZ_QUEUE), modules are sent in batches
+    # so that each queue round trip carries enough work.
+    backend = workqueue.get_backend(max_workers=args.jobs, processes=True)
+    batch_size = 1 if isinstance(backend, workqueue.LocalBackend) else args.queue_batch
+    driver_opts = dict(vars(args.driver))
+    pool = os.path.basename(os.path.normpath(args.output_dir))
+    result_counts = defaultdict(int)
+    stats = output_stats.StatsAggregator(args.driver.num_iterations)
+    policy = None
+    if timeout_policy.policy_enabled() and args.logfile is not None:
+        policy = timeout_policy.TimeoutPolicy(args.driver.timeout, os.path.dirname(os.path.abspath(args.logfile)),
+                                              args.cpu_budget)
+        if os.environ.get('ELMFUZZ_RUNDIR'):
+            policy.load_history(os.environ['ELMFUZZ_RUNDIR'], os.environ.get('ELMFUZZ_GEN'))
+    # The span is exited after the pool has shut down, so the CPU time of the
+    # reaped workers is attributed to it
+    with telemetry.span('genoutputs', pool=pool, expected=module_count, jobs=args.jobs,
+                        results=result_counts) as gen_span, backend:
         progress = (tqdm(total=module_count, desc="Generating", unit="mod")
                     if ON_NSF_ACCESS
                     else txdm(total=module_count, desc="Generating", unit="mod", file=sys.stdout))
         futures_to_paths = OrderedDict()
-        for module_path in sys.stdin:
-            module_path = module_path.strip()
-            # Make an output directory for this module's outputs
-            module_base = os.path.splitext(os.path.basename(module_path))[0]
-            
-            # Use a temp dir for worker files to keep output clean
-            worker_dir = os.path.join(args.output_dir, ".work", module_base)
-            os.makedirs(worker_dir, exist_ok=True)
-            future = executor.submit(
-                generate_corpus,
-                module_path, input_seeds_str, worker_dir, args
+        def submit_batch(batch):
+            future = backend.submit(
+                generate_corpus_batch,
+                {'module_paths': batch, 'input_seeds': input_seeds_str,
+                 'output_dir': args.output_dir, 'driver': driver_opts,
+                 'budgets': {p: policy.budget(p) for p in batch} if policy is not None else None},
+                queue='genoutputs',
             )
-            future.add_done_callback(lambda _: progress.update())
-            futures_to_paths[future] = (module_path, worker_dir)
-        for future in as_completed(futures_to_paths):
-            module_path, worker_dir = futures_to_paths[future]
+            future.add_done_callback(lambda _, n=len(batch): progress.update(n))
+            futures_to_paths[future] = batch
+        def collect(future):
+            module_paths = futures_to_paths.pop(future)
             try:
-                result = future.result()
-                for res in result:
-                    print(json.dumps(res), file=output_log)
+                results = future.result()
             except Exception as e:
                 if args.raise_errors: raise
-                res = Result(
+                results = [[json.loads(Result(
                     error=ExceptionInfo.from_exception(e, module_path),
                     data = None,
                     module_path = module_path,
                     result_type = GenResult.Error,
                     function_name = args.driver.function_name,
-                )
-                print(res.json(), file=output_log)
-            
-            # Clean up worker dir
-            shutil.rmtree(worker_dir, ignore_errors=True)
+                ).json())] for module_path in module_paths]
+            for module_path, result in zip(module_paths, results):
+                for res in result:
+                    result_counts[res.get('result_type')] += 1
+                    if args.log_results == 'full':
+                        print(json.dumps(res), file=output_log)
+                    elif args.log_results == 'compact':
+                        print(json.dumps(output_stats.compact_result(res)), file=output_log)
+                stats.add(module_path, result)
+                if policy is not None:
+                    policy.observe(module_path, result)
+                gen_span.add_items(1)
+        def dispatch(batch):
+            # Budgets are decided when a batch is dispatched, so the runtimes
+            # (and CPU time) of the batches finished so far must be observed
+            # first; a local pool gets a bounded backlog so that most batches
+            # are dispatched after earlier ones have finished.
+            for future in [f for f in futures_to_paths if f.done()]:
+                collect(future)
+            if policy is not None and isinstance(backend, workqueue.LocalBackend):
+                while len(futures_to_paths) >= max_pending:
+                    done, _ = wait(list(futures_to_paths), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+            submit_batch(batch)
+        max_pending = 2 * (args.jobs or os.cpu_count() or 1)
+        batch = []
+        for module_path in sys.stdin:
+            module_path = module_path.strip()
+            # Make an output directory for this module's outputs
+            module_base = os.path.splitext(os.path.basename(module_path))[0]
+            if finished_stems and has_outputs(module_base, finished_stems):
+                progress.update()
+                continue
+            batch.append(module_path)
+            if len(batch) >= batch_size:
+                dispatch(batch)
+                batch = []
+        if batch:
+            dispatch(batch)
+        for future in as_completed(list(futures_to_paths)):
+            collect(future)
         progress.close()
+    if policy is not None:
+        policy.save()
+        policy.report()
 
     # Clean up the .work directory
     shutil.rmtree(os.path.join(args.output_dir, ".work"), ignore_errors=True)
@@ -629,7 +706,10 @@ def main():
     if args.logfile is None: return
 
     # Print the stats out to stderr now that we're done
-    generate_stats(args.logfile)
+    with telemetry.span('genoutputs.stats', pool=pool):
+        log_dir = os.path.dirname(os.path.abspath(args.logfile))
+        stats.write(os.path.splitext(args.logfile)[0] + '.stats.json', pool)
+        stats.report(pool, os.path.join(log_dir, "genoutputs_net.log"))
     # Skip file stats for now, takes too long
     # generate_filestats(args.logfile)
 
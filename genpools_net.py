@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Concurrent seed_gen / genvariants / genoutputs for all (model, state pool)
+combinations of a generation.
+
+do_gen_net.sh used to loop over models and pools and run
+``seed_gen_<proto>.py`` and ``genvariants_parallel_net.py | genoutputs_net.py``
+for one pool at a time, so every pool paid its own start-up and only got a
+slice of the LLM endpoint and of the CPUs. Here all combinations share:
+
+  * one LLM queue per endpoint, with at most ``--llm-limit`` requests in
+    flight (default: cli.genvariants_parallel.jobs),
+  * one generator-execution backend (workqueue.py) with at most
+    ``--exec-workers`` modules in flight (default: cli.genoutputs.jobs),
+
+and both queues serve the pools round-robin, so a large pool cannot starve
+the others. Every variant goes to execution as soon as it is written. The
+per-(model, pool) stage checkpoints of do_gen_net.sh are kept. One combined
+progress line is printed while running, and one combined stats report at
+the end (also appended to ``<logdir>/genoutputs_net.log``), with the
+summary of each pool in ``<logdir>/outputgen_<model>.stats.json`` (see
+output_stats.py).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, List
+
+import checkpoint
+import genoutputs_net
+import genvariants_parallel_net
+import output_stats
+import shrink_batch
+import telemetry
+import timeout_policy
+import workqueue
+from driver_net import ExceptionInfo, GenResult, Result
+from prompt_budget import PromptBudget
+from util import get_config
+
+class FairQueue:
+    """Blocking queue that hands out items round-robin across keys."""
+
+    def __init__(self):
+        self.queues: Dict[object, deque] = {}
+        self.order: deque = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def put(self, key, item) -> None:
+        with self.cond:
+            if key not in self.queues:
+                self.queues[key] = deque()
+            if not self.queues[key]:
+                self.order.append(key)
+            self.queues[key].append(item)
+            self.cond.notify()
+
+    def get(self):
+        """Next (key, item), or None once the queue is closed and drained."""
+        with self.cond:
+            while not self.order:
+                if self.closed:
+                    return None
+                self.cond.wait()
+            key = self.order.popleft()
+            item = self.queues[key].popleft()
+            if self.queues[key]:
+                self.order.append(key)
+            return key, item
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+def start_workers(queue: FairQueue, n: int, fn: Callable, name: str) -> List[threading.Thread]:
+    def loop():
+        while True:
+            entry = queue.get()
+            if entry is None:
+                return
+            fn(*entry)
+    threads = [threading.Thread(target=loop, name=f'{name}-{i}', daemon=True) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+class PoolJob:
+    """State of one (model, pool) combination."""
+
+    def __init__(self, model_name: str, pool: str, variants_dir: str, outputs_dir: str):
+        self.model_name = model_name
+        self.model = os.path.basename(model_name)
+        self.pool = pool
+        self.variants_dir = variants_dir
+        self.outputs_dir = outputs_dir
+        self.lock = threading.Lock()
+        self.gv_args = None
+        self.corpus = None
+        self.weights = None
+        self.llm_total = 0
+        self.llm_done = 0
+        self.variants = 0
+        self.exec_total = 0
+        self.exec_done = 0
+        self.submitted = False
+        self.llm_start = None
+        self.llm_end = None
+        self.exec_start = None
+        self.exec_end = None
+        self.stats = output_stats.StatsAggregator()
+        self.done = threading.Event()
+
+    @property
+    def key(self):
+        return (self.model, self.pool)
+
+    def _check_done(self) -> None:
+        if self.submitted and self.llm_done == self.llm_total and self.exec_done == self.exec_total:
+            self.done.set()
+
+class GenPools:
+    def __init__(self, args):
+        self.args = args
+        self.jobs: List[PoolJob] = []
+        self.llm_queues: Dict[str, FairQueue] = {}
+        self.exec_queue = FairQueue()
+        self.threads: List[threading.Thread] = []
+        self.manifest = checkpoint.Manifest(args.manifest) if args.manifest else None
+        self.input_hash = checkpoint.hash_inputs(args.ckpt_inputs) if args.ckpt_inputs else None
+        self.log_lock = threading.Lock()
+        self.logs = {}
+
+    # -- checkpoints ------------------------------------------------------
+
+    def ckpt_status(self, stage: str, job: PoolJob) -> str:
+        if self.manifest is None:
+            return checkpoint.NONE
+        return self.manifest.status(checkpoint.stage_key(self.args.next_gen, stage, job.model, job.pool),
+                                    self.input_hash)
+
+    def ckpt(self, method: str, stage: str, job: PoolJob) -> None:
+        if self.manifest is not None:
+            getattr(self.manifest, method)(
+                checkpoint.stage_key(self.args.next_gen, stage, job.model, job.pool), self.input_hash)
+
+    # -- LLM side ---------------------------------------------------------
+
+    def llm_queue(self, endpoint: str) -> FairQueue:
+        if endpoint not in self.llm_queues:
+            queue = FairQueue()
+            self.llm_queues[endpoint] = queue
+            self.threads += start_workers(queue, self.args.llm_limit, self.run_variant, 'llm')
+        return self.llm_queues[endpoint]
+
+    def run_variant(self, key, item) -> None:
+        job, indices, filename, ctx = item
+        with job.lock:
+            if job.llm_start is None:
+                job.llm_start = time.time()
+        try:
+            if len(indices) > 1:
+                paths = genvariants_parallel_net.generate_batch(
+                    indices, ctx['generators'], ctx['model_id'], filename, job.gv_args,
+                    endpoint=ctx['endpoint'], infill=ctx['infill'], corpus=job.corpus,
+                    budget=ctx['budget'], mode=job.gv_args.batch, weights=job.weights)
+            else:
+                paths = [genvariants_parallel_net.generate_variant(
+                    indices[0], ctx['generators'], ctx['model_id'], filename, job.gv_args,
+                    endpoint=ctx['endpoint'], infill=ctx['infill'], corpus=job.corpus,
+                    budget=ctx['budget'], weights=job.weights)]
+        except Exception as e:
+            print(f"{job.model}:{job.pool}: variant(s) {indices} failed: {e}", file=sys.stderr)
+            paths = []
+        paths = [p for p in paths if p is not None]
+        for path in paths:
+            self.submit_exec(job, path)
+        with job.lock:
+            job.llm_done += len(indices)
+            job.variants += len(paths)
+            if job.submitted and job.llm_done == job.llm_total:
+                job.llm_end = time.time()
+            job._check_done()
+
+    # -- execution side ---------------------------------------------------
+
+    def submit_exec(self, job: PoolJob, module_path: str) -> None:
+        with job.lock:
+            job.exec_total += 1
+        self.exec_queue.put(job.key, (job, module_path))
+
+    def run_module(self, key, item) -> None:
+        job, module_path = item
+        with job.lock:
+            if job.exec_start is None:
+                job.exec_start = time.time()
+        if self.shrinker is not None:
+            self.shrinker.shrink(module_path)
+        try:
+            future = self.backend.submit(
+                genoutputs_net.generate_corpus_batch,
+                {'module_paths': [module_path], 'input_seeds': self.input_seeds,
+                 'output_dir': job.outputs_dir, 'driver': self.driver_opts,
+                 'budgets': {module_path: self.policy.budget(module_path)} if self.policy is not None else None},
+                queue='genoutputs',
+            )
+            results = future.result()[0]
+        except Exception as e:
+            results = [json.loads(Result(
+                error=ExceptionInfo.from_exception(e, module_path),
+                data=None,
+                module_path=module_path,
+                result_type=GenResult.Error,
+                function_name=self.driver_opts.get('function_name'),
+            ).json())]
+        if self.policy is not None:
+            self.policy.observe(module_path, results)
+        job.stats.add(module_path, results)
+        if self.log_results != 'none':
+            with self.log_lock:
+                log = self.logs[job.model]
+                for res in results:
+                    if self.log_results == 'compact':
+                        res = output_stats.compact_result(res)
+                    print(json.dumps(res), file=log)
+                log.flush()
+        with job.lock:
+            job.exec_done += 1
+            if job.exec_done == job.exec_total and job.llm_done == job.llm_total:
+                job.exec_end = time.time()
+            job._check_done()
+
+    # -- setup ------------------------------------------------------------
+
+    def open_log(self, model: str, header_args) -> None:
+        path = os.path.join(self.args.log_dir, f'outputgen_{model}.jsonl')
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        log = open(path, 'a')
+        if not exists:
+            print(json.dumps(
+                {'error': None, 'data': {'args': header_args.__dict__}},
+                default=lambda x: x.__dict__ if hasattr(x, '__dict__') else str(x),
+            ), file=log)
+        self.logs[model] = log
+
+    def seed_gen(self, job: PoolJob) -> None:
+        if self.ckpt_status('seed_gen', job) == checkpoint.DONE:
+            print(f"Checkpoint: seed modules of {job.pool} already generated; skipping", file=sys.stderr)
+            return
+        self.ckpt('begin', 'seed_gen', job)
+        with telemetry.span('seed_gen', pool=job.pool, model=job.model):
+            subprocess.run([
+                sys.executable, os.path.join(self.rundir, f'seed_gen_{self.protocol}.py'),
+                '--input_seeds', job.outputs_dir + '/',
+                '--init_variants', job.variants_dir + '/',
+            ], check=True, stdout=subprocess.DEVNULL)
+        self.ckpt('mark', 'seed_gen', job)
+
+    def start_mutation(self, job: PoolJob, ctx: dict) -> None:
+        status = self.ckpt_status('mutate', job)
+        if status == checkpoint.DONE:
+            print(f"Checkpoint: variants of {job.model_name}:{job.pool} already generated; skipping", file=sys.stderr)
+            job.submitted = True
+            job.done.set()
+            return
+        resume = status == checkpoint.STARTED
+        files = sorted(
+            os.path.join(job.variants_dir, f) for f in os.listdir(job.variants_dir)
+            if f.endswith('.py') and not f.startswith('var_')
+        )
+        job.gv_args = self.gv_config.parse_args([
+            '-M', job.model_name, '-O', job.variants_dir, '-L', os.path.join(self.args.log_dir, 'meta', job.pool),
+            '-n', str(self.num_variants), *(['--plan', self.args.plan] if self.args.plan else []), *files,
+        ])
+        counts, job.weights = genvariants_parallel_net.load_plan(job.gv_args.plan, files, job.variants_dir,
+                                                                 self.num_variants)
+        job.corpus = genvariants_parallel_net.SeedCorpus(files)
+        os.makedirs(job.gv_args.log_dir, exist_ok=True)
+        self.ckpt('begin', 'mutate', job)
+
+        existing = genvariants_parallel_net.find_existing_variants(job.variants_dir) if resume else {}
+        if resume and existing:
+            print(f"{job.model}:{job.pool}: resuming, {len(existing)} variant(s) already written", file=sys.stderr)
+        spec_dir = os.path.join(self.rundir, 'spec', self.args.prev_gen)
+        if os.path.isdir(os.path.join(spec_dir, 'variants')):
+            from pipeline_net import adopt_spec_variants
+            adopted = adopt_spec_variants(spec_dir, files, self.num_variants, job.variants_dir,
+                                          job.gv_args.log_dir, skip=existing, counts=counts)
+            telemetry.record('genvariants.adopt', time.time(), time.time(), pool=job.pool,
+                             model=job.model_name, items=len(adopted))
+            existing.update(adopted)
+        finished_stems = (genoutputs_net.list_output_stems(job.outputs_dir, self.driver_opts['output_suffix'])
+                          if resume else [])
+
+        queue = self.llm_queue(ctx['endpoint'])
+        for i in sorted(existing):
+            base = os.path.splitext(os.path.basename(existing[i]))[0]
+            if not (finished_stems and genoutputs_net.has_outputs(base, finished_stems)):
+                self.submit_exec(job, existing[i])
+        for filename, indices in genvariants_parallel_net.plan_batches(files, self.num_variants, existing,
+                                                                       ctx['batch_size'], counts):
+            with job.lock:
+                job.llm_total += len(indices)
+            queue.put(job.key, (job, indices, filename, ctx))
+        with job.lock:
+            job.submitted = True
+            # The requests may all have finished before we got here
+            if job.llm_done == job.llm_total and job.llm_end is None:
+                job.llm_end = time.time()
+            job._check_done()
+
+    def model_context(self, model_name: str) -> dict:
+        endpoints = self.gv_defaults.model.endpoints or {}
+        access_info = genvariants_parallel_net.on_nsf_access()
+        if access_info is not None:
+            endpoint = access_info['endpoint']
+        elif model_name in endpoints:
+            endpoint = endpoints[model_name]
+        else:
+            endpoint = genvariants_parallel_net.get_endpoints()[model_name]
+        info = genvariants_parallel_net.model_info(endpoint)
+        model_id = info['model_id']
+        if model_id != model_name:
+            print(f'WARNING: Expected model {model_name}, but {endpoint} is actually {model_id}', file=sys.stderr)
+        infill = genvariants_parallel_net.select_infilling_prompt(model_id)
+        if infill is None and not self.gv_defaults.no_fim:
+            raise SystemExit(f'Model {model_id} does not support FIM')
+        return {
+            'endpoint': endpoint,
+            'model_id': model_id,
+            'infill': infill,
+            'generators': genvariants_parallel_net.get_generators(self.gv_defaults),
+            'budget': PromptBudget.for_endpoint(endpoint, info, self.gv_defaults.gen.max_new_tokens,
+                                                self.gv_defaults.tokenizer),
+            'batch_size': genvariants_parallel_net.effective_batch_size(self.gv_defaults, info),
+        }
+
+    def progress(self, stop: threading.Event) -> None:
+        while not stop.wait(self.args.progress_interval):
+            llm_done = sum(j.llm_done for j in self.jobs)
+            llm_total = sum(j.llm_total for j in self.jobs)
+            exec_done = sum(j.exec_done for j in self.jobs)
+            exec_total = sum(j.exec_total for j in self.jobs)
+            pools = ' '.join(f'{j.pool}:{j.exec_done}/{j.exec_total}' for j in self.jobs)
+            print(f"[genpools] variants {llm_done}/{llm_total}  executed {exec_done}/{exec_total}  | {pools}",
+                  file=sys.stderr, flush=True)
+
+    def run(self) -> None:
+        from elmconfig import ELMFuzzConfig
+        args = self.args
+        self.rundir = os.environ.get('ELMFUZZ_RUNDIR', '.')
+        self.protocol = get_config('protocol_type')
+
+        self.gv_config = ELMFuzzConfig(prog='genvariants_parallel',
+                                       parents={'genvariants_parallel': genvariants_parallel_net.make_parser()})
+        genvariants_parallel_net.init_parser(self.gv_config)
+        # The seed modules are only known per pool; the options are the same for all
+        self.gv_defaults = self.gv_config.parse_args([os.devnull])
+        self.num_variants = args.num_variants or self.gv_defaults.num_variants
+        if args.llm_limit is None:
+            args.llm_limit = self.gv_defaults.jobs
+
+        go_config = ELMFuzzConfig(prog='genoutputs', parents={'genoutputs': genoutputs_net.make_parser()})
+        genoutputs_net.init_parser(go_config)
+        go_args = go_config.parse_args(['-g', args.prev_gen])
+        go_args.driver.num_iterations = 1
+        self.driver_opts = dict(vars(go_args.driver))
+        self.log_results = go_args.log_results
+        if args.exec_workers is None:
+            args.exec_workers = go_args.jobs or os.cpu_count()
+        self.input_seeds = genoutputs_net.resolve_input_seeds(args.prev_gen)
+        os.makedirs(args.log_dir, exist_ok=True)
+
+        for model_name in args.models:
+            model = os.path.basename(model_name)
+            subs = {'MODEL': model, 'GEN': args.prev_gen}
+            variants_root = get_config('run.genvariant_dir', subs)
+            outputs_root = get_config('run.genoutput_dir', subs)
+            for pool in args.pools:
+                job = PoolJob(model_name, pool, os.path.join(variants_root, pool), os.path.join(outputs_root, pool))
+                os.makedirs(job.variants_dir, exist_ok=True)
+                os.makedirs(job.outputs_dir, exist_ok=True)
+                self.jobs.append(job)
+            go_args.output_dir = outputs_root
+            self.open_log(model, go_args)
+
+        start = time.time()
+        self.backend = workqueue.get_backend(max_workers=args.exec_workers, processes=True)
+        self.contexts = {}
+        self.policy = None
+        if timeout_policy.policy_enabled():
+            self.policy = timeout_policy.TimeoutPolicy(self.driver_opts['timeout'], args.log_dir, args.cpu_budget)
+            self.policy.load_history(self.rundir, args.next_gen)
+        # Unreachable functions are removed before a variant is executed
+        self.shrinker = None
+        if shrink_batch.shrink_enabled():
+            self.shrinker = shrink_batch.Shrinker(self.driver_opts['function_name'], args.exec_workers)
+        stop_progress = threading.Event()
+        with telemetry.span('genpools', pairs=len(self.jobs), llm_limit=args.llm_limit,
+                            exec_workers=args.exec_workers) as sp, self.backend:
+            # seed_gen is cheap and independent per pool
+            errors = []
+            def seed_gen_safe(job):
+                try:
+                    self.seed_gen(job)
+                except subprocess.CalledProcessError as e:
+                    errors.append((job, e))
+            seed_threads = [threading.Thread(target=seed_gen_safe, args=(job,)) for job in self.jobs]
+            for t in seed_threads:
+                t.start()
+            for t in seed_threads:
+                t.join()
+            if errors:
+                for job, e in errors:
+                    print(f"seed_gen failed for {job.pool}: {e}", file=sys.stderr)
+                sys.exit(1)
+
+            self.threads += start_workers(self.exec_queue, args.exec_workers, self.run_module, 'exec')
+            reporter = threading.Thread(target=self.progress, args=(stop_progress,), daemon=True)
+            reporter.start()
+            if not args.no_mutate:
+                contexts = self.contexts = {m: self.model_context(m) for m in args.models}
+                for job in self.jobs:
+                    self.start_mutation(job, contexts[job.model_name])
+                for job in self.jobs:
+                    job.done.wait()
+                    self.ckpt('mark', 'mutate', job)
+                    if job.llm_start is not None:
+                        telemetry.record('genvariants', job.llm_start, job.llm_end or time.time(),
+                                         pool=job.pool, model=job.model_name, items=job.variants,
+                                         requested=job.llm_total)
+                    if job.exec_start is not None:
+                        telemetry.record('genoutputs', job.exec_start, job.exec_end or time.time(),
+                                         pool=job.pool, model=job.model_name, items=job.exec_done,
+                                         results=job.stats.counts())
+            stop_progress.set()
+            for queue in list(self.llm_queues.values()) + [self.exec_queue]:
+                queue.close()
+            for t in self.threads:
+                t.join()
+            if self.shrinker is not None:
+                self.shrinker.close()
+                self.shrinker.report()
+            for ctx in self.contexts.values():
+                ctx['budget'].report()
+            if self.policy is not None:
+                self.policy.save()
+                self.policy.report()
+            sp.add_items(sum(j.exec_done for j in self.jobs))
+        for log in self.logs.values():
+            log.close()
+        for job in self.jobs:
+            job.stats.write(os.path.join(self.args.log_dir, f'outputgen_{job.model}.stats.json'), job.pool)
+        for job in self.jobs:
+            shutil.rmtree(os.path.join(job.outputs_dir, '.work'), ignore_errors=True)
+        self.report(time.time() - start)
+
+    def report(self, elapsed: float) -> None:
+        color_preferences = {
+            'Success': genoutputs_net.COLOR_GREEN,
+            'Error': genoutputs_net.COLOR_RED,
+            'Timeout': genoutputs_net.COLOR_YELLOW,
+            'AFLErr': genoutputs_net.COLOR_CYAN_UNDERLINE,
+        }
+        lines = [f"Generation {self.args.prev_gen} -> {self.args.next_gen} ({elapsed:.1f}s)"]
+        visual = []
+        combined = defaultdict(int)
+        for job in self.jobs:
+            pool_stats = job.stats.combined()
+            for k, v in pool_stats.items():
+                combined[k] += v
+            total = sum(pool_stats.values())
+            success = pool_stats.get('Success', 0)
+            rate = f"{success / total * 100:.2f}%" if total else '-'
+            lines.append(f"  {job.model}:{job.pool}: {job.variants} variant(s), {total} executed, "
+                         f"{success} succeeded ({rate}) {dict(pool_stats)}")
+            if total:
+                visual.append(f"  {job.pool}: {genoutputs_net.draw_success_rate(pool_stats, color_preferences)}")
+        total = sum(combined.values())
+        success = combined.get('Success', 0)
+        lines.append(f"  combined: {dict(combined)}")
+        lines.append(f"     total: {total} files attempted")
+        lines.append(f"   success: {success} files generated")
+        if total:
+            lines.append(f"  success%: {success/total*100:.2f}%")
+            visual.append(f"  combined: {genoutputs_net.draw_success_rate(combined, color_preferences)}")
+        print("Stats:", file=sys.stderr)
+        print('\n'.join(lines + visual), file=sys.stderr)
+        with open(os.path.join(self.args.log_dir, 'genoutputs_net.log'), 'a') as f:
+            print('\n'.join(lines), file=f)
+            print('-' * 40, file=f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run seed_gen, mutation and execution for all state pools at once')
+    parser.add_argument('-p', '--prev-gen', required=True, help='Generation whose pools are mutated')
+    parser.add_argument('-g', '--next-gen', required=True, help='Generation being produced (checkpoint key)')
+    parser.add_argument('-L', '--log-dir', required=True, help='Log directory of the next generation')
+    parser.add_argument('--models', nargs='+', required=True)
+    parser.add_argument('--pools', nargs='+', required=True)
+    parser.add_argument('-n', '--num-variants', type=int, default=None,
+                        help='Variants per seed module (default: cli.genvariants_parallel.num_variants)')
+    parser.add_argument('--llm-limit', type=int, default=None,
+                        help='Requests in flight per LLM endpoint (default: cli.genvariants_parallel.jobs)')
+    parser.add_argument('--exec-workers', type=int, default=None,
+                        help='Generator modules executed concurrently (default: cli.genoutputs.jobs or ncpu)')
+    parser.add_argument('--plan', default=None,
+                        help='Variants per seed and mutator weights per pool (see mutator_bandit.py)')
+    parser.add_argument('--cpu-budget', type=float, default=0.0,
+                        help='CPU seconds of module runs for the generation (0: unlimited); see timeout_policy.py')
+    parser.add_argument('--no-mutate', action='store_true', help='Only generate the seed modules (NOSM)')
+    parser.add_argument('-m', '--manifest', default=None, help='Checkpoint manifest (see checkpoint.py)')
+    parser.add_argument('--ckpt-inputs', nargs='*', default=[], help='Inputs hashed into the checkpoints')
+    parser.add_argument('--progress-interval', type=float, default=30.0)
+    args = parser.parse_args()
+    GenPools(args).run()
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,19 @@ import json
 import random
 import os
 import sys
-from typing import List, Optional, Dict
+import time
+from typing import List, NamedTuple, Optional, Dict
 from argparse import ArgumentParser
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import autopep8
 import textwrap
+import telemetry
+from prompt_budget import PromptBudget, TOKENIZERS
+
+# Selected by main(); genpools_net.py passes them per model instead
+ENDPOINT = None
+infilling_prompt = None
 
 def get_endpoints() -> Dict[str, str]:
     result = dict()
@@ -20,9 +27,9 @@ def get_endpoints() -> Dict[str, str]:
     return result
 
 
-def model_info():
+def model_info(endpoint=None):
     """Get information about the model."""
-    return requests.get(f'{ENDPOINT}/info').json()
+    return requests.get(f'{endpoint or ENDPOINT}/info').json()
 
 def generate_completion(
         prompt,
@@ -30,8 +37,13 @@ def generate_completion(
         max_new_tokens=1200,
         repetition_penalty=1.1,
         stop=None,
+        endpoint=None,
+        best_of=None,
 ):
-    """Generate a completion of the prompt."""
+    """Generate a completion of the prompt.
+
+    With ``best_of`` the server samples that many sequences; all of them
+    are in details.best_of_sequences (see split_best_of)."""
     data = {
         'inputs': prompt,
         'parameters': {
@@ -44,8 +56,10 @@ def generate_completion(
     }
     if stop is not None:
         data['parameters']['stop'] = stop
+    if best_of is not None and best_of > 1:
+        data['parameters']['best_of'] = best_of
     try:
-        response = requests.post(f'{ENDPOINT}/generate', json=data)
+        response = requests.post(f'{endpoint or ENDPOINT}/generate', json=data)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -89,6 +103,10 @@ def infilling_prompt_starcoder(
     return f'<fim_prefix>{pre}<fim_suffix>{suf}<fim_middle>'
 
 import re
+import threading
+
+GEN_DEF = re.compile(r'^\s*def\s+(?:__)?\w+_gen(?:__)?\s*\(')
+ONE_LINER = re.compile(r'\):\s*return')
 
 def get_mutable_limit(text: str) -> int:
     """
@@ -100,73 +118,152 @@ def get_mutable_limit(text: str) -> int:
         # Match 'def function_name_gen(' or 'def function_name_gen ('
         # Updated to match __rtsp_gen__ style as well
         # Also ensure it's not a one-line function like 'def foo(): return bar'
-        if re.match(r'^\s*def\s+(?:__)?\w+_gen(?:__)?\s*\(', line) and not re.search(r'\):\s*return', line):
+        if GEN_DEF.match(line) and not ONE_LINER.search(line):
             return i
     return len(lines)
 
-def continue_completion(text: str) -> tuple[str, str]:
-    text_lines = text.split('\n')
-    limit = get_mutable_limit(text)
+class SeedFile:
+    """A seed read once: its text, the offset of every line and its mutable limit.
+
+    Slices of lines are cut straight out of the text, which gives the same
+    strings as '\\n'.join(text.split('\\n')[start:stop]).
+    """
+
+    def __init__(self, text: str, path: Optional[str] = None):
+        self.path = path
+        self.text = text
+        offsets = [0]
+        pos = text.find('\n')
+        while pos != -1:
+            offsets.append(pos + 1)
+            pos = text.find('\n', pos + 1)
+        # One past the end, as if the text ended with a newline
+        offsets.append(len(text) + 1)
+        self.offsets = offsets
+        self.num_lines = len(offsets) - 1
+        self.limit = get_mutable_limit(text)
+
+    @classmethod
+    def load(cls, path: str) -> 'SeedFile':
+        with open(path) as f:
+            return cls(f.read(), path)
+
+    def line(self, i: int) -> str:
+        return self.text[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def lines(self, start: Optional[int] = None, stop: Optional[int] = None) -> str:
+        start, stop, _ = slice(start, stop).indices(self.num_lines)
+        if start >= stop:
+            return ''
+        return self.text[self.offsets[start]:self.offsets[stop] - 1]
+
+    def suffix(self) -> str:
+        """The protected part from the first generator function on."""
+        return self.lines(self.limit) if self.limit < self.num_lines else ''
+
+def as_seed(seed) -> SeedFile:
+    return seed if isinstance(seed, SeedFile) else SeedFile(seed)
+
+def common_prefix_lines(seed1: SeedFile, seed2: SeedFile) -> int:
+    """Where random_crossover may start overlapping: one before the first differing line."""
+    for i in range(min(seed1.limit, seed2.limit)):
+        if seed1.line(i) != seed2.line(i):
+            return i - 1
+    return 0
+
+class SeedCorpus:
+    """The seeds of one genvariants run, each read on first use and then
+    shared by the worker threads.
+
+    Also caches the splice partners of every seed and the common prefix of
+    every pair that has been spliced.
+    """
+
+    def __init__(self, files: List[str]):
+        self.files = list(files)
+        self.seeds: Dict[str, SeedFile] = {}
+        self.lock = threading.Lock()
+        self._others: Dict[str, List[str]] = {}
+        self._common: Dict[tuple, int] = {}
+
+    def get(self, filename: str) -> SeedFile:
+        seed = self.seeds.get(filename)
+        if seed is None:
+            seed = SeedFile.load(filename)
+            with self.lock:
+                seed = self.seeds.setdefault(filename, seed)
+        return seed
+
+    def others(self, filename: str) -> List[str]:
+        others = self._others.get(filename)
+        if others is None:
+            others = self._others[filename] = [f for f in self.files if f != filename]
+        return others
+
+    def common_prefix(self, file1: str, file2: str) -> int:
+        key = (file1, file2)
+        common = self._common.get(key)
+        if common is None:
+            common = self._common[key] = common_prefix_lines(self.get(file1), self.get(file2))
+        return common
+
+def continue_completion(text) -> tuple[str, str]:
+    seed = as_seed(text)
     # Pick a random line number to cut at, respecting the limit
-    cut_line = limit if limit < len(text_lines) else len(text_lines)
-    prompt_text = '\n'.join(text_lines[:cut_line])
+    cut_line = seed.limit if seed.limit < seed.num_lines else seed.num_lines
+    prompt_text = seed.lines(None, cut_line)
     real_completion = ''
     return prompt_text, real_completion
 
-def random_completion(text: str, start_line: int = 1) -> tuple[str,str]:
+def random_completion(text, start_line: int = 1) -> tuple[str,str]:
     """Generate a completion of the text starting from a random line.
-    Always include at least 1 line to avoid an empty prompt."""
-    text_lines = text.split('\n')
-    limit = get_mutable_limit(text)
-    
+    Always include at least 1 line to avoid an empty prompt.
+
+    ``text`` is a string or a SeedFile, as are the texts of the other mutators."""
+    seed = as_seed(text)
+
     # Ensure we don't go past the limit
-    effective_len = min(len(text_lines), limit)
+    effective_len = min(seed.num_lines, seed.limit)
     
     # Pick a random line number to cut at
     cut_line = effective_len - 2 if start_line + 1 >= effective_len - 1 else random.randint(start_line + 1, effective_len - 1)
-    prompt_text = '\n'.join(text_lines[:cut_line])
+    prompt_text = seed.lines(None, cut_line)
     # The completion should ideally not include the protected part, but here we just return the rest of the file as "real_completion"
     # However, for generation, we only care about the prompt.
     # If we want to preserve the suffix (protected part), we should handle it in generate_variant
-    real_completion = '\n'.join(text_lines[cut_line:])
+    real_completion = seed.lines(cut_line)
     return prompt_text, real_completion
 
-def random_fim(text: str, start_line: int = 1) -> tuple[str,str,str]:
+def random_fim(text, start_line: int = 1) -> tuple[str,str,str]:
     """Fill in the middle of the text with a random completion."""
-    text_lines = text.split('\n')
-    limit = get_mutable_limit(text)
-    
+    seed = as_seed(text)
+
     # Ensure we don't go past the limit
-    effective_len = min(len(text_lines), limit)
+    effective_len = min(seed.num_lines, seed.limit)
     
     # Random start and end lines. Make sure we always have at least
     # one line in each section.
     fim_start_line = effective_len - 3 if start_line + 1 >= effective_len - 2 else random.randint(start_line + 1, effective_len - 2)
     fim_end_line = random.randint(fim_start_line + 1, effective_len - 1)
     
-    prefix_text = '\n'.join(text_lines[:fim_start_line]) + '\n'
+    prefix_text = seed.lines(None, fim_start_line) + '\n'
     # Suffix includes the rest of the mutable part AND the protected part
-    suffix_text = '\n'.join(text_lines[fim_end_line:])
-    real_middle = '\n'.join(text_lines[fim_start_line:fim_end_line])
+    suffix_text = seed.lines(fim_end_line)
+    real_middle = seed.lines(fim_start_line, fim_end_line)
     return prefix_text, suffix_text, real_middle
 
-def random_crossover(text1: str, text2: str, start_line: int = 1) -> tuple[str,str]:
-    """Generate a splice of two texts."""
+def random_crossover(text1, text2, start_line: int = 1, common_prefix: Optional[int] = None) -> tuple[str,str]:
+    """Generate a splice of two texts.
 
-    text_lines1 = text1.split('\n')
-    text_lines2 = text2.split('\n')
-    
-    limit1 = get_mutable_limit(text1)
-    limit2 = get_mutable_limit(text2)
-    
-    effective_len1 = min(len(text_lines1), limit1)
-    effective_len2 = min(len(text_lines2), limit2)
+    ``common_prefix`` is common_prefix_lines() of the two, if already known."""
+    seed1 = as_seed(text1)
+    seed2 = as_seed(text2)
 
-    common_prefix = 0
-    for i in range(min(effective_len1, effective_len2)):
-        if text_lines1[i] != text_lines2[i]:
-            common_prefix = i - 1
-            break
+    effective_len1 = min(seed1.num_lines, seed1.limit)
+    effective_len2 = min(seed2.num_lines, seed2.limit)
+
+    if common_prefix is None:
+        common_prefix = common_prefix_lines(seed1, seed2)
     
     cut_line1 = effective_len1 - 2 if start_line + 1 >= effective_len1 -1 else random.randint(start_line + 1, effective_len1 - 1)
 
@@ -175,9 +272,9 @@ def random_crossover(text1: str, text2: str, start_line: int = 1) -> tuple[str,s
     cut_line2_start = max(may_overlap, start_line)
     
     cut_line2 = effective_len2 - 2 if cut_line2_start + 1 >= effective_len2 - 1 else random.randint(cut_line2_start + 1, effective_len2 - 1)
-    prefix = '\n'.join(text_lines1[:cut_line1])
+    prefix = seed1.lines(None, cut_line1)
     # Suffix includes the rest of text2, including any protected part
-    suffix = '\n'.join(text_lines2[cut_line2:])
+    suffix = seed2.lines(cut_line2)
     return prefix, suffix
 
 # SRCS = [
@@ -280,9 +377,32 @@ def new_base(filename: str) -> tuple[str, str]:
         base = base[:first]
         return base, ext
 
-def generate_variant(i, generators, model, filename, args):
-    # Pick a random generator
-    generator = random.choice(generators)
+def fit_prompt(budget, prefix: str, suffix: str = '', fixed: str = '') -> tuple[str, str, dict]:
+    """Prompt prefix and suffix trimmed to the budget (if any), and the meta-log entry."""
+    if budget is None or not budget.enabled:
+        return prefix, suffix, {}
+    return budget.fit(prefix, suffix, fixed)
+
+class VariantPrompt(NamedTuple):
+    """A prompt cut from a seed, and what is needed to turn its completion into a variant."""
+    generator: str
+    prompt: str
+    prefix: str
+    suffix: str
+    orig: str
+    stop: List[str]
+    base: str
+    base2: str
+    ext: str
+    plines: int
+    slines: int
+    olines: int
+    budget_meta: dict
+
+def build_prompt(generator, filename, args, infill, corpus, budget=None) -> VariantPrompt:
+    seed = corpus.get(filename)
+    if budget is not None and budget.enabled:
+        budget.warm(seed.text)
 
     instruction = ""
     # args is actually the config object parsed by ELMFuzzConfig, so it contains all config options
@@ -299,44 +419,45 @@ def generate_variant(i, generators, model, filename, args):
         )
 
     if generator == 'infilled':
-        prefix, suffix, orig = random_fim(open(filename).read(), args.start_line)
+        prefix, suffix, orig = random_fim(seed, args.start_line)
+        prompt_prefix, prompt_suffix, budget_meta = fit_prompt(budget, prefix, suffix, instruction + infill('', ''))
         if instruction:
             prefix = instruction + prefix
-        prompt = infilling_prompt(prefix, suffix) # type: ignore
+        prompt = infill(instruction + prompt_prefix, prompt_suffix) # type: ignore
         stop = []
     elif generator == 'lmsplice':
-        other_files = [f for f in args.files if f != filename]
+        other_files = corpus.others(filename)
         if other_files:
             filename2 = random.choice(other_files)
         else:
             filename2 = filename
-        prefix, suffix = random_crossover(open(filename).read(), open(filename2).read(), args.start_line)
+        seed2 = corpus.get(filename2)
+        if budget is not None and budget.enabled:
+            budget.warm(seed2.text)
+        prefix, suffix = random_crossover(seed, seed2, args.start_line,
+                                          corpus.common_prefix(filename, filename2))
         orig = ''
+        prompt_prefix, prompt_suffix, budget_meta = fit_prompt(budget, prefix, suffix, instruction + infill('', ''))
         if instruction:
             prefix = instruction + prefix
-        prompt = infilling_prompt(prefix, suffix) # type: ignore
+        prompt = infill(instruction + prompt_prefix, prompt_suffix) # type: ignore
         stop = []
     elif generator == 'continue':
         assert False, 'Continue not supported'
-        prefix, orig = continue_completion(open(filename).read())
+        prefix, orig = continue_completion(seed)
         suffix = ''
-        prompt = prefix
+        prompt, _, budget_meta = fit_prompt(budget, prefix)
         stop = ['\nif', '\nclass', '\nfor', '\nwhile']
     else:
         assert generator == 'complete'
-        prefix, orig = random_completion(open(filename).read(), args.start_line)
+        prefix, orig = random_completion(seed, args.start_line)
         # For 'complete', we need to append the protected suffix if it exists
-        text_content = open(filename).read()
-        limit = get_mutable_limit(text_content)
-        text_lines = text_content.split('\n')
-        if limit < len(text_lines):
-            suffix = '\n'.join(text_lines[limit:])
-        else:
-            suffix = ''
+        suffix = seed.suffix()
         
+        prompt_prefix, _, budget_meta = fit_prompt(budget, prefix, fixed=instruction)
         if instruction:
             prefix = instruction + prefix
-        prompt = prefix
+        prompt = instruction + prompt_prefix
         stop = ['\nif', '\nclass', '\nfor', '\nwhile']
 
     # Prepare metadata up front in case we fail to generate
@@ -350,16 +471,25 @@ def generate_variant(i, generators, model, filename, args):
     plines = prefix.count('\n')
     slines = suffix.count('\n')
     olines = orig.count('\n')
+    return VariantPrompt(generator, prompt, prefix, suffix, orig, stop, base, base2, ext,
+                         plines, slines, olines, budget_meta)
+
+def write_variant(i, model, vp: VariantPrompt, res: dict, args, batch: Optional[dict] = None,
+                  gen_time: Optional[float] = None) -> Optional[str]:
+    """Write variant ``i`` (and its meta log) from the response ``res`` to the prompt ``vp``."""
+    generator, prompt, prefix, suffix, stop, base, base2 = (
+        vp.generator, vp.prompt, vp.prefix, vp.suffix, vp.stop, vp.base, vp.base2)
+    plines, slines, olines = vp.plines, vp.slines, vp.olines
+    extra_meta = dict(vp.budget_meta)
+    if batch is not None:
+        extra_meta['batch'] = batch
+    if gen_time is not None:
+        extra_meta['gen_time'] = round(gen_time, 3)
     # Output filenames
-    out_file = f'var_{i:04}.{generator}{ext}'
+    out_file = f'var_{i:04}.{generator}{vp.ext}'
     out_path = os.path.join(args.output_dir,out_file)
     meta_file = os.path.join(args.log_dir, out_file + '.json')
 
-    res = generate_completion(
-        prompt,
-        stop=stop,
-        **vars(args.gen),
-    )
     if 'generated_text' not in res:
         meta = {
             'model': model,
@@ -372,6 +502,7 @@ def generate_variant(i, generators, model, filename, args):
             'finish_reason': 'err',
             'base': [base] + ([base2] if generator == 'lmsplice' else []),
             'response': res,
+            **extra_meta,
         }
 
         # Write (error) metadata to logdir
@@ -422,6 +553,7 @@ def generate_variant(i, generators, model, filename, args):
         'finish_reason': finish_reason,
         'base': [base] + ([base2] if generator == 'lmsplice' else []),
         'response': res,
+        **extra_meta,
     }
     
     mutable_content = prefix + text
@@ -439,9 +571,11 @@ def generate_variant(i, generators, model, filename, args):
 
     full_content = mutable_content + suffix
 
-    # Write output to file
-    with open(out_path, 'w') as f:
+    # Write output to file. Go through a temporary file so that an
+    # interrupted run never leaves a truncated variant behind for --resume
+    with open(out_path + '.tmp', 'w') as f:
         f.write(full_content)
+    os.replace(out_path + '.tmp', out_path)
 
     # Write metadata to logdir
     with open(meta_file, 'w') as f:
@@ -449,6 +583,121 @@ def generate_variant(i, generators, model, filename, args):
 
     return out_path
 
+def pick_generator(generators: List[str], weights: Optional[Dict[str, float]] = None) -> str:
+    """A random generator, weighted by a --plan's mutator weights if given."""
+    if not weights:
+        return random.choice(generators)
+    return random.choices(generators, [weights.get(g, 0.0) or 1e-6 for g in generators])[0]
+
+def generate_variant(i, generators, model, filename, args, endpoint=None, infill=None, corpus=None, budget=None,
+                     weights=None):
+    # endpoint/infill default to the ones main() selected; genpools_net.py
+    # passes them explicitly since it drives several models at once
+    infill = infill or infilling_prompt
+    if corpus is None:
+        corpus = SeedCorpus(args.files)
+    # Pick a random generator
+    generator = pick_generator(generators, weights)
+    vp = build_prompt(generator, filename, args, infill, corpus, budget)
+    start = time.time()
+    res = generate_completion(
+        vp.prompt,
+        stop=vp.stop,
+        endpoint=endpoint,
+        **vars(args.gen),
+    )
+    return write_variant(i, model, vp, res, args, gen_time=time.time() - start)
+
+def split_best_of(res: dict, n: int) -> List[dict]:
+    """One response per sequence of a best_of response (the best one first)."""
+    if 'generated_text' not in res:
+        return [res] * n
+    details = dict(res['details'])
+    others = details.pop('best_of_sequences', None) or []
+    responses = [{**res, 'details': details}]
+    for seq in others[:n - 1]:
+        responses.append({
+            'generated_text': seq['generated_text'],
+            'details': {k: v for k, v in seq.items() if k != 'generated_text'},
+        })
+    while len(responses) < n:
+        responses.append({'error': f'best_of returned only {len(others) + 1} of {n} sequences'})
+    return responses
+
+def generate_batch(indices, generators, model, filename, args, endpoint=None, infill=None, corpus=None,
+                   budget=None, mode='best_of', weights=None) -> List[Optional[str]]:
+    """Generate the variants ``indices`` of one seed with one mutator.
+
+    best_of: one prompt, sampled len(indices) times in a single request.
+    ordered: a prompt per variant, requested back to back so the server's
+    prefix cache still holds the seed's leading tokens.
+    """
+    infill = infill or infilling_prompt
+    if corpus is None:
+        corpus = SeedCorpus(args.files)
+    generator = pick_generator(generators, weights)
+    paths = []
+    if mode == 'best_of' and len(indices) > 1:
+        vp = build_prompt(generator, filename, args, infill, corpus, budget)
+        start = time.time()
+        res = generate_completion(
+            vp.prompt,
+            stop=vp.stop,
+            endpoint=endpoint,
+            best_of=len(indices),
+            **vars(args.gen),
+        )
+        gen_time = (time.time() - start) / len(indices)
+        for k, (i, r) in enumerate(zip(indices, split_best_of(res, len(indices)))):
+            batch = {'mode': mode, 'size': len(indices), 'index': k, 'first': indices[0]}
+            paths.append(write_variant(i, model, vp, r, args, batch=batch, gen_time=gen_time))
+        return paths
+    for k, i in enumerate(indices):
+        vp = build_prompt(generator, filename, args, infill, corpus, budget)
+        start = time.time()
+        res = generate_completion(
+            vp.prompt,
+            stop=vp.stop,
+            endpoint=endpoint,
+            **vars(args.gen),
+        )
+        batch = {'mode': mode, 'size': len(indices), 'index': k, 'first': indices[0]}
+        paths.append(write_variant(i, model, vp, res, args, batch=batch, gen_time=time.time() - start))
+    return paths
+
+def plan_batches(files: List[str], num_variants: int, skip, batch_size: int = 1,
+                 counts: Optional[List[int]] = None) -> List[tuple]:
+    """Group the variant indices still to generate: (seed, [indices]).
+
+    Variant i is made from files[i % len(files)], as in main()'s worklist,
+    in rounds of one variant per seed; ``counts`` (from a --plan) gives the
+    rounds every seed takes part in instead of ``num_variants``. With
+    batch_size 1 every variant is a group of its own, in worklist order.
+    """
+    if counts is None:
+        counts = [num_variants] * len(files)
+    rounds = max(counts, default=0)
+    if batch_size <= 1:
+        return [(files[i % len(files)], [i]) for i in range(len(files) * rounds)
+                if i // len(files) < counts[i % len(files)] and i not in skip]
+    groups = []
+    for j, filename in enumerate(files):
+        pending = [r * len(files) + j for r in range(counts[j]) if r * len(files) + j not in skip]
+        for k in range(0, len(pending), batch_size):
+            groups.append((filename, pending[k:k + batch_size]))
+    return groups
+
+VARIANT_RE = re.compile(r'^var_(\d{4,})\.\w+\.py$')
+
+def find_existing_variants(output_dir: str) -> Dict[int, str]:
+    """Map variant index -> path for the variants already written to output_dir."""
+    existing = {}
+    for name in os.listdir(output_dir):
+        m = VARIANT_RE.match(name)
+        if m and os.path.getsize(os.path.join(output_dir, name)) > 0:
+            existing[int(m.group(1))] = os.path.join(output_dir, name)
+    return existing
+
 def make_parser():
     parser = ArgumentParser(
         description='Use a code model to generate variants of a file.'
@@ -473,12 +722,86 @@ def make_parser():
                         'Allows specifying an immutable region not subject to mutation.')
     parser.add_argument('-j', '--jobs', type=int, default=16,
                         help='Number of inference jobs to run in parallel')
+    parser.add_argument('--resume', action='store_true',
+                        help='Keep variants already present in the output directory ' + \
+                        'and only generate the missing ones')
+    parser.add_argument('--adopt', type=str, default=None,
+                        help='Speculative generation directory (see pipeline_net.py) to take ' + \
+                        'variants of unchanged seed modules from')
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default='tgi',
+                        help='How prompt tokens are counted to fit prompts into the context window '
+                        '(tgi: the endpoint\'s /tokenize, hf: transformers, none: do not fit)')
+    parser.add_argument('--batch', choices=['none', 'best_of', 'ordered'], default='none',
+                        help='Generate several variants of a seed with one mutator at a time: '
+                        'best_of samples them from one prompt in a single request, ordered sends '
+                        'their requests back to back (for the server\'s prefix cache)')
+    parser.add_argument('--batch-size', type=int, default=4,
+                        help='Variants per batch (best_of is also capped by the server\'s max_best_of)')
+    parser.add_argument('--plan', type=str, default=None,
+                        help='Variants per seed and mutator weights from mutator_bandit.py '
+                        '(the pool is the name of the output directory)')
     # Generation params
     parser.add_argument('-t', '--gen.temperature', type=float, default=0.2, help='Generation temperature')
     parser.add_argument('-m', '--gen.max-new-tokens', type=int, default=2048, help='Maximum number of tokens to generate')
     parser.add_argument('-r', '--gen.repetition-penalty', type=float, default=1.1, help='Repetition penalty')
     return parser
 
+def load_plan(path: Optional[str], files: List[str], output_dir: str, num_variants: int):
+    """Variants per seed and mutator weights from a mutator_bandit.py plan.
+
+    The pool is the name of the output directory. Seeds or pools the plan
+    does not know get ``num_variants`` and uniform weights.
+    """
+    if not path:
+        return None, None
+    from mutator_bandit import seed_stem
+    with open(path) as f:
+        plan = json.load(f)
+    pool_plan = plan.get('pools', {}).get(os.path.basename(os.path.normpath(output_dir)))
+    if pool_plan is None:
+        return None, None
+    seeds = pool_plan.get('seeds', {})
+    counts = [seeds.get(seed_stem(f), num_variants) for f in files]
+    return counts, pool_plan.get('mutators') or None
+
+def effective_batch_size(args, info: dict) -> int:
+    """Variants per batch; 1 when batching is off."""
+    if args.batch == 'none':
+        return 1
+    size = max(1, args.batch_size)
+    if args.batch == 'best_of':
+        max_best_of = info.get('max_best_of', 2)
+        if size > max_best_of:
+            print(f'WARNING: the endpoint allows best_of <= {max_best_of}, batching {max_best_of} '
+                  f'variants at a time', file=sys.stderr)
+            size = max_best_of
+    return size
+
+def select_infilling_prompt(model: str):
+    """FIM prompt formatter for a model, or None if it does not support infilling."""
+    if model == 'bigcode/starcoder':
+        return infilling_prompt_starcoder
+    elif model in ('codellama/CodeLlama-13b-hf',
+                   'codellama/CodeLlama-7b-hf'):
+        return infilling_prompt_llama
+    elif model.startswith('Qwen/Qwen2.5-Coder'):
+        return infilling_prompt_qwen
+    return None
+
+def get_generators(args) -> List[str]:
+    forbidden = os.environ.get('ELFUZZ_FORBIDDEN_MUTATORS', '').split(',')
+    forbidden = [f.strip() for f in forbidden if f.strip()]
+
+    generators = []
+    if not args.no_completion and 'complete' not in forbidden:
+        generators += ['complete']
+    if not args.no_fim and 'infilled' not in forbidden:
+        generators += ['infilled']
+    if not args.no_splice and 'lmsplice' not in forbidden:
+        generators += ['lmsplice']
+    # generators += ['continue']
+    return generators
+
 def init_parser(elm):
     # Add a bit of help text to the generation options
     elm.subgroup_help['gen'] = 'Generation parameters'
@@ -502,13 +825,7 @@ def main():
     if model != args.model_name:
         print(f'WARNING: Expected model {args.model_name}, but {ENDPOINT} is actually {model}', file=sys.stderr)
 
-    if model == 'bigcode/starcoder':
-        infilling_prompt = infilling_prompt_starcoder
-    elif model in ('codellama/CodeLlama-13b-hf',
-                   'codellama/CodeLlama-7b-hf'):
-        infilling_prompt = infilling_prompt_llama
-    elif model.startswith('Qwen/Qwen2.5-Coder'):
-        infilling_prompt = infilling_prompt_qwen
+    infilling_prompt = select_infilling_prompt(model)
 
     if infilling_prompt is None and not args.no_fim:
         config.parser.error(f'Model {model} does not support FIM')
@@ -518,40 +835,60 @@ def main():
     os.makedirs(args.output_dir, exist_ok=True)
     os.makedirs(args.log_dir, exist_ok=True)
 
-    forbidden = os.environ.get('ELFUZZ_FORBIDDEN_MUTATORS', '').split(',')
-    forbidden = [f.strip() for f in forbidden if f.strip()]
+    generators = get_generators(args)
 
-    generators = []
-    if not args.no_completion and 'complete' not in forbidden:
-        generators += ['complete']
-    if not args.no_fim and 'infilled' not in forbidden:
-        generators += ['infilled']
-    if not args.no_splice and 'lmsplice' not in forbidden:
-        generators += ['lmsplice']
-    # generators += ['continue']
+    counts, weights = load_plan(args.plan, args.files, args.output_dir, args.num_variants)
 
     # Print the number of variants we'll generate so that the next
     # stage (genoutputs) knows how many to expect.
-    print(len(args.files) * args.num_variants, flush=True)
-
-    worklist = []
-    i = 0
-    for _ in range(args.num_variants):
-        for filename in args.files:
-            worklist.append((i, filename))
-            i += 1
+    print(sum(counts) if counts is not None else len(args.files) * args.num_variants, flush=True)
+
+    existing = {}
+    if args.resume:
+        existing = find_existing_variants(args.output_dir)
+        if existing:
+            print(f'Resuming: {len(existing)} variant(s) already in {args.output_dir}', file=sys.stderr)
+    if args.adopt and os.path.isdir(args.adopt):
+        from pipeline_net import adopt_spec_variants
+        adopt_start = time.time()
+        adopted = adopt_spec_variants(args.adopt, args.files, args.num_variants,
+                                      args.output_dir, args.log_dir, skip=existing, counts=counts)
+        telemetry.record('genvariants.adopt', adopt_start, time.time(),
+                         pool=os.path.basename(os.path.normpath(args.output_dir)),
+                         model=args.model_name, items=len(adopted))
+        print(f'Adopted {len(adopted)} speculative variant(s) from {args.adopt}', file=sys.stderr)
+        existing.update(adopted)
+    # Read every seed once instead of once (or more) per variant
+    corpus = SeedCorpus(args.files)
+    budget = PromptBudget.for_endpoint(ENDPOINT, info, args.gen.max_new_tokens, args.tokenizer)
+    batch_size = effective_batch_size(args, info)
+    for i in sorted(existing):
+        print(existing[i], flush=True)
+    groups = plan_batches(args.files, args.num_variants, existing, batch_size, counts)
     # pbar = tqdm(total=len(worklist), desc='Generating', unit='variant')
-    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    pool = os.path.basename(os.path.normpath(args.output_dir))
+    with telemetry.span('genvariants', pool=pool, model=args.model_name,
+                        requested=sum(len(g[1]) for g in groups) + len(existing), jobs=args.jobs) as sp, \
+            ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        sp.add_items(len(existing))
         futures = []
-        for i, filename in worklist:
-            future = executor.submit(generate_variant, i, generators, model, filename, args)
+        for filename, indices in groups:
+            if batch_size > 1:
+                future = executor.submit(generate_batch, indices, generators, model, filename, args,
+                                         corpus=corpus, budget=budget, mode=args.batch, weights=weights)
+            else:
+                future = executor.submit(generate_variant, indices[0], generators, model, filename, args,
+                                         corpus=corpus, budget=budget, weights=weights)
             # future.add_done_callback(lambda _: pbar.update())
             futures.append(future)
         for future in as_completed(futures):
             res = future.result()
-            if res is not None:
-                print(res, flush=True)
+            for path in (res if isinstance(res, list) else [res]):
+                if path is not None:
+                    sp.add_items(1)
+                    print(path, flush=True)
     # pbar.close()
+    budget.report()
 
 def on_nsf_access() -> dict[str, str] | None:
     if not 'ACCESS_INFO' in os.environ:
@@ -1,13 +1,21 @@
 import click
 import tempfile
 import shutil
-import sys
 import subprocess
 import os
 import os.path
 import re
 import tarfile
+import hashlib
+import time
 from util import *
+import aflnet_monitor
+import canonicalize_net
+import container_runtime
+import protocols
+import telemetry
+import workqueue
+import socket
 import logging
 import json
 from idontwannadoresearch import MailLogger, watch
@@ -15,15 +23,181 @@ from idontwannadoresearch import MailLogger, watch
 logger = logging.getLogger(__file__)
 mailogger = MailLogger.load_from_config(__file__, "/home/appuser/elmfuzz/cli/config.toml", chained_logger=logger)
 
-def on_nsf_access() -> dict[str, str] | None:
-    if not 'ACCESS_INFO' in os.environ:
-        return None
-    endpoint = os.environ['ACCESS_INFO']
-    sif_root = os.environ['SIF_ROOT']
-    return {
-        'endpoint': endpoint,
-        'sif_root': sif_root,
-    }
+# Jobs run on whichever host leases them (see workqueue.py). The prefix must
+# be a directory the container runtime of that host can bind-mount.
+FUZZDATA_PREFIX = os.environ.get('ELMFUZZ_FUZZDATA', '/tmp/host/fuzzdata/')
+# Where the images run AFLNet and leave its tarball
+AFLNET_WORKDIR = '/home/ubuntu/experiments'
+
+def add_job_coverage(all_cov_data: dict, next_gen: int, safe_job: str, job_cov: dict[str, list[str]]):
+    """Fold the raw seed_cov lines of one job into the aggregated coverage."""
+    if safe_job not in all_cov_data[str(next_gen)]:
+        all_cov_data[str(next_gen)][safe_job] = {}
+
+    for k, v in job_cov.items():
+        state_info, edges_only = parse_seed_cov(v)
+        # Structure: gen -> job -> seed -> state_info -> edges
+        # Note: This changes the structure from seed -> edges to seed -> {state_info: edges}
+        all_cov_data[str(next_gen)][safe_job][k] = {state_info: edges_only}
+
+def job_name(job_path: str) -> str:
+    # sanitize job name to produce a safe artifact name
+    job_base = os.path.basename(job_path.rstrip(os.path.sep))
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', job_base)
+
+def job_label(dest_dir: str, next_gen: int, safe_job: str) -> str:
+    # Identifies the container of a job across restarts of this script
+    out_id = hashlib.sha1(os.path.abspath(dest_dir).encode()).hexdigest()[:12]
+    return f'elmfuzz.job={out_id}-{next_gen}-{safe_job}'
+
+def extract_job_output(aflout_path: str, extract_root: str) -> dict[str, list[str]]:
+    """Extract queue/ and .state/seed_cov/ from an AFLNet tarball and read the seed coverage."""
+    os.makedirs(extract_root, exist_ok=True)
+    with tarfile.open(aflout_path, 'r:*') as tf:
+        for member in tf.getmembers():
+            # normalize member name
+            name = member.name.lstrip('./')
+            parts = name.split('/')
+            
+            target_path = None
+            if '.state' in parts and 'seed_cov' in parts:
+                si = parts.index('seed_cov')
+                rel_parts = parts[si+1:]
+                if rel_parts:
+                    target_path = os.path.join(extract_root, 'seed_cov', *rel_parts)
+            elif 'queue' in parts:
+                if '.state' in parts:
+                    continue
+                qi = parts.index('queue')
+                rel_parts = parts[qi+1:]
+                if rel_parts:
+                    target_path = os.path.join(extract_root, *rel_parts)
+            
+            if target_path:
+                # create directories as needed
+                parent = os.path.dirname(target_path)
+                if parent:
+                    os.makedirs(parent, exist_ok=True)
+                if member.isdir():
+                    os.makedirs(target_path, exist_ok=True)
+                else:
+                    f = tf.extractfile(member)
+                    if f is None:
+                        continue
+                    with open(target_path, 'wb') as out_f:
+                        shutil.copyfileobj(f, out_f)
+    
+    # Process coverage files
+    seed_cov_dir = os.path.join(extract_root, 'seed_cov')
+    job_cov = {}
+    if os.path.exists(seed_cov_dir):
+        for cov_file in os.listdir(seed_cov_dir):
+            cov_path = os.path.join(seed_cov_dir, cov_file)
+            if os.path.isfile(cov_path):
+                with open(cov_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = [line.strip() for line in f if line.strip()]
+                job_cov[cov_file] = content
+    return job_cov
+
+def run_aflnet_job(job_path: str, idx: int, image: str, options: str, next_gen: int,
+                   dest_dir: str, cov_job: str, host_cov_dest: str | None = None,
+                   reattach_cid: str | None = None, protocol: str | None = None,
+                   runtime: str = 'docker') -> dict:
+    """Run (or reattach to) the AFLNet container of one state pool and collect its results.
+
+    Work-queue handler: everything it needs is in its arguments and it only
+    touches dest_dir, so it can run on any host that shares the run directory.
+    With ``protocol`` set, equivalent inputs are dropped before they are
+    copied into the container (see canonicalize_net.py). ``runtime`` is one
+    of container_runtime.RUNTIMES.
+    """
+    rt = container_runtime.get_runtime(runtime)
+    safe_job = job_name(job_path)
+    output_base = f'aflnetout_{safe_job}'
+    run_tmp = None
+    dedup = None
+    job_start = time.time()
+    if reattach_cid is None:
+        os.makedirs(FUZZDATA_PREFIX, exist_ok=True)
+        run_tmp = tempfile.mkdtemp(prefix=FUZZDATA_PREFIX)
+        # copy job input into work tmp input
+        dest_input = os.path.join(run_tmp, 'input')
+        os.makedirs(dest_input, exist_ok=True)
+        if os.path.isdir(job_path) and protocol is not None:
+            dedup_start = time.time()
+            dedup = canonicalize_net.copy_deduplicated(protocols.get(protocol), job_path, dest_input)
+            with open(os.path.join(dest_dir, f'dedup_{cov_job}.json'), 'w') as f:
+                json.dump(dedup, f)
+            telemetry.record('canonicalize', dedup_start, time.time(), pool=safe_job,
+                             items=dedup['total'], kept=dedup['kept'])
+        elif os.path.isdir(job_path):
+            for name in os.listdir(job_path):
+                s = os.path.join(job_path, name)
+                d = os.path.join(dest_input, name)
+                if os.path.isdir(s):
+                    shutil.copytree(s, d)
+                else:
+                    shutil.copy2(s, d)
+        else:
+            shutil.copy2(job_path, os.path.join(dest_input, os.path.basename(job_path)))
+
+        # run <fuzzer> <inputs> <outdir> <options> <timeout> <skipcount> (fuzzbench/*/run.sh)
+        # (next_gen+1) * 600 s and a skip count of 50 were used before
+        fuzz_timeout, skipcount = aflnet_schedule(next_gen)
+        command = ['run', 'aflnet', '/tmp/input', output_base, options, str(fuzz_timeout), str(skipcount)]
+        cid = rt.start(image, command, binds={run_tmp: '/tmp'}, workdir=AFLNET_WORKDIR,
+                       label=job_label(dest_dir, next_gen, safe_job),
+                       limits=container_runtime.Limits(cpus=aflnet_cpus(safe_job)),
+                       log_path=os.path.join(dest_dir, f'aflnet_{cov_job}.log'))
+        print(f"Started {rt.name} job {idx} (job={safe_job}) on {socket.gethostname()}: {cid}")
+    else:
+        cid = reattach_cid
+    monitor = None
+    if aflnet_monitor.monitor_enabled():
+        monitor = aflnet_monitor.JobMonitor(rt, cid, cov_job, output_base, dest_dir, AFLNET_WORKDIR).start()
+    try:
+        rt.wait(cid)
+        if monitor is not None:
+            monitor.stop()
+        fuzz_end = time.time()
+        telemetry.record('aflnet.job', job_start, fuzz_end, pool=safe_job, cid=cid[:12],
+                         reattached=reattach_cid is not None, runtime=rt.name)
+
+        collected = 0
+        aflout_path = os.path.join(dest_dir, f'{output_base}.tar.gz')
+        try:
+            rt.copy_out(cid, f'{AFLNET_WORKDIR}/{output_base}.tar.gz', aflout_path)
+        except (subprocess.CalledProcessError, OSError):
+            print(f"Warning: could not copy {output_base}.tar.gz from {rt.name} job {cid}")
+        if monitor is not None and os.path.exists(aflout_path):
+            monitor.ingest_tarball(aflout_path)
+
+        # If the tarball was copied, extract files under 'queue/' into a safe per-job dir
+        cov_path = None
+        if os.path.exists(aflout_path):
+            try:
+                job_cov = extract_job_output(aflout_path, os.path.join(dest_dir, cov_job))
+                # Save per-job json
+                cov_path = os.path.join(dest_dir, f'cov_{cov_job}.json')
+                with open(cov_path, 'w') as f:
+                    json.dump(job_cov, f)
+                collected = len(job_cov)
+            except Exception as e:
+                print(f"Warning: failed to extract/process files from {aflout_path}: {e}")
+        telemetry.record('aflnet.collect', fuzz_end, time.time(), pool=safe_job, items=collected)
+
+        # copy cov if present in bound dir
+        if run_tmp is not None and host_cov_dest is not None:
+            host_cov = os.path.join(run_tmp, 'cov')
+            if os.path.exists(host_cov):
+                shutil.copy(host_cov, host_cov_dest.format(cid=cid[:12]))
+    finally:
+        if monitor is not None:
+            monitor.stop()
+        rt.cleanup(cid)
+        if run_tmp is not None:
+            shutil.rmtree(run_tmp, ignore_errors=True)
+    return {'job': cov_job, 'cid': cid, 'cov_path': cov_path, 'dedup': dedup}
 
 @click.command()
 @click.option('--image', type=str, required=True)
@@ -33,40 +207,31 @@ def on_nsf_access() -> dict[str, str] | None:
 @click.option('--covfile', type=str, default='./cov.json')
 @click.option('--next_gen', type=int, default=1)
 @click.option('-j', 'parallel_num', type=int, default=64, required=False)
+@click.option('--resume/--no-resume', type=bool, default=False,
+              help='Skip jobs whose results are already in --output and reattach to containers left running')
+@click.option('--dedup/--no-dedup', type=bool, default=canonicalize_net.dedup_enabled(),
+              help='Keep one input per protocol-equivalence class (see canonicalize_net.py)')
+@click.option('--runtime', type=click.Choice(container_runtime.RUNTIMES), default=container_runtime.default_runtime(),
+              help='Container runtime of the AFLNet jobs (see container_runtime.py)')
 @watch(mailogger)
-def main(image: str, input: str,output:str, persist: bool, covfile: str, parallel_num: int, next_gen: int):
-    covbin = get_config('target.covbin')
+def main(image: str, input: str,output:str, persist: bool, covfile: str, parallel_num: int, next_gen: int, resume: bool,
+         dedup: bool, runtime: str):
     options = get_config('target.options')
     # Normalize options to a single string for command-line usage
     if isinstance(options, list):
         options = ' '.join(options)
     if options is None:
         options = ''
-    
-    if isinstance(covbin, list):
-        covbin_str = ' '.join(covbin)
-    else:
-        covbin_str = covbin
-    access_info = on_nsf_access()
-    real_feedback = get_config('cli.getcov.real_feedback') == 'true'
-    # afl_timeout = int(get_config('cli.getcov.afl_timeout'))
-    
-    cwd = os.path.dirname(os.path.abspath(__file__))
-    # if access_info is not None:
-    #     prefix = os.path.join(cwd, 'tmp', 'fuzzdata') + '/'
-    # elif bool(os.environ.get('REPROUDCE_MODE', 'false')):
-    prefix = '/tmp/host/fuzzdata/'
-    # else:
-    #     prefix = '/tmp/fuzzdata/'
-    # if not os.path.exists(prefix):
-    #     os.makedirs(prefix)
-    dest_dir = output if output else os.path.join(tmpdir, 'out')
-    os.makedirs(dest_dir, exist_ok=True)
-    aflout_path = os.path.join(dest_dir, 'aflnetout.tar.gz')
-    
+    protocol = get_config('protocol_type') if dedup else None
+    if protocol not in protocols.PROTOCOLS:
+        protocol = None
+
+    prefix = FUZZDATA_PREFIX
+    os.makedirs(prefix, exist_ok=True)
+
     with tempfile.TemporaryDirectory(prefix=prefix) as tmpdir:
-        target_dir = os.path.join(tmpdir, 'input')
-        os.makedirs(target_dir, exist_ok=True)
+        dest_dir = output if output else os.path.join(tmpdir, 'out')
+        os.makedirs(dest_dir, exist_ok=True)
         # Build worklist: if input dir has subdirectories, treat each subdir as a separate job
         worklist = []
         use_0000 = False
@@ -84,177 +249,68 @@ def main(image: str, input: str,output:str, persist: bool, covfile: str, paralle
             # single file provided
             worklist = [input]
         
-        # If there are multiple work items, run them in parallel (one docker container per item)
-        if access_info is None:
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-
-            def start_container_for_job(job_path, idx):
-                run_tmp = os.path.join(tmpdir, f'run_{idx}')
-                os.makedirs(run_tmp, exist_ok=True)
-                # copy job input into work tmp input
-                dest_input = os.path.join(run_tmp, 'input')
-                os.makedirs(dest_input, exist_ok=True)
-                if os.path.isdir(job_path):
-                    for name in os.listdir(job_path):
-                        s = os.path.join(job_path, name)
-                        d = os.path.join(dest_input, name)
-                        if os.path.isdir(s):
-                            shutil.copytree(s, d)
-                        else:
-                            shutil.copy2(s, d)
-                else:
-                    shutil.copy2(job_path, os.path.join(dest_input, os.path.basename(job_path)))
+        # If there are multiple work items, run them in parallel (one container per item)
+        from concurrent.futures import as_completed
 
-                # sanitize job name to produce a safe artifact name
-                job_base = os.path.basename(job_path.rstrip(os.path.sep))
-                safe_job = re.sub(r'[^A-Za-z0-9_.-]', '_', job_base)
-                output_base = f'aflnetout_{safe_job}'
+        all_cov_data = {str(next_gen): {}}
+        payloads = []
+        for i, job in enumerate(worklist, start=1):
+            safe_job = job_name(job)
+            output_base = f'aflnetout_{safe_job}'
+            cov_job = '0000' if use_0000 else safe_job
+            payload = {
+                'job_path': os.path.abspath(job), 'idx': i, 'image': image, 'options': options,
+                'next_gen': next_gen, 'dest_dir': os.path.abspath(dest_dir), 'cov_job': cov_job,
+                # single job: legacy coverage copy goes straight to covfile
+                'host_cov_dest': covfile if len(worklist) == 1 else f"{covfile.rstrip('.json')}_{{cid}}.json",
+                'protocol': protocol, 'runtime': runtime,
+            }
+            if resume:
+                job_cov_path = os.path.join(dest_dir, f'cov_{cov_job}.json')
+                if (os.path.exists(os.path.join(dest_dir, f'{output_base}.tar.gz'))
+                        and os.path.exists(job_cov_path)):
+                    print(f"Resuming: job {safe_job} already collected; skipping it")
+                    with open(job_cov_path) as f:
+                        add_job_coverage(all_cov_data, next_gen, cov_job, json.load(f))
+                    continue
+                cid = container_runtime.get_runtime(runtime).find(job_label(dest_dir, next_gen, safe_job))
+                if cid is not None:
+                    print(f"Resuming: reattaching to {runtime} job {cid} of job {safe_job}")
+                    payload['reattach_cid'] = cid
+            payloads.append(payload)
 
-                cmd = [
-                    'docker', 'run', '-d', 
-                    '--cpus=3' if safe_job == '0000' else '--cpus=1',
-                    '-v', f'{run_tmp}:/tmp',
-                    image,
-                    # '/bin/bash', '-c', f'cd /home/ubuntu/experiments && run aflnet /tmp/input {output_base} "{options}" {(next_gen+1) * 600} 50'
-                    #DEBUG:
-                    # '/bin/bash', '-c', f'cd /home/ubuntu/experiments && run aflnet /tmp/input {output_base} "{options}"  1800 50'
-                    '/bin/bash', '-c', f'cd /home/ubuntu/experiments && run aflnet /tmp/input {output_base} "{options}" {(3 if next_gen > 5 else next_gen + 1) * 3600} {(next_gen + 1) * 20}'
-                ]
-                # start and return container id and run_tmp
-                res = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                cid = res.stdout.strip()
-                print(f"Started container for job {idx} (job={job_base}): {cid}")
-                return cid, run_tmp, output_base, idx
-
-            # start all jobs in parallel
-            futures = []
-            cids = []
-            runmap = {}
-            with ThreadPoolExecutor(max_workers=min(len(worklist), parallel_num or len(worklist))) as ex:
-                for i, job in enumerate(worklist, start=1):
-                    futures.append(ex.submit(start_container_for_job, job, i))
-                for fut in as_completed(futures):
-                    cid, run_tmp, output_base, idx = fut.result()
-                    cids.append(cid)
-                    runmap[cid] = (run_tmp, output_base)
-
-            # Wait for all containers
-            if cids:
-                subprocess.run(['docker', 'wait'] + cids, check=True)
-
-            all_cov_data = {str(next_gen): {}}
-
-            # Collect outputs from each container
-            for cid in cids:
-                run_tmp, output_base = runmap.get(cid)
-                dest_dir = output if output else os.path.join(tmpdir, 'out')
-                os.makedirs(dest_dir, exist_ok=True)
-                aflout_path = os.path.join(dest_dir, f'{output_base}.tar.gz')
+        # One container per job; with ELMFUZZ_QUEUE set the jobs are spread
+        # over the workers of all hosts sharing the run directory
+        dedup_stats = []
+        backend = workqueue.get_backend(max_workers=max(1, min(len(worklist), parallel_num or len(worklist))))
+        with telemetry.span('aflnet', jobs=len(payloads), next_gen=next_gen, runtime=runtime) as sp, backend:
+            futures = {backend.submit(run_aflnet_job, payload, queue='aflnet'): payload
+                       for payload in payloads}
+            for fut in as_completed(futures):
+                payload = futures[fut]
                 try:
-                    subprocess.run(['docker', 'cp', f'{cid}:/home/ubuntu/experiments/{output_base}.tar.gz', aflout_path], check=True)
-                except subprocess.CalledProcessError:
-                    print(f"Warning: could not copy {output_base}.tar.gz from container {cid}")
+                    res = fut.result()
+                except Exception as e:
+                    print(f"Warning: AFLNet job {payload['cov_job']} failed: {e}")
+                    continue
+                if res['cov_path'] is not None:
+                    with open(res['cov_path']) as f:
+                        add_job_coverage(all_cov_data, next_gen, res['job'], json.load(f))
+                    sp.add_items(1)
+                if res.get('dedup') is not None:
+                    dedup_stats.append(res['dedup'])
+        if dedup_stats:
+            print("Deduplicated inputs per pool:")
+            canonicalize_net.print_report(dedup_stats)
+        progress = aflnet_monitor.consolidate(
+            dest_dir, os.path.join(os.path.dirname(os.path.abspath(covfile)), aflnet_monitor.TABLE_FILE))
+        if progress is not None:
+            print(f"AFLNet progress written to {progress}")
 
-                # If the tarball was copied, extract files under 'queue/' into a safe per-job dir
-                if os.path.exists(aflout_path):
-                    try:
-                        safe_job = output_base[len('aflnetout_'):] if output_base.startswith('aflnetout_') else output_base
-                        if use_0000:
-                            safe_job = '0000'
-                        extract_root = os.path.join(dest_dir, safe_job)
-                        os.makedirs(extract_root, exist_ok=True)
-                        with tarfile.open(aflout_path, 'r:*') as tf:
-                            for member in tf.getmembers():
-                                # normalize member name
-                                name = member.name.lstrip('./')
-                                parts = name.split('/')
-                                
-                                target_path = None
-                                if '.state' in parts and 'seed_cov' in parts:
-                                    si = parts.index('seed_cov')
-                                    rel_parts = parts[si+1:]
-                                    if rel_parts:
-                                        target_path = os.path.join(extract_root, 'seed_cov', *rel_parts)
-                                elif 'queue' in parts:
-                                    if '.state' in parts:
-                                        continue
-                                    qi = parts.index('queue')
-                                    rel_parts = parts[qi+1:]
-                                    if rel_parts:
-                                        target_path = os.path.join(extract_root, *rel_parts)
-                                
-                                if target_path:
-                                    # create directories as needed
-                                    parent = os.path.dirname(target_path)
-                                    if parent:
-                                        os.makedirs(parent, exist_ok=True)
-                                    if member.isdir():
-                                        os.makedirs(target_path, exist_ok=True)
-                                    else:
-                                        f = tf.extractfile(member)
-                                        if f is None:
-                                            continue
-                                        with open(target_path, 'wb') as out_f:
-                                            shutil.copyfileobj(f, out_f)
-                        
-                        # Process coverage files
-                        seed_cov_dir = os.path.join(extract_root, 'seed_cov')
-                        job_cov = {}
-                        if os.path.exists(seed_cov_dir):
-                            for cov_file in os.listdir(seed_cov_dir):
-                                cov_path = os.path.join(seed_cov_dir, cov_file)
-                                if os.path.isfile(cov_path):
-                                    with open(cov_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                        content = [line.strip() for line in f if line.strip()]
-                                    job_cov[cov_file] = content
-                        
-                        # Save per-job json
-                        with open(os.path.join(dest_dir, f'cov_{safe_job}.json'), 'w') as f:
-                            json.dump(job_cov, f)
-                        
-                        if safe_job not in all_cov_data[str(next_gen)]:
-                            all_cov_data[str(next_gen)][safe_job] = {}
-
-                        for k, v in job_cov.items():
-                            edges_only = []
-                            state_info = "unknown"
-                            for item in v:
-                                if '::::' in item:
-                                    # Extract state info
-                                    try:
-                                        state_info = item.split("state:", 1)[1].split("::::", 1)[0]
-                                    except IndexError:
-                                        pass
-                                    continue
-                                edges_only.append(item.split(':')[0])
-                            
-                            # Structure: gen -> job -> seed -> state_info -> edges
-                            # Note: This changes the structure from seed -> edges to seed -> {state_info: edges}
-                            all_cov_data[str(next_gen)][safe_job][k] = {state_info: edges_only}
-
-                    except Exception as e:
-                        print(f"Warning: failed to extract/process files from {aflout_path}: {e}")
-                
-                # copy cov if present in bound dir
-                host_cov = os.path.join(run_tmp, 'cov')
-                if os.path.exists(host_cov):
-                    out_cov = covfile if len(cids) == 1 else f"{covfile.rstrip('.json')}_{cid[:12]}.json"
-                    shutil.copy(host_cov, out_cov)
-            
-            # Write aggregated coverage to covfile
-            if all_cov_data:
-                with open(covfile, 'w') as f:
-                    json.dump(all_cov_data, f)
-        else:
-            # Apptainer/sif path: run serially for the combined input
-            cmd = [
-                'apptainer', 'exec',
-                '--cleanenv',
-                '--bind', f'{tmpdir}:/tmp:rw',
-                os.path.join(access_info['sif_root'], image),
-                '/usr/bin/bash', '-c', f'python3 /src/elm_getcov_inside_docker.py --input {target_dir} --output /tmp/out -j {parallel_num} --prog="{covbin_str}" --real-feedback {real_feedback} --afl-timeout={afl_timeout}'
-            ]
-            subprocess.run(cmd, check=True, stdout=sys.stdout, stderr=sys.stderr)
+        # Write aggregated coverage to covfile
+        if all_cov_data:
+            with open(covfile, 'w') as f:
+                json.dump(all_cov_data, f)
 
     if os.path.exists(tmpdir):
         shutil.rmtree(tmpdir, ignore_errors=True)
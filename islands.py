@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Island-model evolution: K populations with periodic elite migration.
+
+all_gen_net.sh evolves one population per rundir, so extra cores only help
+inside a stage, and seed selection grows with the population. In island
+mode the rundir holds K sub-rundirs (``islands/island_<i>``), each with
+its own copy of the run's files. Each one runs the normal loop
+(``do_gen_net.sh``: genvariants -> genoutputs -> AFLNet -> selection) on its
+own share of the CPUs. The islands advance in lockstep. After every M
+generation steps, the latest elites of every island are offered to the
+others:
+
+  * an island receives, greedily, the foreign elites covering the most edges
+    and state transitions (``__TRANS_`` pseudo-edges) that its own elites
+    miss, up to ``--migrants`` per step (select_seeds_net.greedy_search
+    against the island's elite coverage);
+  * a migrant's input is copied to ``<gen>/aflnetout/isl<origin>_<pool>/``
+    of the receiving island, and the migrant is added to that island's
+    ``elites.json`` under this pool. The next selection takes it like any
+    other elite.
+
+Offers are taken from a snapshot of all islands, so a migrant moves one
+island per migration step. ``islands/migrations.jsonl`` logs the
+migrations, and ``islands/coverage.json`` holds the combined coverage of the
+elites per island and over all islands.
+
+    python islands.py run $ELMFUZZ_RUNDIR -k 4 -m 3       # 4 islands, migrate every 3 steps
+    python islands.py migrate $ELMFUZZ_RUNDIR gen5 -n 20  # a migration step by hand
+    python islands.py status $ELMFUZZ_RUNDIR
+
+Islands on several machines share the rundir (e.g. over NFS): each machine
+runs its islands' do_gen_net.sh steps, and ``migrate`` runs once all of
+them have finished the step.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+ISLANDS_DIRNAME = 'islands'
+MIGRATION_LOG = 'migrations.jsonl'
+COVERAGE_VIEW = 'coverage.json'
+
+# Per-run directories that an island makes for itself instead of sharing
+RUN_STATE = ('initial', 'stamps', 'spec', ISLANDS_DIRNAME)
+
+def islands_root(rundir: str) -> str:
+    return os.path.join(rundir, ISLANDS_DIRNAME)
+
+def island_dirs(rundir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(islands_root(rundir), 'island_*')),
+                  key=lambda d: int(d.rsplit('_', 1)[1]))
+
+def migrant_pool(origin: int, pool: str) -> str:
+    return f'isl{origin}_{pool}'
+
+def is_run_state(name: str) -> bool:
+    return name in RUN_STATE or (name.startswith('gen') and name[3:].isdigit())
+
+def init_islands(rundir: str, k: int) -> List[str]:
+    """Create the island rundirs: the run's files copied, its directories shared."""
+    dirs = []
+    for i in range(k):
+        d = os.path.join(islands_root(rundir), f'island_{i}')
+        os.makedirs(d, exist_ok=True)
+        for name in os.listdir(rundir):
+            src, dst = os.path.join(rundir, name), os.path.join(d, name)
+            if is_run_state(name) or os.path.lexists(dst):
+                continue
+            if os.path.isdir(src):
+                os.symlink(os.path.abspath(src), dst)
+            else:
+                shutil.copy2(src, dst)
+        dirs.append(d)
+    return dirs
+
+def cpu_shares(k: int) -> List[List[int]]:
+    """Split the CPUs this process may use into k contiguous shares."""
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < k:
+        return [[cpus[i % len(cpus)]] for i in range(k)]
+    size, extra = divmod(len(cpus), k)
+    shares, start = [], 0
+    for i in range(k):
+        end = start + size + (1 if i < extra else 0)
+        shares.append(cpus[start:end])
+        start = end
+    return shares
+
+def island_env(rundir: str, island_dir: str, index: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env['ELMFUZZ_RUNDIR'] = island_dir
+    env['ELMFUZZ_RUN_NAME'] = f'{os.path.basename(os.path.abspath(rundir))}-{index}'
+    env['ELMFUZZ_ISLAND'] = str(index)
+    # Compiled seeds are content-addressed, so the islands share them
+    env['ELMFUZZ_SEED_CACHE'] = os.environ.get('ELMFUZZ_SEED_CACHE', os.path.join(rundir, 'seed_cache'))
+    return env
+
+def config_value(key: str, env: Dict[str, str]) -> str:
+    return subprocess.run(['./elmconfig.py', 'get', key], env=env, stdout=subprocess.PIPE,
+                          universal_newlines=True, check=True).stdout.strip()
+
+def run_logged(cmd: List[str], env: Dict[str, str], cpus: List[int], log) -> None:
+    rc = subprocess.run(cmd, env=env, stdout=log, stderr=subprocess.STDOUT,
+                        preexec_fn=lambda: os.sched_setaffinity(0, cpus)).returncode
+    if rc != 0:
+        raise RuntimeError(f"{' '.join(cmd)} failed with exit code {rc} (ELMFUZZ_RUNDIR={env['ELMFUZZ_RUNDIR']})")
+
+def setup_initial(island_dir: str, env: Dict[str, str], cpus: List[int], log) -> None:
+    """The initial generation of an island, as all_gen_net.sh makes it."""
+    if os.path.isdir(os.path.join(island_dir, 'initial')):
+        return
+    for sub in ('variants/0000', 'seeds/0000', 'logs', 'aflnetout'):
+        os.makedirs(os.path.join(island_dir, 'initial', sub), exist_ok=True)
+    os.makedirs(os.path.join(island_dir, 'stamps'), exist_ok=True)
+    seeds_dir = os.path.join(island_dir, 'initial', 'seeds', '0000')
+    for pattern in config_value('run.seeds', env).split():
+        for path in glob.glob(pattern):
+            shutil.copy(path, seeds_dir)
+    protocol = config_value('protocol_type', env)
+    run_logged([sys.executable, os.path.join(island_dir, f'seed_gen_{protocol}.py'),
+                '--input_seeds', seeds_dir + '/',
+                '--init_variants', os.path.join(island_dir, 'initial', 'variants', '0000') + '/'],
+               env, cpus, log)
+
+def run_steps(island_dir: str, steps: List[Tuple[str, str]], env: Dict[str, str], cpus: List[int],
+              log_path: str, script: str = './do_gen_net.sh') -> None:
+    with open(log_path, 'a') as log:
+        setup_initial(island_dir, env, cpus, log)
+        for prev_gen, next_gen in steps:
+            if os.path.exists(os.path.join(island_dir, 'stamps', f'{next_gen}.stamp')):
+                continue
+            log.flush()
+            run_logged([script, prev_gen, next_gen], env, cpus, log)
+
+# -- migration --------------------------------------------------------------
+
+def elites_path(island_dir: str, gen: str) -> str:
+    return os.path.join(island_dir, gen, 'logs', 'elites.json')
+
+def read_elites(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def elite_entries(elites: dict) -> List[Tuple[str, str, str, List[str], int]]:
+    """(gen, pool, filename, edges, size) of every elite of an elites.json."""
+    entries = []
+    for gen, pools in elites.items():
+        for pool, files in pools.items():
+            for filename, val in files.items():
+                if isinstance(val, list) and len(val) == 2 and isinstance(val[1], (int, float)):
+                    edges, size = val
+                else:
+                    edges, size = val, float('inf')
+                entries.append((gen, pool, filename, edges, size))
+    return entries
+
+def origin_of(pool: str, island: int) -> Tuple[int, str]:
+    """Island an elite started on and its pool there (migrants keep their origin)."""
+    if pool.startswith('isl') and '_' in pool:
+        origin, original = pool[3:].split('_', 1)
+        if origin.isdigit():
+            return int(origin), original
+    return island, pool
+
+def find_input(island_dir: str, gen: str, pool: str, filename: str) -> Optional[str]:
+    from select_states_net import get_seed_map, resolve_gen_dir
+    name = filename.split(':state:')[0]
+    base = os.path.join(island_dir, resolve_gen_dir(island_dir, gen), 'aflnetout', pool)
+    return get_seed_map(base).get(name.split(',')[0])
+
+def migrate(rundir: str, gen: str, num_migrants: int) -> List[dict]:
+    """Offer the elites of ``gen`` of every island to the others; one log record per island."""
+    from select_seeds_net import greedy_search
+    from select_states_net import resolve_gen_dir
+    dirs = island_dirs(rundir)
+    snapshot = {i: read_elites(elites_path(d, gen)) for i, d in enumerate(dirs)}
+    records = []
+    for i, dest in enumerate(dirs):
+        if not snapshot[i]:
+            continue
+        own = elite_entries(snapshot[i])
+        covered = set(e for _, _, _, edges, _ in own for e in edges)
+        present = set((g, origin_of(p, i), f) for g, p, f, _, _ in own)
+        offers: Dict[str, tuple] = {}
+        for j, src in enumerate(dirs):
+            if j == i:
+                continue
+            for g, p, f, edges, size in elite_entries(snapshot[j]):
+                origin, pool = origin_of(p, j)
+                if origin == i or (g, (origin, pool), f) in present:
+                    continue
+                offers.setdefault(f'{g}-{migrant_pool(origin, pool)}/{f}', (j, g, p, f, edges, size))
+        candidates = [(key, set(o[4]) - covered, o[5]) for key, o in offers.items()]
+        candidates = [c for c in candidates if c[1]]
+        chosen = greedy_search(candidates, num_migrants, covered) if candidates else []
+        elites = snapshot[i]
+        received, new_edges = [], set()
+        for key, _, _ in chosen:
+            j, g, p, f, edges, size = offers[key]
+            gain = set(edges) - covered - new_edges
+            if not gain:
+                continue
+            origin, pool = origin_of(p, j)
+            src_path = find_input(dirs[j], g, p, f)
+            if src_path is None:
+                print(f"Warning: input of {key} not found on island {j}", file=sys.stderr)
+                continue
+            dest_pool = migrant_pool(origin, pool)
+            dest_dir = os.path.join(dest, resolve_gen_dir(dest, g), 'aflnetout', dest_pool, 'queue')
+            os.makedirs(dest_dir, exist_ok=True)
+            shutil.copy(src_path, dest_dir)
+            elites.setdefault(g, {}).setdefault(dest_pool, {})[f] = [edges, size]
+            received.append(key)
+            new_edges |= gain
+        if received:
+            path = elites_path(dest, gen)
+            with open(path + '.tmp', 'w') as out:
+                json.dump(elites, out)
+            os.replace(path + '.tmp', path)
+        records.append({'time': time.time(), 'gen': gen, 'island': i, 'received': received,
+                        'new_edges': sum(1 for e in new_edges if not e.startswith('__TRANS_')),
+                        'new_transitions': sum(1 for e in new_edges if e.startswith('__TRANS_'))})
+    with open(os.path.join(islands_root(rundir), MIGRATION_LOG), 'a') as log:
+        for rec in records:
+            print(json.dumps(rec), file=log)
+    return records
+
+# -- combined view ----------------------------------------------------------
+
+def latest_elites(island_dir: str) -> Tuple[Optional[str], dict]:
+    paths = glob.glob(os.path.join(island_dir, 'gen*', 'logs', 'elites.json'))
+    if not paths:
+        return None, {}
+    path = max(paths, key=lambda p: int(p.split(os.sep)[-3][3:]))
+    return path.split(os.sep)[-3], read_elites(path)
+
+def coverage_view(rundir: str) -> dict:
+    """Edges and transitions of the latest elites per island and over all islands."""
+    view = {'islands': {}}
+    union = set()
+    for i, d in enumerate(island_dirs(rundir)):
+        gen, elites = latest_elites(d)
+        edges = set(e for _, _, _, es, _ in elite_entries(elites) for e in es)
+        union |= edges
+        stamps = glob.glob(os.path.join(d, 'stamps', '*.stamp'))
+        view['islands'][str(i)] = {
+            'gen': gen,
+            'finished_steps': len(stamps),
+            'elites': len(elite_entries(elites)),
+            'edges': sum(1 for e in edges if not e.startswith('__TRANS_')),
+            'transitions': sum(1 for e in edges if e.startswith('__TRANS_')),
+        }
+    view['combined'] = {
+        'edges': sum(1 for e in union if not e.startswith('__TRANS_')),
+        'transitions': sum(1 for e in union if e.startswith('__TRANS_')),
+    }
+    with open(os.path.join(islands_root(rundir), COVERAGE_VIEW), 'w') as f:
+        json.dump(view, f, indent=2)
+    return view
+
+def print_view(view: dict) -> None:
+    print(f"{'island':>6} {'gen':>6} {'steps':>5} {'elites':>6} {'edges':>7} {'trans':>6}")
+    for i, v in view['islands'].items():
+        print(f"{i:>6} {v['gen'] or '-':>6} {v['finished_steps']:5d} {v['elites']:6d} "
+              f"{v['edges']:7d} {v['transitions']:6d}")
+    c = view['combined']
+    print(f"{'all':>6} {'':>6} {'':>5} {'':>6} {c['edges']:7d} {c['transitions']:6d}")
+
+# -- coordinator ------------------------------------------------------------
+
+def run(rundir: str, k: int, interval: int, num_migrants: int) -> None:
+    rundir = os.path.abspath(rundir)
+    os.environ['ELMFUZZ_RUNDIR'] = rundir
+    base_env = dict(os.environ)
+    base_env.setdefault('ELMFUZZ_RUN_NAME', os.path.basename(rundir))
+    for var, key in [('TYPE', 'type'), ('PROJECT_NAME', 'project_name'), ('ENDPOINTS', 'model.endpoints')]:
+        os.environ[var] = config_value(key, base_env)
+    last_gen = int(os.environ.get('NUM_GENERATIONS') or config_value('run.num_generations', base_env)) - 1
+    if not island_dirs(rundir) and os.environ['TYPE'] == 'profuzzbench':
+        # As all_gen_net.sh does, once for all islands
+        subprocess.run([sys.executable, 'prepare_fuzzbench_net.py', '-t', 'profuzzbench'], check=True)
+
+    dirs = init_islands(rundir, k)
+    shares = cpu_shares(k)
+    envs = [island_env(rundir, d, i) for i, d in enumerate(dirs)]
+    logs = [os.path.join(islands_root(rundir), f'island_{i}.log') for i in range(k)]
+    gens = ['initial'] + [f'gen{i}' for i in range(last_gen + 2)]
+    steps = list(zip(gens, gens[1:]))
+    print(f"Running {k} islands on {[len(s) for s in shares]} CPUs, migrating every {interval} step(s)",
+          file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        for start in range(0, len(steps), interval):
+            epoch = steps[start:start + interval]
+            futures = [pool.submit(run_steps, dirs[i], epoch, envs[i], shares[i], logs[i]) for i in range(k)]
+            for f in futures:
+                f.result()
+            # The last step selected the elites of its previous generation
+            gen = epoch[-1][0]
+            records = migrate(rundir, gen, num_migrants)
+            moved = sum(len(r['received']) for r in records)
+            print(f"{epoch[-1][1]}: migrated {moved} elite(s) of {gen}", file=sys.stderr)
+            print_view(coverage_view(rundir))
+        final = (f'gen{last_gen + 1}', f'gen{last_gen + 2}')
+        futures = [pool.submit(run_steps, dirs[i], [final], envs[i], shares[i], logs[i],
+                               './do_gen_net_finial.sh') for i in range(k)]
+        for f in futures:
+            f.result()
+
+def main():
+    parser = argparse.ArgumentParser(description='Island-model evolution with periodic elite migration')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('run', help='Run K islands from the run directory')
+    p.add_argument('rundir')
+    p.add_argument('-k', '--islands', type=int, default=2, help='Number of islands')
+    p.add_argument('-m', '--interval', type=int, default=2, help='Generation steps between migrations')
+    p.add_argument('-n', '--migrants', type=int, default=10, help='Elites an island receives per migration')
+    p = sub.add_parser('migrate', help='Run one migration step')
+    p.add_argument('rundir')
+    p.add_argument('gen', help='Generation whose elites.json is exchanged (e.g. gen5)')
+    p.add_argument('-n', '--migrants', type=int, default=10)
+    p = sub.add_parser('status', help='Print the combined coverage of the islands')
+    p.add_argument('rundir')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.rundir, args.islands, max(1, args.interval), args.migrants)
+    elif args.command == 'migrate':
+        for rec in migrate(args.rundir, args.gen, args.migrants):
+            print(f"island {rec['island']}: {len(rec['received'])} migrant(s), "
+                  f"+{rec['new_edges']} edges, +{rec['new_transitions']} transitions")
+    else:
+        print_view(coverage_view(args.rundir))
+
+if __name__ == '__main__':
+    main()
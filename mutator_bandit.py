@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Yield-driven allocation of the LLM budget over mutators and seed lineages.
+
+Every seed used to get the same ``-n NUM_VARIANTS`` variants, with the
+mutator picked uniformly. This scheduler measures what the variants of the
+last generation step yielded and allocates the next step's variants with a
+discounted UCB1 bandit.
+
+Yield of a variant (from the step's logs):
+
+  * successful outputs: ``Success`` records in ``outputgen_*.jsonl``,
+  * new edges and new state transitions: coverage (``aflnetout/cov_*.json``)
+    of the queue entries that descend from its outputs and that no earlier
+    generation covered, split among the variants that reached them,
+
+per GPU-second (``gen_time`` in the variant's meta log; one second per
+variant when unknown).
+
+Arms are the mutators of every state pool and the seed lineages. The lineage
+of a seed is the seed it descends from through AFLNet's queue (``src:`` and
+``orig:``), a variant's outputs and the variant's meta log; a seed without
+such ancestry starts a lineage of its own. ``<logdir>/lineage.json`` records
+the lineage of every seed of a step.
+
+``plan`` updates the bandit state (``<rundir>/bandit_state.json``) with the
+previous step, logs the realized yields to ``<prev logdir>/bandit_yields.json``
+and writes the plan, which genvariants_parallel_net.py and genpools_net.py
+take with ``--plan``: the number of variants per seed module and the mutator
+weights per pool. The total number of variants stays
+``seeds * num_variants`` per pool. do_gen_net.sh runs it when ELMFUZZ_BANDIT=1:
+
+    python mutator_bandit.py plan -r $ELMFUZZ_RUNDIR -p gen3 -g gen4 -n 10 --pools 0000 0001
+    python mutator_bandit.py report -r $ELMFUZZ_RUNDIR
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from cmin_net import coverage_elements
+
+STATE_FILE = 'bandit_state.json'
+MUTATORS = ['complete', 'infilled', 'lmsplice']
+
+# Older observations count less: the arms' statistics are multiplied by
+# GAMMA before every update
+GAMMA = 0.7
+# Exploration constant of UCB1, relative to the best observed rate
+EXPLORATION = 0.5
+# Smallest share of every mutator
+MUTATOR_FLOOR = 0.05
+
+OUTPUT_RE = re.compile(r'^(var_\d{4,}\.[A-Za-z]+)(?:[_.]|$)')
+QUEUE_ID_RE = re.compile(r'id:(\d+)')
+QUEUE_SRC_RE = re.compile(r'src:(\d+)')
+
+class VariantYield(NamedTuple):
+    pool: str
+    variant: str
+    mutator: str
+    lineage: str
+    cost: float
+    outputs: int
+    new_edges: float
+    new_transitions: float
+
+def gen_number(gen: str) -> int:
+    m = re.search(r'(\d+)$', gen)
+    return int(m.group(1)) if m else -1
+
+def seed_stem(name: str) -> str:
+    """Raw seed name of a seed module or meta-log base (``<proto>_seeds_<stem>``)."""
+    name = os.path.basename(name)
+    if name.endswith('.py'):
+        name = name[:-len('.py')]
+    return name.split('_seeds_', 1)[1] if '_seeds_' in name else name
+
+def load_json(path: str, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def cov_files(rundir: str) -> Dict[Tuple[str, str], str]:
+    """(generation, pool) -> cov_<pool>.json of every AFLNet run of the run."""
+    files = {}
+    for path in glob.glob(os.path.join(rundir, '*', 'aflnetout', 'cov_*.json')):
+        gen = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        pool = os.path.basename(path)[len('cov_'):-len('.json')]
+        files[(gen, pool)] = path
+    return files
+
+def queue_roots(names: List[str]) -> Dict[str, str]:
+    """Queue entry -> the ``orig:`` name it descends from (via ``src:``), if any."""
+    by_id = {}
+    for name in names:
+        m = QUEUE_ID_RE.search(name)
+        if m:
+            by_id[m.group(1)] = name
+    roots = {}
+    for name in names:
+        seen = set()
+        cur = name
+        while cur is not None and cur not in seen:
+            seen.add(cur)
+            if 'orig:' in cur:
+                roots[name] = cur.split('orig:', 1)[1]
+                break
+            m = QUEUE_SRC_RE.search(cur)
+            cur = by_id.get(m.group(1)) if m else None
+    return roots
+
+def variant_of_output(output_name: str) -> Optional[str]:
+    m = OUTPUT_RE.match(os.path.basename(output_name))
+    return m.group(1) if m else None
+
+def load_meta(logdir: str, pool: str, variant: str) -> Optional[dict]:
+    for path in [os.path.join(logdir, 'meta', pool, f'{variant}.py.json'),
+                 os.path.join(logdir, 'meta', f'{variant}.py.json')]:
+        meta = load_json(path)
+        if meta is not None:
+            return meta
+    return None
+
+def lineage_of_base(logdir: str, pool: str, base: str) -> str:
+    stem = seed_stem(base)
+    lineages = load_json(os.path.join(logdir, 'lineage.json'), {})
+    return lineages.get(pool, {}).get(stem, stem)
+
+def step_yields(rundir: str, gen: str) -> List[VariantYield]:
+    """Yields of the variants whose coverage was collected in generation ``gen``."""
+    logdir = os.path.join(rundir, gen, 'logs')
+    cost: Dict[Tuple[str, str], float] = {}
+    info: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for path in glob.glob(os.path.join(logdir, 'meta', '*', 'var_*.json')) + \
+            glob.glob(os.path.join(logdir, 'meta', 'var_*.json')):
+        parent = os.path.basename(os.path.dirname(path))
+        pool = '' if parent == 'meta' else parent
+        variant = os.path.basename(path)[:-len('.py.json')]
+        meta = load_json(path)
+        if meta is None:
+            continue
+        cost[(pool, variant)] = float(meta.get('gen_time') or 1.0)
+        base = (meta.get('base') or [''])[0]
+        info[(pool, variant)] = (meta.get('generator', variant.split('.')[-1]), lineage_of_base(logdir, pool, base))
+
+    outputs: Dict[Tuple[str, str], int] = defaultdict(int)
+    for log_path in glob.glob(os.path.join(logdir, 'outputgen_*.jsonl')):
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    res = json.loads(line)
+                except ValueError:
+                    continue
+                if res.get('result_type') == 'Success' and res.get('module_path'):
+                    module_path = res['module_path']
+                    pool = os.path.basename(os.path.dirname(module_path))
+                    outputs[(pool, os.path.splitext(os.path.basename(module_path))[0])] += 1
+
+    # Coverage known before this generation
+    files = cov_files(rundir)
+    known_edges, known_trans = set(), set()
+    for (g, _), path in files.items():
+        if gen_number(g) < gen_number(gen):
+            for lines in (load_json(path) or {}).values():
+                elements = coverage_elements(lines)
+                known_trans |= {e for e in elements if e.startswith('__TRANS_')}
+                known_edges |= {e for e in elements if not e.startswith('__TRANS_')}
+
+    # New element -> variants that reached it
+    reached: Dict[str, set] = defaultdict(set)
+    for (g, pool), path in files.items():
+        if g != gen:
+            continue
+        job_cov = load_json(path) or {}
+        roots = queue_roots(list(job_cov))
+        for name, lines in job_cov.items():
+            variant = variant_of_output(roots.get(name, ''))
+            if variant is None:
+                continue
+            for e in coverage_elements(lines):
+                if e not in known_edges and e not in known_trans:
+                    reached[e].add((pool, variant))
+
+    new_edges: Dict[Tuple[str, str], float] = defaultdict(float)
+    new_trans: Dict[Tuple[str, str], float] = defaultdict(float)
+    for e, variants in reached.items():
+        target = new_trans if e.startswith('__TRANS_') else new_edges
+        for v in variants:
+            target[v] += 1 / len(variants)
+
+    yields = []
+    credited = set(new_edges) | set(new_trans) | set(outputs)
+    for (pool, variant), c in sorted(cost.items()):
+        mutator, lineage = info[(pool, variant)]
+        # Older runs share one meta directory between the pools; their
+        # variants are matched on the name alone
+        keys = [(pool, variant)] if pool else [k for k in credited if k[1] == variant]
+        yields.append(VariantYield(
+            pool=pool, variant=variant, mutator=mutator, lineage=lineage, cost=c,
+            outputs=sum(outputs.get(k, 0) for k in keys),
+            new_edges=sum(new_edges.get(k, 0.0) for k in keys),
+            new_transitions=sum(new_trans.get(k, 0.0) for k in keys),
+        ))
+    return yields
+
+def reward(y: VariantYield, weights: Tuple[float, float, float]) -> float:
+    w_out, w_edge, w_trans = weights
+    return w_out * y.outputs + w_edge * y.new_edges + w_trans * y.new_transitions
+
+def new_arm() -> dict:
+    return {'n': 0.0, 'cost': 0.0, 'reward': 0.0}
+
+def update_state(state: dict, gen: str, yields: List[VariantYield], weights) -> bool:
+    """Fold one step into the arms; False if it was already applied."""
+    if gen in state.setdefault('applied', []):
+        return False
+    for group in [state.setdefault('lineages', {})] + list(state.setdefault('mutators', {}).values()):
+        for arm in group.values():
+            for k in arm:
+                arm[k] *= GAMMA
+    for y in yields:
+        r = reward(y, weights)
+        for arm in (state['mutators'].setdefault(y.pool, {}).setdefault(y.mutator, new_arm()),
+                    state['lineages'].setdefault(y.lineage, new_arm())):
+            arm['n'] += 1
+            arm['cost'] += y.cost
+            arm['reward'] += r
+    state['applied'].append(gen)
+    return True
+
+def ucb_scores(arms: Dict[str, dict], keys: List[str]) -> Dict[str, float]:
+    """UCB1 on the reward rate; arms never pulled get the best score."""
+    rates = {k: arms[k]['reward'] / arms[k]['cost'] for k in keys
+             if k in arms and arms[k]['n'] > 0 and arms[k]['cost'] > 0}
+    if not rates:
+        return {k: 1.0 for k in keys}
+    scale = max(rates.values()) or 1.0
+    total = sum(arms[k]['n'] for k in rates)
+    scores = {}
+    for k in keys:
+        if k in rates:
+            scores[k] = rates[k] + EXPLORATION * scale * math.sqrt(math.log(max(total, 1.0) + 1) / arms[k]['n'])
+    best = max(scores.values()) if scores else 1.0
+    for k in keys:
+        scores.setdefault(k, best)
+    return scores
+
+def allocate(scores: Dict[str, float], budget: int, floor: int = 1) -> Dict[str, int]:
+    """Split ``budget`` proportionally to the scores, at least ``floor`` each (largest remainder)."""
+    keys = sorted(scores)
+    counts = {k: floor for k in keys}
+    rest = budget - floor * len(keys)
+    total = sum(max(scores[k], 0.0) for k in keys)
+    if rest <= 0 or not keys:
+        return counts
+    shares = {k: rest * (max(scores[k], 0.0) / total if total > 0 else 1 / len(keys)) for k in keys}
+    for k in keys:
+        counts[k] += int(shares[k])
+    left = rest - sum(int(s) for s in shares.values())
+    for k in sorted(keys, key=lambda k: (-(shares[k] - int(shares[k])), k))[:left]:
+        counts[k] += 1
+    return counts
+
+def mutator_weights(scores: Dict[str, float]) -> Dict[str, float]:
+    total = sum(max(s, 0.0) for s in scores.values())
+    k = len(scores)
+    spread = 1 - MUTATOR_FLOOR * k
+    return {m: round(MUTATOR_FLOOR + spread * (max(s, 0.0) / total if total > 0 else 1 / k), 4)
+            for m, s in scores.items()}
+
+def queue_index(rundir: str) -> Dict[str, Tuple[str, str, str]]:
+    """Content hash -> (generation, pool, queue root) of every AFLNet queue entry."""
+    index = {}
+    for (gen, pool), path in sorted(cov_files(rundir).items()):
+        names = list(load_json(path) or {})
+        roots = queue_roots(names)
+        queue_dir = os.path.join(os.path.dirname(path), pool)
+        for name in names:
+            for p in [os.path.join(queue_dir, name), os.path.join(queue_dir, 'queue', name)]:
+                if os.path.isfile(p):
+                    with open(p, 'rb') as f:
+                        index.setdefault(hashlib.sha1(f.read()).hexdigest(), (gen, pool, roots.get(name, '')))
+                    break
+    return index
+
+def seed_lineages(rundir: str, seeds_dir: str, pools: List[str]) -> Dict[str, Dict[str, str]]:
+    """Lineage of every seed of the pools about to be mutated."""
+    index = queue_index(rundir)
+    lineages = {}
+    for pool in pools:
+        pool_dir = os.path.join(seeds_dir, pool)
+        if not os.path.isdir(pool_dir):
+            continue
+        lineages[pool] = {}
+        for name in sorted(os.listdir(pool_dir)):
+            path = os.path.join(pool_dir, name)
+            if not os.path.isfile(path):
+                continue
+            stem = os.path.splitext(name)[0]
+            with open(path, 'rb') as f:
+                hit = index.get(hashlib.sha1(f.read()).hexdigest())
+            lineage = stem
+            if hit is not None:
+                gen, qpool, root = hit
+                variant = variant_of_output(root)
+                logdir = os.path.join(rundir, gen, 'logs')
+                meta = load_meta(logdir, qpool, variant) if variant else None
+                if meta and meta.get('base'):
+                    lineage = lineage_of_base(logdir, qpool, meta['base'][0])
+            lineages[pool][stem] = lineage
+    return lineages
+
+def make_plan(state: dict, lineages: Dict[str, Dict[str, str]], num_variants: int,
+              mutators: List[str], floor: int) -> dict:
+    plan = {'num_variants': num_variants, 'pools': {}}
+    for pool, seeds in sorted(lineages.items()):
+        if not seeds:
+            continue
+        lineage_scores = ucb_scores(state.get('lineages', {}), sorted(set(seeds.values())))
+        seed_scores = {stem: lineage_scores[lin] for stem, lin in seeds.items()}
+        counts = allocate(seed_scores, num_variants * len(seeds), floor)
+        mscores = ucb_scores(state.get('mutators', {}).get(pool, {}), mutators)
+        plan['pools'][pool] = {
+            'seeds': counts,
+            'mutators': mutator_weights(mscores),
+            'lineages': seeds,
+            'scores': {stem: round(s, 6) for stem, s in seed_scores.items()},
+        }
+    return plan
+
+def summarize(yields: List[VariantYield], weights) -> dict:
+    by_mutator = defaultdict(lambda: defaultdict(float))
+    for y in yields:
+        s = by_mutator[f'{y.pool}/{y.mutator}' if y.pool else y.mutator]
+        s['variants'] += 1
+        s['cost'] += y.cost
+        s['outputs'] += y.outputs
+        s['new_edges'] += y.new_edges
+        s['new_transitions'] += y.new_transitions
+        s['reward'] += reward(y, weights)
+    return {k: dict(v) for k, v in sorted(by_mutator.items())}
+
+def print_state(state: dict, file=sys.stderr) -> None:
+    print(f"{'arm':<40} {'n':>8} {'cost':>10} {'reward':>10} {'rate':>10}", file=file)
+    arms = [(f'{pool}/{m}', a) for pool, ms in sorted(state.get('mutators', {}).items()) for m, a in sorted(ms.items())]
+    arms += sorted(state.get('lineages', {}).items(), key=lambda kv: -kv[1]['reward'])[:20]
+    for name, a in arms:
+        rate = a['reward'] / a['cost'] if a['cost'] else 0.0
+        print(f"{name[:40]:<40} {a['n']:>8.1f} {a['cost']:>10.1f} {a['reward']:>10.2f} {rate:>10.4f}", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Allocate the variant budget over mutators and seed lineages')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('plan', help='Update the bandit with the last step and plan the next one')
+    p.add_argument('-r', '--rundir', default=os.environ.get('ELMFUZZ_RUNDIR'), help='Run directory')
+    p.add_argument('-p', '--prev-gen', required=True, help='Generation whose seeds are mutated next')
+    p.add_argument('-g', '--next-gen', required=True, help='Generation being produced')
+    p.add_argument('-n', '--num-variants', type=int, required=True, help='Average variants per seed')
+    p.add_argument('--pools', nargs='+', required=True)
+    p.add_argument('-o', '--output', default=None, help='Plan file (default: <next gen>/logs/bandit_plan.json)')
+    p.add_argument('--min-variants', type=int, default=1, help='Variants every seed gets at least')
+    p.add_argument('--weights', type=float, nargs=3, default=[0.1, 1.0, 2.0],
+                   metavar=('OUTPUT', 'EDGE', 'TRANSITION'), help='Reward per successful output, new edge, new transition')
+    p = sub.add_parser('report', help='Print the arms of the bandit')
+    p.add_argument('-r', '--rundir', default=os.environ.get('ELMFUZZ_RUNDIR'), help='Run directory')
+    args = parser.parse_args()
+    if not args.rundir:
+        parser.error('--rundir or ELMFUZZ_RUNDIR is required')
+
+    state_path = os.path.join(args.rundir, STATE_FILE)
+    state = load_json(state_path, {})
+    if args.cmd == 'report':
+        print_state(state, file=sys.stdout)
+        return
+
+    weights = tuple(args.weights)
+    prev_logdir = os.path.join(args.rundir, args.prev_gen, 'logs')
+    yields = step_yields(args.rundir, args.prev_gen) if os.path.isdir(prev_logdir) else []
+    if yields:
+        with open(os.path.join(prev_logdir, 'bandit_yields.json'), 'w') as f:
+            json.dump({'summary': summarize(yields, weights), 'variants': [y._asdict() for y in yields]}, f, indent=2)
+    if update_state(state, args.prev_gen, yields, weights):
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(state_path + '.tmp', state_path)
+
+    next_logdir = os.path.join(args.rundir, args.next_gen, 'logs')
+    os.makedirs(next_logdir, exist_ok=True)
+    lineages = seed_lineages(args.rundir, os.path.join(args.rundir, args.prev_gen, 'seeds'), args.pools)
+    with open(os.path.join(next_logdir, 'lineage.json'), 'w') as f:
+        json.dump(lineages, f, indent=2)
+    plan = make_plan(state, lineages, args.num_variants, MUTATORS, args.min_variants)
+    output = args.output or os.path.join(next_logdir, 'bandit_plan.json')
+    with open(output, 'w') as f:
+        json.dump(plan, f, indent=2)
+
+    print(f"Bandit: {len(yields)} variant yield(s) of {args.prev_gen} folded in", file=sys.stderr)
+    for pool, pp in plan['pools'].items():
+        counts = sorted(pp['seeds'].values())
+        print(f"  {pool}: {sum(counts)} variants over {len(counts)} seeds "
+              f"(min {counts[0]}, max {counts[-1]}), mutators {pp['mutators']}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Streaming statistics of generator executions.
+
+genoutputs_net.py wrote every result as a JSON line and, once all modules
+had run, re-read and re-parsed the whole log to count the result types
+(and the file stats, re-hashing every output, were too slow to keep on).
+A StatsAggregator is fed the results of each module as they arrive
+instead, and keeps per generation type:
+
+  * result-type counts (an ImportError counts for every iteration),
+  * log2 histograms of ``time_taken``, ``memory_used`` and output sizes,
+  * the digests of the outputs, for unique-output counts per module.
+
+Output sizes and digests are taken by the execution workers
+(annotate_outputs) and travel with the results as ``output_size`` and
+``output_digest``, so the aggregating process never reads an output. At the
+end, a compact summary is merged into ``<log>.stats.json`` under the pool's
+name, and the text report is printed as before.
+
+With the stats kept in-process the result log is only needed by the
+runtime history (timeout_policy.py, mutator_bandit.py); ``compact_result``
+drops what those do not read (the arguments, and the output of successful
+runs) from each line.
+
+    python output_stats.py gen3/logs/outputgen_rtsp.stats.json    # print a summary
+    python output_stats.py --from-log gen3/logs/outputgen_rtsp.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+LOG_MODES = ['full', 'compact', 'none']
+
+COLOR_PREFERENCE_KEYS = ['Success', 'Error', 'Timeout', 'AFLErr']
+
+def digest_file(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def annotate_outputs(results: List[dict]) -> List[dict]:
+    """Add the size and digest of the output of every successful result (in the worker)."""
+    for res in results:
+        path = res.get('output_file')
+        if res.get('result_type') != 'Success' or not path:
+            continue
+        try:
+            res['output_size'] = os.path.getsize(path)
+            res['output_digest'] = digest_file(path)
+        except OSError:
+            pass
+    return results
+
+def compact_result(res: dict) -> dict:
+    """A result without what nothing reads back: the arguments and the output of successful runs."""
+    res = {k: v for k, v in res.items() if k != 'args'}
+    if res.get('result_type') == 'Success' and isinstance(res.get('data'), dict):
+        res['data'] = {k: v for k, v in res['data'].items() if k not in ('stdout', 'stderr')}
+    return res
+
+class Histogram:
+    """Counts per power-of-two bucket, with the exact count, sum, min and max."""
+
+    def __init__(self, scale: float = 1.0):
+        # Values are multiplied by ``scale`` before bucketing (e.g. seconds -> ms)
+        self.scale = scale
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.n = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float) -> None:
+        scaled = value * self.scale
+        self.buckets[0 if scaled < 1 else math.ceil(math.log2(scaled))] += 1
+        self.n += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'Histogram') -> None:
+        for b, c in other.buckets.items():
+            self.buckets[b] += c
+        self.n += other.n
+        self.total += other.total
+        if other.n:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, in the original unit."""
+        if not self.n:
+            return None
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= q * self.n:
+                return min(2 ** b / self.scale, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.n:
+            return {'n': 0}
+        return {
+            'n': self.n,
+            'mean': self.total / self.n,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            # Bucket upper bounds (scaled unit) -> counts
+            'buckets': {str(2 ** b): c for b, c in sorted(self.buckets.items())},
+        }
+
+class GentypeStats:
+    def __init__(self):
+        self.results: Dict[str, int] = defaultdict(int)
+        self.time_taken = Histogram(scale=1000)
+        self.memory_used = Histogram()
+        self.output_size = Histogram()
+        # Module path -> digests of its outputs
+        self.digests: Dict[str, set] = defaultdict(set)
+
+class StatsAggregator:
+    """Thread-safe running statistics of module executions."""
+
+    def __init__(self, num_iterations: int = 1):
+        self.num_iterations = num_iterations
+        self.lock = threading.Lock()
+        self.gentypes: Dict[str, GentypeStats] = defaultdict(GentypeStats)
+
+    @staticmethod
+    def gentype(module_path: Optional[str]) -> str:
+        from genoutputs_net import gentype_re
+        m = gentype_re.search(os.path.basename(module_path or ''))
+        return m.group('gentype') if m else 'unknown'
+
+    def add(self, module_path: Optional[str], results: List[dict]) -> None:
+        """Record the results of one module."""
+        with self.lock:
+            for res in results:
+                stats = self.gentypes[self.gentype(res.get('module_path') or module_path)]
+                result_type = res.get('result_type')
+                if result_type == 'ImportError':
+                    # The whole batch of the module failed
+                    stats.results[result_type] += self.num_iterations
+                else:
+                    stats.results[result_type] += 1
+                data = res.get('data') or {}
+                if data.get('time_taken') is not None:
+                    stats.time_taken.add(data['time_taken'])
+                if data.get('memory_used') is not None:
+                    stats.memory_used.add(data['memory_used'])
+                path = res.get('module_path') or module_path
+                if result_type == 'Success':
+                    stats.digests.setdefault(path, set())
+                if res.get('output_size') is not None:
+                    stats.output_size.add(res['output_size'])
+                if res.get('output_digest') is not None:
+                    stats.digests[path].add(res['output_digest'])
+
+    @classmethod
+    def from_log(cls, logfile: str) -> 'StatsAggregator':
+        """Aggregate an existing result log (for --stats-only)."""
+        with open(logfile) as f:
+            original_args = json.loads(f.readline())['data']['args']
+            agg = cls(original_args['driver']['num_iterations'])
+            for line in f:
+                try:
+                    res = json.loads(line)
+                except ValueError:
+                    print(f"Error: {line}", file=sys.stderr)
+                    continue
+                agg.add(res.get('module_path'), [res])
+        return agg
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            return {k: dict(v.results) for k, v in self.gentypes.items()}
+
+    def combined(self) -> Dict[str, int]:
+        combined = defaultdict(int)
+        for counts in self.counts().values():
+            for k, v in counts.items():
+                combined[k] += v
+        return dict(combined)
+
+    def summary(self) -> dict:
+        def section(stats: List[GentypeStats]) -> dict:
+            results = defaultdict(int)
+            hists = {'time_taken': Histogram(1000), 'memory_used': Histogram(), 'output_size': Histogram()}
+            unique = []
+            for s in stats:
+                for k, v in s.results.items():
+                    results[k] += v
+                for name, hist in hists.items():
+                    hist.merge(getattr(s, name))
+                unique += [len(d) for d in s.digests.values()]
+            return {
+                'results': dict(results),
+                'time_taken': hists['time_taken'].summary(),
+                'memory_used': hists['memory_used'].summary(),
+                'output_size': hists['output_size'].summary(),
+                'total_unique': sum(unique),
+                'single_unique': sum(1 for n in unique if n == 1),
+                'zero_unique': sum(1 for n in unique if n == 0),
+            }
+        with self.lock:
+            summary = {k: section([v]) for k, v in sorted(self.gentypes.items())}
+            summary['combined'] = section(list(self.gentypes.values()))
+        return summary
+
+    def write(self, path: str, key: str) -> None:
+        """Merge the summary into ``path`` under ``key`` (e.g. the pool)."""
+        try:
+            with open(path) as f:
+                summaries = json.load(f)
+        except (OSError, ValueError):
+            summaries = {}
+        summaries[key] = self.summary()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(summaries, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def report(self, statename: str, stats_log_path: Optional[str] = None, file=sys.stderr) -> None:
+        """Print the stats (as generate_stats did) and append them to ``stats_log_path``."""
+        from genoutputs_net import (COLOR_CYAN_UNDERLINE, COLOR_GREEN, COLOR_RED, COLOR_YELLOW,
+                                    draw_success_rate)
+        color_preferences = dict(zip(COLOR_PREFERENCE_KEYS,
+                                     [COLOR_GREEN, COLOR_RED, COLOR_YELLOW, COLOR_CYAN_UNDERLINE]))
+        running_stats = self.counts()
+        combined = self.combined()
+        total = sum(combined.values())
+        success = combined.get('Success', 0)
+        lines = [f"  {k}: {running_stats[k]}" for k in sorted(running_stats)]
+        lines.append(f"  combined: {combined}")
+        totals = [f"     total: {total} files attempted", f"   success: {success} files generated"]
+        if total != 0:
+            totals.append(f"  success%: {success/total*100:.2f}%")
+        print("Stats:", file=file)
+        print('\n'.join(lines), file=file)
+        print("Stats (visual):", file=file)
+        for k in sorted(running_stats):
+            print(f"  {k}: {draw_success_rate(running_stats[k], color_preferences)}", file=file)
+        print(f"  combined: {draw_success_rate(combined, color_preferences)}", file=file)
+        print('\n'.join(totals), file=file)
+        if stats_log_path is None:
+            return
+        try:
+            with open(stats_log_path, 'a') as f:
+                print(f"State: {statename}", file=f)
+                print('\n'.join(lines + totals), file=f)
+                print("-" * 40, file=f)
+        except Exception as e:
+            print(f"Error writing stats to log file: {e}", file=sys.stderr)
+
+def print_summary(key: str, summary: dict) -> None:
+    print(f"{key}:")
+    for gentype, s in summary.items():
+        t, size = s['time_taken'], s['output_size']
+        print(f"  {gentype:<10} {s['results']}")
+        if t['n']:
+            print(f"  {'':<10} time_taken: mean {t['mean']:.3f}s p50 <={t['p50']:.3f}s p90 <={t['p90']:.3f}s "
+                  f"max {t['max']:.3f}s")
+        if size['n']:
+            print(f"  {'':<10} output_size: mean {size['mean']:.0f}B max {size['max']}B; "
+                  f"{s['total_unique']} unique, {s['single_unique']} single-unique, "
+                  f"{s['zero_unique']} zero-unique module(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the output statistics of a generation')
+    parser.add_argument('path', help='A .stats.json summary (or a result log with --from-log)')
+    parser.add_argument('--from-log', action='store_true', help='Aggregate a result log instead')
+    args = parser.parse_args()
+
+    if args.from_log:
+        print_summary(args.path, StatsAggregator.from_log(args.path).summary())
+        return
+    with open(args.path) as f:
+        for key, summary in json.load(f).items():
+            print_summary(key, summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Pipelined scheduler for the evolution loop.
+
+all_gen_net.sh normally runs the steps ``do_gen_net.sh genN genN+1`` strictly
+one after the other, so the LLM endpoint idles while AFLNet measures the
+coverage of a generation and the CPUs idle while the LLM writes variants.
+With ``PIPELINE=1`` the steps are driven by this script instead:
+
+  * While the coverage stage of step N is running, the per-pool coverage
+    files it leaves behind (``<gen>/aflnetout/cov_<pool>.json``) are polled.
+    As soon as the elite pool 0000 is measured, or enough of the pools,
+    seed/state selection and LLM mutation for step N+1 are run
+    *speculatively* on the partial coverage, under ``<rundir>/spec/<gen>/``.
+  * When step N finishes, the speculation is stopped and step N+1 runs as
+    usual on the final coverage. Its mutation stage is given the speculative
+    generation (``genvariants_parallel_net.py --adopt``), which takes over
+    every speculative variant whose seed module(s) the final selection
+    produced byte-for-byte again. Only the remaining variants are generated.
+
+The speculation never writes outside ``spec/``, so a wrong guess costs LLM
+time but cannot change the result of a generation.
+
+    python pipeline_net.py run initial gen0 gen1 gen2   # steps initial->gen0->gen1->gen2
+    python pipeline_net.py report $ELMFUZZ_RUNDIR       # per-resource utilization and overlap
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import telemetry
+from util import get_config, parse_seed_cov
+
+SPEC_DIRNAME = 'spec'
+MODULE_INDEX = 'modules.json'
+
+# Stages grouped by the resource they keep busy
+RESOURCES = {
+    'llm': ['genvariants'],
+    'exec': ['genoutputs', 'aflnet'],
+    'select': ['select_seeds', 'select_states'],
+}
+
+def spec_gen_dir(rundir: str, gen: str) -> str:
+    return os.path.join(rundir, SPEC_DIRNAME, gen)
+
+def module_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+def module_base(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+def write_module_index(variants_dir: str) -> Dict[str, str]:
+    """Record the digest of every seed module of a speculative pool."""
+    index = {}
+    for path in sorted(glob.glob(os.path.join(variants_dir, '*.py'))):
+        if os.path.basename(path).startswith('var_'):
+            continue
+        index[module_base(path)] = module_digest(path)
+    with open(os.path.join(variants_dir, MODULE_INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def adopt_spec_variants(spec_dir: str, files: List[str], num_variants: int,
+                        output_dir: str, log_dir: str, skip=(),
+                        counts: Optional[List[int]] = None) -> Dict[int, str]:
+    """
+    Copy the speculative variants of unchanged seed modules into output_dir.
+
+    Variant indices follow genvariants' worklist (round * len(files) + file
+    index), so the adopted variants fill exactly the slots genvariants would
+    otherwise generate; ``counts`` (from a --plan) limits the rounds of every
+    seed as in plan_batches. Splice variants are only adopted if both of
+    their parents are unchanged. Returns index -> path of the adopted
+    variants.
+    """
+    # digest -> (pool, base) over all speculative pools
+    by_digest = {}
+    for index_path in glob.glob(os.path.join(spec_dir, 'variants', '*', MODULE_INDEX)):
+        pool = os.path.basename(os.path.dirname(index_path))
+        with open(index_path) as f:
+            for base, digest in json.load(f).items():
+                by_digest.setdefault(digest, (pool, base))
+
+    matches = {}
+    matched_bases = {}
+    for j, path in enumerate(files):
+        hit = by_digest.get(module_digest(path))
+        if hit is not None:
+            matches[j] = hit
+            matched_bases.setdefault(hit[0], set()).add(hit[1])
+    if not matches:
+        return {}
+
+    # (pool, base) -> speculative variants, in index order
+    candidates = {}
+    for pool in matched_bases:
+        for meta_path in sorted(glob.glob(os.path.join(spec_dir, 'meta', pool, 'var_*.json'))):
+            out_file = os.path.basename(meta_path)[:-len('.json')]
+            var_path = os.path.join(spec_dir, 'variants', pool, out_file)
+            if not os.path.exists(var_path):
+                continue
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('finish_reason') == 'err':
+                continue
+            if not all(b in matched_bases[pool] for b in meta['base']):
+                continue
+            candidates.setdefault((pool, meta['base'][0]), []).append((var_path, meta_path, meta))
+
+    adopted = {}
+    used = set()
+    for j, key in matches.items():
+        rounds = counts[j] if counts is not None else num_variants
+        slots = [r * len(files) + j for r in range(rounds)]
+        pending = [c for c in candidates.get(key, []) if c[0] not in used]
+        for i in slots:
+            if not pending:
+                break
+            if i in skip:
+                continue
+            var_path, meta_path, meta = pending.pop(0)
+            used.add(var_path)
+            out_file = f"var_{i:04}.{meta['generator']}.py"
+            out_path = os.path.join(output_dir, out_file)
+            shutil.copyfile(var_path, out_path + '.tmp')
+            os.replace(out_path + '.tmp', out_path)
+            meta = dict(meta, adopted_from=var_path)
+            with open(os.path.join(log_dir, out_file + '.json'), 'w') as f:
+                f.write(json.dumps(meta))
+            adopted[i] = out_path
+    return adopted
+
+def partial_coverage(aflnet_out: str, gen_key: str) -> tuple[dict, List[str]]:
+    """Aggregate the per-pool coverage files written so far by the coverage stage."""
+    cov = {gen_key: {}}
+    pools = []
+    for path in sorted(glob.glob(os.path.join(aflnet_out, 'cov_*.json'))):
+        pool = os.path.basename(path)[len('cov_'):-len('.json')]
+        try:
+            with open(path) as f:
+                job_cov = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Still being written
+            continue
+        cov[gen_key][pool] = {k: dict([parse_seed_cov(v)]) for k, v in job_cov.items()}
+        pools.append(pool)
+    return cov, pools
+
+class Speculation:
+    """Selection and LLM mutation for the step after ``gen``, on partial coverage."""
+
+    def __init__(self, rundir: str, gen: str):
+        self.rundir = rundir
+        self.gen = gen
+        self.dir = spec_gen_dir(rundir, gen)
+        self.stop_event = threading.Event()
+        self.proc: Optional[subprocess.Popen] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def _call(self, cmd: List[str], **kwargs) -> int:
+        with self.lock:
+            if self.stop_event.is_set():
+                return -1
+            self.proc = subprocess.Popen(cmd, **kwargs)
+        rc = self.proc.wait()
+        with self.lock:
+            self.proc = None
+        return rc
+
+    def start(self, pools_done: List[str]) -> None:
+        self.thread = threading.Thread(target=self._run, args=(pools_done,), daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.lock:
+            self.stop_event.set()
+            if self.proc is not None and self.proc.poll() is None:
+                self.proc.terminate()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self, pools_done: List[str]) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.dir, 'logs'), exist_ok=True)
+        env = dict(os.environ)
+        env[telemetry.TIMELINE_ENV] = os.path.join(self.dir, 'logs', 'timeline.jsonl')
+        env[telemetry.GEN_ENV] = self.gen
+        start = time.time()
+        status, variants = 'ok', 0
+        try:
+            if self._select(env):
+                variants = self._mutate(env)
+        except Exception as e:
+            # A failed guess only costs time; the real step is unaffected
+            print(f"Speculation for {self.gen} failed: {e}", file=sys.stderr)
+            status = f'error:{type(e).__name__}'
+        telemetry.emit({'stage': 'pipeline.speculate', 'start': start, 'end': time.time(),
+                        'duration': time.time() - start, 'items': variants, 'status': status,
+                        'attrs': {'pools': len(pools_done), 'stopped': self.stop_event.is_set()},
+                        'gen': self.gen}, path=env[telemetry.TIMELINE_ENV])
+
+    def _select(self, env: dict) -> bool:
+        gen_num = self.gen[len('gen'):]
+        prev_prev = self.gen if self.gen == 'gen0' else f'gen{int(gen_num) - 1}'
+        cov, _ = partial_coverage(os.path.join(self.rundir, self.gen, 'aflnetout'), gen_num)
+        cov_file = os.path.join(self.dir, 'logs', 'coverage.json')
+        with open(cov_file, 'w') as f:
+            json.dump(cov, f)
+        input_elite_file = os.path.join(self.rundir, prev_prev, 'logs', 'elites.json')
+        if not os.path.exists(input_elite_file):
+            return False
+        elite_file = os.path.join(self.dir, 'logs', 'elites.json')
+        rc = self._call([sys.executable, 'select_seeds_net.py', '-u', '-g', self.gen,
+                         '-n', get_config('run.num_selected'), '-c', cov_file,
+                         '-i', input_elite_file, '-o', elite_file], env=env)
+        if rc != 0:
+            return False
+        forbidden = os.environ.get('TDPFUZZ_FORBIDDEN', '')
+        if forbidden not in ('', 'NOSS'):
+            return False
+        rc = self._call([sys.executable, 'select_states_net.py', '-c', cov_file, '-e', elite_file,
+                         '-g', self.gen, '--noss' if forbidden == 'NOSS' else '--ss',
+                         '--seeds-root', os.path.join(self.dir, 'seeds'),
+                         '--log-dir', os.path.join(self.dir, 'logs')], env=env)
+        return rc == 0
+
+    def _mutate(self, env: dict) -> int:
+        if os.environ.get('TDPFUZZ_FORBIDDEN', '') == 'NOSM':
+            return 0
+        models = get_config('model.names')
+        models = models if isinstance(models, list) else [models]
+        pools = get_config('run.state_pools')
+        pools = pools if isinstance(pools, list) else [pools]
+        protocol = get_config('protocol_type')
+        num_variants = get_config('cli.genvariants_parallel.num_variants')
+        written = 0
+        for model in models:
+            for pool in pools:
+                seeds_dir = os.path.join(self.dir, 'seeds', pool)
+                variants_dir = os.path.join(self.dir, 'variants', pool)
+                if not os.path.isdir(seeds_dir) or not os.listdir(seeds_dir):
+                    continue
+                os.makedirs(variants_dir, exist_ok=True)
+                if self._call([sys.executable, os.path.join(self.rundir, f'seed_gen_{protocol}.py'),
+                               '--input_seeds', seeds_dir + '/', '--init_variants', variants_dir + '/'],
+                              env=env, stdout=subprocess.DEVNULL) != 0:
+                    continue
+                modules = sorted(os.path.join(variants_dir, m) for m in write_module_index(variants_dir))
+                self._call([sys.executable, 'genvariants_parallel_net.py', '-n', num_variants,
+                            '-M', model, '-O', variants_dir + '/',
+                            '-L', os.path.join(self.dir, 'meta', pool),
+                            *[m + '.py' for m in modules]],
+                           env=env, stdout=subprocess.DEVNULL)
+                written += len(glob.glob(os.path.join(variants_dir, 'var_*.py')))
+                if self.stop_event.is_set():
+                    return written
+        return written
+
+def should_speculate(pools_done: List[str], num_pools: int, min_fraction: float) -> bool:
+    if '0000' in pools_done:
+        return True
+    return num_pools > 0 and len(pools_done) / num_pools >= min_fraction
+
+def run_step(rundir: str, prev_gen: str, next_gen: str, args) -> int:
+    """Run one do_gen_net.sh step and speculate on the next one while it runs."""
+    if os.path.exists(os.path.join(rundir, 'stamps', f'{next_gen}.stamp')):
+        print(f"Generation {next_gen} already finished; skipping", file=sys.stderr)
+        return 0
+    proc = subprocess.Popen(['./do_gen_net.sh', prev_gen, next_gen])
+    spec = None
+    if not args.no_speculation and next_gen != args.last_gen:
+        pools = get_config('run.state_pools')
+        num_pools = 1 if prev_gen == 'initial' else len(pools if isinstance(pools, list) else [pools])
+        aflnet_out = os.path.join(rundir, next_gen, 'aflnetout')
+        while proc.poll() is None:
+            _, pools_done = partial_coverage(aflnet_out, next_gen[len('gen'):])
+            if should_speculate(pools_done, num_pools, args.min_fraction):
+                print(f"Pipeline: {len(pools_done)}/{num_pools} pools of {next_gen} measured; "
+                      f"speculating on the next generation", file=sys.stderr)
+                spec = Speculation(rundir, next_gen)
+                spec.start(pools_done)
+                break
+            time.sleep(args.poll)
+    rc = proc.wait()
+    if spec is not None:
+        spec.stop()
+    return rc
+
+def merge_intervals(intervals: List[tuple]) -> List[tuple]:
+    merged = []
+    for s, e in sorted(intervals):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+def intersect_length(a: List[tuple], b: List[tuple]) -> float:
+    total, i, j = 0.0, 0, 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if hi > lo:
+            total += hi - lo
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+def utilization(rundir: str) -> dict:
+    """Busy time per resource over all generations (speculation included) and their overlap."""
+    paths = glob.glob(os.path.join(rundir, '*', 'logs', 'timeline.jsonl'))
+    spec_paths = glob.glob(os.path.join(rundir, SPEC_DIRNAME, '*', 'logs', 'timeline.jsonl'))
+    def timed(events):
+        return [e for e in events if e.get('start') is not None and e.get('end') is not None]
+    spec_events = timed(telemetry.load_events(sorted(spec_paths)))
+    events = timed(telemetry.load_events(sorted(paths))) + spec_events
+    if not events:
+        return {'wall_seconds': 0.0, 'resources': {}}
+    wall = max(e['end'] for e in events) - min(e['start'] for e in events)
+    busy = {}
+    for resource, stages in RESOURCES.items():
+        busy[resource] = merge_intervals([(e['start'], e['end']) for e in events if e['stage'] in stages])
+    def total(intervals):
+        return sum(e - s for s, e in intervals)
+    result = {
+        'wall_seconds': wall,
+        'resources': {
+            r: {'busy_seconds': total(iv), 'utilization': total(iv) / wall if wall > 0 else 0.0}
+            for r, iv in busy.items()
+        },
+        'llm_exec_overlap_seconds': intersect_length(busy['llm'], busy['exec']),
+        'speculative_llm_seconds': total(merge_intervals(
+            [(e['start'], e['end']) for e in spec_events if e['stage'] == 'genvariants'])),
+        'adopted_variants': sum(e.get('items') or 0 for e in events if e['stage'] == 'genvariants.adopt'),
+    }
+    return result
+
+def print_utilization(result: dict, file=sys.stderr) -> None:
+    wall = result['wall_seconds']
+    print(f"Pipeline wall-clock: {wall:.1f}s", file=file)
+    for resource, r in result['resources'].items():
+        print(f"  {resource:<8} busy {r['busy_seconds']:>10.1f}s  {100.0 * r['utilization']:>5.1f}%", file=file)
+    print(f"  LLM/exec overlap:    {result['llm_exec_overlap_seconds']:.1f}s", file=file)
+    print(f"  Speculation:         {result['speculative_llm_seconds']:.1f}s, "
+          f"{result['adopted_variants']} variant(s) adopted", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipelined scheduler for the evolution loop')
+    subparsers = parser.add_subparsers(dest='subcommand', required=True)
+    cmd = subparsers.add_parser('run', help='Run consecutive generations, overlapping them speculatively')
+    cmd.add_argument('gens', nargs='+', help='Generations in order, e.g. initial gen0 gen1')
+    cmd.add_argument('--min-fraction', type=float, default=0.5,
+                     help='Speculate once this fraction of pools is measured (or pool 0000 is)')
+    cmd.add_argument('--poll', type=float, default=10.0, help='Seconds between coverage polls')
+    cmd.add_argument('--no-speculation', action='store_true', help='Only run the steps in order')
+    cmd = subparsers.add_parser('report', help='Print per-resource utilization of a run')
+    cmd.add_argument('rundir', nargs='?', default=os.environ.get('ELMFUZZ_RUNDIR'))
+    cmd.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if args.subcommand == 'report':
+        result = utilization(args.rundir)
+        if args.json:
+            json.dump(result, sys.stdout, indent=2)
+            print()
+        else:
+            print_utilization(result, file=sys.stdout)
+        return
+
+    rundir = os.environ.get('ELMFUZZ_RUNDIR')
+    if not rundir:
+        print("Error: ELMFUZZ_RUNDIR environment variable not set.", file=sys.stderr)
+        sys.exit(1)
+    args.last_gen = args.gens[-1]
+    for prev_gen, next_gen in zip(args.gens, args.gens[1:]):
+        rc = run_step(rundir, prev_gen, next_gen, args)
+        if rc != 0:
+            print(f"do_gen_net.sh {prev_gen} {next_gen} failed with exit status {rc}", file=sys.stderr)
+            sys.exit(rc)
+    print_utilization(utilization(rundir))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Cost model and dry-run planner for evolution runs.
+
+What a run costs follows from config.yaml (run.num_selected,
+run.num_generations, run.state_pools, the variants per seed, the models)
+and from formulas in the code: the elites kept after each generation grow
+with the harmonic number (util.max_elites_for, select_seeds_net.py), and
+the AFLNet budget of a generation grows up to 3 h per pool
+(util.aflnet_schedule, getcov_fuzzbench_net.py). This planner walks the
+generation steps of do_gen_net.sh and estimates, per step:
+
+    seeds        seed modules mutated (the elites in 0000, split again over the other pools)
+    requests     LLM requests (variants / batch size)
+    gpu_h        GPU-hours (variants x GPU-seconds per variant)
+    execs        generator module executions
+    container_h  AFLNet container CPU-hours (timeout x CPUs per pool)
+    select_s     seed selection seconds (quadratic in the elites)
+    wall_h       wall-clock of the step (its stages one after the other)
+
+Rates come from the telemetry of earlier runs (``*/logs/timeline.jsonl``,
+see telemetry.py); without history, DEFAULT_RATES are used. ``--set``
+simulates other settings next to the configured ones:
+
+    python plan_run.py $ELMFUZZ_RUNDIR
+    python plan_run.py $ELMFUZZ_RUNDIR --history old_runs/*/gen*/logs/timeline.jsonl \\
+        --set num_selected=200 --set num_generations=6 --set endpoints=4
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import List, NamedTuple
+
+import telemetry
+from util import aflnet_cpus, aflnet_schedule, get_config, max_elites_for
+
+class Settings(NamedTuple):
+    num_selected: int
+    num_generations: int
+    pools: List[str]
+    num_variants: int
+    models: int
+    # LLM endpoints serving the models concurrently
+    endpoints: int
+    # Variants per LLM request (genvariants --batch best_of)
+    batch_size: int
+    initial_seeds: int
+
+class Rates(NamedTuple):
+    # Seconds of one endpoint per variant
+    gpu_seconds_per_variant: float
+    # Wall-clock seconds of genoutputs per variant executed
+    exec_seconds_per_variant: float
+    # Module executions per variant (driver num_iterations, retries)
+    execs_per_variant: float
+    # Fraction of max_elites that selection actually keeps
+    elite_fill: float
+    # Seed selection seconds per max_elites^2
+    select_seconds_per_elite2: float
+    # Fraction of the AFLNet timeout a job runs
+    aflnet_fill: float
+
+# Rough figures of a CodeLlama-13b endpoint and a ProFuzzBench target
+DEFAULT_RATES = Rates(gpu_seconds_per_variant=20.0, exec_seconds_per_variant=0.5, execs_per_variant=1.0,
+                      elite_fill=1.0, select_seconds_per_elite2=1e-4, aflnet_fill=1.0)
+
+SETTING_TYPES = {'pools': lambda v: v.split(',')}
+
+def as_list(value) -> list:
+    return value if isinstance(value, list) else [value] if value else []
+
+def config_or(key: str, default):
+    try:
+        return get_config(key)
+    except Exception:
+        return default
+
+def load_settings(rundir: str) -> Settings:
+    os.environ['ELMFUZZ_RUNDIR'] = rundir
+    models = as_list(get_config('model.names'))
+    endpoints = as_list(config_or('model.endpoints', []))
+    batch = config_or('cli.genvariants_parallel.batch', 'none')
+    seeds = [p for pattern in as_list(get_config('run.seeds')) for p in glob.glob(pattern)]
+    return Settings(
+        num_selected=int(get_config('run.num_selected')),
+        num_generations=int(os.environ.get('NUM_GENERATIONS') or get_config('run.num_generations')),
+        pools=as_list(get_config('run.state_pools')),
+        num_variants=int(get_config('cli.genvariants_parallel.num_variants')),
+        models=len(models),
+        endpoints=max(1, len(endpoints)),
+        batch_size=1 if batch in ('', 'none') else int(config_or('cli.genvariants_parallel.batch_size', 4)),
+        initial_seeds=max(1, len(seeds)),
+    )
+
+def apply_overrides(settings: Settings, overrides: List[str]) -> Settings:
+    changes = {}
+    for item in overrides:
+        key, _, value = item.partition('=')
+        if key not in Settings._fields:
+            raise SystemExit(f"Unknown setting {key!r}; one of {', '.join(Settings._fields)}")
+        changes[key] = SETTING_TYPES.get(key, int)(value)
+    return settings._replace(**changes)
+
+def fit_rates(events: List[dict], endpoints: int) -> Rates:
+    """Rates measured by earlier generations; the defaults where they measured nothing."""
+    summary = telemetry.summarize(events)['stages']
+
+    def stage(name):
+        rows = [r for r in summary if r['stage'] == name]
+        return sum(r['wall_seconds'] for r in rows), sum(r['items'] for r in rows)
+
+    rates = DEFAULT_RATES._asdict()
+    wall, variants = stage('genvariants')
+    if variants:
+        rates['gpu_seconds_per_variant'] = wall * endpoints / variants
+    wall, executed = stage('genoutputs')
+    if executed:
+        rates['exec_seconds_per_variant'] = wall / executed
+    selections = [e for e in events if e['stage'] == 'select_seeds' and (e.get('attrs') or {}).get('max_elites')]
+    if selections:
+        rates['elite_fill'] = min(1.0, sum(e['items'] / e['attrs']['max_elites'] for e in selections) / len(selections))
+        rates['select_seconds_per_elite2'] = sum(e['duration'] / e['attrs']['max_elites'] ** 2
+                                                 for e in selections) / len(selections)
+    jobs = [e for e in events if e['stage'] == 'aflnet.job' and e.get('gen', '') and e['gen'].startswith('gen')]
+    if jobs:
+        fills = [e['duration'] / aflnet_schedule(int(e['gen'][3:]))[0] for e in jobs if e['gen'][3:].isdigit()]
+        if fills:
+            rates['aflnet_fill'] = min(1.0, sum(fills) / len(fills))
+    return Rates(**rates)
+
+def plan(settings: Settings, rates: Rates) -> List[dict]:
+    """Estimates per generation step of all_gen_net.sh (initial -> gen0 -> ... -> gen<N>)."""
+    gens = ['initial'] + [f'gen{i}' for i in range(settings.num_generations + 1)]
+    rows = []
+    for prev_gen, next_gen in zip(gens, gens[1:]):
+        if prev_gen == 'initial':
+            elites = 0
+            seeds = settings.initial_seeds
+        else:
+            elites = int(max_elites_for(prev_gen, settings.num_selected) * rates.elite_fill)
+            # select_states_net.py: every elite in 0000, the elites split again over the other pools
+            seeds = elites * (2 if len(settings.pools) > 1 else 1)
+        variants = seeds * settings.num_variants * settings.models
+        requests = -(-variants // max(1, settings.batch_size))
+        gpu_seconds = variants * rates.gpu_seconds_per_variant
+        exec_seconds = variants * rates.exec_seconds_per_variant
+        timeout, _ = aflnet_schedule(int(next_gen[3:]))
+        aflnet_seconds = timeout * rates.aflnet_fill
+        # Pools without seeds get no AFLNet job
+        pools = settings.pools if prev_gen != 'initial' else settings.pools[:1]
+        container_seconds = sum(aflnet_cpus(p) for p in pools) * aflnet_seconds
+        select_seconds = rates.select_seconds_per_elite2 * elites ** 2
+        wall = gpu_seconds / settings.endpoints + exec_seconds + aflnet_seconds + select_seconds
+        rows.append({
+            'step': f'{prev_gen}->{next_gen}',
+            'elites': elites,
+            'seeds': seeds,
+            'variants': variants,
+            'requests': requests,
+            'gpu_hours': gpu_seconds / 3600,
+            'executions': int(variants * rates.execs_per_variant),
+            'container_hours': container_seconds / 3600,
+            'select_seconds': select_seconds,
+            'wall_hours': wall / 3600,
+        })
+    return rows
+
+def totals(rows: List[dict]) -> dict:
+    keys = ['variants', 'requests', 'gpu_hours', 'executions', 'container_hours', 'select_seconds', 'wall_hours']
+    return {k: sum(r[k] for r in rows) for k in keys}
+
+def print_plan(title: str, settings: Settings, rows: List[dict], file=sys.stdout) -> None:
+    print(f"{title}: {settings.num_generations} generations, {settings.num_selected} selected, "
+          f"{len(settings.pools)} pools, {settings.num_variants} variants x {settings.models} model(s), "
+          f"{settings.endpoints} endpoint(s)", file=file)
+    header = (f"{'step':<14} {'elites':>7} {'seeds':>7} {'variants':>9} {'requests':>9} {'gpu_h':>8} "
+              f"{'execs':>9} {'container_h':>11} {'select_s':>9} {'wall_h':>7}")
+    print(header, file=file)
+    print('-' * len(header), file=file)
+    for r in rows + [dict(totals(rows), step='total', elites='', seeds='')]:
+        print(f"{r['step']:<14} {r['elites']:>7} {r['seeds']:>7} {r['variants']:>9} {r['requests']:>9} "
+              f"{r['gpu_hours']:>8.1f} {r['executions']:>9} {r['container_hours']:>11.1f} "
+              f"{r['select_seconds']:>9.0f} {r['wall_hours']:>7.1f}", file=file)
+    print(f"Estimated wall-clock: {totals(rows)['wall_hours'] / 24:.1f} day(s)", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate the cost of an evolution run from its config')
+    parser.add_argument('rundir', nargs='?', default=os.environ.get('ELMFUZZ_RUNDIR', '.'),
+                        help='Run directory with config.yaml')
+    parser.add_argument('--history', nargs='*', default=None,
+                        help='Telemetry timelines of earlier runs (default: <rundir>/*/logs/timeline.jsonl)')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='SETTING=VALUE',
+                        help=f"Simulate another setting ({', '.join(Settings._fields)}; pools comma-separated)")
+    parser.add_argument('--json', action='store_true', help='Print the plan(s) as JSON')
+    args = parser.parse_args()
+
+    settings = load_settings(args.rundir)
+    history = args.history if args.history is not None else \
+        glob.glob(os.path.join(args.rundir, '*', 'logs', 'timeline.jsonl'))
+    events = telemetry.load_events(history) if history else []
+    rates = fit_rates(events, settings.endpoints)
+    print(f"Rates from {len(history)} timeline(s): {json.dumps(rates._asdict())}", file=sys.stderr)
+
+    plans = {'configured': (settings, plan(settings, rates))}
+    if args.overrides:
+        alternative = apply_overrides(settings, args.overrides)
+        plans['simulated'] = (alternative, plan(alternative, rates))
+    if args.json:
+        print(json.dumps({name: {'settings': s._asdict(), 'rates': rates._asdict(), 'steps': rows,
+                                 'totals': totals(rows)} for name, (s, rows) in plans.items()}, indent=2))
+        return
+    for name, (s, rows) in plans.items():
+        print_plan(name, s, rows)
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Fit generation prompts into the model's context window.
+
+TGI rejects a request whose prompt plus ``max_new_tokens`` exceeds
+``max_total_tokens`` (or whose prompt exceeds ``max_input_tokens``), and long
+elites make such prompts. A PromptBudget knows both limits from the
+endpoint's ``/info`` and counts tokens per line: every seed is tokenized once
+(TGI's ``/tokenize``, a local ``transformers`` tokenizer, or a
+characters-per-token estimate) and the counts are cached by line text, so
+the many prompts cut from the same seeds cost no further requests.
+
+A prompt that does not fit loses whole lines of context farthest from the
+cut point: the top of the prefix and the bottom of the FIM suffix, each
+side keeping at least half of the budget when it needs it. Only the prompt
+is trimmed; the variant written to disk still has the full prefix and
+suffix. The meta log of every variant records the estimated prompt tokens
+and how many were trimmed, and genvariants prints how many overflowing
+requests were avoided.
+
+    python prompt_budget.py -e http://localhost:8192 -m 2048 gen0/variants/0001/*.py
+"""
+
+import argparse
+import bisect
+import math
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+TOKENIZERS = ['tgi', 'hf', 'heuristic', 'none']
+
+# Token counts are estimates (a prompt is not tokenized as a whole), so
+# leave some room
+MARGIN_RATIO = 0.02
+MARGIN_TOKENS = 16
+
+# A conservative estimate for code when no tokenizer is available
+CHARS_PER_TOKEN = 3
+
+def heuristic_count(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def tgi_spans(endpoint: str, text: str) -> List[int]:
+    """Start offsets of the tokens of ``text``, from TGI's /tokenize."""
+    import requests
+    response = requests.post(f'{endpoint}/tokenize', json={'inputs': text}, timeout=30)
+    response.raise_for_status()
+    return [t['start'] for t in response.json()]
+
+def hf_spans_fn(model: str) -> Callable[[str], List[int]]:
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model)
+
+    def spans(text: str) -> List[int]:
+        enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [start for start, _ in enc['offset_mapping']]
+    return spans
+
+def context_limits(info: dict, max_new_tokens: int) -> Optional[int]:
+    """Largest prompt (in tokens) the endpoint accepts with ``max_new_tokens``, or None if unknown."""
+    max_total = info.get('max_total_tokens')
+    max_input = info.get('max_input_tokens', info.get('max_input_length'))
+    limits = []
+    if max_total:
+        limits.append(max_total - max_new_tokens)
+    if max_input:
+        limits.append(max_input)
+    return min(limits) if limits else None
+
+class PromptBudget:
+    def __init__(self, limit: Optional[int], spans: Optional[Callable[[str], List[int]]] = None,
+                 name: str = 'heuristic'):
+        self.limit = limit
+        self.spans = spans
+        self.name = name
+        self.lock = threading.Lock()
+        # Line text -> tokens (including its newline)
+        self.line_tokens: Dict[str, int] = {}
+        self.warmed = set()
+        self.stats = {'prompts': 0, 'trimmed': 0, 'trimmed_tokens': 0, 'too_long': 0, 'tokenize_errors': 0}
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str, info: dict, max_new_tokens: int,
+                     tokenizer: str = 'tgi') -> 'PromptBudget':
+        limit = context_limits(info, max_new_tokens) if tokenizer != 'none' else None
+        if limit is None:
+            return cls(None, name='none')
+        if tokenizer == 'tgi':
+            return cls(limit, lambda text: tgi_spans(endpoint, text), 'tgi')
+        if tokenizer == 'hf':
+            try:
+                return cls(limit, hf_spans_fn(info.get('model_id')), 'hf')
+            except Exception as e:
+                print(f'WARNING: cannot load the tokenizer of {info.get("model_id")} ({e}), '
+                      f'estimating token counts', file=sys.stderr)
+        return cls(limit)
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit is not None
+
+    def warm(self, text: str) -> None:
+        """Tokenize ``text`` once and cache the token count of every line."""
+        if text in self.warmed:
+            return
+        lines = text.split('\n')
+        counts = None
+        if self.spans is not None:
+            try:
+                starts = self.spans(text)
+                offsets = [0]
+                for line in lines[:-1]:
+                    offsets.append(offsets[-1] + len(line) + 1)
+                counts = [0] * len(lines)
+                for start in starts:
+                    counts[bisect.bisect_right(offsets, start) - 1] += 1
+            except Exception as e:
+                with self.lock:
+                    self.stats['tokenize_errors'] += 1
+                    if self.stats['tokenize_errors'] == 1:
+                        print(f'WARNING: tokenizing with {self.name} failed ({e}), estimating token counts',
+                              file=sys.stderr)
+                counts = None
+        with self.lock:
+            for i, line in enumerate(lines):
+                if counts is not None:
+                    # Lines that tokenize differently in different contexts keep the larger count
+                    self.line_tokens[line] = max(counts[i], self.line_tokens.get(line, 0))
+                else:
+                    self.line_tokens.setdefault(line, heuristic_count(line) + 1)
+            self.warmed.add(text)
+
+    def line_counts(self, text: str) -> List[int]:
+        counts = []
+        for line in text.split('\n'):
+            n = self.line_tokens.get(line)
+            counts.append(heuristic_count(line) + 1 if n is None else n)
+        return counts
+
+    def count(self, text: str) -> int:
+        return sum(self.line_counts(text)) if text else 0
+
+    def available(self) -> int:
+        return int(self.limit * (1 - MARGIN_RATIO)) - MARGIN_TOKENS
+
+    def fit(self, prefix: str, suffix: str = '', fixed: str = '') -> Tuple[str, str, dict]:
+        """Trim ``prefix`` from the top and ``suffix`` from the bottom to fit the budget.
+
+        ``fixed`` is the rest of the prompt (instructions, FIM tokens), which
+        is never trimmed. Returns the prompt prefix and suffix and the
+        meta-log entry.
+        """
+        if not self.enabled:
+            return prefix, suffix, {}
+        pre_counts = self.line_counts(prefix)
+        suf_counts = self.line_counts(suffix) if suffix else []
+        pre_tokens, suf_tokens = sum(pre_counts), sum(suf_counts)
+        total = pre_tokens + suf_tokens + self.count(fixed)
+        avail = self.available() - self.count(fixed)
+        meta = {'prompt_tokens': total, 'prompt_limit': self.limit, 'tokenizer': self.name, 'trimmed_tokens': 0}
+        with self.lock:
+            self.stats['prompts'] += 1
+        if pre_tokens + suf_tokens <= avail:
+            return prefix, suffix, meta
+
+        # Each side gets at least half of what is available, and whatever
+        # the other side does not need
+        half = max(avail, 0) // 2
+        if suf_tokens <= half:
+            pre_avail = max(avail, 0) - suf_tokens
+        elif pre_tokens <= half:
+            pre_avail = pre_tokens
+        else:
+            pre_avail = half
+        suf_avail = max(avail, 0) - min(pre_tokens, pre_avail)
+
+        pre_lines = prefix.split('\n')
+        start, kept = len(pre_lines), 0
+        while start > 0 and kept + pre_counts[start - 1] <= pre_avail:
+            start -= 1
+            kept += pre_counts[start]
+        new_prefix = '\n'.join(pre_lines[start:])
+        new_suffix = suffix
+        if suffix:
+            suf_lines = suffix.split('\n')
+            stop, kept_suf = 0, 0
+            while stop < len(suf_lines) and kept_suf + suf_counts[stop] <= suf_avail:
+                kept_suf += suf_counts[stop]
+                stop += 1
+            new_suffix = '\n'.join(suf_lines[:stop])
+        else:
+            kept_suf = 0
+        trimmed = pre_tokens + suf_tokens - kept - kept_suf
+        meta['prompt_tokens'] = total - trimmed
+        meta['trimmed_tokens'] = trimmed
+        meta['overflow_avoided'] = True
+        with self.lock:
+            self.stats['trimmed'] += 1
+            self.stats['trimmed_tokens'] += trimmed
+            if not new_prefix.strip():
+                self.stats['too_long'] += 1
+        return new_prefix, new_suffix, meta
+
+    def report(self, file=sys.stderr) -> None:
+        if not self.enabled or not self.stats['prompts']:
+            return
+        s = self.stats
+        print(f"Prompt budget ({self.name}, {self.limit} tokens): {s['trimmed']} of {s['prompts']} prompts "
+              f"trimmed to fit ({s['trimmed_tokens']} tokens of context dropped)", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the token counts of seeds against an endpoint\'s context window')
+    parser.add_argument('-e', '--endpoint', required=True, help='TGI endpoint')
+    parser.add_argument('-m', '--max-new-tokens', type=int, default=2048, help='Tokens requested per generation')
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default='tgi', help='How to count tokens')
+    parser.add_argument('files', nargs='+', help='Seed modules')
+    args = parser.parse_args()
+
+    import requests
+    info = requests.get(f'{args.endpoint}/info').json()
+    budget = PromptBudget.for_endpoint(args.endpoint, info, args.max_new_tokens, args.tokenizer)
+    print(f"limit: {budget.limit} prompt tokens ({budget.name})")
+    for path in args.files:
+        with open(path) as f:
+            text = f.read()
+        budget.warm(text)
+        print(f"{budget.count(text):>8} {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Protocol plugins for the seed compiler (seed_compiler.py).
+
+A plugin says how raw protocol seeds are turned into seed modules:
+
+  * ``splitter``: regex splitting a raw seed into messages,
+  * ``classify``: maps one message to its method / command name,
+  * ``known``: one canonical message per known method; methods that no seed
+    covers get a synthetic seed module, and ``<proto>_all.py`` lists them all,
+  * ``order``: canonical method order for the synthetic and all modules,
+  * ``separator``: written between (and after) the messages of a module,
+  * ``suffix``: appended to every message taken from a raw seed,
+  * ``volatile_headers`` / ``volatile_patterns``: fields that change between
+    otherwise equivalent messages (sequence numbers, session ids, lengths);
+    canonicalize_net.py blanks them out before deduplicating inputs.
+
+The tables used to live in the per-target ``preset/*/seed_gen_<proto>.py``
+scripts, which are now thin wrappers around the compiler.
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+class Protocol(NamedTuple):
+    name: str
+    splitter: bytes
+    classify: Callable[[bytes], str]
+    known: Dict[str, bytes]
+    order: List[str]
+    separator: bytes
+    suffix: bytes = b''
+    # Sort synthetic seeds by ``order`` (otherwise alphabetically)
+    ordered_synthetic: bool = True
+    # Also write <proto>_all.py with every known method in canonical order
+    all_module: bool = True
+    # Lower-case header names whose value is volatile
+    volatile_headers: Tuple[bytes, ...] = ()
+    # (regex, replacement) applied to every message
+    volatile_patterns: Tuple[Tuple[bytes, bytes], ...] = ()
+
+    def split(self, content: bytes) -> List[bytes]:
+        parts = re.split(self.splitter, content.strip())
+        return [p for p in parts if p.strip()]
+
+    def sort_methods(self, methods) -> List[str]:
+        if not self.ordered_synthetic:
+            return sorted(methods)
+        return sorted(methods, key=lambda m: self.order.index(m) if m in self.order else 999)
+
+    def canonical_methods(self) -> List[str]:
+        return list(self.order) + [m for m in self.known if m not in self.order]
+
+def first_token_method(payload: bytes) -> str:
+    """Request-line protocols (RTSP, SIP, FTP): an upper-case first word."""
+    try:
+        first_line = payload.split(b'\n', 1)[0]
+        method = first_line.split(b' ', 1)[0].decode('utf-8', errors='ignore')
+        if method.isupper() and method.isalpha():
+            return method
+    except Exception:
+        pass
+    return "UNKNOWN"
+
+# RTSP (live555)
+KNOWN_RTSP_COMMANDS = {
+    "OPTIONS": b"OPTIONS rtsp://127.0.0.1:8554/wavAudioTest RTSP/1.0\r\nCSeq: 1\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\n\r\n",
+    "DESCRIBE": b"DESCRIBE rtsp://127.0.0.1:8554/wavAudioTest RTSP/1.0\r\nCSeq: 2\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nAccept: application/sdp\r\n\r\n",
+    "SETUP": b"SETUP rtsp://127.0.0.1:8554/wavAudioTest/track1 RTSP/1.0\r\nCSeq: 3\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nTransport: RTP/AVP;unicast;client_port=8000-8001\r\n\r\n",
+    "PLAY": b"PLAY rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 4\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\nRange: npt=0.000-\r\n\r\n",
+    "PAUSE": b"PAUSE rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 5\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\n\r\n",
+    "TEARDOWN": b"TEARDOWN rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 6\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\n\r\n",
+    "GET_PARAMETER": b"GET_PARAMETER rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 7\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\n\r\n",
+    "SET_PARAMETER": b"SET_PARAMETER rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 8\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\nContent-Length: 20\r\n\r\nparam: value",
+    "ANNOUNCE": b"ANNOUNCE rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 9\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nContent-Type: application/sdp\r\nContent-Length: 20\r\n\r\nv=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=No Name\r\nc=IN IP4 127.0.0.1\r\nt=0 0\r\na=tool:libavformat 58.29.100\r\nm=audio 0 RTP/AVP 10\r\nb=AS:128\r\n",
+    "RECORD": b"RECORD rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 10\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nSession: 12345678\r\nRange: npt=0.000-\r\n\r\n",
+    "REDIRECT": b"REDIRECT rtsp://127.0.0.1:8554/wavAudioTest/ RTSP/1.0\r\nCSeq: 11\r\nUser-Agent: ./testRTSPClient (LIVE555 Streaming Media v2018.08.28)\r\nLocation: rtsp://127.0.0.1:8554/wavAudioTestNew/\r\n\r\n",
+}
+
+# Logical order for RTSP methods to maximize state transitions
+RTSP_METHOD_ORDER = [
+    "OPTIONS", "DESCRIBE", "ANNOUNCE", "SETUP", "PLAY", "RECORD", "PAUSE",
+    "GET_PARAMETER", "SET_PARAMETER", "TEARDOWN", "REDIRECT"
+]
+
+# FTP (proftpd, pureftpd)
+KNOWN_FTP_COMMANDS = {
+    # Access Control
+    "USER": b"USER anonymous",
+    "PASS": b"PASS anonymous@",
+    "ACCT": b"ACCT account",
+    "CWD":  b"CWD /",
+    "CDUP": b"CDUP",
+    "SMNT": b"SMNT /tmp",
+    "QUIT": b"QUIT",
+    "REIN": b"REIN",
+    # Transfer Parameters
+    "PORT": b"PORT 127,0,0,1,4,1",
+    "PASV": b"PASV",
+    "TYPE": b"TYPE I",
+    "STRU": b"STRU F",
+    "MODE": b"MODE S",
+    # FTP Service
+    "RETR": b"RETR file.txt",
+    "STOR": b"STOR file.txt",
+    "STOU": b"STOU file.txt",
+    "APPE": b"APPE file.txt",
+    "ALLO": b"ALLO 1024",
+    "REST": b"REST 0",
+    "RNFR": b"RNFR oldname",
+    "RNTO": b"RNTO newname",
+    "ABOR": b"ABOR",
+    "DELE": b"DELE file.txt",
+    "RMD":  b"RMD dir",
+    "MKD":  b"MKD dir",
+    "PWD":  b"PWD",
+    "LIST": b"LIST",
+    "NLST": b"NLST",
+    "SITE": b"SITE HELP",
+    "SYST": b"SYST",
+    "STAT": b"STAT",
+    "HELP": b"HELP",
+    "NOOP": b"NOOP",
+    # Extensions
+    "FEAT": b"FEAT",
+    "OPTS": b"OPTS UTF8 ON",
+    "MDTM": b"MDTM 20200101000000 file.txt",
+    "SIZE": b"SIZE file.txt",
+    "MLST": b"MLST /",
+    "MLSD": b"MLSD /",
+    # IPv6
+    "EPRT": b"EPRT |1|127.0.0.1|1024|",
+    "EPSV": b"EPSV",
+    # Security
+    "AUTH": b"AUTH TLS",
+    "PBSZ": b"PBSZ 0",
+    "PROT": b"PROT P",
+}
+
+# Logical order for FTP methods to maximize state transitions
+FTP_METHOD_ORDER = [
+    # Authentication
+    "USER", "PASS", "ACCT", "AUTH", "PBSZ", "PROT",
+    # Negotiation & Settings
+    "SYST", "FEAT", "OPTS", "TYPE", "STRU", "MODE",
+    # Navigation
+    "CWD", "PWD", "CDUP",
+    # Connection
+    "PORT", "PASV", "EPRT", "EPSV",
+    # Listing
+    "LIST", "NLST", "MLSD", "MLST",
+    # Transfer
+    "RETR", "STOR", "APPE", "STOU", "ALLO", "REST",
+    # File Ops
+    "RNFR", "RNTO", "DELE", "RMD", "MKD", "SIZE", "MDTM",
+    # Misc
+    "SITE", "HELP", "NOOP", "STAT",
+    # Exit
+    "QUIT", "ABOR"
+]
+
+# SIP (kamailio)
+# Standard SIP Methods (RFC 3261 and extensions)
+KNOWN_SIP_COMMANDS = {
+    "INVITE": b"INVITE sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1234\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 1 INVITE\r\nContact: <sip:user@127.0.0.1:5061>\r\nMax-Forwards: 70\r\nContent-Type: application/sdp\r\nContent-Length: 0\r\n\r\n",
+    "ACK": b"ACK sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1235\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 1 ACK\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "BYE": b"BYE sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1236\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 2 BYE\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "CANCEL": b"CANCEL sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1234\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 1 CANCEL\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "REGISTER": b"REGISTER sip:127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1237\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:user@127.0.0.1>\r\nCall-ID: 5678@127.0.0.1\r\nCSeq: 1 REGISTER\r\nContact: <sip:user@127.0.0.1:5061>\r\nMax-Forwards: 70\r\nExpires: 3600\r\nContent-Length: 0\r\n\r\n",
+    "OPTIONS": b"OPTIONS sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1238\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>\r\nCall-ID: 9012@127.0.0.1\r\nCSeq: 1 OPTIONS\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "INFO": b"INFO sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1239\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 3 INFO\r\nMax-Forwards: 70\r\nContent-Type: application/dtmf-relay\r\nContent-Length: 0\r\n\r\n",
+    "PRACK": b"PRACK sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1240\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 4 PRACK\r\nRAck: 1 1 INVITE\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "SUBSCRIBE": b"SUBSCRIBE sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1241\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>\r\nCall-ID: 3456@127.0.0.1\r\nCSeq: 1 SUBSCRIBE\r\nEvent: presence\r\nExpires: 600\r\nContact: <sip:user@127.0.0.1:5061>\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "NOTIFY": b"NOTIFY sip:user@127.0.0.1:5061 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5060;branch=z9hG4bK-1242\r\nFrom: <sip:service@127.0.0.1>;tag=2\r\nTo: <sip:user@127.0.0.1>;tag=1\r\nCall-ID: 3456@127.0.0.1\r\nCSeq: 1 NOTIFY\r\nEvent: presence\r\nSubscription-State: active\r\nMax-Forwards: 70\r\nContent-Type: application/pidf+xml\r\nContent-Length: 0\r\n\r\n",
+    "PUBLISH": b"PUBLISH sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1243\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>\r\nCall-ID: 7890@127.0.0.1\r\nCSeq: 1 PUBLISH\r\nEvent: presence\r\nExpires: 600\r\nMax-Forwards: 70\r\nContent-Type: application/pidf+xml\r\nContent-Length: 0\r\n\r\n",
+    "MESSAGE": b"MESSAGE sip:user@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1244\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:user@127.0.0.1>\r\nCall-ID: 1111@127.0.0.1\r\nCSeq: 1 MESSAGE\r\nMax-Forwards: 70\r\nContent-Type: text/plain\r\nContent-Length: 5\r\n\r\nHello",
+    "REFER": b"REFER sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1245\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 5 REFER\r\nRefer-To: <sip:other@127.0.0.1>\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+    "UPDATE": b"UPDATE sip:service@127.0.0.1:5060 SIP/2.0\r\nVia: SIP/2.0/UDP 127.0.0.1:5061;branch=z9hG4bK-1246\r\nFrom: <sip:user@127.0.0.1>;tag=1\r\nTo: <sip:service@127.0.0.1>;tag=2\r\nCall-ID: 1234@127.0.0.1\r\nCSeq: 6 UPDATE\r\nMax-Forwards: 70\r\nContent-Length: 0\r\n\r\n",
+}
+
+# Logical order for SIP methods to maximize state transitions
+# 1. Registration & Presence
+# 2. Standalone Messages
+# 3. Session Setup (INVITE)
+# 4. Session Manipulation (ACK, INFO, etc.)
+# 5. Session Teardown (BYE)
+SIP_METHOD_ORDER = [
+    "REGISTER", "SUBSCRIBE", "PUBLISH", "NOTIFY", "OPTIONS", "MESSAGE", # Non-session / Setup
+    "INVITE", "PRACK", "ACK", "UPDATE", "INFO", "REFER", "CANCEL",      # Active Session
+    "BYE"                                                               # Teardown
+]
+
+# SMTP (exim)
+# Standard SMTP Commands (RFC 5321 and extensions)
+KNOWN_SMTP_COMMANDS = {
+    # Session Initiation
+    "HELO": b"HELO localhost\r\n",
+    "EHLO": b"EHLO localhost\r\n",
+    
+    # Authentication & Security
+    "AUTH": b"AUTH PLAIN\r\n",
+    "STARTTLS": b"STARTTLS\r\n",
+    
+    # Mail Transaction
+    "MAIL": b"MAIL FROM:<sender@example.com>\r\n",
+    "RCPT": b"RCPT TO:<recipient@example.com>\r\n",
+    "DATA": b"DATA\r\nSubject: Test\r\n\r\nBody\r\n.\r\n",
+    "BDAT": b"BDAT 10 LAST\r\nHelloBDAT\r\n",
+    
+    # Reset & Verify
+    "RSET": b"RSET\r\n",
+    "VRFY": b"VRFY user\r\n",
+    "EXPN": b"EXPN list\r\n",
+    
+    # Info & Control
+    "HELP": b"HELP\r\n",
+    "NOOP": b"NOOP\r\n",
+    "QUIT": b"QUIT\r\n",
+}
+
+# Logical order for SMTP methods to maximize state transitions
+SMTP_METHOD_ORDER = [
+    "EHLO", "HELO", "STARTTLS", "AUTH",
+    "MAIL", "RCPT", "DATA", "BDAT",
+    "RSET", "VRFY", "EXPN", "HELP", "NOOP",
+    "QUIT"
+]
+
+def smtp_command(payload: bytes) -> str:
+    """SMTP commands are case-insensitive; only known commands are named."""
+    try:
+        first_line = payload.split(b'\n', 1)[0]
+        method = first_line.split(b' ', 1)[0].decode('utf-8', errors='ignore').upper().strip()
+        if method in KNOWN_SMTP_COMMANDS:
+            return method
+    except Exception:
+        pass
+    return "UNKNOWN"
+
+# DAAP and the JSON API (forked-daapd)
+KNOWN_DAAP_COMMANDS = {
+    # DAAP Protocol (DMAP)
+    "SERVER-INFO": b"GET /server-info HTTP/1.1\r\nHost: 127.0.0.1\r\nViewer-Only-Client: 1\r\n\r\n",
+    "CONTENT-CODES": b"GET /content-codes HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "LOGIN": b"GET /login HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "UPDATE": b"GET /update?session-id=1&revision-number=1 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "DATABASES": b"GET /databases?session-id=1&revision-number=1 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "DATABASE-ITEMS": b"GET /databases/1/items?session-id=1&revision-number=1 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "DATABASE-CONTAINERS": b"GET /databases/1/containers?session-id=1&revision-number=1 HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "RESOLVE": b"GET /resolve?session-id=1&revision-number=1&path=/ HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    
+    # JSON API (forked-daapd specific)
+    "API-CONFIG": b"GET /api/config HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "API-LIBRARY": b"GET /api/library/artists HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "API-PLAYBACK": b"PUT /api/player/play HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: 0\r\n\r\n",
+    "API-QUEUE": b"GET /api/queue HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+    "API-OUTPUTS": b"GET /api/outputs HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n",
+}
+
+# Logical order for DAAP methods to maximize state transitions
+DAAP_METHOD_ORDER = [
+    "SERVER-INFO", "CONTENT-CODES", "LOGIN", "UPDATE", 
+    "DATABASES", "DATABASE-ITEMS", "DATABASE-CONTAINERS", "RESOLVE",
+    "API-CONFIG", "API-OUTPUTS", "API-LIBRARY", "API-QUEUE", "API-PLAYBACK",
+]
+
+# Request path prefix -> command, first match wins
+DAAP_PATHS = [
+    ('/server-info', "SERVER-INFO"),
+    ('/content-codes', "CONTENT-CODES"),
+    ('/login', "LOGIN"),
+    ('/update', "UPDATE"),
+    ('/databases', "DATABASES"),
+    ('/resolve', "RESOLVE"),
+    ('/logout', "LOGOUT"),
+    ('/api/config', "API-CONFIG"),
+    ('/api/library', "API-LIBRARY"),
+    ('/api/player', "API-PLAYBACK"),
+    ('/api/queue', "API-QUEUE"),
+    ('/api/outputs', "API-OUTPUTS"),
+    ('/api/', "API-OTHER"),
+]
+
+def daap_command(payload: bytes) -> str:
+    """DAAP requests are all GETs, so they are told apart by their path."""
+    try:
+        parts = payload.split(b'\n', 1)[0].decode('utf-8', errors='ignore').split(' ')
+        if len(parts) >= 2:
+            path = parts[1]
+            if path.startswith('/databases') and 'items' in path:
+                return "DATABASE-ITEMS"
+            if path.startswith('/databases') and 'containers' in path:
+                return "DATABASE-CONTAINERS"
+            for prefix, command in DAAP_PATHS:
+                if path.startswith(prefix):
+                    return command
+    except Exception:
+        pass
+    return "UNKNOWN"
+
+MESSAGES = rb'(?:\r?\n){2,}'
+LINES = rb'(?:\r?\n)+'
+
+HTTP_LIKE_VOLATILE = (b'content-length', b'date')
+
+PROTOCOLS = {
+    'rtsp': Protocol('rtsp', MESSAGES, first_token_method, KNOWN_RTSP_COMMANDS, RTSP_METHOD_ORDER, b'\r\n\r\n',
+                     volatile_headers=HTTP_LIKE_VOLATILE + (b'cseq', b'session'),
+                     volatile_patterns=((rb'client_port=\d+-\d+', b'client_port=*'),)),
+    'ftp': Protocol('ftp', LINES, first_token_method, KNOWN_FTP_COMMANDS, FTP_METHOD_ORDER, b'\r\n',
+                    volatile_patterns=((rb'^(PORT|EPRT|REST|ALLO) .*$', rb'\1 *'),)),
+    'sip': Protocol('sip', MESSAGES, first_token_method, KNOWN_SIP_COMMANDS, SIP_METHOD_ORDER, b'\r\n\r\n',
+                    volatile_headers=HTTP_LIKE_VOLATILE + (b'cseq', b'call-id'),
+                    volatile_patterns=((rb';branch=[^;\s]+', b';branch=*'), (rb';tag=[^;\s>]+', b';tag=*'))),
+    'smtp': Protocol('smtp', LINES, smtp_command, KNOWN_SMTP_COMMANDS, SMTP_METHOD_ORDER, b'\r\n',
+                     suffix=b'\r\n', volatile_headers=(b'date', b'message-id')),
+    'daap': Protocol('daap', MESSAGES, daap_command, KNOWN_DAAP_COMMANDS, DAAP_METHOD_ORDER, b'\r\n\r\n',
+                     all_module=False, volatile_headers=HTTP_LIKE_VOLATILE,
+                     volatile_patterns=((rb'(session-id|revision-number|delta)=\d+', rb'\1=*'),)),
+}
+
+# Targets whose old seed_gen script differed from the shared plugin. The
+# modules are still named after the protocol (ftp_seeds_*.py, __ftp_gen__).
+# proftpd sorted the synthetic seeds alphabetically, pureftpd by FTP_METHOD_ORDER.
+PROTOCOLS['proftpd'] = PROTOCOLS['ftp']._replace(ordered_synthetic=False)
+
+def get(name: str) -> Protocol:
+    try:
+        return PROTOCOLS[name]
+    except KeyError:
+        raise ValueError(f"Unknown protocol {name!r} (known: {', '.join(sorted(PROTOCOLS))})")
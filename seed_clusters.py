@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate clusters of seeds by coverage, with MinHash and LSH.
+
+select_seeds_net.py merges seeds whose edge sets (edges plus ``__TRANS_``
+state transitions) are identical, then drops every seed whose edges are a
+subset of a larger one's, which is quadratic in the number of distinct
+edge sets. AFLNet queues hold thousands of entries that differ by an edge
+or two, so most of that work compares near-identical sets.
+
+Each seed's edge set is sketched with one-permutation MinHash (every edge
+hashed once into one of ``num_perm`` bins, empty bins filled from their
+neighbours), the sketches are split into LSH bands, and seeds sharing a band
+whose estimated Jaccard similarity reaches the threshold end up in one
+cluster. Only the cluster's representative (the smallest input, then the
+largest coverage) goes on to the exact selection. Edges that only a dropped
+member covered are lost, so thresholds below ~0.9 trade coverage for speed.
+
+select_seeds_net.py clusters with ``--cluster-threshold`` (default
+ELMFUZZ_CLUSTER_THRESHOLD; off when unset) and writes the clusters of the
+final elites to ``<elites>.clusters.json``. select_states_net.py --ss then
+keeps each cluster within one pool and gives the pools different clusters.
+
+    python seed_clusters.py gen3/logs/elites.json -t 0.8    # cluster sizes of the elites
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+CLUSTER_ENV = 'ELMFUZZ_CLUSTER_THRESHOLD'
+
+NUM_PERM = 128
+
+_MAX_HASH = (1 << 64) - 1
+_hash_cache: Dict[str, int] = {}
+
+def default_threshold() -> Optional[float]:
+    value = os.environ.get(CLUSTER_ENV, '')
+    return float(value) if value else None
+
+def clusters_path(elites_file: str) -> str:
+    return os.path.splitext(elites_file)[0] + '.clusters.json'
+
+def _hash(item: str) -> int:
+    # Stable across processes (unlike hash()); edges repeat across seeds, so cache them
+    h = _hash_cache.get(item)
+    if h is None:
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'little')
+        _hash_cache[item] = h
+    return h
+
+def minhash(items: Iterable[str], num_perm: int = NUM_PERM) -> Tuple[int, ...]:
+    """One-permutation MinHash signature of a set, densified by rotation."""
+    bins = [_MAX_HASH] * num_perm
+    for item in items:
+        h = _hash(item)
+        b = h % num_perm
+        v = h // num_perm
+        if v < bins[b]:
+            bins[b] = v
+    filled = [i for i, v in enumerate(bins) if v != _MAX_HASH]
+    if not filled:
+        return tuple(bins)
+    if len(filled) < num_perm:
+        # An empty bin takes the value of the next non-empty one, offset by the distance
+        nxt = filled[0] + num_perm
+        for i in range(num_perm - 1, -1, -1):
+            if bins[i] == _MAX_HASH:
+                bins[i] = bins[nxt % num_perm] + (nxt - i)
+            else:
+                nxt = i
+    return tuple(bins)
+
+def similarity(sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(sig1, sig2)) / len(sig1)
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """Bands and rows per band whose S-curve crosses 1/2 closest to the threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        # Similarity at which a pair becomes a candidate with probability 1/2
+        crossing = (1 - 0.5 ** (1 / bands)) ** (1 / rows)
+        # Err on the side of false positives: they are verified, misses are not
+        err = abs(crossing - threshold) + (0.05 if crossing > threshold else 0)
+        if best is None or err < best[0]:
+            best = (err, bands, rows)
+    return best[1], best[2]
+
+class _UnionFind:
+    def __init__(self, keys: Iterable[Hashable]):
+        self.parent = {k: k for k in keys}
+
+    def find(self, k: Hashable) -> Hashable:
+        while self.parent[k] != k:
+            self.parent[k] = self.parent[self.parent[k]]
+            k = self.parent[k]
+        return k
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+def cluster(edge_sets: Dict[str, Set[str]], threshold: float, num_perm: int = NUM_PERM) -> List[List[str]]:
+    """Clusters of keys whose edge sets are near-duplicates, largest first."""
+    signatures = {k: minhash(edges, num_perm) for k, edges in edge_sets.items()}
+    bands, rows = lsh_params(threshold, num_perm)
+    uf = _UnionFind(signatures)
+    for band in range(bands):
+        buckets: Dict[Tuple[int, ...], List[str]] = {}
+        for k, sig in signatures.items():
+            buckets.setdefault(sig[band * rows:(band + 1) * rows], []).append(k)
+        for members in buckets.values():
+            # Verify against the bucket's first member rather than all pairs
+            head = members[0]
+            for k in members[1:]:
+                if uf.find(k) != uf.find(head) and similarity(signatures[head], signatures[k]) >= threshold:
+                    uf.union(head, k)
+    groups: Dict[str, List[str]] = {}
+    for k in signatures:
+        groups.setdefault(uf.find(k), []).append(k)
+    return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g[0]))
+
+def representatives(seeds: Dict[str, Tuple[Set[str], int]], threshold: float,
+                    num_perm: int = NUM_PERM) -> Dict[str, Tuple[Set[str], int]]:
+    """One seed per cluster of ``seeds`` (key -> (edges, size)): the smallest, then the widest."""
+    clusters = cluster({k: edges for k, (edges, _) in seeds.items()}, threshold, num_perm)
+    kept = {}
+    for members in clusters:
+        best = min(members, key=lambda k: (seeds[k][1], -len(seeds[k][0]), k))
+        kept[best] = seeds[best]
+    return kept
+
+def write_clusters(path: str, clusters: List[List[str]], threshold: float) -> None:
+    data = {
+        'threshold': threshold,
+        'clusters': clusters,
+        'members': {k: i for i, members in enumerate(clusters) for k in members},
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+def load_clusters(path: str) -> Optional[Dict[str, int]]:
+    """Cluster id per seed key (``gen/state/filename``), or None without a clusters file."""
+    try:
+        with open(path) as f:
+            return json.load(f)['members']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def elite_edge_sets(elites_data: dict) -> Dict[str, Set[str]]:
+    """Edge sets of an elites.json (gen -> state -> filename -> [edges, size]) by ``gen/state/filename``."""
+    sets = {}
+    for gen, states in elites_data.items():
+        for state, files in states.items():
+            for filename, val in files.items():
+                edges = val[0] if isinstance(val, list) and len(val) == 2 and isinstance(val[1], (int, float)) else val
+                sets[f'{gen}/{state}/{filename}'] = set(edges)
+    return sets
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster the elites of a generation by coverage')
+    parser.add_argument('elites', help='elites.json written by select_seeds_net.py')
+    parser.add_argument('-t', '--threshold', type=float, default=default_threshold() or 0.8,
+                        help='Jaccard similarity threshold')
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM)
+    parser.add_argument('-o', '--output', default=None, help='Write the clusters to this file')
+    args = parser.parse_args()
+
+    with open(args.elites) as f:
+        sets = elite_edge_sets(json.load(f))
+    clusters = cluster(sets, args.threshold, args.num_perm)
+    bands, rows = lsh_params(args.threshold, args.num_perm)
+    print(f"{len(sets)} seeds in {len(clusters)} clusters (threshold {args.threshold}, "
+          f"{bands} bands x {rows} rows)", file=sys.stderr)
+    for members in clusters:
+        if len(members) > 1:
+            print(f"  {len(members):5d}  {members[0]}")
+    if args.output:
+        write_clusters(args.output, clusters, args.threshold)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Compile raw protocol seeds into seed modules.
+
+Every raw seed ``<stem>.<ext>`` of a state pool becomes a module
+``<proto>_seeds_<stem>.py`` with one function per message, followed by the
+``__<proto>_gen__`` driver that writes the messages out again:
+
+    def seed_000_OPTIONS(): return b'OPTIONS rtsp://... RTSP/1.0\\r\\n...'
+    def seed_001_DESCRIBE(): return b'DESCRIBE rtsp://... RTSP/1.0\\r\\n...'
+
+    def __rtsp_gen__(rng, f):
+        ...
+
+    __message_table__ = tuple(sorted(...))  # the functions above the driver
+
+``__message_table__`` is the ordered tuple of message functions: every
+function defined above the driver, by line number, resolved once when the
+module is imported. It is built from the module's own functions, not from
+a list the compiler writes out, because mutation renames, drops and adds
+them (lmsplice joins the prefix of one seed to the suffix of another); the
+functions an LLM adds are written like the compiled ones. The driver joins
+their messages into one buffer and writes it with a single call
+(driver_net.py runs it thousands of times per variant); driver_net.py's
+fallback for modules without the driver reads the same table.
+
+Known methods that no seed covers go to ``<proto>_seeds_synthetic.py`` and,
+for most protocols, ``<proto>_all.py`` lists every known method in canonical
+order. The protocol specifics (splitting, method names, canonical messages)
+are plugins in protocols.py; ``preset/*/seed_gen_<proto>.py`` just call
+``main()`` with their protocol.
+
+Compilation is incremental: ``<output>/.seed_compiler.json`` records the
+content hash of every raw seed, so a seed that has not changed since the
+last run into the same directory is skipped, and unchanged module files are
+not rewritten. Across directories (the next generation, the next model),
+compiled seeds are shared through a content-addressed cache directory
+(``--cache``, default ``$ELMFUZZ_SEED_CACHE``).
+
+Several pools can be compiled by one process, in parallel:
+
+    python seed_compiler.py -p rtsp --input-root gen3/seeds --output-root gen3/variants \\
+        --pools 0000 0001 0002 -j 4
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import protocols
+from protocols import Protocol
+
+# Bump when the compiled functions or the module layout change, to invalidate
+# the manifests and caches
+VERSION = 4
+MANIFEST = '.seed_compiler.json'
+CACHE_ENV = 'ELMFUZZ_SEED_CACHE'
+FORMATS = ['compact', 'legacy']
+
+def func_name(*parts) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(str(p) for p in parts))
+
+def message_function(name: str, payload: bytes) -> str:
+    return f"def {name}(): return {repr(payload)}"
+
+def driver_code(proto: Protocol, fmt: str) -> str:
+    """The ``__<proto>_gen__`` driver: writes every function defined above it."""
+    gen = f'__{proto.name}_gen__'
+    sep = repr(proto.separator)
+    if fmt == 'legacy':
+        # Byte for byte what the old seed_gen_<proto>.py scripts wrote
+        return (
+            f"def {gen}(rng, f):\n"
+            "    try:\n"
+            "        g = globals()\n"
+            "        funcs = []\n"
+            f"        this_lineno = {gen}.__code__.co_firstlineno\n"
+            "        for name, obj in g.items():\n"
+            "            if callable(obj) and hasattr(obj, '__module__') and obj.__module__ == __name__:\n"
+            "                 if hasattr(obj, '__code__') and obj.__code__.co_firstlineno < this_lineno:\n"
+            "                     funcs.append(obj)\n"
+            "        funcs.sort(key=lambda f: f.__code__.co_firstlineno)\n"
+            "        for i, func in enumerate(funcs):\n"
+            "            try:\n"
+            "                f.write(func())\n"
+            "                # Add separator between requests\n"
+            "                if i < len(funcs) - 1:\n"
+            f"                    f.write({sep})\n"
+            "            except Exception:\n"
+            "                pass\n"
+            "        # Ensure file ends with newline\n"
+            f"        f.write({sep})\n"
+            "    except Exception:\n"
+            "        pass\n"
+        )
+    # The message table is resolved once, when the module is imported; it
+    # picks up functions added above the driver by mutation as well
+    return (
+        f"def {gen}(rng, f):\n"
+        "    parts = []\n"
+        "    for func in __message_table__:\n"
+        "        try:\n"
+        "            part = func()\n"
+        "        except Exception:\n"
+        "            continue\n"
+        "        if isinstance(part, (bytes, bytearray)):\n"
+        "            parts.append(part)\n"
+        f"    f.write({sep}.join(parts) + {sep})\n"
+        "\n"
+        "__message_table__ = tuple(sorted(\n"
+        "    (obj for obj in list(globals().values()) if callable(obj) and getattr(obj, '__module__', None) == __name__\n"
+        f"     and getattr(getattr(obj, '__code__', None), 'co_firstlineno', 0) < {gen}.__code__.co_firstlineno),\n"
+        "    key=lambda func: func.__code__.co_firstlineno))\n"
+    )
+
+def render_module(proto: Protocol, fmt: str, funcs: List[str], raw_name: str) -> str:
+    gen = f'__{proto.name}_gen__'
+    content = "import os\n\n"
+    content += "\n".join(funcs)
+    content += "\n\n"
+    content += driver_code(proto, fmt)
+    content += "\n"
+    content += "def main():\n"
+    if fmt == 'legacy':
+        content += f'    with open("{raw_name}", "wb") as f:\n'
+        content += '        with open("/dev/urandom", "rb") as rng:\n'
+        content += f'            {gen}(rng, f)\n'
+    else:
+        content += f'    with open("{raw_name}", "wb") as f, open("/dev/urandom", "rb") as rng:\n'
+        content += f'        {gen}(rng, f)\n'
+    content += "\nif __name__ == '__main__':\n    main()\n"
+    return content
+
+def compile_seed(proto: Protocol, raw_name: str, content: bytes) -> Tuple[List[str], List[str]]:
+    """Message functions and methods of one raw seed."""
+    stem = os.path.splitext(raw_name)[0]
+    funcs, methods = [], []
+    for idx, part in enumerate(proto.split(content)):
+        method = proto.classify(part)
+        methods.append(method)
+        funcs.append(message_function(func_name(stem, f'{idx:03d}', method), part + proto.suffix))
+    return funcs, methods
+
+def write_if_changed(path: str, text: str) -> bool:
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+class SeedCache:
+    """Content-addressed store of compiled seeds, shared between runs."""
+
+    def __init__(self, root: Optional[str]):
+        self.root = root
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.json')
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.root:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: dict) -> None:
+        if not self.root:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Several pools may compile the same seed at once
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+def seed_key(proto: Protocol, raw_name: str, content: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(f'{VERSION}\0{proto.name}\0{proto.splitter!r}\0{proto.suffix!r}\0{raw_name}\0'.encode())
+    h.update(content)
+    return h.hexdigest()
+
+def load_manifest(output_dir: str, proto: Protocol, fmt: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != VERSION or manifest.get('protocol') != proto.name \
+            or manifest.get('format') != fmt:
+        return {}
+    return manifest
+
+def compile_dir(proto: Protocol, seeds_dir: str, output_dir: str, fmt: str = 'compact',
+                cache_dir: Optional[str] = None) -> Dict[str, int]:
+    """Compile all raw seeds of ``seeds_dir`` into modules in ``output_dir``."""
+    try:
+        os.makedirs(seeds_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating directories: {e}", file=sys.stderr)
+        sys.exit(1)
+    cache = SeedCache(cache_dir)
+    old = load_manifest(output_dir, proto, fmt)
+    old_seeds = old.get('seeds', {})
+    seeds = {}
+    stats = {'seeds': 0, 'compiled': 0, 'cached': 0, 'unchanged': 0, 'written': 0, 'removed': 0}
+
+    # Deterministic order, as the function names and synthetic seeds depend on it
+    raw_files = [os.path.basename(p) for p in sorted(glob.glob(os.path.join(seeds_dir, "*")))
+                 if os.path.isfile(p)]
+    seen_methods = set()
+    for raw_name in raw_files:
+        stats['seeds'] += 1
+        with open(os.path.join(seeds_dir, raw_name), 'rb') as f:
+            content = f.read()
+        key = seed_key(proto, raw_name, content)
+        module = f"{proto.name}_seeds_{os.path.splitext(raw_name)[0]}.py"
+        module_path = os.path.join(output_dir, module)
+        prev = old_seeds.get(raw_name)
+        if prev is not None and prev['key'] == key and os.path.exists(module_path):
+            stats['unchanged'] += 1
+            methods = prev['methods']
+        else:
+            compiled = cache.get(key)
+            if compiled is None:
+                funcs, methods = compile_seed(proto, raw_name, content)
+                cache.put(key, {'funcs': funcs, 'methods': methods})
+                stats['compiled'] += 1
+            else:
+                funcs, methods = compiled['funcs'], compiled['methods']
+                stats['cached'] += 1
+            if write_if_changed(module_path, render_module(proto, fmt, funcs, raw_name)):
+                stats['written'] += 1
+        seen_methods.update(methods)
+        seeds[raw_name] = {'key': key, 'module': module, 'methods': methods}
+
+    extra = []
+    # Generate synthetic seeds for missing methods
+    missing_methods = set(proto.known) - seen_methods
+    if missing_methods:
+        print(f"Adding synthetic seeds for missing methods: {proto.sort_methods(missing_methods)}")
+        funcs = [message_function(func_name('synthetic_000', m), proto.known[m])
+                 for m in proto.sort_methods(missing_methods)]
+        module = f"{proto.name}_seeds_synthetic.py"
+        if write_if_changed(os.path.join(output_dir, module), render_module(proto, fmt, funcs, "synthetic.raw")):
+            stats['written'] += 1
+        extra.append(module)
+
+    if proto.all_module:
+        # Prefix to keep the canonical order in __<proto>_gen__
+        funcs = [message_function(func_name(f'order_{i:03d}', m), proto.known[m])
+                 for i, m in enumerate(proto.canonical_methods()) if m in proto.known]
+        module = f"{proto.name}_all.py"
+        if write_if_changed(os.path.join(output_dir, module),
+                            render_module(proto, fmt, funcs, f"{proto.name}_all.raw")):
+            stats['written'] += 1
+        extra.append(module)
+
+    # Modules this compiler wrote earlier whose raw seed is gone
+    current = {s['module'] for s in seeds.values()} | set(extra)
+    previous = {s['module'] for s in old_seeds.values()} | set(old.get('extra', []))
+    for module in sorted(previous - current):
+        try:
+            os.remove(os.path.join(output_dir, module))
+            stats['removed'] += 1
+        except FileNotFoundError:
+            pass
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump({'version': VERSION, 'protocol': proto.name, 'format': fmt,
+                   'seeds': seeds, 'extra': extra}, f, indent=1)
+    return stats
+
+def _compile_job(job):
+    proto, seeds_dir, output_dir, fmt, cache_dir = job
+    return output_dir, compile_dir(proto, seeds_dir, output_dir, fmt, cache_dir)
+
+def compile_pools(proto: Protocol, pairs: List[Tuple[str, str]], fmt: str = 'compact',
+                  cache_dir: Optional[str] = None, jobs: int = 1) -> Dict[str, Dict[str, int]]:
+    """Compile several (seeds_dir, output_dir) pairs, ``jobs`` at a time."""
+    work = [(proto, s, o, fmt, cache_dir) for s, o in pairs]
+    if jobs <= 1 or len(work) <= 1:
+        return dict(_compile_job(job) for job in work)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+        return dict(pool.map(_compile_job, work))
+
+def main(protocol: Optional[Protocol] = None, argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Compile raw protocol seeds into seed modules')
+    parser.add_argument('-p', '--protocol', default=None, required=protocol is None,
+                        choices=sorted(protocols.PROTOCOLS), help='Protocol of the seeds')
+    parser.add_argument('--input_seeds', default='seeds', help='Input seeds directory')
+    parser.add_argument('--init_variants', default='initial/variants', help='Output python file directory')
+    parser.add_argument('--pools', nargs='+', default=None,
+                        help='Compile <input-root>/<pool> into <output-root>/<pool> for each pool')
+    parser.add_argument('--input-root', default=None, help='Parent directory of the pools\' raw seeds')
+    parser.add_argument('--output-root', default=None, help='Parent directory of the pools\' seed modules')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Pools compiled in parallel')
+    parser.add_argument('--format', choices=FORMATS, default='compact',
+                        help='compact modules, or exactly what the old seed_gen scripts wrote')
+    parser.add_argument('--cache', default=os.environ.get(CACHE_ENV),
+                        help=f'Compiled-seed cache shared between runs (default: ${CACHE_ENV})')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not print per-pool statistics')
+    args = parser.parse_args(argv)
+
+    proto = protocols.get(args.protocol) if args.protocol else protocol
+    if args.pools:
+        if not args.input_root or not args.output_root:
+            parser.error('--pools needs --input-root and --output-root')
+        pairs = [(os.path.join(args.input_root, p), os.path.join(args.output_root, p)) for p in args.pools]
+    else:
+        pairs = [(args.input_seeds, args.init_variants)]
+    results = compile_pools(proto, pairs, args.format, args.cache, args.jobs)
+    if not args.quiet:
+        for output_dir, stats in results.items():
+            print(f"{output_dir}: {stats['seeds']} seeds, {stats['compiled']} compiled, "
+                  f"{stats['cached']} cached, {stats['unchanged']} unchanged, "
+                  f"{stats['written']} modules written", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
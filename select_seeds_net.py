@@ -5,8 +5,10 @@ import os
 import time
 from typing import Union, Literal, Optional
 import random
-from tqdm import tqdm
 import heapq
+import telemetry
+import seed_clusters
+from util import max_elites_for
 
 MODEL = 'CodeLlama-13b-hf'
 
@@ -37,6 +39,8 @@ def greedy_search(set_family: list[tuple[str, set[str], int]], num: int, baselin
         # We use key as tie breaker for stability
         heapq.heappush(pq, (-gain, size, key, edges))
         
+    # Only here: with -u the ILP usually selects and tqdm is never needed
+    from tqdm import tqdm
     for _ in tqdm(range(num), desc='Greedy Selecting'):
         if not pq:
             break
@@ -200,16 +204,15 @@ def extract_state_pseudo_edges(filename: str) -> set[str]:
 @click.option('--output-elite-file', '-o', 'output_elite_file', type=click.Path(writable=True, dir_okay=False), help='Elite seeds file')
 @click.option('--baseline', '-b', type=click.Path(exists=False), default=None)
 @click.option('--use-ilp', '-u', is_flag=True, help='Use ILP to find the minimum set of seeds covering all edges')
-def main(generation: str, current_covfile, max_elites: int, input_elite_file, output_elite_file, baseline, use_ilp):
-    if generation.startswith('gen'):
-        try:
-            gen_num = int(generation[3:])
-            initial_max_elites = max_elites
-            harmonic_sum = sum(1/i for i in range(1, gen_num + 1))
-            max_elites = int(initial_max_elites * (1 + harmonic_sum))
-            print(f"DEBUG: Adjusted max_elites to {max_elites} for generation {generation} (Harmonic factor: {1 + harmonic_sum:.2f})", file=sys.stderr)
-        except ValueError:
-            pass
+@click.option('--cluster-threshold', type=float, default=seed_clusters.default_threshold(),
+              help='Keep one seed per cluster of near-duplicate coverage (MinHash Jaccard >= this) '
+                   'before the subset filter; see seed_clusters.py')
+def main(generation: str, current_covfile, max_elites: int, input_elite_file, output_elite_file, baseline, use_ilp,
+         cluster_threshold):
+    if max_elites_for(generation, max_elites) != max_elites:
+        initial_max_elites = max_elites
+        max_elites = max_elites_for(generation, initial_max_elites)
+        print(f"DEBUG: Adjusted max_elites to {max_elites} for generation {generation} (Harmonic factor: {max_elites / initial_max_elites:.2f})", file=sys.stderr)
 
     if generation == 'initial':
         coverage_raw = dict()
@@ -419,6 +422,12 @@ def main(generation: str, current_covfile, max_elites: int, input_elite_file, ou
     for descendant_edges, (descendant_key, descendant_size) in elite_filtering_record.items():
         filtered_descendants0[descendant_key] = (set(descendant_edges), descendant_size)
 
+    if cluster_threshold is not None:
+        num_distinct = len(filtered_descendants0)
+        filtered_descendants0 = seed_clusters.representatives(filtered_descendants0, cluster_threshold)
+        print(f"DEBUG: Clustered {num_distinct} distinct coverage sets into {len(filtered_descendants0)} "
+              f"(threshold {cluster_threshold})", file=sys.stderr)
+
     # Optimized filtering 1
     sorted_candidates = sorted(
         filtered_descendants0.items(),
@@ -672,6 +681,8 @@ def main(generation: str, current_covfile, max_elites: int, input_elite_file, ou
 
     end_time = time.time()
     print(f'Selection time: {end_time - start_time:.4f} seconds', file=sys.stderr)
+    telemetry.record('select_seeds', start_time, end_time, items=len(new_elites),
+                     max_elites=max_elites, use_ilp=use_ilp, cluster_threshold=cluster_threshold)
     
     final_output = {}
     for key, (edges, size) in new_elites.items():
@@ -696,6 +707,11 @@ def main(generation: str, current_covfile, max_elites: int, input_elite_file, ou
         
     with open(output_elite_file, 'w') as f:
         f.write(json.dumps(final_output))
+
+    if cluster_threshold is not None:
+        # For select_states_net.py, which spreads the clusters over the pools
+        clusters = seed_clusters.cluster(seed_clusters.elite_edge_sets(final_output), cluster_threshold)
+        seed_clusters.write_clusters(seed_clusters.clusters_path(output_elite_file), clusters, cluster_threshold)
     
     for elite_key, (elite_edges, _) in sorted(new_elites.items(), key=lambda item: (len(item[1][0]), -item[1][1])):
         try:
@@ -5,6 +5,8 @@ import shutil
 import subprocess
 import sys
 import math
+import telemetry
+import seed_clusters
 
 def get_state_pools():
     try:
@@ -65,7 +67,11 @@ def resolve_gen_dir(elmfuzz_rundir, gen_name):
             
     return gen_name # Default fallback
 
-def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
+def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir, seeds_root=None, log_dir=None):
+    if seeds_root is None:
+        seeds_root = os.path.join(elmfuzz_rundir, gen, 'seeds')
+    if log_dir is None:
+        log_dir = os.path.join(elmfuzz_rundir, gen, 'logs')
     print(f"Loading coverage file: {cov_file}")
     with open(cov_file, 'r') as f:
         cov_data = json.load(f)
@@ -108,7 +114,7 @@ def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
         return global_seed_map.get(seed_prefix)
 
     # 1. Copy Elite Seeds to 0000
-    dest_0000 = os.path.join(elmfuzz_rundir, gen, 'seeds', '0000')
+    dest_0000 = os.path.join(seeds_root, '0000')
     os.makedirs(dest_0000, exist_ok=True)
     
     elite_seeds_copied = []
@@ -138,7 +144,7 @@ def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
     print(f"Copied {len(elite_seeds_copied)} elite seeds to {dest_0000}")
 
     # 2. Identify Missing Transitions and Copy to respective pools
-    dest_0001 = os.path.join(elmfuzz_rundir, gen, 'seeds', '0001')
+    dest_0001 = os.path.join(seeds_root, '0001')
     os.makedirs(dest_0001, exist_ok=True)
 
     # Calculate generation string for JSON lookup (e.g., gen2 -> 1)
@@ -235,7 +241,7 @@ def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
             chunk_size = math.ceil(num_seeds / num_targets)
             
             for i, pool in enumerate(target_pools):
-                dest_pool = os.path.join(elmfuzz_rundir, gen, 'seeds', pool)
+                dest_pool = os.path.join(seeds_root, pool)
                 os.makedirs(dest_pool, exist_ok=True)
                 
                 start_idx = i * chunk_size
@@ -258,7 +264,6 @@ def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
         print("No other state pools to distribute to.")
 
     # 4. Write selection results to log file
-    log_dir = os.path.join(elmfuzz_rundir, gen, 'logs')
     os.makedirs(log_dir, exist_ok=True)
     state_log_path = os.path.join(log_dir, 'state.log')
     
@@ -281,7 +286,11 @@ def select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir):
         else:
             f.write("No distribution performed.\n")
 
-def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
+def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir, seeds_root=None, log_dir=None):
+    if seeds_root is None:
+        seeds_root = os.path.join(elmfuzz_rundir, gen, 'seeds')
+    if log_dir is None:
+        log_dir = os.path.join(elmfuzz_rundir, gen, 'logs')
     print(f"Loading coverage file: {cov_file}")
     with open(cov_file, 'r') as f:
         cov_data = json.load(f)
@@ -324,7 +333,7 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
         return global_seed_map.get(seed_prefix)
 
     # 1. Identify and Copy Elite Seeds (Pool 0000)
-    dest_0000 = os.path.join(elmfuzz_rundir, gen, 'seeds', '0000')
+    dest_0000 = os.path.join(seeds_root, '0000')
     os.makedirs(dest_0000, exist_ok=True)
     
     elite_seeds_info = [] # List of {'path': str, 'transitions': set(), 'name': str}
@@ -360,7 +369,8 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
                         'path': src_path,
                         'name': seed_name_full,
                         'transitions': transitions,
-                        'origin_gen': prev_gen
+                        'origin_gen': prev_gen,
+                        'key': f"{prev_gen}/{state_pool}/{filename_key}"
                     })
                     
                     shutil.copy(src_path, dest_0000)
@@ -436,7 +446,7 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
     
     if seeds_to_rescue:
         # Case A: Missing transitions exist -> 0001 gets rescue seeds
-        dest_0001 = os.path.join(elmfuzz_rundir, gen, 'seeds', '0001')
+        dest_0001 = os.path.join(seeds_root, '0001')
         os.makedirs(dest_0001, exist_ok=True)
         for src_path in seeds_to_rescue:
             shutil.copy(src_path, dest_0001)
@@ -469,18 +479,22 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
         
         print(f"Distributing {num_seeds} elite seeds to {num_pools} pools: {dist_pools}")
         
-        # Split into chunks (Slicing instead of Round Robin)
-        chunk_size = math.ceil(num_seeds / num_pools)
+        # Near-duplicate clusters from select_seeds_net.py --cluster-threshold
+        cluster_of = seed_clusters.load_clusters(seed_clusters.clusters_path(elites_file))
+        if cluster_of is not None:
+            chunks = distribute_clusters(sorted_elites, cluster_of, num_pools)
+            print(f"Keeping {len(set(cluster_of.get(s['key'], s['key']) for s in sorted_elites))} coverage clusters within pools.")
+        else:
+            # Split into chunks (Slicing instead of Round Robin)
+            chunk_size = math.ceil(num_seeds / num_pools)
+            chunks = [sorted_elites[i * chunk_size:min((i + 1) * chunk_size, num_seeds)] for i in range(num_pools)]
         
         distribution_results = {}
 
         for i, pool in enumerate(dist_pools):
-            start_idx = i * chunk_size
-            end_idx = min((i + 1) * chunk_size, num_seeds)
-            
-            chunk = sorted_elites[start_idx:end_idx]
+            chunk = chunks[i]
             
-            dest_pool = os.path.join(elmfuzz_rundir, gen, 'seeds', pool)
+            dest_pool = os.path.join(seeds_root, pool)
             os.makedirs(dest_pool, exist_ok=True)
             
             distribution_results[pool] = []
@@ -495,7 +509,6 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
         distribution_results = {}
 
     # 5. Write selection results to log file
-    log_dir = os.path.join(elmfuzz_rundir, gen, 'logs')
     os.makedirs(log_dir, exist_ok=True)
     state_log_path = os.path.join(log_dir, 'state.log')
     
@@ -519,6 +532,22 @@ def select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir):
         else:
             f.write("No distribution performed.\n")
 
+def distribute_clusters(sorted_elites, cluster_of, num_pools):
+    """
+    Split the elites (sorted by rarity) into ``num_pools`` chunks, each
+    cluster of near-duplicates whole: clusters are taken rarest first and go
+    to the pool with the fewest seeds, so pools explore different coverage.
+    Elites without a cluster are clusters of their own.
+    """
+    clusters = {}
+    for seed in sorted_elites:
+        clusters.setdefault(cluster_of.get(seed['key'], seed['key']), []).append(seed)
+    chunks = [[] for _ in range(num_pools)]
+    # Dicts keep insertion order, so the first cluster holds the rarest seed
+    for members in clusters.values():
+        min(chunks, key=len).extend(members)
+    return chunks
+
 def get_all_aflnet_dirs(elmfuzz_rundir):
     dirs = []
     # Search in root aflnetout
@@ -562,17 +591,22 @@ def get_all_aflnet_dirs(elmfuzz_rundir):
 @click.option('--gen', '-g', type=str, required=True, help='Next generation name')
 @click.option('--noss', is_flag=True, default=False, help='Use current state selection algorithm')
 @click.option('--ss', '-ss', is_flag=True, default=False, help='Use new state selection algorithm')
-def main(cov_file, elites_file, gen, noss, ss):
+@click.option('--seeds-root', type=click.Path(file_okay=False), default=None,
+              help='Directory to create the state pools in (default: $ELMFUZZ_RUNDIR/<gen>/seeds)')
+@click.option('--log-dir', type=click.Path(file_okay=False), default=None,
+              help='Directory for state.log (default: $ELMFUZZ_RUNDIR/<gen>/logs)')
+def main(cov_file, elites_file, gen, noss, ss, seeds_root, log_dir):
     elmfuzz_rundir = os.environ.get('ELMFUZZ_RUNDIR')
     if not elmfuzz_rundir:
         print("Error: ELMFuzz_RUNDIR environment variable not set.", file=sys.stderr)
         sys.exit(1)
 
-    if ss:
-        select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir)
-    else:
-        # Default to noss if not specified or if noss is specified
-        select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir)
+    with telemetry.span('select_states', mode='ss' if ss else 'noss'):
+        if ss:
+            select_states_ss(cov_file, elites_file, gen, elmfuzz_rundir, seeds_root, log_dir)
+        else:
+            # Default to noss if not specified or if noss is specified
+            select_states_noss(cov_file, elites_file, gen, elmfuzz_rundir, seeds_root, log_dir)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Batch shrinking of generated variants.
+
+LLMs tend to insert lengthy functions that are unreachable from the entry
+point; removing them makes the generator modules import faster and the next
+generation's prompts cheaper. shrink_variant.py did this one file (and one
+``elmconfig.py`` lookup, and one interpreter) at a time. Here the entry
+point is looked up once and files are shrunk in a process pool:
+
+    python shrink_batch.py -f __rtsp_gen__ gen3/variants/0001/      # a directory
+    genvariants_parallel_net.py ... | python shrink_batch.py --stream | genoutputs_net.py ...
+
+The roots of the reachability analysis are the entry function, everything
+referenced by module-level statements (``main()`` under ``__main__``) and,
+when the entry is a table driver as written by seed_compiler.py (it uses
+``__message_table__`` or ``globals()``), every function defined above it:
+those are the messages it writes, including the ones mutation added.
+Only top-level functions are removed; a module nothing can be removed from
+is left untouched.
+
+Reachability is cached by AST hash, and ``.shrink_cache.json`` in each
+directory records the digest of every shrunk file, so files that have not
+changed since are skipped without parsing.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import ast_comments
+
+CACHE_FILE = '.shrink_cache.json'
+SHRINK_ENV = 'ELMFUZZ_SHRINK'
+TABLE_NAMES = {'__message_table__', 'globals'}
+
+# AST hash -> names of the reachable functions
+_REACHABLE: Dict[str, FrozenSet[str]] = {}
+
+def shrink_enabled() -> bool:
+    return os.environ.get(SHRINK_ENV, '1') != '0'
+
+def referenced_names(node) -> set:
+    """Names a piece of code calls or otherwise refers to."""
+    names = set()
+    for n in ast.walk(node):
+        if isinstance(n, ast.Name):
+            names.add(n.id)
+        elif isinstance(n, ast.Attribute):
+            names.add(n.attr)
+    return names
+
+def reachable_functions(tree: ast.Module, entry_point: str) -> FrozenSet[str]:
+    funcs = {n.name: n for n in tree.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    roots = {entry_point}
+    for stmt in tree.body:
+        if not isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            roots |= referenced_names(stmt)
+    entry = funcs.get(entry_point)
+    if entry is not None and (referenced_names(entry) | roots) & TABLE_NAMES:
+        roots |= {name for name, f in funcs.items() if f.lineno < entry.lineno}
+    reachable = set()
+    worklist = [name for name in roots if name in funcs]
+    while worklist:
+        name = worklist.pop()
+        if name in reachable:
+            continue
+        reachable.add(name)
+        worklist += [n for n in referenced_names(funcs[name]) if n in funcs and n not in reachable]
+    return frozenset(reachable)
+
+def tidy(src: str) -> str:
+    """Blank-line fixups around comments after unparsing (as shrink_variant.py did)."""
+    lines = src.splitlines()
+    new_lines = []
+    for i, l in enumerate(lines):
+        if l.strip().startswith('#') and i >= 1 and lines[i - 1].strip() and not lines[i - 1].strip().startswith('#'):
+            new_lines.append('')
+        if not l.strip() and i >= 1 and lines[i - 1].strip().startswith('#'):
+            continue
+        new_lines.append(l)
+    return '\n'.join(new_lines)
+
+def shrink_source(src: str, entry_point: str) -> Optional[str]:
+    """The shrunk source, or None if nothing can be removed (or it does not parse)."""
+    try:
+        tree = ast.parse(src)
+    except SyntaxError:
+        return None
+    key = hashlib.sha1(f'{entry_point}\0{ast.dump(tree)}'.encode()).hexdigest()
+    reachable = _REACHABLE.get(key)
+    if reachable is None:
+        reachable = _REACHABLE[key] = reachable_functions(tree, entry_point)
+    unreachable = {n.name for n in tree.body
+                   if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name not in reachable}
+    if not unreachable:
+        return None
+    # Re-parse with comments, which the plain AST drops
+    tree = ast_comments.parse(src)
+    tree.body = [n for n in tree.body
+                 if not (isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name in unreachable)]
+    return tidy(ast_comments.unparse(tree))
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+def shrink_file(path: str, entry_point: str, known_digest: Optional[str] = None) -> Tuple[str, str, int, int]:
+    """Shrink one file in place: (path, status, size before, size after).
+
+    ``known_digest`` is the digest recorded the last time the file was
+    shrunk; if the file still has it, it is skipped.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if known_digest is not None and file_digest(data) == known_digest:
+        return path, 'cached', len(data), len(data)
+    new_src = shrink_source(data.decode('utf-8', errors='surrogateescape'), entry_point)
+    if new_src is None:
+        return path, 'unchanged', len(data), len(data)
+    new_data = new_src.encode('utf-8', errors='surrogateescape')
+    with open(path, 'wb') as f:
+        f.write(new_data)
+    return path, 'shrunk', len(data), len(new_data)
+
+class Shrinker:
+    """Process pool that shrinks files, with per-directory digest caches."""
+
+    def __init__(self, entry_point: str, jobs: int = 1):
+        self.entry_point = entry_point
+        self.executor = ProcessPoolExecutor(max_workers=max(1, jobs))
+        self.lock = threading.Lock()
+        self.caches: Dict[str, Dict[str, str]] = {}
+        self.stats = {'shrunk': 0, 'unchanged': 0, 'cached': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    def _cache(self, directory: str) -> Dict[str, str]:
+        if directory not in self.caches:
+            try:
+                with open(os.path.join(directory, CACHE_FILE)) as f:
+                    self.caches[directory] = json.load(f)
+            except (OSError, ValueError):
+                self.caches[directory] = {}
+        return self.caches[directory]
+
+    def submit(self, path: str) -> Future:
+        directory, name = os.path.split(os.path.abspath(path))
+        with self.lock:
+            known = self._cache(directory).get(name)
+        future = self.executor.submit(shrink_file, path, self.entry_point, known)
+        future.add_done_callback(lambda f: self._record(directory, name, f))
+        return future
+
+    def _record(self, directory: str, name: str, future: Future) -> None:
+        if future.exception() is not None:
+            return
+        path, status, before, after = future.result()
+        with open(path, 'rb') as f:
+            digest = file_digest(f.read())
+        with self.lock:
+            self._cache(directory)[name] = digest
+            self.stats[status] += 1
+            self.stats['bytes_before'] += before
+            self.stats['bytes_after'] += after
+
+    def shrink(self, path: str) -> str:
+        """Shrink one file and wait for it; errors leave the file as it is."""
+        try:
+            self.submit(path).result()
+        except Exception as e:
+            print(f"Shrinking {path} failed: {e}", file=sys.stderr)
+        return path
+
+    def shrink_dir(self, directory: str) -> None:
+        paths = [os.path.join(p, f) for p, _, fs in os.walk(directory) for f in sorted(fs) if f.endswith('.py')]
+        for future in [self.submit(p) for p in paths]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Shrinking failed: {e}", file=sys.stderr)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for directory, cache in self.caches.items():
+                try:
+                    with open(os.path.join(directory, CACHE_FILE), 'w') as f:
+                        json.dump(cache, f)
+                except OSError:
+                    pass
+
+    def report(self, file=sys.stderr) -> None:
+        s = self.stats
+        saved = s['bytes_before'] - s['bytes_after']
+        print(f"Shrink: {s['shrunk']} shrunk, {s['unchanged']} unchanged, {s['cached']} cached; "
+              f"{saved} bytes removed", file=file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stream(shrinker: Shrinker, infile=sys.stdin, outfile=sys.stdout) -> None:
+    """Filter for the genvariants -> genoutputs pipe: a count line, then one path per line.
+
+    Every path is passed on as soon as it has been shrunk.
+    """
+    count = infile.readline()
+    if not count:
+        return
+    outfile.write(count)
+    outfile.flush()
+    out_lock = threading.Lock()
+
+    def forward(path, future):
+        if future.exception() is not None:
+            print(f"Shrinking {path} failed: {future.exception()}", file=sys.stderr)
+        with out_lock:
+            outfile.write(path + '\n')
+            outfile.flush()
+
+    futures = []
+    for line in infile:
+        path = line.strip()
+        if not path:
+            continue
+        future = shrinker.submit(path)
+        future.add_done_callback(lambda f, p=path: forward(p, f))
+        futures.append(future)
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove functions unreachable from the entry point')
+    parser.add_argument('paths', nargs='*', help='Files or directories to shrink in place')
+    parser.add_argument('-f', '--function', default=None,
+                        help='Entry function (default: cli.genoutputs.driver.function_name)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--stream', action='store_true',
+                        help='Shrink the variant paths read from stdin and pass them on to stdout')
+    args = parser.parse_args()
+    if not args.paths and not args.stream:
+        parser.error('nothing to shrink')
+
+    entry_point = args.function
+    if entry_point is None:
+        import util
+        entry_point = util.get_config('cli.genoutputs.driver.function_name')
+
+    with Shrinker(entry_point, args.jobs) as shrinker:
+        if args.stream:
+            stream(shrinker)
+        for path in args.paths:
+            if os.path.isdir(path):
+                shrinker.shrink_dir(path)
+            else:
+                shrinker.shrink(path)
+    shrinker.report()
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,19 @@
 import os
 import click
-import subprocess
 import sys
-from typing import List
+
+import shrink_batch
+import util
 
 @click.command()
 @click.option('--source-dir', 'source_dir', type=click.Path(exists=True))
-def main(source_dir: click.Path):
+@click.option('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+def main(source_dir: click.Path, jobs: int):
     # print(f'Shrink files in {str(source_dir)}...', file=sys.stderr)
-    ps: List[subprocess.Popen] = []
-    for p, ds, fs in os.walk(str(source_dir)):
-        for f in fs:
-            if f.endswith('.py'):
-                file = os.path.join(p, f)
-                ps.append(subprocess.Popen(['python', 'shrink_variant.py', file]))
-    for p in ps:
-        p.wait()
+    entry_point = util.get_config('cli.genoutputs.driver.function_name')
+    with shrink_batch.Shrinker(entry_point, jobs) as shrinker:
+        shrinker.shrink_dir(str(source_dir))
+    shrinker.report(file=sys.stderr)
 
 if __name__ == '__main__':
     main()
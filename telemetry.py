@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Lightweight stage telemetry for the evolution loop.
+
+Every pipeline entry point (genvariants_parallel_net, genoutputs_net,
+getcov_fuzzbench_net, select_seeds_net, select_states_net, ...) wraps its
+work in a ``span``. When ``ELMFUZZ_TIMELINE`` points at a file, each span is
+appended to it as one JSON line; otherwise spans are no-ops. do_gen_net.sh
+sets ``ELMFUZZ_TIMELINE`` to ``<gen>/logs/timeline.jsonl`` so that every
+process of a generation writes to the same timeline.
+
+Usage from Python:
+
+    import telemetry
+    with telemetry.span('genoutputs', pool='0001', model='codellama') as sp:
+        ...
+        sp.add_items(1)
+
+Usage from the shell:
+
+    python telemetry.py run --stage seed_gen --pool 0001 -- python seed_gen_rtsp.py ...
+    python telemetry.py summary gen*/logs/timeline.jsonl
+    python telemetry.py chrome gen3/logs/timeline.jsonl -o gen3.trace.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+TIMELINE_ENV = 'ELMFUZZ_TIMELINE'
+GEN_ENV = 'ELMFUZZ_GEN'
+
+_write_lock = threading.Lock()
+
+# Spans open in this process, to tell which ones ran concurrently with a
+# span of another thread
+_open_spans = set()
+_open_lock = threading.Lock()
+
+# Linux only; elsewhere a concurrent span records no CPU time
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', None)
+
+def timeline_path() -> Optional[str]:
+    """Return the timeline file of the current generation, if telemetry is enabled."""
+    path = os.environ.get(TIMELINE_ENV)
+    return path if path else None
+
+def _cpu_seconds(who) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss is in KiB on Linux. Children only count once they are reaped.
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+def emit(event: Dict[str, Any], path: Optional[str] = None) -> None:
+    """Append one event to the timeline. Silently does nothing if telemetry is off."""
+    if path is None:
+        path = timeline_path()
+    if path is None:
+        return
+    event.setdefault('event', 'span')
+    event.setdefault('gen', os.environ.get(GEN_ENV))
+    event.setdefault('host', os.uname().nodename)
+    event.setdefault('pid', os.getpid())
+    line = json.dumps(event, default=str) + '\n'
+    try:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # One write() on an O_APPEND descriptor keeps lines from concurrent
+        # processes from interleaving.
+        with _write_lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+    except OSError as e:
+        print(f"Warning: could not write telemetry to {path}: {e}", file=sys.stderr)
+
+def record(stage: str, start: float, end: float, pool: Optional[str] = None,
+           model: Optional[str] = None, items: Optional[int] = None, **attrs) -> None:
+    """Record a span whose start/end were measured elsewhere (e.g. a container run)."""
+    emit({
+        'stage': stage,
+        'pool': pool,
+        'model': model,
+        'start': start,
+        'end': end,
+        'duration': end - start,
+        'items': items,
+        'status': attrs.pop('status', 'ok'),
+        'attrs': attrs,
+    })
+
+class Span:
+    """Context manager timing one stage of the pipeline.
+
+    Records wall-clock start/end, CPU seconds of this process and of the
+    children reaped while the span was open, peak RSS and the number of
+    items processed.
+
+    getrusage counts the whole process, so a span that overlaps a span of
+    another thread (the per-pool spans of genpools_net, the aflnet.job
+    spans of the LocalBackend threads) cannot claim it: its cpu_seconds are
+    those of its own thread only (RUSAGE_THREAD) and children_cpu_seconds is
+    left out (``cpu_scope`` is ``thread``). Nested spans of one thread keep
+    the process-wide figures, the outer one including the inner.
+    """
+    def __init__(self, stage: str, pool: Optional[str] = None, model: Optional[str] = None, **attrs):
+        self.stage = stage
+        self.pool = pool
+        self.model = model
+        self.attrs = attrs
+        self.items = 0
+        self.start = None
+        self.end = None
+
+    def add_items(self, n: int = 1) -> None:
+        self.items += n
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def elapsed(self) -> float:
+        if self.start is None:
+            return 0.0
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        with _open_lock:
+            self.concurrent = False
+            for other in _open_spans:
+                if other.thread != self.thread:
+                    other.concurrent = self.concurrent = True
+            _open_spans.add(self)
+        self.start = time.time()
+        self.cpu_self = _cpu_seconds(resource.RUSAGE_SELF)
+        self.cpu_thread = _cpu_seconds(RUSAGE_THREAD) if RUSAGE_THREAD is not None else None
+        self.cpu_children = _cpu_seconds(resource.RUSAGE_CHILDREN)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.time()
+        with _open_lock:
+            _open_spans.discard(self)
+        if not self.concurrent:
+            cpu_self = _cpu_seconds(resource.RUSAGE_SELF) - self.cpu_self
+            cpu_children = _cpu_seconds(resource.RUSAGE_CHILDREN) - self.cpu_children
+        else:
+            cpu_self = _cpu_seconds(RUSAGE_THREAD) - self.cpu_thread if RUSAGE_THREAD is not None else None
+            cpu_children = None
+        emit({
+            'stage': self.stage,
+            'pool': self.pool,
+            'model': self.model,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.end - self.start,
+            'cpu_seconds': cpu_self,
+            'children_cpu_seconds': cpu_children,
+            'cpu_scope': 'thread' if self.concurrent else 'process',
+            'peak_rss_kb': _peak_rss_kb(),
+            'items': self.items,
+            'tid': self.thread,
+            'status': 'ok' if exc_type is None else f'error:{exc_type.__name__}',
+            'attrs': self.attrs,
+        })
+        return False
+
+def span(stage: str, pool: Optional[str] = None, model: Optional[str] = None, **attrs) -> Span:
+    return Span(stage, pool=pool, model=model, **attrs)
+
+def load_events(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    events = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A process killed mid-write may leave a truncated last line
+                    print(f"Warning: skipping malformed telemetry line in {path}", file=sys.stderr)
+    events.sort(key=lambda e: e.get('start') or 0)
+    return events
+
+def to_chrome_trace(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert timeline events to the Chrome trace event format (chrome://tracing, Perfetto)."""
+    trace = []
+    processes = {}
+    for e in events:
+        if e.get('start') is None or e.get('end') is None:
+            continue
+        proc_key = (e.get('host'), e.get('pid'))
+        if proc_key not in processes:
+            processes[proc_key] = len(processes) + 1
+            trace.append({
+                'name': 'process_name', 'ph': 'M', 'pid': processes[proc_key],
+                'args': {'name': f"{e.get('host')}:{e.get('pid')} {e['stage'].split('.')[0]}"},
+            })
+        name = e['stage'] if not e.get('pool') else f"{e['stage']} [{e['pool']}]"
+        args = {k: e.get(k) for k in ('gen', 'model', 'pool', 'items', 'cpu_seconds',
+                                      'children_cpu_seconds', 'cpu_scope', 'peak_rss_kb', 'status')
+                if e.get(k) is not None}
+        args.update(e.get('attrs') or {})
+        trace.append({
+            'name': name,
+            'cat': e['stage'].split('.')[0],
+            'ph': 'X',
+            'ts': e['start'] * 1e6,
+            'dur': (e['end'] - e['start']) * 1e6,
+            'pid': processes[proc_key],
+            'tid': e.get('tid') or 0,
+            'args': args,
+        })
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+def _union_length(intervals: List[tuple]) -> float:
+    total = 0.0
+    cur_start = cur_end = None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+def summarize(events: List[Dict[str, Any]], by_pool: bool = False) -> Dict[str, Any]:
+    """Aggregate spans per stage (optionally per stage and pool)."""
+    groups = defaultdict(list)
+    for e in events:
+        if e.get('start') is None or e.get('end') is None:
+            continue
+        key = (e.get('gen'), e['stage'], e.get('pool') if by_pool else None)
+        groups[key].append(e)
+    if not groups:
+        return {'wall_seconds': 0.0, 'stages': []}
+    first = min(e['start'] for g in groups.values() for e in g)
+    last = max(e['end'] for g in groups.values() for e in g)
+    rows = []
+    for (gen, stage, pool), evs in sorted(groups.items(), key=lambda kv: min(e['start'] for e in kv[1])):
+        busy = _union_length([(e['start'], e['end']) for e in evs])
+        items = sum(e.get('items') or 0 for e in evs)
+        rows.append({
+            'gen': gen,
+            'stage': stage,
+            'pool': pool,
+            'count': len(evs),
+            'wall_seconds': busy,
+            'sum_seconds': sum(e['duration'] for e in evs),
+            'cpu_seconds': sum((e.get('cpu_seconds') or 0) + (e.get('children_cpu_seconds') or 0) for e in evs),
+            'peak_rss_kb': max((e.get('peak_rss_kb') or 0) for e in evs),
+            'items': items,
+            'items_per_second': items / busy if busy > 0 else None,
+            'errors': sum(1 for e in evs if str(e.get('status', 'ok')) != 'ok'),
+        })
+    return {'wall_seconds': last - first, 'stages': rows}
+
+def print_summary(summary: Dict[str, Any], file=sys.stdout) -> None:
+    wall = summary['wall_seconds']
+    print(f"Timeline wall-clock: {wall:.1f}s", file=file)
+    header = f"{'gen':<7} {'stage':<24} {'pool':<6} {'n':>4} {'wall(s)':>10} {'cpu(s)':>10} {'rss(MB)':>8} {'items':>8} {'items/s':>9} {'util%':>6}"
+    print(header, file=file)
+    print('-' * len(header), file=file)
+    for r in summary['stages']:
+        ips = f"{r['items_per_second']:.2f}" if r['items_per_second'] is not None else '-'
+        util = 100.0 * r['wall_seconds'] / wall if wall > 0 else 0.0
+        print(f"{str(r['gen'] or '-'):<7} {r['stage']:<24} {str(r['pool'] or '-'):<6} {r['count']:>4} "
+              f"{r['wall_seconds']:>10.1f} {r['cpu_seconds']:>10.1f} {r['peak_rss_kb'] / 1024:>8.1f} "
+              f"{r['items']:>8} {ips:>9} {util:>6.1f}", file=file)
+
+def run_cmd(args) -> int:
+    # Only the CLI runs commands; the stages importing this module do not need subprocess
+    import subprocess
+    cmd = args.cmd
+    if cmd and cmd[0] == '--':
+        cmd = cmd[1:]
+    if not cmd:
+        print("Error: no command given", file=sys.stderr)
+        return 2
+    with span(args.stage, pool=args.pool, model=args.model, cmd=' '.join(cmd)) as sp:
+        rc = subprocess.call(cmd)
+        sp.set(returncode=rc)
+    return rc
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage telemetry for the evolution loop')
+    subparsers = parser.add_subparsers(dest='subcommand', required=True)
+    cmd = subparsers.add_parser('run', help='Run a command and record it as a span')
+    cmd.add_argument('--stage', required=True)
+    cmd.add_argument('--pool', default=None)
+    cmd.add_argument('--model', default=None)
+    cmd.add_argument('cmd', nargs=argparse.REMAINDER)
+    cmd = subparsers.add_parser('summary', help='Summarize one or more timelines')
+    cmd.add_argument('timelines', nargs='+')
+    cmd.add_argument('--by-pool', action='store_true', help='Break stages down by state pool')
+    cmd.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    cmd = subparsers.add_parser('chrome', help='Export timelines to the Chrome trace format')
+    cmd.add_argument('timelines', nargs='+')
+    cmd.add_argument('-o', '--output', default='trace.json')
+    args = parser.parse_args()
+
+    if args.subcommand == 'run':
+        sys.exit(run_cmd(args))
+    events = load_events(args.timelines)
+    if args.subcommand == 'summary':
+        summary = summarize(events, by_pool=args.by_pool)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary)
+    elif args.subcommand == 'chrome':
+        with open(args.output, 'w') as f:
+            json.dump(to_chrome_trace(events), f)
+        print(f"Wrote {len(events)} spans to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+History-driven execution budgets for the generator modules.
+
+genoutputs_net.py used to give every variant the driver's fixed ``-t``
+timeout (and kill the driver after a multiple of it), however fast the
+variants of the same lineage ran before. The policy keeps the runtimes
+(``data.time_taken`` of successful results in the ``outputgen_*.jsonl``
+logs) per seed lineage, from the last generations and from the siblings that
+finished before the variant was dispatched, and gives a variant
+
+    min(SLACK * quantile(runtimes, q), KILL_FACTOR * median(runtimes))
+
+seconds, never more than the timeout and never less than MIN_BUDGET. With
+fewer than MIN_SAMPLES runtimes of a lineage the runtimes of all lineages
+are used, and with fewer than that the timeout. A variant stopped by its
+budget rather than the timeout is recorded as ``BudgetKill``. genoutputs_net.py
+decides the budgets of a batch when it dispatches it, after observing the
+batches finished by then, and keeps the backlog of a local pool short so
+that the siblings' runtimes and the CPU time used count within the pool.
+
+A generation can also have a CPU-seconds budget (``--cpu-budget``): once the
+executions of the generation have used it up, every variant gets
+MIN_BUDGET. The time used is kept in ``<logdir>/cpu_ledger.json`` so that the
+per-pool genoutputs runs of a generation share it; within a run, the batches
+already dispatched keep their budgets.
+
+The lineage of a variant is the one mutator_bandit.py recorded for its seed
+module (``lineage.json``), or the seed module itself. ELMFUZZ_ADAPTIVE_TIMEOUT=0
+turns the policy off.
+
+    python timeout_policy.py gen3/logs        # budgets the history would give
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from statistics import median
+from typing import Dict, List, Optional
+
+from mutator_bandit import gen_number, lineage_of_base, load_json, seed_stem
+
+POLICY_ENV = 'ELMFUZZ_ADAPTIVE_TIMEOUT'
+LEDGER_FILE = 'cpu_ledger.json'
+
+QUANTILE = 0.9
+SLACK = 2.0
+KILL_FACTOR = 5.0
+MIN_BUDGET = 0.5
+MIN_SAMPLES = 5
+# Generations of history read at startup
+HISTORY_GENS = 3
+
+def policy_enabled() -> bool:
+    return os.environ.get(POLICY_ENV, '1') != '0'
+
+def quantile(samples: List[float], q: float) -> float:
+    s = sorted(samples)
+    pos = q * (len(s) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+class TimeoutPolicy:
+    def __init__(self, timeout: float, logdir: Optional[str] = None, cpu_budget: float = 0.0):
+        self.timeout = timeout
+        self.logdir = logdir
+        self.cpu_budget = cpu_budget
+        self.lock = threading.Lock()
+        self.runtimes: Dict[str, List[float]] = defaultdict(list)
+        self.all_runtimes: List[float] = []
+        self.lineages: Dict[str, str] = {}
+        self.spent = 0.0
+        self.stats = {'decisions': 0, 'adaptive': 0, 'exhausted': 0, 'budget_kills': 0}
+        if logdir is not None:
+            self.spent = (load_json(os.path.join(logdir, LEDGER_FILE)) or {}).get('spent', 0.0)
+
+    def lineage(self, module_path: str) -> str:
+        """Lineage of a variant, from its meta log (``<logdir>/meta/<pool>/``)."""
+        lineage = self.lineages.get(module_path)
+        if lineage is not None:
+            return lineage
+        pool = os.path.basename(os.path.dirname(os.path.abspath(module_path)))
+        stem = os.path.splitext(os.path.basename(module_path))[0]
+        lineage = seed_stem(stem)
+        if self.logdir is not None and stem.startswith('var_'):
+            meta = (load_json(os.path.join(self.logdir, 'meta', pool, f'{stem}.py.json')) or
+                    load_json(os.path.join(self.logdir, 'meta', f'{stem}.py.json')))
+            if meta and meta.get('base'):
+                lineage = lineage_of_base(self.logdir, pool, meta['base'][0])
+        self.lineages[module_path] = lineage
+        return lineage
+
+    def observe(self, module_path: str, results: List[dict]) -> None:
+        """Record the results of one module: runtimes of its lineage, CPU time used."""
+        lineage = self.lineage(module_path)
+        with self.lock:
+            for res in results:
+                t = (res.get('data') or {}).get('time_taken')
+                if t is None:
+                    continue
+                self.spent += t
+                if res.get('result_type') == 'Success':
+                    self.runtimes[lineage].append(t)
+                    self.all_runtimes.append(t)
+                elif res.get('result_type') == 'BudgetKill':
+                    self.stats['budget_kills'] += 1
+
+    def budget(self, module_path: str) -> Optional[float]:
+        """Seconds per call for the module, or None for the plain timeout."""
+        lineage = self.lineage(module_path)
+        with self.lock:
+            self.stats['decisions'] += 1
+            if self.cpu_budget and self.spent >= self.cpu_budget:
+                self.stats['exhausted'] += 1
+                return MIN_BUDGET
+            samples = self.runtimes.get(lineage, [])
+            if len(samples) < MIN_SAMPLES:
+                samples = self.all_runtimes
+            if len(samples) < MIN_SAMPLES:
+                return None
+            b = min(SLACK * quantile(samples, QUANTILE), KILL_FACTOR * median(samples))
+            b = max(MIN_BUDGET, b)
+            if b >= self.timeout:
+                return None
+            self.stats['adaptive'] += 1
+            return round(b, 3)
+
+    def load_history(self, rundir: str, gen: Optional[str] = None) -> int:
+        """Runtimes of the last HISTORY_GENS generations before ``gen`` (all if None)."""
+        logdirs = sorted(glob.glob(os.path.join(rundir, '*', 'logs')),
+                         key=lambda d: gen_number(os.path.basename(os.path.dirname(d))))
+        if gen is not None:
+            logdirs = [d for d in logdirs if gen_number(os.path.basename(os.path.dirname(d))) < gen_number(gen)]
+        n = 0
+        for logdir in logdirs[-HISTORY_GENS:]:
+            past = TimeoutPolicy(self.timeout, logdir)
+            for log_path in glob.glob(os.path.join(logdir, 'outputgen_*.jsonl')):
+                with open(log_path) as f:
+                    for line in f:
+                        try:
+                            res = json.loads(line)
+                        except ValueError:
+                            continue
+                        t = (res.get('data') or {}).get('time_taken')
+                        if res.get('result_type') != 'Success' or t is None or not res.get('module_path'):
+                            continue
+                        lineage = past.lineage(res['module_path'])
+                        self.runtimes[lineage].append(t)
+                        self.all_runtimes.append(t)
+                        n += 1
+        return n
+
+    def save(self) -> None:
+        if self.logdir is None:
+            return
+        path = os.path.join(self.logdir, LEDGER_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'spent': self.spent, 'cpu_budget': self.cpu_budget}, f)
+        os.replace(path + '.tmp', path)
+
+    def report(self, file=sys.stderr) -> None:
+        s = self.stats
+        print(f"Timeout policy: {s['adaptive']} of {s['decisions']} modules got an adaptive budget, "
+              f"{s['budget_kills']} budget kill(s), {s['exhausted']} after the CPU budget ran out; "
+              f"{self.spent:.1f} CPU-s used", file=file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the execution budgets the runtime history gives')
+    parser.add_argument('logdir', help='Log directory of a generation')
+    parser.add_argument('-t', '--timeout', type=float, default=10, help='Driver timeout')
+    args = parser.parse_args()
+
+    logdir = os.path.abspath(args.logdir)
+    gen = os.path.basename(os.path.dirname(logdir))
+    policy = TimeoutPolicy(args.timeout, logdir)
+    n = policy.load_history(os.path.dirname(os.path.dirname(logdir)), gen)
+    print(f"{n} runtimes of {len(policy.runtimes)} lineages before {gen}")
+    print(f"{'lineage':<50} {'n':>6} {'median':>8} {'budget':>8}")
+    for lineage, samples in sorted(policy.runtimes.items()):
+        policy.lineages[lineage] = lineage
+        budget = policy.budget(lineage)
+        print(f"{lineage[:50]:<50} {len(samples):>6} {median(samples):>8.3f} "
+              f"{budget if budget is not None else args.timeout:>8}")
+
+if __name__ == '__main__':
+    main()
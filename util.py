@@ -1,12 +1,15 @@
 import subprocess
-from typing import Union
+from typing import Optional, Union
 
-def get_config(key: str) -> Union[str, list[str]]:
+def get_config(key: str, subs: Optional[dict] = None) -> Union[str, list[str]]:
     cmd = [
         './elmconfig.py',
         'get',
         key
     ]
+    # Template substitutions, e.g. {'GEN': 'gen3', 'MODEL': 'CodeLlama-13b-hf'}
+    for k, v in (subs or {}).items():
+        cmd += ['-s', f'{k}={v}']
     p = subprocess.run(cmd, capture_output=True, check=True)
     r = p.stdout.decode().strip()
     if r.count(' ') > 0:
@@ -34,3 +37,41 @@ def get_state_sequence(content: list[str]) -> list[str]:
         except IndexError:
             return []
     return []
+
+def parse_seed_cov(lines: list[str]) -> tuple[str, list[str]]:
+    """
+    Splits the lines of an AFLNet seed_cov file into the state string and the
+    covered edges. State lines look like: state:0-200-201-202::::
+    Edge lines look like: <edge>:<hits>
+    Returns ("unknown", edges) if the file has no state line.
+    """
+    state_info = "unknown"
+    edges = []
+    for item in lines:
+        if '::::' in item:
+            try:
+                state_info = item.split("state:", 1)[1].split("::::", 1)[0]
+            except IndexError:
+                pass
+            continue
+        edges.append(item.split(':')[0])
+    return state_info, edges
+
+def max_elites_for(generation: str, num_selected: int) -> int:
+    """Elites kept after selecting from ``generation``: run.num_selected grown by the harmonic number."""
+    if not generation.startswith('gen'):
+        return num_selected
+    try:
+        gen_num = int(generation[3:])
+    except ValueError:
+        return num_selected
+    harmonic_sum = sum(1/i for i in range(1, gen_num + 1))
+    return int(num_selected * (1 + harmonic_sum))
+
+def aflnet_schedule(next_gen: int) -> tuple[int, int]:
+    """AFLNet fuzzing timeout (s) and skip count of the coverage run of a generation."""
+    return (3 if next_gen > 5 else next_gen + 1) * 3600, (next_gen + 1) * 20
+
+def aflnet_cpus(pool: str) -> int:
+    # The elite pool holds every elite, so its container gets more CPUs
+    return 3 if pool == '0000' else 1
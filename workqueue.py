@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Work queue for the expensive stages of a generation.
+
+Stages hand their jobs (AFLNet container runs, batches of generator
+executions, ...) to a backend and get ``concurrent.futures.Future`` objects
+back, so callers keep using ``as_completed`` as before:
+
+    backend = workqueue.get_backend(max_workers=8)
+    with backend:
+        futures = {backend.submit(run_aflnet_job, payload, queue='aflnet'): payload
+                   for payload in payloads}
+        for future in as_completed(futures):
+            ...
+
+A handler is a top-level function of a module in the repository root (or
+its ``module:function`` name). It is called with the payload as keyword
+arguments; for the shared queue, payload and result must be JSON
+serializable.
+
+Without ``ELMFUZZ_QUEUE`` the jobs run on this host in a thread or process
+pool (``LocalBackend``). With ``ELMFUZZ_QUEUE=/shared/rundir/queue.sqlite``
+the jobs go to a SQLite queue on the shared file system
+(``SharedQueueBackend``) and are executed by workers started on any host
+that mounts the run directory:
+
+    python workqueue.py worker --db /shared/rundir/queue.sqlite --slots 4 --queue aflnet
+    python workqueue.py status --db /shared/rundir/queue.sqlite
+
+Workers lease jobs for a limited time and renew the lease with a heartbeat
+while the job runs. Leases of crashed or unreachable workers expire and the
+job is handed to another worker, up to ``max_attempts`` times.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+QUEUE_ENV = 'ELMFUZZ_QUEUE'
+LOCAL_SLOTS_ENV = 'ELMFUZZ_QUEUE_LOCAL_SLOTS'
+
+DEFAULT_LEASE = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    handler TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, queue, id);
+"""
+
+class JobFailed(Exception):
+    pass
+
+Handler = Union[str, Callable[..., Any]]
+
+def handler_name(handler: Handler) -> str:
+    if isinstance(handler, str):
+        return handler
+    module_name = handler.__module__
+    if module_name == '__main__':
+        # The submitting stage runs as a script; workers import it by file name
+        module_name = os.path.splitext(os.path.basename(sys.modules['__main__'].__file__))[0]
+    return f'{module_name}:{handler.__name__}'
+
+def resolve_handler(handler: Handler):
+    if not isinstance(handler, str):
+        return handler
+    module_name, func_name = handler.split(':', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+def call_handler(handler: Handler, payload: Dict[str, Any]) -> Any:
+    """Top-level so that it can be shipped to a process pool."""
+    return resolve_handler(handler)(**payload)
+
+class LocalBackend:
+    """Runs jobs on this host. ``processes`` selects a process pool over threads."""
+    def __init__(self, max_workers: Optional[int] = None, processes: bool = False):
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, handler: Handler, payload: Dict[str, Any], queue: str = 'default') -> Future:
+        return self.executor.submit(call_handler, handler, payload)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class WorkQueue:
+    """SQLite-backed job table. Every call opens its own connection, so an
+    instance can be shared between threads."""
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _open(self) -> sqlite3.Connection:
+        # Rollback journal rather than WAL: WAL needs shared memory and does
+        # not work on network file systems.
+        conn = sqlite3.connect(self.path, timeout=120, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connect(self):
+        conn = self._open()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, handler: str, payload: Dict[str, Any], queue: str = 'default',
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                'INSERT INTO jobs (queue, handler, payload, max_attempts, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                (queue, handler, json.dumps(payload), max_attempts, now, now))
+            return cur.lastrowid
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+            "error = COALESCE(error, '') || 'lease of ' || lease_owner || ' expired; ', "
+            "lease_owner = NULL, lease_expires = NULL, updated = ? "
+            "WHERE status = 'leased' AND lease_expires < ?", (now, now))
+
+    def lease(self, owner: str, queues: Optional[List[str]] = None,
+              lease_seconds: float = DEFAULT_LEASE) -> Optional[sqlite3.Row]:
+        now = time.time()
+        conn = self._open()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._expire_leases(conn, now)
+            if queues:
+                marks = ','.join('?' * len(queues))
+                row = conn.execute(
+                    f"SELECT * FROM jobs WHERE status = 'pending' AND queue IN ({marks}) ORDER BY id LIMIT 1",
+                    queues).fetchone()
+            else:
+                row = conn.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, row['id']))
+            conn.execute('COMMIT')
+            return row
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_ids: List[int], owner: str, lease_seconds: float = DEFAULT_LEASE) -> None:
+        if not job_ids:
+            return
+        now = time.time()
+        marks = ','.join('?' * len(job_ids))
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET lease_expires = ?, updated = ? "
+                f"WHERE status = 'leased' AND lease_owner = ? AND id IN ({marks})",
+                [now + lease_seconds, now, owner] + list(job_ids))
+
+    def complete(self, job_id: int, owner: str, result: Any) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result), time.time(), job_id, owner))
+
+    def fail(self, job_id: int, owner: str, error: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+                "error = COALESCE(error, '') || ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (f'[{owner}] {error}\n', time.time(), job_id, owner))
+
+    def poll(self, job_ids: List[int]) -> List[sqlite3.Row]:
+        if not job_ids:
+            return []
+        rows = []
+        with self._connect() as conn:
+            # Stay below SQLite's limit on the number of host parameters
+            for start in range(0, len(job_ids), 500):
+                chunk = job_ids[start:start + 500]
+                marks = ','.join('?' * len(chunk))
+                rows += conn.execute(
+                    f"SELECT id, status, result, error FROM jobs WHERE id IN ({marks}) "
+                    f"AND status IN ('done', 'failed')", chunk).fetchall()
+        return rows
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        with self._connect() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute('SELECT queue, status, COUNT(*) AS n FROM jobs GROUP BY queue, status').fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            counts.setdefault(row['queue'], {})[row['status']] = row['n']
+        return counts
+
+    def requeue_failed(self, queue: Optional[str] = None) -> int:
+        with self._connect() as conn:
+            if queue is None:
+                cur = conn.execute("UPDATE jobs SET status = 'pending', attempts = 0 WHERE status = 'failed'")
+            else:
+                cur = conn.execute("UPDATE jobs SET status = 'pending', attempts = 0 WHERE status = 'failed' AND queue = ?",
+                                   (queue,))
+            return cur.rowcount
+
+class Worker:
+    """Leases jobs from the queue and runs them in ``slots`` threads."""
+    def __init__(self, wq: WorkQueue, queues: Optional[List[str]] = None, slots: int = 1,
+                 lease_seconds: float = DEFAULT_LEASE, idle_sleep: float = 2.0, exit_when_idle: bool = False):
+        self.wq = wq
+        self.queues = queues
+        self.slots = slots
+        self.lease_seconds = lease_seconds
+        self.idle_sleep = idle_sleep
+        self.exit_when_idle = exit_when_idle
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.active: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def _heartbeat_loop(self):
+        while not self.stop.wait(self.lease_seconds / 3):
+            with self.lock:
+                job_ids = list(self.active)
+            try:
+                self.wq.heartbeat(job_ids, self.owner, self.lease_seconds)
+            except sqlite3.Error as e:
+                print(f"Warning: heartbeat failed: {e}", file=sys.stderr)
+
+    def _slot_loop(self):
+        while not self.stop.is_set():
+            job = self.wq.lease(self.owner, self.queues, self.lease_seconds)
+            if job is None:
+                if self.exit_when_idle:
+                    return
+                self.stop.wait(self.idle_sleep)
+                continue
+            with self.lock:
+                self.active[job['id']] = job['handler']
+            print(f"[{self.owner}] running job {job['id']} ({job['queue']}, attempt {job['attempts'] + 1})", file=sys.stderr)
+            try:
+                result = call_handler(job['handler'], json.loads(job['payload']))
+                self.wq.complete(job['id'], self.owner, result)
+            except Exception:
+                self.wq.fail(job['id'], self.owner, traceback.format_exc())
+                print(f"[{self.owner}] job {job['id']} failed", file=sys.stderr)
+            finally:
+                with self.lock:
+                    del self.active[job['id']]
+
+    def start(self) -> List[threading.Thread]:
+        threads = [threading.Thread(target=self._heartbeat_loop, daemon=True)]
+        threads += [threading.Thread(target=self._slot_loop, daemon=True) for _ in range(self.slots)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def run(self):
+        threads = self.start()
+        try:
+            for t in threads[1:]:
+                t.join()
+        except KeyboardInterrupt:
+            print("Stopping worker; leased jobs will be re-queued once their lease expires", file=sys.stderr)
+        finally:
+            self.stop.set()
+
+class SharedQueueBackend:
+    """Submits jobs to a shared WorkQueue and resolves futures as workers finish them.
+
+    With ``local_slots`` > 0 this process also works on the queue itself, so a
+    single host makes progress without separately started workers.
+    """
+    def __init__(self, path: str, local_slots: int = 0, poll_interval: float = 2.0,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, lease_seconds: float = DEFAULT_LEASE):
+        self.wq = WorkQueue(path)
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.futures: Dict[int, Future] = {}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.poller = threading.Thread(target=self._poll_loop, daemon=True)
+        self.poller.start()
+        self.worker = None
+        if local_slots > 0:
+            self.worker = Worker(self.wq, None, local_slots, lease_seconds)
+            self.worker.start()
+
+    def submit(self, handler: Handler, payload: Dict[str, Any], queue: str = 'default') -> Future:
+        job_id = self.wq.submit(handler_name(handler), payload, queue, self.max_attempts)
+        future: Future = Future()
+        with self.lock:
+            self.futures[job_id] = future
+        return future
+
+    def _poll_loop(self):
+        last_report = time.time()
+        while not self.stop.wait(self.poll_interval):
+            with self.lock:
+                pending = list(self.futures)
+            if not pending:
+                continue
+            try:
+                rows = self.wq.poll(pending)
+            except sqlite3.Error as e:
+                print(f"Warning: polling the work queue failed: {e}", file=sys.stderr)
+                continue
+            for row in rows:
+                with self.lock:
+                    future = self.futures.pop(row['id'], None)
+                if future is None:
+                    continue
+                if row['status'] == 'done':
+                    future.set_result(json.loads(row['result']))
+                else:
+                    future.set_exception(JobFailed(f"job {row['id']} failed:\n{row['error']}"))
+            if time.time() - last_report > 60:
+                last_report = time.time()
+                print(f"Work queue {self.wq.path}: {len(self.futures)} job(s) outstanding; {self.wq.counts()}",
+                      file=sys.stderr)
+
+    def close(self):
+        with self.lock:
+            outstanding = list(self.futures.values())
+        for future in outstanding:
+            try:
+                future.exception()
+            except BaseException:
+                pass
+        self.stop.set()
+        if self.worker is not None:
+            self.worker.stop.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def get_backend(max_workers: Optional[int] = None, processes: bool = False):
+    """The shared queue if ELMFUZZ_QUEUE is set, otherwise a local pool."""
+    path = os.environ.get(QUEUE_ENV)
+    if not path:
+        return LocalBackend(max_workers=max_workers, processes=processes)
+    local_slots = int(os.environ.get(LOCAL_SLOTS_ENV, '0'))
+    return SharedQueueBackend(path, local_slots=local_slots)
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared work queue for distributed generations')
+    subparsers = parser.add_subparsers(dest='subcommand', required=True)
+    cmd = subparsers.add_parser('worker', help='Run jobs from the queue')
+    cmd.add_argument('--db', default=os.environ.get(QUEUE_ENV), help='Path to the queue database')
+    cmd.add_argument('--queue', action='append', default=None,
+                     help='Only take jobs from this queue (may be repeated; default: all)')
+    cmd.add_argument('--slots', type=int, default=1, help='Number of jobs to run concurrently')
+    cmd.add_argument('--lease', type=float, default=DEFAULT_LEASE,
+                     help='Lease duration in seconds; renewed every lease/3 while a job runs')
+    cmd.add_argument('--exit-when-idle', action='store_true', help='Exit once the queue is empty')
+    cmd = subparsers.add_parser('status', help='Print job counts per queue and status')
+    cmd.add_argument('--db', default=os.environ.get(QUEUE_ENV))
+    cmd = subparsers.add_parser('requeue', help='Put failed jobs back into the queue')
+    cmd.add_argument('--db', default=os.environ.get(QUEUE_ENV))
+    cmd.add_argument('--queue', default=None)
+    args = parser.parse_args()
+
+    if not args.db:
+        parser.error(f'No queue database given (--db or ${QUEUE_ENV})')
+    wq = WorkQueue(args.db)
+    if args.subcommand == 'worker':
+        # Handlers are resolved relative to the repository root
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        Worker(wq, args.queue, args.slots, args.lease, exit_when_idle=args.exit_when_idle).run()
+    elif args.subcommand == 'status':
+        for queue, counts in sorted(wq.counts().items()):
+            print(f"{queue:<16} " + ' '.join(f'{k}={v}' for k, v in sorted(counts.items())))
+    elif args.subcommand == 'requeue':
+        print(f"Re-queued {wq.requeue_failed(args.queue)} job(s)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()